@@ -0,0 +1,70 @@
+"""LZH展開のベンチマークスクリプト
+
+年度パック（data/annual/<年>/*.lzh）について、インプロセスのデコーダーとlhaコマンドの展開時間を比較する。
+lhaコマンドがインストールされていない環境では、インプロセスのデコーダーのみ計測する。
+
+使用例:
+    python scripts/benchmark_lzh_extractor.py
+    python scripts/benchmark_lzh_extractor.py --years 2023 2024 --repeat 3
+"""
+
+import argparse
+import shutil
+import sys
+import time
+from pathlib import Path
+
+# パス設定
+PREDICTION_APP_DIRECTORY = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PREDICTION_APP_DIRECTORY))
+
+from src.jrdb_scraper.lzh_decoder import iter_lzh_members
+from src.jrdb_scraper.lzh_extractor import extract_lzh_file_with_lha
+
+ANNUAL_DATA_DIRECTORY = PREDICTION_APP_DIRECTORY.parent.parent / "data" / "annual"
+
+
+def measure(func, repeat: int) -> tuple[float, object]:
+    """最速の処理時間（秒）と結果を返す"""
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LZH展開のベンチマーク")
+    parser.add_argument("--years", nargs="+", default=["2023", "2024"], help="対象年度（data/annual配下のディレクトリ名）")
+    parser.add_argument("--data-dir", type=Path, default=ANNUAL_DATA_DIRECTORY, help="年度パックのディレクトリ")
+    parser.add_argument("--repeat", type=int, default=3, help="計測回数（最速値を採用）")
+    args = parser.parse_args()
+
+    has_lha = shutil.which("lha") is not None
+    if not has_lha: print("lhaコマンドが見つからないため、インプロセスのデコーダーのみ計測します")
+
+    print(f"{'ファイル':<16}{'メンバー数':>10}{'展開後(MB)':>12}{'インプロセス':>14}{'lha':>10}{'比率':>8}")
+    total_in_process, total_lha = 0.0, 0.0
+    for year in args.years:
+        for path in sorted((args.data_dir / year).glob("*.lzh")):
+            buffer = path.read_bytes()
+            in_process_time, members = measure(lambda buffer=buffer: [member for member in iter_lzh_members(buffer) if member[1].endswith(".txt")], args.repeat)
+            total_in_process += in_process_time
+            size_mb = sum(len(content) for content, _ in members) / 1e6
+
+            lha_column, ratio_column = f"{'-':>10}", f"{'-':>8}"
+            if has_lha:
+                lha_time, lha_members = measure(lambda buffer=buffer: extract_lzh_file_with_lha(buffer), args.repeat)
+                total_lha += lha_time
+                # 展開結果が一致することを確認
+                if sorted(lha_members, key=lambda m: m[1]) != sorted(members, key=lambda m: m[1]): raise AssertionError(f"展開結果がlhaと一致しません: {path}")
+                lha_column, ratio_column = f"{lha_time:>9.3f}秒", f"{lha_time / in_process_time:>7.2f}倍"
+
+            print(f"{path.name:<16}{len(members):>10}{size_mb:>12.1f}{in_process_time:>13.3f}秒{lha_column}{ratio_column}")
+
+    print(f"合計: インプロセス {total_in_process:.3f}秒" + (f", lha {total_lha:.3f}秒" if has_lha else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""騎手・調教師の直近Nレース抽出のベンチマークスクリプト
+
+1シーズン分の合成データで、従来のグループ単位ループ実装とベクトル化実装の処理時間を比較する。
+
+使用例:
+    python scripts/benchmark_recent_races.py
+    python scripts/benchmark_recent_races.py --races 3456 --jockeys 150 --repeat 3
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# パス設定
+PREDICTION_APP_DIRECTORY = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PREDICTION_APP_DIRECTORY))
+
+from src.data_processer._03_01_time_series_statistics import TimeSeriesStatistics
+from src.data_processer._03_04_jockey_statistics import JockeyStatistics
+
+
+def make_season(num_races: int, num_jockeys: int, horses_per_race: int, seed: int) -> pd.DataFrame:
+    """1シーズン分の合成データを作成（1日12レース、騎手は1日に複数騎乗）"""
+    rng = np.random.default_rng(seed)
+    n = num_races * horses_per_race
+    race_idx = np.repeat(np.arange(num_races), horses_per_race)
+    day_idx = race_idx // 12
+    ymd = (pd.Timestamp("2024-01-06") + pd.to_timedelta(day_idx * 3, unit="D")).strftime("%Y%m%d").astype(int).to_numpy()
+    df = pd.DataFrame({
+        "race_key": [f"{(r % 10) + 1:02d}_{r // 120 + 1}_{(r // 12) % 10 + 1}_{r % 12 + 1:02d}" for r in race_idx],
+        "馬番": np.tile(np.arange(1, horses_per_race + 1), num_races),
+        "騎手コード": np.char.add("J", rng.integers(0, num_jockeys, size=n).astype(str)).astype(object),
+        "start_datetime": ymd.astype(np.int64) * 10000,
+        "着順": np.tile(np.arange(1, horses_per_race + 1), num_races).astype(float),
+        "タイム": rng.integers(1000, 2500, size=n).astype(float),
+        "馬場状態": rng.integers(1, 5, size=n),
+        "R": race_idx % 12 + 1,
+        "芝ダ障害コード": rng.integers(1, 3, size=n),
+        "頭数": horses_per_race,
+        "距離": rng.choice([1200, 1600, 2000, 2400], size=n),
+    })
+    return df
+
+
+def legacy_recent_races(stats_df: pd.DataFrame, target_df: pd.DataFrame, group_col: str, time_col: str, columns: list[str], num_races: int) -> pd.DataFrame:
+    """従来実装（グループ単位のループ × 対象行 × N × カラムの多重ループ）"""
+    prefix_jp = JockeyStatistics.JP_PREFIX
+    grouped_stats = stats_df.groupby(group_col, sort=False)
+    results = []
+    for group_value, group_targets in target_df.groupby(group_col, sort=False):
+        if group_value not in grouped_stats.groups: continue
+        group_stats = grouped_stats.get_group(group_value).sort_values(by=time_col).reset_index(drop=True)
+        n_targets = len(group_targets)
+        result_data = {f"{prefix_jp}直近{i}{col}": np.full(n_targets, np.nan) for i in range(1, num_races + 1) for col in columns}
+        stats_arrays = {col: group_stats[col].values for col in columns}
+        search_indices = np.searchsorted(group_stats[time_col].values, group_targets[time_col].values, side="left")
+        for target_idx in range(n_targets):
+            past_count = search_indices[target_idx]
+            for i in range(1, min(num_races, past_count) + 1):
+                for col in columns: result_data[f"{prefix_jp}直近{i}{col}"][target_idx] = stats_arrays[col][past_count - i]
+        results.append(pd.DataFrame(result_data, index=group_targets.index))
+    return pd.concat(results).reindex(target_df.index)
+
+
+def measure(func, repeat: int) -> tuple[float, object]:
+    """最速の処理時間（秒）と結果を返す"""
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="直近Nレース抽出のベンチマーク")
+    parser.add_argument("--races", type=int, default=3456, help="レース数（JRAの1シーズン相当）")
+    parser.add_argument("--jockeys", type=int, default=150, help="騎手数")
+    parser.add_argument("--horses-per-race", type=int, default=14, help="1レースあたりの頭数")
+    parser.add_argument("--repeat", type=int, default=3, help="計測回数（最速値を採用）")
+    parser.add_argument("--seed", type=int, default=0, help="乱数シード")
+    args = parser.parse_args()
+
+    df = make_season(args.races, args.jockeys, args.horses_per_race, args.seed)
+    target_df = df.set_index(JockeyStatistics.MERGE_KEYS)
+    group_col, time_col = JockeyStatistics.GROUP_COLUMN, JockeyStatistics.TIME_COLUMN
+    columns = JockeyStatistics._get_available_recent_race_columns(df)
+    num_races = JockeyStatistics.RECENT_RACES_COUNT
+
+    print(f"データ: {len(df):,}行, 騎手数: {df[group_col].nunique()}, 直近{num_races}レース × {len(columns)}カラム")
+
+    legacy_time, legacy_df = measure(lambda: legacy_recent_races(df, target_df, group_col, time_col, columns, num_races), args.repeat)
+    vectorized_time, vectorized_df = measure(lambda: TimeSeriesStatistics.recent_races(df, target_df, group_col, time_col, JockeyStatistics.JP_PREFIX, columns, num_races, JockeyStatistics.MERGE_KEYS), args.repeat)
+
+    # 結果が一致することを確認
+    value_cols = list(legacy_df.columns)
+    np.testing.assert_allclose(legacy_df[value_cols].to_numpy(dtype=float), vectorized_df[value_cols].to_numpy(dtype=float), equal_nan=True)
+
+    print(f"従来実装:       {legacy_time:8.3f}秒")
+    print(f"ベクトル化実装: {vectorized_time:8.3f}秒")
+    print(f"高速化:         {legacy_time / vectorized_time:8.1f}倍")
+
+
+if __name__ == "__main__":
+    main()
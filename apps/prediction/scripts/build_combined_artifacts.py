@@ -0,0 +1,51 @@
+"""年度パックParquetから年度ごとの結合済みデータ（combined/combined_{年度}.parquet）を作成するスクリプト"""
+
+import argparse
+import logging
+import sys
+from pathlib import Path
+
+# パス設定
+PREDICTION_APP_DIRECTORY = Path(__file__).resolve().parent.parent
+PROJECT_ROOT_DIRECTORY = PREDICTION_APP_DIRECTORY.parent.parent
+sys.path.insert(0, str(PREDICTION_APP_DIRECTORY))
+
+from src.data_processer._02_01_combined_artifact import CombinedArtifactStore
+from src.utils.jrdb_format_loader import JRDBFormatLoader
+from src.utils.schema_loader import SchemaFile, SchemaLoader
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def create_combined_artifact_store(parquet_dir: Path) -> CombinedArtifactStore:
+    """プロジェクトのスキーマ・フォーマット定義を使う結合済みデータのストアを作成"""
+    schema_loader = SchemaLoader(PROJECT_ROOT_DIRECTORY / 'packages' / 'data' / 'schemas')
+    format_loader = JRDBFormatLoader(PREDICTION_APP_DIRECTORY / 'src' / 'jrdb_scraper' / 'formats')
+    return CombinedArtifactStore(
+        parquet_dir, schema_loader.load_schema(SchemaFile.COMBINED), schema_loader.get_schema_path(SchemaFile.COMBINED), format_loader
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='年度ごとの結合済みデータの作成スクリプト')
+    parser.add_argument('--parquet-dir', type=Path, default=PREDICTION_APP_DIRECTORY / 'cache' / 'jrdb' / 'parquet', help='年度パックParquetのディレクトリ（デフォルト: cache/jrdb/parquet）')
+    parser.add_argument('--years', nargs='+', type=int, required=True, help='作成する年度')
+    parser.add_argument('--force', action='store_true', help='マニフェストと一致していても再作成する')
+
+    args = parser.parse_args()
+
+    store = create_combined_artifact_store(args.parquet_dir)
+    results = [store.build(year, force=args.force) for year in args.years]
+
+    print("\n=== 作成結果 ===")
+    for result in results:
+        if not result['success']:
+            print(f"✗ {result['year']}: エラー - {result['error']}")
+        elif result['skipped']:
+            print(f"- {result['year']}: 最新のため省略 ({result['recordCount']:,}件) - {result['outputPath']}")
+        else:
+            print(f"✓ {result['year']}: {result['recordCount']:,}件 - {result['outputPath']}")
+
+    successCount = sum(1 for r in results if r['success'])
+    print(f"\n成功: {successCount}/{len(results)}")
+    sys.exit(0 if successCount == len(results) else 1)
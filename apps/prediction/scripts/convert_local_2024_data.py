@@ -8,8 +8,11 @@ PREDICTION_APP_DIRECTORY = Path(__file__).resolve().parent.parent
 PROJECT_ROOT_DIRECTORY = PREDICTION_APP_DIRECTORY.parent.parent
 sys.path.insert(0, str(PREDICTION_APP_DIRECTORY))
 
+from src.data_processer._02_01_combined_artifact import CombinedArtifactStore
 from src.jrdb_scraper.convert_local_folder_to_parquet import convert_local_folder_to_parquet
 from src.jrdb_scraper.entities.jrdb import JRDBDataType, get_all_data_types
+from src.utils.jrdb_format_loader import JRDBFormatLoader
+from src.utils.schema_loader import SchemaFile, SchemaLoader
 
 # 設定
 INPUT_FOLDER = PROJECT_ROOT_DIRECTORY / 'data' / 'annual' / '2024'
@@ -50,3 +53,17 @@ for result in results:
 
 print(f"\n成功: {success_count}/{len(results)}")
 
+
+# 学習時に結合処理を省略できるように、年度ごとの結合済みデータを作成（KYI/BAC/SED/UKC/TYBがすべて揃っている場合のみ）
+schema_loader = SchemaLoader(PROJECT_ROOT_DIRECTORY / 'packages' / 'data' / 'schemas')
+combined_artifact_store = CombinedArtifactStore(
+    OUTPUT_DIR,
+    schema_loader.load_schema(SchemaFile.COMBINED),
+    schema_loader.get_schema_path(SchemaFile.COMBINED),
+    JRDBFormatLoader(PREDICTION_APP_DIRECTORY / 'src' / 'jrdb_scraper' / 'formats'),
+)
+combined_result = combined_artifact_store.build(YEAR)
+if combined_result['success']:
+    print(f"結合済みデータ: {combined_result['recordCount']:,}件 - {combined_result['outputPath']}")
+else:
+    print(f"結合済みデータ: 作成しませんでした - {combined_result['error']}")
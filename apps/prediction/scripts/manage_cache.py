@@ -0,0 +1,73 @@
+"""前処理済みデータのキャッシュ（apps/prediction/cache）の一覧・ヒット率・削除可能な容量を表示し、容量上限まで削除するスクリプト"""
+
+import argparse
+import sys
+from pathlib import Path
+from typing import Optional
+
+# パス設定
+PREDICTION_APP_DIRECTORY = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PREDICTION_APP_DIRECTORY))
+
+from src.utils.cache_manager import CacheManager
+
+
+def format_size(size_bytes: int) -> str:
+    """バイト数をMB/GB表記に変換"""
+    if size_bytes >= 1024 ** 3:
+        return f"{size_bytes / 1024 ** 3:.2f}GB"
+    return f"{size_bytes / 1024 ** 2:.1f}MB"
+
+
+def print_entries(cacheManager: CacheManager) -> None:
+    """キャッシュエントリの一覧を最終アクセスが古い順に表示"""
+    entries = cacheManager.list_entries()
+    print(f"{'最終アクセス':<26} {'作成日時':<26} {'ヒット':>6} {'サイズ':>10}  エントリ")
+    for entry in entries:
+        print(
+            f"{entry['last_accessed_at']:<26} {entry['created_at']:<26} {entry['hits']:>6} "
+            f"{format_size(entry['size_bytes']):>10}  {entry['id']}"
+        )
+    print(f"\n合計: {len(entries)}件, {format_size(sum(e['size_bytes'] for e in entries))}")
+
+
+def print_stats(cacheManager: CacheManager, maxSizeBytes: Optional[int]) -> None:
+    """ステージごとのヒット率と、容量上限に対して削除可能な容量を表示"""
+    print("=== ヒット率 ===")
+    for stage, stats in sorted(cacheManager.get_stats().items()):
+        total = stats['hits'] + stats['misses']
+        hitRate = stats['hits'] / total * 100 if total else 0.0
+        print(f"{stage:<12} ヒット: {stats['hits']:>6}  ミス: {stats['misses']:>6}  ヒット率: {hitRate:5.1f}%")
+
+    totalSize = cacheManager.get_total_size()
+    print("\n=== 容量 ===")
+    print(f"合計: {format_size(totalSize)}")
+    if maxSizeBytes is None:
+        print("容量上限: 未設定（--max-size-gbまたは環境変数PREDICTION_CACHE_MAX_SIZE_GBで指定）")
+        return
+    candidates = cacheManager.get_eviction_candidates(maxSizeBytes)
+    print(f"容量上限: {format_size(maxSizeBytes)}")
+    print(f"削除可能: {format_size(sum(e['size_bytes'] for e in candidates))}（{len(candidates)}件、最終アクセスが古い順）")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='前処理済みデータのキャッシュ管理スクリプト')
+    parser.add_argument('command', choices=['list', 'stats', 'evict'], help='list: エントリ一覧, stats: ヒット率と削除可能な容量, evict: 容量上限まで削除')
+    parser.add_argument('--max-size-gb', type=float, help='容量上限（GB、省略時は環境変数PREDICTION_CACHE_MAX_SIZE_GB）')
+    parser.add_argument('--prediction-app-dir', type=Path, default=PREDICTION_APP_DIRECTORY, help='apps/predictionディレクトリ（デフォルト: このスクリプトの親ディレクトリ）')
+
+    args = parser.parse_args()
+
+    maxSizeBytes = int(args.max_size_gb * 1024 ** 3) if args.max_size_gb is not None else None
+    cacheManager = CacheManager(args.prediction_app_dir, max_size_bytes=maxSizeBytes)
+
+    if args.command == 'list':
+        print_entries(cacheManager)
+    elif args.command == 'stats':
+        print_stats(cacheManager, cacheManager.max_size_bytes)
+    else:
+        if cacheManager.max_size_bytes is None:
+            print("容量上限が指定されていません（--max-size-gbまたは環境変数PREDICTION_CACHE_MAX_SIZE_GB）")
+            sys.exit(1)
+        evicted = cacheManager.evict()
+        print(f"\n削除: {len(evicted)}件, 残り: {format_size(cacheManager.get_total_size())}")
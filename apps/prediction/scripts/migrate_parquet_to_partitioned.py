@@ -0,0 +1,37 @@
+"""既存の年度パックParquet（{データタイプ}_{年度}.parquet）をHiveパーティション形式（type=/year=/month=）に移行するスクリプト"""
+
+import argparse
+import logging
+import sys
+from pathlib import Path
+
+# パス設定
+PREDICTION_APP_DIRECTORY = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PREDICTION_APP_DIRECTORY))
+
+from src.jrdb_scraper.partitioned_dataset import migrate_flat_to_partitioned
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='年度パックParquetのパーティション形式への移行スクリプト')
+    parser.add_argument('--parquet-dir', type=Path, default=PREDICTION_APP_DIRECTORY / 'cache' / 'jrdb' / 'parquet', help='Parquetファイルのディレクトリ（デフォルト: cache/jrdb/parquet）')
+    parser.add_argument('--data-types', nargs='+', help='移行するデータタイプ（例: SED BAC、省略時は全て）')
+    parser.add_argument('--years', nargs='+', type=int, help='移行する年度（省略時は全て）')
+    parser.add_argument('--keep-flat', action='store_true', help='移行後もフラット形式のファイルを残す')
+
+    args = parser.parse_args()
+
+    print(f"Parquetディレクトリ: {args.parquet_dir}")
+    results = migrate_flat_to_partitioned(args.parquet_dir, dataTypes=args.data_types, years=args.years, keepFlat=args.keep_flat)
+
+    print("\n=== 移行結果 ===")
+    for result in results:
+        if result['success']:
+            print(f"✓ {result['dataType']}_{result['year']}: {result['recordCount']:,}件 - {result['outputPath']}")
+        else:
+            print(f"✗ {result['dataType']}_{result['year']}: エラー - {result['error']}")
+
+    successCount = sum(1 for r in results if r['success'])
+    print(f"\n成功: {successCount}/{len(results)}")
+    sys.exit(0 if successCount == len(results) else 1)
@@ -0,0 +1,76 @@
+"""直前情報（TYB）の更新で内容が変わったレースのみを予測し直し、予測結果JSON・Firestoreの該当レースを置き換えるスクリプト"""
+
+import argparse
+import logging
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+# パス設定
+PREDICTION_APP_DIRECTORY = Path(__file__).resolve().parent.parent
+PROJECT_ROOT_DIRECTORY = PREDICTION_APP_DIRECTORY.parent.parent
+sys.path.insert(0, str(PREDICTION_APP_DIRECTORY))
+
+from src.executor.prediction_executor import PredictionExecutor
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='直前情報（TYB）の更新で内容が変わったレースのみを予測し直す')
+    parser.add_argument('date', help='予測対象日付（YYYY-MM-DD形式、全レースの予測済みの日）')
+    parser.add_argument('--model-path', type=Path, required=True, help='モデルファイルのパス')
+    parser.add_argument('--tyb-parquet', type=Path, help='更新後のTYBのParquetファイル（省略時はdata/daily/MM/DDの日次LZHファイルを変換する）')
+    parser.add_argument('--parquet-dir', type=Path, default=PREDICTION_APP_DIRECTORY / 'cache' / 'jrdb' / 'parquet', help='年度パックParquetのディレクトリ（デフォルト: cache/jrdb/parquet）')
+    parser.add_argument('--output-path', type=Path, help='予測結果JSONのパス（デフォルト: output/prediction_results_{日付}.json）')
+    parser.add_argument('--json-indent', type=int, default=2, help='JSON出力のインデント（デフォルト: 2）')
+    parser.add_argument('--save-to-firestore', action='store_true', help='Firestoreの予測結果の該当レースも置き換える')
+    parser.add_argument('--use-emulator', action='store_true', help='Firebaseエミュレーターを使用')
+
+    args = parser.parse_args()
+
+    try:
+        year = datetime.strptime(args.date, "%Y-%m-%d").year
+    except ValueError:
+        print("✗ 日付形式が正しくありません。YYYY-MM-DD形式で指定してください。例: 2025-12-13")
+        sys.exit(1)
+
+    dailyParquetPath = args.parquet_dir / 'daily' / args.date
+    if not dailyParquetPath.exists():
+        print(f"✗ 予測済みの日次Parquetが見つかりません（先にrun_daily_prediction.pyで全レースを予測してください）: {dailyParquetPath}")
+        sys.exit(1)
+    outputPath = args.output_path or PREDICTION_APP_DIRECTORY / 'output' / f'prediction_results_{args.date}.json'
+
+    if args.tyb_parquet:
+        tybDf = pd.read_parquet(args.tyb_parquet)
+    else:
+        tybDf = PredictionExecutor.load_updated_tyb(str(PROJECT_ROOT_DIRECTORY / 'data' / 'daily'), args.date, year)
+        if tybDf is None:
+            print(f"✗ 日次データにTYBが存在しません: {args.date}")
+            sys.exit(1)
+
+    resources = PredictionExecutor.load_resources(args.model_path, PROJECT_ROOT_DIRECTORY, args.parquet_dir, year)
+    # Firestoreも置き換える場合、日次ParquetのTYBはFirestoreの置き換え後に更新する（失敗した場合は次回も同じレースを予測し直す）
+    raceKeys, predictions = PredictionExecutor.repredict_changed_races(
+        args.date, tybDf, dailyParquetPath, resources, args.parquet_dir,
+        output_path=str(outputPath), json_indent=args.json_indent, apply_tyb=not args.save_to_firestore,
+    )
+
+    print("\n=== 再予測結果 ===")
+    if not raceKeys:
+        print("✓ TYBの内容が変わったレースはありません")
+        sys.exit(0)
+    print(f"✓ 予測し直したレース: {len(raceKeys)}レース, {len(predictions)}頭 - {', '.join(raceKeys)}")
+    print(f"✓ 予測結果JSON: {outputPath}")
+
+    if args.save_to_firestore:
+        if args.use_emulator:
+            os.environ['USE_FIREBASE_EMULATOR'] = 'true'
+            os.environ.setdefault('FIRESTORE_EMULATOR_HOST', '127.0.0.1:8180')
+        from src.utils.firestore_saver import update_race_predictions_in_firestore
+        totalCount = update_race_predictions_in_firestore(args.date, predictions, raceKeys)
+        print(f"✓ Firestore: {totalCount}件（{len(raceKeys)}レースを置き換え）")
+        PredictionExecutor.apply_updated_tyb(dailyParquetPath, year, tybDf)
@@ -0,0 +1,51 @@
+"""スキーマ・モデル・エンティティ状態を読み込んだまま予測リクエストを受け付ける常駐予測サービスを起動するスクリプト"""
+
+import argparse
+import logging
+import sys
+from datetime import datetime
+from pathlib import Path
+
+# パス設定
+PREDICTION_APP_DIRECTORY = Path(__file__).resolve().parent.parent
+PROJECT_ROOT_DIRECTORY = PREDICTION_APP_DIRECTORY.parent.parent
+sys.path.insert(0, str(PREDICTION_APP_DIRECTORY))
+
+from src.executor.prediction_service import PredictionService
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='常駐予測サービスの起動スクリプト')
+    parser.add_argument('--model-path', type=Path, required=True, help='モデルファイルのパス')
+    parser.add_argument('--host', default='127.0.0.1', help='待ち受けるホスト（デフォルト: 127.0.0.1）')
+    parser.add_argument('--port', type=int, default=8765, help='待ち受けるポート（デフォルト: 8765）')
+    parser.add_argument('--parquet-dir', type=Path, default=PREDICTION_APP_DIRECTORY / 'cache' / 'jrdb' / 'parquet', help='年度パックParquetのディレクトリ（デフォルト: cache/jrdb/parquet）')
+    parser.add_argument('--daily-data-dir', type=Path, default=PROJECT_ROOT_DIRECTORY / 'data' / 'daily', help='日次LZHファイルのディレクトリ（デフォルト: data/daily）')
+    parser.add_argument('--output-dir', type=Path, default=PREDICTION_APP_DIRECTORY / 'output', help='/repredictのoutput_pathに指定できるディレクトリ（デフォルト: output）')
+    parser.add_argument('--preload-years', nargs='*', type=int, default=[datetime.now().year], help='起動時にリソースを読み込む年度（デフォルト: 今年）')
+
+    args = parser.parse_args()
+
+    if not args.model_path.exists():
+        print(f"✗ モデルファイルが見つかりません: {args.model_path}")
+        sys.exit(1)
+
+    service = PredictionService(args.model_path, PROJECT_ROOT_DIRECTORY, args.parquet_dir, args.daily_data_dir, output_dir=args.output_dir)
+    for year in args.preload_years:
+        service.get_resources(year)
+        print(f"✓ {year}: 予測リソースを読み込みました")
+
+    server = service.create_server(args.host, args.port)
+    print(f"\n予測サービスを起動しました: http://{args.host}:{args.port}")
+    print("  GET  /health")
+    print(f'  POST /predict  {{"date": "YYYY-MM-DD", "daily_parquet_path": 省略可（{args.parquet_dir / "daily"}内）, "race_keys": 省略可（リスト）}}')
+    print(f'  POST /repredict  {{"date": "YYYY-MM-DD", "tyb_parquet_path": 省略可（{args.parquet_dir}内）, "output_path": 省略可（{args.output_dir}内）}}')
+    print("  POST /reload")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n予測サービスを停止します")
+    finally:
+        server.server_close()
@@ -0,0 +1,66 @@
+"""日次予測用のエンティティ状態のスナップショットを作成し、SEDの結果（成績データ）を取り込むスクリプト"""
+
+import argparse
+import logging
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+# パス設定
+PREDICTION_APP_DIRECTORY = Path(__file__).resolve().parent.parent
+PROJECT_ROOT_DIRECTORY = PREDICTION_APP_DIRECTORY.parent.parent
+sys.path.insert(0, str(PREDICTION_APP_DIRECTORY))
+
+from src.data_processer._03_08_entity_state_snapshot import EntityStateSnapshot
+from src.utils.parquet_loader import ParquetLoader
+from src.utils.schema_loader import SchemaFile, SchemaLoader
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='エンティティ状態のスナップショットの作成・更新スクリプト')
+    parser.add_argument('--parquet-dir', type=Path, default=PREDICTION_APP_DIRECTORY / 'cache' / 'jrdb' / 'parquet', help='年度パックParquetのディレクトリ（デフォルト: cache/jrdb/parquet）')
+    parser.add_argument('--years', nargs='+', type=int, required=True, help='予測対象年度（各年度のスナップショットは前年度までの結果を保持）')
+    parser.add_argument('--sed-parquet', nargs='+', type=Path, default=[], help='取り込むSEDの結果のParquetファイル（対象年度より前の結果のみ取り込む）')
+    parser.add_argument('--rebuild', action='store_true', help='SED年度パックからスナップショットを作り直す')
+    parser.add_argument('--verify', action='store_true', help='更新後のスナップショットを、年度パックと--sed-parquetの全件から再計算した結果と比較する（--sed-parquetには年度パックに未反映の結果をすべて指定する）')
+
+    args = parser.parse_args()
+
+    schemaLoader = SchemaLoader(PROJECT_ROOT_DIRECTORY / 'packages' / 'data' / 'schemas')
+    featureExtractionSchema = schemaLoader.load_schema(SchemaFile.FEATURE_EXTRACTION)
+    parquetLoader = ParquetLoader(args.parquet_dir)
+    sedDfs = [pd.read_parquet(path) for path in args.sed_parquet]
+
+    print("\n=== 更新結果 ===")
+    verifyFailed = False
+    for year in args.years:
+        startTime = time.perf_counter()
+        directory = EntityStateSnapshot.get_dir(args.parquet_dir, year)
+        snapshot = None if args.rebuild else EntityStateSnapshot.load(directory)
+        rebuilt = snapshot is None or not snapshot.is_current(parquetLoader)
+        if rebuilt:
+            snapshot = EntityStateSnapshot.build(parquetLoader, year, featureExtractionSchema)
+        ingestedCount = sum(snapshot.update(sedDf, featureExtractionSchema) for sedDf in sedDfs)
+        snapshot.save(directory)
+        elapsed = time.perf_counter() - startTime
+        asOf = f"{snapshot.as_of:.0f}" if snapshot.as_of is not None else "-"
+        print(f"✓ {year}: {'作成' if rebuilt else '更新'} 取り込み: {ingestedCount:,}行, 合計: {len(snapshot):,}行, 最新レース: {asOf}, {elapsed:.1f}秒 - {directory}")
+        if sedDfs and ingestedCount == 0:
+            print(f"⚠ {year}: --sed-parquetの結果は取り込まれませんでした（取り込み済み、または対象外の年度。取り込み対象は{snapshot.window_years}年の結果のみで、{year}年の結果は{year + 1}年のスナップショットに取り込まれます）")
+
+        if args.verify:
+            expected = EntityStateSnapshot.build(parquetLoader, year, featureExtractionSchema, additional_sed=sedDfs)
+            differences = snapshot.diff(expected)
+            if differences:
+                verifyFailed = True
+                print(f"✗ {year}: 全件から再計算した結果と一致しません")
+                for difference in differences:
+                    print(f"    {difference}")
+            else:
+                print(f"✓ {year}: 全件から再計算した結果と一致しました")
+
+    sys.exit(1 if verifyFailed else 0)
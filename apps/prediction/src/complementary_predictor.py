@@ -19,6 +19,7 @@ import numpy as np
 import pandas as pd
 
 from .features import Features
+from .inference_plan import InferencePlan
 
 
 class ComplementaryPredictor:
@@ -790,148 +791,45 @@ class ComplementaryPredictor:
                 "time_model_stage1が提供されていません。学習時に第1段階のモデルも保存してください。"
             )
 
-        # 学習時に使用された特徴量名を取得（モデルから取得）
-        # LightGBMモデルはfeature_name()メソッドを持っている
-        try:
-            model_feature_names = time_model_stage1.feature_name()
-            if model_feature_names and len(model_feature_names) > 0:
-                # モデルが期待する特徴量名を順序通りに使用（モデルの順序を保持）
-                # 重要: モデルの期待する順序で特徴量を提供する必要がある
-                time_features_stage1 = []
-                for f in model_feature_names:
-                    if f in race_df_processed.columns:
-                        # object型のカラムは除外（LightGBMは数値型のみ受け付ける）
-                        if race_df_processed[f].dtype != "object":
-                            time_features_stage1.append(f)
-
-                # モデルが期待する特徴量がすべて存在するか確認
-                if len(time_features_stage1) != len(model_feature_names):
-                    missing_features = set(model_feature_names) - set(time_features_stage1)
-                    # object型のカラムが除外された場合は警告のみ
-                    object_missing = [
-                        f
-                        for f in missing_features
-                        if f in race_df_processed.columns and race_df_processed[f].dtype == "object"
-                    ]
-                    if object_missing:
-                        print(f"警告: object型の特徴量が除外されました: {object_missing}")
-                        missing_features = missing_features - set(object_missing)
-
-                    if missing_features:
-                        raise ValueError(
-                            f"タイム予測モデルが期待する特徴量が見つかりません: {missing_features}\n"
-                            f"期待される特徴量数: {len(model_feature_names)}, 見つかった特徴量数: {len(time_features_stage1)}\n"
-                            f"期待される特徴量: {model_feature_names[:10]}...\n"
-                            f"利用可能な特徴量: {race_df_processed.columns.tolist()[:30]}..."
-                        )
-            else:
-                # モデルから特徴量名を取得できない場合は、features_for_lgbを使用
-                time_features_stage1 = features_for_lgb.copy()
-        except (AttributeError, TypeError) as e:
-            # モデルから特徴量名を取得できない場合は、features_for_lgbを使用
-            print(f"警告: モデルから特徴量名を取得できませんでした: {e}")
-            print(f"features_for_lgbを使用します（{len(features_for_lgb)}特徴量）")
-            time_features_stage1 = features_for_lgb.copy()
-
-        # 念のため、object型のカラムが含まれていないか確認
-        object_features = [
-            f for f in time_features_stage1 if race_df_processed[f].dtype == "object"
-        ]
-        if object_features:
-            print(f"警告: object型の特徴量が検出されました。除外します: {object_features}")
-            time_features_stage1 = [f for f in time_features_stage1 if f not in object_features]
-
-        predicted_time_stage1 = time_model_stage1.predict(
-            race_df_processed[time_features_stage1], num_iteration=time_model_stage1.best_iteration
-        )
-        race_df_processed["predicted_time"] = predicted_time_stage1
+        # 各段階のモデルの特徴量順の入力行列に値を取り出して予測（推論計画はモデルごとに1回だけ作成）
+        # モデルから特徴量名を取得できない場合は、features_for_lgbを使用
+        time_plan_stage1 = InferencePlan.for_model(time_model_stage1, features_for_lgb)
+        ComplementaryPredictor._check_missing_features(time_plan_stage1, race_df_processed, "タイム予測モデル")
+        race_df_processed["predicted_time"] = time_plan_stage1.predict(race_df_processed)
 
         # ステップ2: 第2段階の着順予測モデルで着順を予測（predicted_timeを含む）
-        # object型のカラムを除外（LightGBMは数値型のみ受け付ける）
         rank_features = [
             f
             for f in features.encoded_feature_names
             if f in race_df_processed.columns and race_df_processed[f].dtype != "object"
         ]
-        if "predicted_time" not in rank_features and "predicted_time" in race_df_processed.columns:
+        if "predicted_time" not in rank_features:
             rank_features.append("predicted_time")
-
-        # 念のため、object型のカラムが含まれていないか確認
-        object_features = [f for f in rank_features if race_df_processed[f].dtype == "object"]
-        if object_features:
-            print(f"警告: object型の特徴量が検出されました。除外します: {object_features}")
-            rank_features = [f for f in rank_features if f not in object_features]
-
-        predicted_rank = rank_model_v2.predict(
-            race_df_processed[rank_features], num_iteration=rank_model_v2.best_iteration
-        )
+        rank_plan = InferencePlan.for_model(rank_model_v2, rank_features)
+        ComplementaryPredictor._check_missing_features(rank_plan, race_df_processed, "着順予測モデル（第2段階）")
+        predicted_rank = rank_plan.predict(race_df_processed)
         race_df_processed["predicted_rank"] = predicted_rank
 
         # ステップ3: 第3段階のタイム予測モデルでタイムを再予測（predicted_rankを含む）
         # 第3段階のモデルは第1段階と同じ特徴量 + predicted_rankを使用
-        try:
-            model_feature_names_v2 = time_model_v2.feature_name()
-            if model_feature_names_v2 and len(model_feature_names_v2) > 0:
-                # モデルが期待する特徴量名を順序通りに使用（モデルの順序を保持）
-                # 重要: モデルの期待する順序で特徴量を提供する必要がある
-                time_features_v2 = []
-                for f in model_feature_names_v2:
-                    if f in race_df_processed.columns:
-                        # object型のカラムは除外（LightGBMは数値型のみ受け付ける）
-                        if race_df_processed[f].dtype != "object":
-                            time_features_v2.append(f)
-
-                # モデルが期待する特徴量がすべて存在するか確認
-                if len(time_features_v2) != len(model_feature_names_v2):
-                    missing_features = set(model_feature_names_v2) - set(time_features_v2)
-                    # object型のカラムが除外された場合は警告のみ
-                    object_missing = [
-                        f
-                        for f in missing_features
-                        if f in race_df_processed.columns and race_df_processed[f].dtype == "object"
-                    ]
-                    if object_missing:
-                        print(f"警告: object型の特徴量が除外されました: {object_missing}")
-                        missing_features = missing_features - set(object_missing)
-
-                    if missing_features:
-                        raise ValueError(
-                            f"タイム予測モデル（第3段階）が期待する特徴量が見つかりません: {missing_features}\n"
-                            f"期待される特徴量数: {len(model_feature_names_v2)}, 見つかった特徴量数: {len(time_features_v2)}\n"
-                            f"期待される特徴量: {model_feature_names_v2[:10]}...\n"
-                            f"利用可能な特徴量: {race_df_processed.columns.tolist()[:30]}..."
-                        )
-            else:
-                # モデルから特徴量名を取得できない場合は、features_for_lgb + predicted_rankを使用
-                time_features_v2 = features_for_lgb.copy()
-                if (
-                    "predicted_rank" not in time_features_v2
-                    and "predicted_rank" in race_df_processed.columns
-                ):
-                    time_features_v2.append("predicted_rank")
-        except (AttributeError, TypeError) as e:
-            # モデルから特徴量名を取得できない場合は、features_for_lgb + predicted_rankを使用
-            print(f"警告: モデルから特徴量名を取得できませんでした: {e}")
-            print("features_for_lgb + predicted_rankを使用します")
-            time_features_v2 = features_for_lgb.copy()
-            if (
-                "predicted_rank" not in time_features_v2
-                and "predicted_rank" in race_df_processed.columns
-            ):
-                time_features_v2.append("predicted_rank")
-
-        # 念のため、object型のカラムが含まれていないか確認
-        object_features = [f for f in time_features_v2 if race_df_processed[f].dtype == "object"]
-        if object_features:
-            print(f"警告: object型の特徴量が検出されました。除外します: {object_features}")
-            time_features_v2 = [f for f in time_features_v2 if f not in object_features]
-
-        predicted_time_normalized = time_model_v2.predict(
-            race_df_processed[time_features_v2], num_iteration=time_model_v2.best_iteration
-        )
+        time_plan_v2 = InferencePlan.for_model(time_model_v2, features_for_lgb + ["predicted_rank"])
+        ComplementaryPredictor._check_missing_features(time_plan_v2, race_df_processed, "タイム予測モデル（第3段階）")
+        predicted_time_normalized = time_plan_v2.predict(race_df_processed)
 
         result_df = race_df_processed.copy()
         result_df.insert(0, "predict_rank", np.round(predicted_rank, 2))
         result_df.insert(1, "predict_time_normalized", np.round(predicted_time_normalized, 4))
 
         return result_df
+
+    @staticmethod
+    def _check_missing_features(plan: InferencePlan, race_df: pd.DataFrame, model_label: str) -> None:
+        """モデルが期待する特徴量がすべて存在するか確認（存在しない場合はValueError）"""
+        missing_features = plan.missing_features(race_df)
+        if missing_features:
+            raise ValueError(
+                f"{model_label}が期待する特徴量が見つかりません: {set(missing_features)}\n"
+                f"期待される特徴量数: {len(plan.feature_names)}, 見つかった特徴量数: {len(plan.feature_names) - len(missing_features)}\n"
+                f"期待される特徴量: {plan.feature_names[:10]}...\n"
+                f"利用可能な特徴量: {race_df.columns.tolist()[:30]}..."
+            )
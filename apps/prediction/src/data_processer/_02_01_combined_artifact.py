@@ -0,0 +1,159 @@
+"""年度ごとの結合済みデータ（race_key+馬番）のParquetアーティファクト"""
+
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Dict, Optional
+
+import pandas as pd
+
+from src.jrdb_scraper.parquet_manifest import (
+    ManifestEntry,
+    compute_format_hash,
+    compute_hash,
+    is_up_to_date,
+    load_manifest,
+    record_outputs,
+)
+from src.utils.jrdb_format_loader import JRDBFormatLoader
+from src.utils.parquet_loader import ParquetLoader
+from src.utils.schema_loader import Schema
+from ._02_jrdb_combiner import JrdbCombiner
+
+logger = logging.getLogger(__name__)
+
+# 結合処理（JrdbCombiner）の出力が変わる変更をした場合に上げる
+COMBINED_ARTIFACT_VERSION = 1
+
+# 年度パックのディレクトリ内の、結合済みデータの出力ディレクトリ（マニフェストもここに置く）
+COMBINED_DIR_NAME = "combined"
+
+# 結合に使うデータタイプ（KYIがbase、学習用の年度データではすべて必須）
+COMBINED_DATA_TYPES = [JrdbCombiner.BASE_DATA_TYPE] + JrdbCombiner.TARGET_DATA_TYPES
+
+
+class CombinedArtifactStore:
+    """
+    年度パック（KYI/BAC/SED/UKC/TYB）をJrdbCombinerで結合した結果を年度ごとに保存・読み込むクラス
+
+    出力はrace_key・馬番のMultiIndexとstart_datetimeを含む結合結果そのもの（combined/combined_{年度}.parquet）。
+    マニフェストには入力の年度パック（変換元LZH等の変換条件）・フォーマット定義・結合スキーマ・結合処理のバージョンを記録し、
+    すべて一致する場合のみ読み込む。
+    """
+
+    def __init__(
+        self,
+        parquet_base_path: Path,
+        combined_schema: Schema,
+        combined_schema_path: Path,
+        format_loader: JRDBFormatLoader,
+    ):
+        """
+        初期化
+
+        Args:
+            parquet_base_path: 年度パックParquetのベースパス
+            combined_schema: 結合用スキーマ（_02_）
+            combined_schema_path: 結合用スキーマのファイルパス（変更検知用）
+            format_loader: JRDBフォーマット定義のローダー
+        """
+        self._parquet_base_path = Path(parquet_base_path)
+        self._output_dir = self._parquet_base_path / COMBINED_DIR_NAME
+        self._combined_schema = combined_schema
+        self._combined_schema_path = Path(combined_schema_path)
+        self._format_loader = format_loader
+        self._parquet_loader = ParquetLoader(self._parquet_base_path)
+
+    @staticmethod
+    def get_file_name(year: int) -> str:
+        """結合済みデータのファイル名"""
+        return f"combined_{year}.parquet"
+
+    def get_path(self, year: int) -> Path:
+        """結合済みデータのファイルパス"""
+        return self._output_dir / CombinedArtifactStore.get_file_name(year)
+
+    def load(self, year: int) -> Optional[pd.DataFrame]:
+        """
+        結合済みデータを読み込む
+
+        Args:
+            year: 年度
+
+        Returns:
+            結合済みDataFrame（JrdbCombiner.combineの結果と同じ形式、ただしobject型のカラムの欠損はNone）。
+            存在しない、または入力・フォーマット・スキーマ・結合処理のバージョンのいずれかがマニフェストと一致しない場合はNone
+        """
+        file_name = CombinedArtifactStore.get_file_name(year)
+        fingerprint = self.build_fingerprint(year)
+        if fingerprint is None or not is_up_to_date(load_manifest(self._output_dir), self._output_dir, file_name, fingerprint):
+            return None
+        logger.info(f"結合済みデータを読み込みます: {self.get_path(year)}")
+        return pd.read_parquet(self.get_path(year))
+
+    def build(self, year: int, force: bool = False) -> Dict[str, object]:
+        """
+        年度パックを結合して結合済みデータを書き出す（マニフェストと一致する場合は省略）
+
+        Args:
+            year: 年度
+            force: Trueの場合はマニフェストと一致していても再作成する
+
+        Returns:
+            結果辞書（year, success, skipped, recordCount, outputPath, error）
+        """
+        file_name = CombinedArtifactStore.get_file_name(year)
+        output_path = self.get_path(year)
+        fingerprint = self.build_fingerprint(year)
+        if fingerprint is None:
+            missing = [dt.value for dt in COMBINED_DATA_TYPES if not self._parquet_loader.has_annual_pack(dt.value, year)]
+            return {"year": year, "success": False, "skipped": False, "recordCount": 0, "error": f"年度パックが存在しません: {missing}"}
+
+        manifest = load_manifest(self._output_dir)
+        if not force and is_up_to_date(manifest, self._output_dir, file_name, fingerprint):
+            logger.info(f"結合済みデータは最新のため作成を省略します: {output_path}")
+            record_count = manifest[file_name].get("recordCount", 0)
+            return {"year": year, "success": True, "skipped": True, "recordCount": record_count, "outputPath": str(output_path)}
+
+        try:
+            combined_df = self.combine(year)
+            self._output_dir.mkdir(parents=True, exist_ok=True)
+            temporary_path = output_path.with_name(f".{file_name}.tmp")
+            combined_df.to_parquet(temporary_path, compression="snappy")
+            os.replace(temporary_path, output_path)
+            record_outputs(self._output_dir, {file_name: {**fingerprint, "recordCount": len(combined_df)}})
+            logger.info(f"結合済みデータを作成しました: {output_path}（{len(combined_df)}行）")
+            return {"year": year, "success": True, "skipped": False, "recordCount": len(combined_df), "outputPath": str(output_path)}
+        except Exception as e:
+            logger.error(f"結合済みデータの作成エラー: {year}年: {type(e).__name__}: {e}")
+            return {"year": year, "success": False, "skipped": False, "recordCount": 0, "error": str(e)}
+
+    def combine(self, year: int) -> pd.DataFrame:
+        """年度パックを読み込んでJrdbCombinerで結合（結合済みデータを使わない場合の処理）"""
+        data_dict = {
+            data_type: self._parquet_loader.load_annual_pack_parquet(data_type.value, year) for data_type in COMBINED_DATA_TYPES
+        }
+        return JrdbCombiner.combine(data_dict, self._combined_schema, self._format_loader)
+
+    def build_fingerprint(self, year: int) -> Optional[ManifestEntry]:
+        """
+        結合済みデータの作成条件（マニフェストのエントリ）を作成
+
+        Returns:
+            作成条件（いずれかの年度パックが存在しない場合はNone）
+        """
+        if not all(self._parquet_loader.has_annual_pack(dt.value, year) for dt in COMBINED_DATA_TYPES):
+            return None
+        input_hashes = {dt.value: self._parquet_loader.get_annual_pack_fingerprint(dt.value, year) for dt in COMBINED_DATA_TYPES}
+        dependency_hashes = {
+            **{data_type: input_hash for data_type, input_hash in input_hashes.items() if input_hash is not None},
+            "schema": compute_hash(self._combined_schema_path),
+        }
+        format_hashes = {dt.value: compute_format_hash(dt) for dt in COMBINED_DATA_TYPES}
+        return {
+            "sourceHash": compute_hash(json.dumps(input_hashes, sort_keys=True).encode()),
+            "formatHash": compute_hash(json.dumps(format_hashes, sort_keys=True).encode()),
+            "converterVersion": COMBINED_ARTIFACT_VERSION,
+            "dependencyHashes": dict(sorted(dependency_hashes.items())),
+        }
@@ -2,19 +2,28 @@
 
 import gc
 import logging
-from typing import Dict
+from typing import Dict, List, Optional, Union
 
+import numpy as np
 import pandas as pd
+from pandas.api.extensions import ExtensionArray
 
 from src.jrdb_scraper.entities.jrdb import JRDBDataType
 from src.utils.jrdb_format_loader import JRDBFormatLoader
 from src.utils.feature_converter import FeatureConverter
+from src.utils.key_codec import KeyCodec
 from src.utils.schema_loader import Schema
 
 logger = logging.getLogger(__name__)
 
+# カラムの値の配列（numpy配列またはExtensionArray）
+ArrayLike = Union[np.ndarray, ExtensionArray]
+
 class JrdbCombiner:
-    """複数のJRDBデータタイプを1つのDataFrameに結合するクラス（static関数のみ）"""
+    """複数のJRDBデータタイプを1つのDataFrameに結合するクラス（static関数のみ）
+    
+    結合キーのrace_key・血統登録番号等は結合前に整数化する（KeyCodec）。結合結果のrace_keyは整数キー。
+    """
     
     # データ結合設定
     BASE_DATA_TYPE = JRDBDataType.KYI
@@ -22,7 +31,13 @@ class JrdbCombiner:
 
     @staticmethod
     def combine(data_dict: Dict[JRDBDataType, pd.DataFrame], schema: Schema, format_loader: JRDBFormatLoader) -> pd.DataFrame:
-        """全データタイプを1つのDataFrameに結合（結合キーは各データタイプのidentifierColumnsから自動決定）"""
+        """全データタイプを1つのDataFrameに結合（結合キーは各データタイプのidentifierColumnsから自動決定）
+
+        各データタイプはmerge(how="left")と同じ結果になるように、baseの各行に対応するtargetの行位置（見つからない場合は-1）を
+        結合キーのハッシュで1回だけ求め、targetのカラムをその位置でtakeする。中間の結合済みDataFrameは作らず、
+        全カラムを揃えてから最後に1回だけDataFrameを作成する。
+        targetの結合キーが重複削除後も一意でない場合（行が増える場合）のみ、従来どおりmergeで結合する。
+        """
         # 早期バリデーション
         if not data_dict: raise ValueError("データが空です")
         if JrdbCombiner.BASE_DATA_TYPE not in data_dict: raise ValueError(f"{JrdbCombiner.BASE_DATA_TYPE.value}データが必要です。現在のデータタイプ: {', '.join([dt.value for dt in data_dict.keys()])}")
@@ -30,9 +45,12 @@ class JrdbCombiner:
         
         base_type = JrdbCombiner.BASE_DATA_TYPE
         target_data_types = JrdbCombiner.TARGET_DATA_TYPES
-        # base DataFrameをコピーして、元のDataFrameへの参照を切る（メモリ効率化）
-        # 注意: copy()はメモリを一時的に増やすが、後続のmerge操作でメモリを効率的に管理するため必要
-        combined_df = data_dict[base_type].copy()
+        # race_key・エンティティコードを整数化したbase DataFrame（元のDataFrameは変更しない）
+        base_df = KeyCodec.encode_keys(data_dict[base_type])
+        # 結合済みのカラム（カラム名 → 値の配列、base_dfの行順）
+        columns = {col: JrdbCombiner._column_values(base_df[col]) for col in base_df.columns}
+        row_count = len(base_df)
+        del base_df
         
         # baseのidentifierColumnsを取得（インデックスにも使用）
         base_format = format_loader.load_format_definition(base_type)
@@ -47,7 +65,7 @@ class JrdbCombiner:
                     logger.info(f"データタイプ '{target_data_type.value}' は存在しないためスキップします")
                     continue
                 logger.info(f"データタイプ '{target_data_type.value}' の結合を開始")
-                target_df = data_dict[target_data_type]
+                target_df = KeyCodec.encode_keys(data_dict[target_data_type])
                 logger.info(f"データタイプ '{target_data_type.value}' のデータ行数: {len(target_df)}")
                 
                 # 結合先のidentifierColumnsを取得
@@ -56,74 +74,64 @@ class JrdbCombiner:
                 target_identifier_columns = target_format["identifierColumns"]
                 logger.info(f"データタイプ '{target_data_type.value}' のidentifierColumns: {target_identifier_columns}")
                 
-                # 結合キーを自動決定
-                logger.info(f"データタイプ '{target_data_type.value}' の結合キーを決定中...")
-                if set(target_identifier_columns) == base_identifier_columns:
-                    # 1. 一致している場合 → targetのidentifierColumnsを使用
-                    target_join_keys = target_identifier_columns
-                    logger.info(f"データタイプ '{target_data_type.value}': 一致している場合 → {target_join_keys}")
-                elif set(target_identifier_columns).issubset(base_identifier_columns):
-                    # 2. targetがbaseのサブセット → targetのidentifierColumnsを使用
-                    target_join_keys = target_identifier_columns
-                    logger.info(f"データタイプ '{target_data_type.value}': targetがbaseのサブセット → {target_join_keys}")
-                elif not any(col in base_identifier_columns for col in target_identifier_columns):
-                    # 3. targetのidentifierColumnsがbaseのidentifierColumnsに全く含まれていない場合 → baseのDataFrameにtargetのidentifierColumnsが含まれているか確認（マスターデータなど）
-                    available_in_base = [col for col in target_identifier_columns if col in combined_df.columns]
-                    if available_in_base:
-                        target_join_keys = available_in_base
-                        logger.info(f"データタイプ '{target_data_type.value}': マスターデータとして結合 → {target_join_keys}")
-                    else:
-                        logger.error(f"データタイプ '{target_data_type.value}' の結合キーが見つかりません。baseのDataFrameカラム: {list(combined_df.columns)[:20]}")
-                        raise ValueError(f"データタイプ '{target_data_type.value}' とbase '{base_type.value}' のidentifierColumnsに共通部分がなく、baseのDataFrameにも結合先のidentifierColumnsが存在しません。base: {list(base_identifier_columns)}, {target_data_type.value}: {target_identifier_columns}, baseのDataFrameカラム: {list(combined_df.columns)[:20]}")
-                else:
-                    # それ以外はエラー（baseがtargetのサブセットの場合も含む）
-                    if base_identifier_columns.issubset(set(target_identifier_columns)):
-                        logger.error(f"データタイプ '{target_data_type.value}' のidentifierColumnsがbaseより厳しい条件です")
-                        raise ValueError(f"データタイプ '{target_data_type.value}' のidentifierColumnsがbase '{base_type.value}' より厳しい条件です。結合時に情報が失われる可能性があります。base: {list(base_identifier_columns)}, {target_data_type.value}: {target_identifier_columns}")
-                    else:
-                        logger.error(f"データタイプ '{target_data_type.value}' とbaseのidentifierColumnsの関係が不明です")
-                        raise ValueError(f"データタイプ '{target_data_type.value}' とbase '{base_type.value}' のidentifierColumnsの関係が不明です。base: {list(base_identifier_columns)}, {target_data_type.value}: {target_identifier_columns}")
+                target_join_keys = JrdbCombiner._resolve_join_keys(
+                    target_data_type, target_identifier_columns, base_type, base_identifier_columns, list(columns)
+                )
                 
-                # 識別キーで重複を削除（全カラムを保持）
+                # 識別キー（重複削除に使用）
                 existing_target_identifier_columns = [col for col in target_identifier_columns if col in target_df.columns]
                 if not existing_target_identifier_columns: raise ValueError(f"{target_data_type.value}データに識別キーが存在しません。識別キー: {target_identifier_columns}, 利用可能なカラム: {list(target_df.columns)[:10]}")
-                logger.info(f"データタイプ '{target_data_type.value}' の重複削除前: {len(target_df)}行")
-                target_source_df = target_df.drop_duplicates(subset=existing_target_identifier_columns, keep='first')
-                logger.info(f"データタイプ '{target_data_type.value}' の重複削除後: {len(target_source_df)}行")
-                # 元のtarget_dfへの参照を削除（メモリ効率化）
-                del target_df
 
                 # 結合キーの決定（実際に存在するカラムのみ）
-                actual_join_keys = [k for k in target_join_keys if k in combined_df.columns and k in target_source_df.columns]
+                actual_join_keys = [k for k in target_join_keys if k in columns and k in target_df.columns]
                 logger.info(f"データタイプ '{target_data_type.value}' の実際の結合キー: {actual_join_keys}")
                 
                 if not actual_join_keys:
                     logger.error(f"データタイプ '{target_data_type.value}' の結合キーが存在しません。")
                     logger.error(f"  期待される結合キー: {target_join_keys}")
-                    logger.error(f"  combined_dfのカラム（最初の20個）: {list(combined_df.columns)[:20]}")
-                    logger.error(f"  target_source_dfのカラム（最初の20個）: {list(target_source_df.columns)[:20]}")
-                    logger.error(f"  combined_dfに存在する結合キー候補: {[k for k in target_join_keys if k in combined_df.columns]}")
-                    logger.error(f"  target_source_dfに存在する結合キー候補: {[k for k in target_join_keys if k in target_source_df.columns]}")
+                    logger.error(f"  combined_dfのカラム（最初の20個）: {list(columns)[:20]}")
+                    logger.error(f"  target_source_dfのカラム（最初の20個）: {list(target_df.columns)[:20]}")
+                    logger.error(f"  combined_dfに存在する結合キー候補: {[k for k in target_join_keys if k in columns]}")
+                    logger.error(f"  target_source_dfに存在する結合キー候補: {[k for k in target_join_keys if k in target_df.columns]}")
                     raise ValueError(
                         f"データタイプ '{target_data_type.value}' の結合キーが存在しません。\n"
                         f"  期待される結合キー: {target_join_keys}\n"
-                        f"  combined_dfのカラム: {list(combined_df.columns)[:20]}\n"
-                        f"  target_source_dfのカラム: {list(target_source_df.columns)[:20]}\n"
+                        f"  combined_dfのカラム: {list(columns)[:20]}\n"
+                        f"  target_source_dfのカラム: {list(target_df.columns)[:20]}\n"
                         f"  parquetファイルにrace_keyが含まれていない可能性があります。parquetファイルを再生成してください。"
                     )
 
-                # マージ処理（全カラムを結合）
-                logger.info(f"データタイプ '{target_data_type.value}' のマージ開始。結合前の行数: {len(combined_df)}")
-                # mergeは常に新しいDataFrameを作成するため、明示的に古いDataFrameを削除
-                old_combined_df = combined_df
-                combined_df = old_combined_df.merge(target_source_df, on=actual_join_keys, how="left", suffixes=("", f"_{target_data_type.value}"))
-                logger.info(f"データタイプ '{target_data_type.value}' のマージ完了。結合後の行数: {len(combined_df)}")
-                
-                # メモリ解放（明示的に削除してからgc.collect()を呼ぶ）
-                del old_combined_df
-                del target_source_df
-                # 結合処理後は定期的にガベージコレクションを実行（メモリ使用量を抑制）
-                gc.collect()
+                # baseの各行に対応するtargetの行位置（識別キーで重複削除した先頭の行）
+                indexer = JrdbCombiner._take_indexer(columns, target_df, existing_target_identifier_columns, actual_join_keys)
+                if indexer is None:
+                    # 結合キーが一意でない・型が異なる場合はmergeで結合（行数・型の扱いをmergeに合わせる）
+                    logger.info(f"データタイプ '{target_data_type.value}' は結合キーが一意でないためmergeで結合します。結合前の行数: {row_count}")
+                    target_source_df = target_df.drop_duplicates(subset=existing_target_identifier_columns, keep='first')
+                    combined_df = JrdbCombiner._build_frame(columns, row_count).merge(
+                        target_source_df, on=actual_join_keys, how="left", suffixes=("", f"_{target_data_type.value}")
+                    )
+                    if combined_df.columns.has_duplicates:
+                        raise ValueError(f"データタイプ '{target_data_type.value}' の結合でカラム名が重複しました: {list(combined_df.columns[combined_df.columns.duplicated()])}")
+                    columns = {col: JrdbCombiner._column_values(combined_df[col]) for col in combined_df.columns}
+                    row_count = len(combined_df)
+                    del combined_df, target_source_df
+                else:
+                    matched_count = int((indexer >= 0).sum())
+                    logger.info(f"データタイプ '{target_data_type.value}' の結合完了。一致した行数: {matched_count}/{row_count}")
+                    for col in target_df.columns:
+                        if col in actual_join_keys:
+                            continue
+                        # mergeのsuffixes=("", "_{データタイプ}")と同じ命名
+                        name = col if col not in columns else f"{col}_{target_data_type.value}"
+                        if name in columns:
+                            raise ValueError(f"データタイプ '{target_data_type.value}' の結合でカラム名が重複しました: {name}")
+                        columns[name] = JrdbCombiner._take(target_df[col], indexer)
+                del target_df
+
+            # 全カラムを1回で1つのDataFrameにまとめる
+            combined_df = JrdbCombiner._build_frame(columns, row_count)
+            del columns
+            gc.collect()
 
             # 結合完了後にstart_datetimeを計算（年月日/発走時間から算出、race_keyからの導出は禁止）
             if "start_datetime" not in combined_df.columns:
@@ -155,3 +163,92 @@ class JrdbCombiner:
         except Exception as e:
             logger.error(f"データ結合エラー: {type(e).__name__}: {str(e)}", exc_info=True)
             raise
+
+    @staticmethod
+    def _resolve_join_keys(
+        target_data_type: JRDBDataType, target_identifier_columns: List[str], base_type: JRDBDataType,
+        base_identifier_columns: set, combined_columns: List[str]
+    ) -> List[str]:
+        """baseとtargetのidentifierColumnsから結合キーを自動決定"""
+        logger.info(f"データタイプ '{target_data_type.value}' の結合キーを決定中...")
+        if set(target_identifier_columns) == base_identifier_columns:
+            # 1. 一致している場合 → targetのidentifierColumnsを使用
+            logger.info(f"データタイプ '{target_data_type.value}': 一致している場合 → {target_identifier_columns}")
+            return target_identifier_columns
+        if set(target_identifier_columns).issubset(base_identifier_columns):
+            # 2. targetがbaseのサブセット → targetのidentifierColumnsを使用
+            logger.info(f"データタイプ '{target_data_type.value}': targetがbaseのサブセット → {target_identifier_columns}")
+            return target_identifier_columns
+        if not any(col in base_identifier_columns for col in target_identifier_columns):
+            # 3. targetのidentifierColumnsがbaseのidentifierColumnsに全く含まれていない場合 → baseのDataFrameにtargetのidentifierColumnsが含まれているか確認（マスターデータなど）
+            available_in_base = [col for col in target_identifier_columns if col in combined_columns]
+            if available_in_base:
+                logger.info(f"データタイプ '{target_data_type.value}': マスターデータとして結合 → {available_in_base}")
+                return available_in_base
+            logger.error(f"データタイプ '{target_data_type.value}' の結合キーが見つかりません。baseのDataFrameカラム: {combined_columns[:20]}")
+            raise ValueError(f"データタイプ '{target_data_type.value}' とbase '{base_type.value}' のidentifierColumnsに共通部分がなく、baseのDataFrameにも結合先のidentifierColumnsが存在しません。base: {list(base_identifier_columns)}, {target_data_type.value}: {target_identifier_columns}, baseのDataFrameカラム: {combined_columns[:20]}")
+        # それ以外はエラー（baseがtargetのサブセットの場合も含む）
+        if base_identifier_columns.issubset(set(target_identifier_columns)):
+            logger.error(f"データタイプ '{target_data_type.value}' のidentifierColumnsがbaseより厳しい条件です")
+            raise ValueError(f"データタイプ '{target_data_type.value}' のidentifierColumnsがbase '{base_type.value}' より厳しい条件です。結合時に情報が失われる可能性があります。base: {list(base_identifier_columns)}, {target_data_type.value}: {target_identifier_columns}")
+        logger.error(f"データタイプ '{target_data_type.value}' とbaseのidentifierColumnsの関係が不明です")
+        raise ValueError(f"データタイプ '{target_data_type.value}' とbase '{base_type.value}' のidentifierColumnsの関係が不明です。base: {list(base_identifier_columns)}, {target_data_type.value}: {target_identifier_columns}")
+
+    @staticmethod
+    def _take_indexer(
+        columns: Dict[str, ArrayLike], target_df: pd.DataFrame, identifier_columns: List[str], join_keys: List[str]
+    ) -> Optional[np.ndarray]:
+        """
+        baseの各行に対応するtargetの行位置を計算（merge(how="left")で対応する行、見つからない場合は-1）
+
+        targetは識別キーで重複削除した先頭の行のみを対象とする（drop_duplicates(keep='first')と同じ）。
+        結合キーのカラムの型がbaseとtargetで異なる（数値同士を除く）場合、または重複削除後も結合キーが一意でない場合はNone。
+        """
+        for key in join_keys:
+            if not JrdbCombiner._is_compatible_key(columns[key].dtype, target_df[key].dtype):
+                return None
+        kept_positions = np.flatnonzero(~target_df.duplicated(subset=identifier_columns, keep="first").to_numpy())
+        base_codes, target_codes = JrdbCombiner._joint_key_codes(
+            [pd.Series(columns[key]) for key in join_keys], [target_df[key] for key in join_keys]
+        )
+        target_index = pd.Index(target_codes[kept_positions])
+        if not target_index.is_unique:
+            return None
+        positions = target_index.get_indexer(base_codes)
+        return np.where(positions >= 0, kept_positions[positions], -1)
+
+    @staticmethod
+    def _joint_key_codes(base_keys: List[pd.Series], target_keys: List[pd.Series]):
+        """baseとtargetの結合キーを共通の整数コードに変換（欠損値同士も一致として扱う、mergeと同じ）"""
+        base_count = len(base_keys[0])
+        codes = None
+        for base_key, target_key in zip(base_keys, target_keys, strict=True):
+            key_codes, uniques = pd.factorize(pd.concat([base_key, target_key], ignore_index=True), use_na_sentinel=False)
+            # 複数キーは1つのコードにまとめ、桁あふれしないように都度振り直す
+            codes = key_codes if codes is None else pd.factorize(codes * len(uniques) + key_codes)[0]
+        return codes[:base_count], codes[base_count:]
+
+    @staticmethod
+    def _is_compatible_key(base_dtype, target_dtype) -> bool:
+        """結合キーとしてハッシュで突き合わせられる型の組み合わせか（同じ型、またはbool以外の数値同士）"""
+        if base_dtype == target_dtype:
+            return True
+        return all(
+            pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+            for dtype in (base_dtype, target_dtype)
+        )
+
+    @staticmethod
+    def _column_values(series: pd.Series) -> ArrayLike:
+        """Seriesの値の配列（拡張型はExtensionArray、それ以外はnumpy配列）"""
+        return series.array if isinstance(series.dtype, pd.api.extensions.ExtensionDtype) else series.to_numpy()
+
+    @staticmethod
+    def _take(series: pd.Series, indexer: np.ndarray) -> ArrayLike:
+        """行位置で値を取り出す（-1は欠損、mergeと同様に必要な場合のみ欠損を表せる型に変換）"""
+        return pd.api.extensions.take(JrdbCombiner._column_values(series), indexer, allow_fill=True)
+
+    @staticmethod
+    def _build_frame(columns: Dict[str, ArrayLike], row_count: int) -> pd.DataFrame:
+        """カラムの配列から1回でDataFrameを作成（インデックスはmergeの結果と同じ0からの連番）"""
+        return pd.DataFrame(columns, index=pd.RangeIndex(row_count))
@@ -0,0 +1,239 @@
+"""エンティティ（馬・騎手・調教師など）の時系列累積統計を計算する共通カーネル"""
+
+import numpy as np
+import pandas as pd
+
+from src.utils.schema_loader import Schema
+
+
+class TimeSeriesStatistics:
+    """
+    任意のエンティティカラムについて、各レースのstart_datetimeより前の累積成績を計算するクラス（staticメソッドのみ）
+
+    (entity, start_datetime)で1回だけグローバルにソートし、勝利数・3着内数・着順合計・出走回数を
+    エンティティ単位の累積和で求め、対象行ごとの「厳密に前」の累積値を複合キーの1回のsearchsortedで引く。
+    新しいエンティティ（種牡馬、馬主、生産者など）は、グループ化カラムとプレフィックスを渡すだけで追加できる。
+    例: TimeSeriesStatistics.calculate(stats_df, target_df, "生産者コード", "breeder", "生産者", schema)
+    """
+
+    # 結合キー
+    MERGE_KEYS = ["race_key", "馬番"]
+    TIME_COLUMN = "start_datetime"
+
+    # 累積対象カラム（統計量計算用DataFrameで事前に計算済み）
+    RANK_COLUMN = "着順"
+    RANK_1ST_COLUMN = "rank_1st"
+    RANK_3RD_COLUMN = "rank_3rd"
+
+    # 出力する統計量名（日本語プレフィックスを付けて使用）
+    STAT_SUFFIXES = ["勝率", "連対率", "平均着順", "出走回数"]
+
+    @staticmethod
+    def calculate(stats_df: pd.DataFrame, target_df: pd.DataFrame, group_col: str, prefix: str, jp_prefix: str, schema: Schema) -> pd.DataFrame:
+        """エンティティの過去成績統計特徴量をtarget_dfに追加。各レースのstart_datetimeより前のデータのみを使用（未来情報を除外）。"""
+        time_col = TimeSeriesStatistics.TIME_COLUMN
+        merge_keys = TimeSeriesStatistics.MERGE_KEYS
+        target_df_sorted = target_df.sort_values(by=[group_col, time_col])
+        entity_stats = TimeSeriesStatistics.cumulative_stats(stats_df, target_df_sorted, group_col, time_col, jp_prefix, merge_keys)
+
+        # race_keyと馬番をキーとしてmerge（dropnaでインデックスが変わる可能性があるため）
+        target_df_merged = target_df_sorted.reset_index()
+        stats_subset = entity_stats[[col for col in entity_stats.columns if col not in [group_col, time_col]]]
+        target_df_merged = target_df_merged.merge(stats_subset, on=merge_keys, how="left", suffixes=("", f"_{prefix}_stats"))
+        del target_df_sorted, entity_stats
+
+        # _03_feature_extractor.pyでmergeする際にrace_keyと馬番をカラムとして使用するため、reset_indexが必要
+        result_df = target_df_merged.reset_index()
+
+        # スキーマ検証
+        schema.validate(result_df)
+
+        return result_df
+
+    @staticmethod
+    def stat_columns(jp_prefix: str) -> list[str]:
+        """出力する統計量カラム名のリスト"""
+        return [f"{jp_prefix}{suffix}" for suffix in TimeSeriesStatistics.STAT_SUFFIXES]
+
+    @staticmethod
+    def cumulative_stats(
+        stats_df: pd.DataFrame, target_df: pd.DataFrame, group_col: str, time_col: str, jp_prefix: str, merge_keys: list[str]
+    ) -> pd.DataFrame:
+        """
+        各対象行について、同一エンティティの「start_datetimeより前」の累積統計量を計算。
+
+        stats_dfにエンティティ状態のスナップショット（EntityStateSnapshot）を渡した場合は、
+        対象行のエンティティの累積状態を参照する（対象行はスナップショットの最新レースより後であること）。
+
+        Returns:
+            merge_keys + [group_col, time_col] + 統計量カラムを持つDataFrame（target_dfと同じ行順）。
+            過去レースがない行（新馬・新人、グループ/時刻の欠損を含む）は0で埋める。
+        """
+        from ._03_08_entity_state_snapshot import EntityStateSnapshot
+
+        stat_cols = TimeSeriesStatistics.stat_columns(jp_prefix)
+        result = TimeSeriesStatistics._merge_key_frame(target_df, merge_keys)
+        result[group_col] = target_df[group_col].to_numpy()
+        result[time_col] = target_df[time_col].to_numpy()
+
+        if isinstance(stats_df, EntityStateSnapshot):
+            count, sums = stats_df.lookup_cumulative(group_col, target_df[group_col].to_numpy(), target_df[time_col].to_numpy(dtype=float))
+            return TimeSeriesStatistics._assign_rates(result, stat_cols, count, sums)
+
+        # 欠損行は統計量計算にも検索にも使用できない
+        stats_valid = stats_df[group_col].notna().to_numpy() & stats_df[time_col].notna().to_numpy()
+        target_valid = target_df[group_col].notna().to_numpy() & target_df[time_col].notna().to_numpy()
+        stats_groups = stats_df[group_col].to_numpy()[stats_valid]
+        stats_times = stats_df[time_col].to_numpy(dtype=float)[stats_valid]
+        target_groups = target_df[group_col].to_numpy()[target_valid]
+        target_times = target_df[time_col].to_numpy(dtype=float)[target_valid]
+
+        # エンティティを共通の整数コードに変換し、(entity, start_datetime)で1回だけ安定ソート
+        codes, _ = pd.factorize(np.concatenate([stats_groups, target_groups]))
+        stats_codes, target_codes = codes[:len(stats_groups)], codes[len(stats_groups):]
+        order = np.lexsort((stats_times, stats_codes))
+        stats_codes, stats_times = stats_codes[order], stats_times[order]
+        group_starts = TimeSeriesStatistics.group_start_positions(stats_codes)
+
+        cumsum_1st = TimeSeriesStatistics.grouped_cumsum(stats_df[TimeSeriesStatistics.RANK_1ST_COLUMN].to_numpy(dtype=float)[stats_valid][order], group_starts)
+        cumsum_3rd = TimeSeriesStatistics.grouped_cumsum(stats_df[TimeSeriesStatistics.RANK_3RD_COLUMN].to_numpy(dtype=float)[stats_valid][order], group_starts)
+        cumsum_rank = TimeSeriesStatistics.grouped_cumsum(stats_df[TimeSeriesStatistics.RANK_COLUMN].to_numpy(dtype=float)[stats_valid][order], group_starts)
+        cumcount = np.arange(len(stats_codes)) - group_starts + 1
+
+        # 対象行の「厳密に前」の最後の位置（同一エンティティの区間外なら過去レースなし）
+        prev_pos = TimeSeriesStatistics.searchsorted_within_groups(stats_codes, stats_times, target_codes, target_times) - 1
+        safe_pos = np.maximum(prev_pos, 0)
+        has_prev = (prev_pos >= 0) & (stats_codes[safe_pos] == target_codes) if len(stats_codes) > 0 else np.zeros(len(target_codes), dtype=bool)
+
+        count = np.zeros(len(result), dtype=int)
+        sums = np.zeros((3, len(result)), dtype=float)
+        valid_rows = np.flatnonzero(target_valid)[has_prev]
+        prev_rows = safe_pos[has_prev]
+        count[valid_rows] = cumcount[prev_rows]
+        sums[0, valid_rows] = cumsum_1st[prev_rows]
+        sums[1, valid_rows] = cumsum_3rd[prev_rows]
+        sums[2, valid_rows] = cumsum_rank[prev_rows]
+        return TimeSeriesStatistics._assign_rates(result, stat_cols, count, sums)
+
+    @staticmethod
+    def _assign_rates(result: pd.DataFrame, stat_cols: list[str], count: np.ndarray, sums: np.ndarray) -> pd.DataFrame:
+        """出走回数と勝利数・3着内数・着順合計から統計量カラムを追加"""
+        # cumcountが0の場合は0除算を防ぐ（新馬・新人の初レースなど正常なケース）
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rates = np.nan_to_num(sums / count, nan=0.0)
+        result[stat_cols[0]] = rates[0]
+        result[stat_cols[1]] = rates[1]
+        result[stat_cols[2]] = rates[2]
+        result[stat_cols[3]] = count
+        return result
+
+    @staticmethod
+    def recent_races(
+        stats_df: pd.DataFrame, target_df: pd.DataFrame, group_col: str, time_col: str, jp_prefix: str, columns: list[str], num_races: int, merge_keys: list[str]
+    ) -> pd.DataFrame:
+        """
+        各対象行について、同一エンティティの「start_datetimeより前」の直近Nレースの詳細を抽出。
+
+        過去レース数を一括searchsortedで求め、(対象行数 × N)の位置行列から
+        {jp_prefix}直近{i}{カラム}を1カラムにつき1回のfancy indexingで埋める。
+
+        stats_dfにエンティティ状態のスナップショット（EntityStateSnapshot）を渡した場合は、
+        対象行のエンティティの直近レースを参照する（対象行はスナップショットの最新レースより後であること）。
+
+        Returns:
+            merge_keys + [group_col, time_col] + 直近{i}カラム（+ 直近{i}レースキー_SED）を持つDataFrame（target_dfと同じ行順）。
+            直近i走目が存在しない行はNaN（レースキー_SEDはNone）。
+        """
+        from ._03_08_entity_state_snapshot import EntityStateSnapshot
+
+        result = TimeSeriesStatistics._merge_key_frame(target_df, merge_keys)
+        result[group_col] = target_df[group_col].to_numpy()
+        result[time_col] = target_df[time_col].to_numpy()
+
+        if isinstance(stats_df, EntityStateSnapshot):
+            values, race_keys = stats_df.lookup_recent(group_col, target_df[group_col].to_numpy(), target_df[time_col].to_numpy(dtype=float), columns, num_races)
+            return TimeSeriesStatistics._assign_recent_races(result, jp_prefix, columns, num_races, values, race_keys)
+
+        stats_valid = stats_df[group_col].notna().to_numpy() & stats_df[time_col].notna().to_numpy()
+        target_valid = target_df[group_col].notna().to_numpy() & target_df[time_col].notna().to_numpy()
+        stats_groups = stats_df[group_col].to_numpy()[stats_valid]
+        stats_times = stats_df[time_col].to_numpy(dtype=float)[stats_valid]
+
+        codes, _ = pd.factorize(np.concatenate([stats_groups, target_df[group_col].to_numpy()[target_valid]]))
+        stats_codes, target_codes = codes[:len(stats_groups)], codes[len(stats_groups):]
+        order = np.lexsort((stats_times, stats_codes))
+        stats_codes, stats_times = stats_codes[order], stats_times[order]
+
+        # 対象行ごとの「厳密に前」の終端位置と、同一エンティティ区間の先頭位置
+        past_end = TimeSeriesStatistics.searchsorted_within_groups(stats_codes, stats_times, target_codes, target_df[time_col].to_numpy(dtype=float)[target_valid])
+        group_start = np.searchsorted(stats_codes, target_codes, side="left")
+
+        # (対象行数 × N)の位置行列（i走前が同一エンティティ区間外なら-1）
+        positions = np.full((len(result), num_races), -1, dtype=np.int64)
+        lags = past_end[:, None] - 1 - np.arange(num_races)[None, :]
+        positions[target_valid] = np.where(lags >= group_start[:, None], lags, -1)
+        has_race = positions >= 0
+        safe_positions = np.where(has_race, positions, 0)
+
+        source_rows = np.flatnonzero(stats_valid)[order]
+        source_race_keys = stats_df["race_key"].to_numpy()[source_rows] if "race_key" in stats_df.columns else None
+
+        values = {col: np.full((len(result), num_races), np.nan, dtype=float) for col in columns}
+        race_keys = np.full((len(result), num_races), None, dtype=object)
+        if len(source_rows) > 0:
+            for col in columns:
+                values[col][has_race] = stats_df[col].to_numpy()[source_rows][safe_positions[has_race]]
+            # 日程情報（リーク検証用）
+            if source_race_keys is not None: race_keys[has_race] = source_race_keys[safe_positions[has_race]]
+
+        return TimeSeriesStatistics._assign_recent_races(result, jp_prefix, columns, num_races, values, race_keys)
+
+    @staticmethod
+    def _assign_recent_races(
+        result: pd.DataFrame, jp_prefix: str, columns: list[str], num_races: int, values: dict[str, np.ndarray], race_keys: np.ndarray
+    ) -> pd.DataFrame:
+        """(対象行数 × N)の直近レースの値から{jp_prefix}直近{i}カラムを追加"""
+        recent_data = {}
+        for i in range(1, num_races + 1):
+            for col in columns:
+                recent_data[f"{jp_prefix}直近{i}{col}"] = values[col][:, i - 1]
+            recent_data[f"{jp_prefix}直近{i}レースキー_SED"] = race_keys[:, i - 1]
+
+        return pd.concat([result, pd.DataFrame(recent_data, index=result.index)], axis=1)
+
+    @staticmethod
+    def group_start_positions(sorted_codes: np.ndarray) -> np.ndarray:
+        """ソート済みコード配列の各位置について、同一グループの先頭位置を返す"""
+        if len(sorted_codes) == 0: return np.zeros(0, dtype=np.int64)
+        is_start = np.r_[True, sorted_codes[1:] != sorted_codes[:-1]]
+        return np.maximum.accumulate(np.where(is_start, np.arange(len(sorted_codes)), 0))
+
+    @staticmethod
+    def grouped_cumsum(values: np.ndarray, group_starts: np.ndarray) -> np.ndarray:
+        """グループ単位の累積和（pandasのgroupby().cumsum()と同じく、NaNの行はNaN、以降の行ではNaNをスキップ）"""
+        is_nan = np.isnan(values)
+        total = np.cumsum(np.where(is_nan, 0.0, values))
+        # グループ先頭より前の累積値を差し引く
+        before_start = np.where(group_starts > 0, total[np.maximum(group_starts - 1, 0)], 0.0)
+        result = total - before_start
+        result[is_nan] = np.nan
+        return result
+
+    @staticmethod
+    def searchsorted_within_groups(sorted_codes: np.ndarray, sorted_times: np.ndarray, codes: np.ndarray, times: np.ndarray) -> np.ndarray:
+        """(コード, 時刻)の複合キーで一括searchsorted（各対象について、同一コードでtimesより前の要素の終端位置を返す）"""
+        # 時刻を密な順位に変換し、コードと合わせて単調な整数キーにする
+        unique_times = np.unique(np.concatenate([sorted_times, times]))
+        n_times = len(unique_times) + 1
+        sorted_composite = sorted_codes.astype(np.int64) * n_times + np.searchsorted(unique_times, sorted_times)
+        target_composite = codes.astype(np.int64) * n_times + np.searchsorted(unique_times, times)
+        return np.searchsorted(sorted_composite, target_composite, side="left")
+
+    @staticmethod
+    def _merge_key_frame(target_df: pd.DataFrame, merge_keys: list[str]) -> pd.DataFrame:
+        """target_dfの結合キー（MultiIndexまたはカラム）を位置順のDataFrameとして取得"""
+        if isinstance(target_df.index, pd.MultiIndex) and all(key in target_df.index.names for key in merge_keys):
+            return pd.DataFrame({key: target_df.index.get_level_values(key) for key in merge_keys})
+        if all(key in target_df.columns for key in merge_keys):
+            return pd.DataFrame({key: target_df[key].to_numpy() for key in merge_keys})
+        raise ValueError(f"target_dfに{merge_keys}がインデックスまたはカラムとして存在しません。index names: {list(target_df.index.names)}, columns: {list(target_df.columns)[:20]}")
@@ -4,165 +4,173 @@ import gc
 
 import numpy as np
 import pandas as pd
-from tqdm import tqdm
 
 from src.utils.schema_loader import Schema
 
 
 class PreviousRaceExtractor:
     """前走データ抽出クラス（staticメソッドのみ）"""
-    
+
     # 結合キー
     MERGE_KEYS = ["race_key", "馬番"]
-    
+
     # 前走データカラム
     PREV_RACE_COLUMNS = ["着順", "タイム", "距離", "頭数", "芝ダ障害コード", "馬場状態", "R"]
-    
+
     # グループ化カラム
     GROUP_COLUMN_HORSE = "血統登録番号"
-    
+    TIME_COLUMN = "start_datetime"
+
     # 前走データ数
     PREV_RACES_COUNT = 5
-    
+
     # 前走データカラム名のベース（日本語、後で英語に変換される）
     _PREV_COLUMN_BASES = ["着順", "タイム", "距離", "頭数", "芝ダ障害コード", "馬場状態", "race_key", "枠番", "R", "馬番"]
 
+    # 前走行列の探索幅を広げる際の増分（同一race_keyの過去レースを除外した結果、N件に満たない行のみ再探索する）
+    _WINDOW_STEP = PREV_RACES_COUNT
+
     @staticmethod
     def extract(target_df: pd.DataFrame, schema: Schema) -> pd.DataFrame:
-        """結合済みDataFrameから前走データを抽出。前走データが追加されたDataFrameを返す。"""
+        """
+        結合済みDataFrameから前走データを抽出。前走データが追加されたDataFrameを返す。
+
+        (血統登録番号, start_datetime)で一度だけソートし、各行の「直前のレース位置」をsearchsortedで求め、
+        1..N走前の位置行列から全ての前走{i}_*カラムを一括でgatherする（馬ごと・行ごとのループは行わない）。
+        """
         target_df = target_df.copy()
-        
+
         try:
-            # target_dfに存在する前走データカラムを取得（結合済みデータなので、存在するカラムのみ抽出）
-            prev_race_columns = {col: True for col in PreviousRaceExtractor.PREV_RACE_COLUMNS if col in target_df.columns}
-            
             # 前走データ抽出用の全データを準備（race_keyがインデックスに設定されている場合はreset_index）
             target_df_for_extract = target_df.reset_index() if isinstance(target_df.index, pd.MultiIndex) and "race_key" in target_df.index.names else target_df
-            all_races_df = target_df_for_extract[target_df_for_extract["race_key"].notna() & target_df_for_extract["血統登録番号"].notna()].copy()
-            # 全データを時系列でソート
-            all_races_df = all_races_df.sort_values("start_datetime", ascending=True)
-            
+            if "race_key" not in target_df_for_extract.columns: raise ValueError(f"target_dfに'race_key'カラムが存在しません。カラム: {list(target_df_for_extract.columns)[:10]}")
+
             # 前走データカラム名のリストを生成（日本語、後で英語に変換される）
-            prev_cols = [f"前走{i}_{base}" if base != "race_key" else f"前走{i}レースキー_SED" for i in range(1, PreviousRaceExtractor.PREV_RACES_COUNT + 1) for base in PreviousRaceExtractor._PREV_COLUMN_BASES]
-            result_dfs = []
-            
-            # groupbyで各馬ごとに前走データを抽出
-            for horse_id, group_df in tqdm(target_df.groupby(PreviousRaceExtractor.GROUP_COLUMN_HORSE), desc="前走データ抽出", unit="頭"):
-                if pd.isna(horse_id): continue
-                
-                # 該当馬の全レースデータを抽出（前走検索用）
-                horse_all_races = all_races_df[all_races_df[PreviousRaceExtractor.GROUP_COLUMN_HORSE] == horse_id]
-                if len(horse_all_races) == 0: continue
-                
-                # ベクトル化処理のため配列として取得
-                all_races_datetimes = horse_all_races["start_datetime"].values
-                all_races_keys = horse_all_races["race_key"].values
-                
-                # 結果を格納するDataFrameを初期化
-                result_data = {col: [] for col in prev_cols}
-                result_indices = []
-                
-                # group_dfがMultiIndexの場合はreset_indexしてから処理
-                group_df_for_iter = group_df.reset_index() if isinstance(group_df.index, pd.MultiIndex) else group_df
-                original_indices = list(group_df.index) if isinstance(group_df.index, pd.MultiIndex) else list(group_df_for_iter.index)
-                
-                # 各レースに対して前走データを設定
-                for original_idx, (_, row) in zip(original_indices, group_df_for_iter.iterrows()):
-                    if "race_key" not in row.index: raise ValueError(f"group_df_for_iterに'race_key'カラムが存在しません。カラム: {list(row.index)[:10]}")
-                    current_race_key = row["race_key"]
-                    current_datetime = row["start_datetime"]
-                    
-                    if not current_race_key or pd.isna(current_datetime) or current_datetime == 0:
-                        continue
-
-                    # 現在のレースより前のレースを取得（start_datetimeで比較、同じレースキーは除外）
-                    datetime_mask = all_races_datetimes < current_datetime
-                    race_key_mask = all_races_keys != current_race_key
-                    prev_indices = np.where(datetime_mask & race_key_mask)[0]
-                    
-                    if len(prev_indices) == 0:
-                        result_indices.append(original_idx)
-                        for col in prev_cols: result_data[col].append(None)
-                        continue
-                    
-                    # 最後のN件を取得（既にソート済みなので、末尾から取得）
-                    prev_indices = prev_indices[-PreviousRaceExtractor.PREV_RACES_COUNT:] if len(prev_indices) >= PreviousRaceExtractor.PREV_RACES_COUNT else prev_indices
-                    # 前走データを設定（1走前からN走前まで、新しい順）
-                    prev_races_sorted = horse_all_races.iloc[prev_indices].iloc[::-1]
-                    
-                    # 前走データを辞書に格納
-                    row_data = {}
-                    for i in range(min(PreviousRaceExtractor.PREV_RACES_COUNT, len(prev_races_sorted))):
-                        prev_row = prev_races_sorted.iloc[i]
-                        prefix = f"前走{i + 1}_"
-                        # target_dfに存在するカラムのみを抽出（fallback禁止のため、存在チェック後にエラー）
-                        if "着順" in prev_race_columns:
-                            if "着順" not in prev_row.index: raise ValueError(f"前走データに'着順'カラムが存在しません。利用可能なカラム: {list(prev_row.index)[:10]}")
-                            row_data[f"{prefix}着順"] = prev_row["着順"]
-                        if "タイム" in prev_race_columns:
-                            if "タイム" not in prev_row.index: raise ValueError(f"前走データに'タイム'カラムが存在しません。利用可能なカラム: {list(prev_row.index)[:10]}")
-                            row_data[f"{prefix}タイム"] = prev_row["タイム"]
-                        if "距離" in prev_race_columns:
-                            if "距離" not in prev_row.index: raise ValueError(f"前走データに'距離'カラムが存在しません。利用可能なカラム: {list(prev_row.index)[:10]}")
-                            row_data[f"{prefix}距離"] = prev_row["距離"]
-                        if "頭数" in prev_race_columns:
-                            if "頭数" not in prev_row.index: raise ValueError(f"前走データに'頭数'カラムが存在しません。利用可能なカラム: {list(prev_row.index)[:10]}")
-                            row_data[f"{prefix}頭数"] = prev_row["頭数"]
-                        if "芝ダ障害コード" in prev_race_columns:
-                            if "芝ダ障害コード" not in prev_row.index: raise ValueError(f"前走データに'芝ダ障害コード'カラムが存在しません。利用可能なカラム: {list(prev_row.index)[:10]}")
-                            row_data[f"{prefix}芝ダ障害コード"] = prev_row["芝ダ障害コード"]
-                        if "馬場状態" in prev_race_columns:
-                            if "馬場状態" not in prev_row.index: raise ValueError(f"前走データに'馬場状態'カラムが存在しません。利用可能なカラム: {list(prev_row.index)[:10]}")
-                            row_data[f"{prefix}馬場状態"] = prev_row["馬場状態"]
-                        # race_keyは必須（日程情報、リーク検証用）
-                        if "race_key" not in prev_row.index: raise ValueError(f"前走データに'race_key'カラムが存在しません。利用可能なカラム: {list(prev_row.index)[:10]}")
-                        row_data[f"前走{i + 1}レースキー_SED"] = prev_row["race_key"]
-                        # 枠番、R、馬番も追加
-                        if "枠番" in prev_row.index:
-                            row_data[f"{prefix}枠番"] = prev_row["枠番"]
-                        if "R" in prev_row.index:
-                            row_data[f"{prefix}R"] = prev_row["R"]
-                        if "馬番" in prev_row.index:
-                            row_data[f"{prefix}馬番"] = prev_row["馬番"]
-                    
-                    # 結果に追加
-                    for col in prev_cols:
-                        result_data[col].append(row_data.get(col, np.nan if "race_key" not in col else None))
-                    result_indices.append(original_idx)
-                
-                # DataFrameに変換して追加
-                if len(result_indices) > 0:
-                    horse_prev_data = pd.DataFrame(result_data, index=result_indices)
-                    result_dfs.append(horse_prev_data)
-            
-            # 結果を結合してDataFrameに反映
-            if result_dfs:
-                prev_data_df = pd.concat(result_dfs)
-                for col in prev_cols:
-                    if col in prev_data_df.columns:
-                        # カラムが存在しない場合は追加（race_keyは文字列型、それ以外は数値型）
-                        if col not in target_df.columns:
-                            if "race_key" in col:
-                                target_df[col] = None
-                            else:
-                                target_df[col] = np.nan
-                        # 値を設定（型の不一致を防ぐため、Noneを含む可能性がある場合は常にobject型に変換）
-                        col_data = prev_data_df[col]
-                        # result_dataにNoneが追加されている可能性があるため、target_dfのカラムもobject型に変換
-                        if target_df[col].dtype != 'object' or col_data.dtype != 'object':
-                            target_df[col] = target_df[col].astype(object)
-                            target_df.loc[prev_data_df.index, col] = col_data.astype(object)
-                        else:
-                            target_df.loc[prev_data_df.index, col] = col_data
-            
+            prev_cols = PreviousRaceExtractor._get_prev_columns()
+            # target_dfに存在する前走データカラムのみ値を設定（存在しないカラムはNaN）
+            source_columns = PreviousRaceExtractor._get_source_columns(target_df_for_extract)
+
+            processed_mask, prev_positions, all_races_df = PreviousRaceExtractor._find_previous_positions(target_df_for_extract)
+
+            # 前走検索対象の行が1件もない場合はカラムを追加しない（従来と同じ挙動）
+            if processed_mask.any():
+                n_rows = len(target_df_for_extract)
+                for i in range(PreviousRaceExtractor.PREV_RACES_COUNT):
+                    positions = prev_positions[:, i]
+                    has_prev = positions >= 0
+                    for base in PreviousRaceExtractor._PREV_COLUMN_BASES:
+                        col = PreviousRaceExtractor._prev_column_name(i + 1, base)
+                        # i走前が存在しない行は欠損（NaN）
+                        values = target_df[col].to_numpy(dtype=object, copy=True) if col in target_df.columns else np.full(n_rows, np.nan, dtype=object)
+                        values[processed_mask] = np.nan
+                        if base in source_columns and has_prev.any():
+                            values[has_prev] = all_races_df[base].to_numpy()[positions[has_prev]].astype(object)
+                        target_df[col] = values
+                # カラム順を従来と揃える（新規カラムは前走1..Nの順に末尾へ）
+                target_df = target_df[[c for c in target_df.columns if c not in prev_cols] + prev_cols]
+
             # MultiIndexの場合はreset_indexしてカラムとして使用可能にする
             if isinstance(target_df.index, pd.MultiIndex) and target_df.index.names == PreviousRaceExtractor.MERGE_KEYS: target_df = target_df.reset_index()
-            
+
             # スキーマ検証
             schema.validate(target_df)
-            
+
             return target_df
         finally:
             # メモリクリーンアップ
             if 'all_races_df' in locals() and all_races_df is not None: del all_races_df
             gc.collect()
+
+    @staticmethod
+    def _prev_column_name(i: int, base: str) -> str:
+        """前走カラム名を生成（race_keyのみ前走{i}レースキー_SED）"""
+        return f"前走{i}_{base}" if base != "race_key" else f"前走{i}レースキー_SED"
+
+    @staticmethod
+    def _get_prev_columns() -> list[str]:
+        """前走データカラム名のリスト（前走1..Nの順）"""
+        return [PreviousRaceExtractor._prev_column_name(i, base) for i in range(1, PreviousRaceExtractor.PREV_RACES_COUNT + 1) for base in PreviousRaceExtractor._PREV_COLUMN_BASES]
+
+    @staticmethod
+    def _get_source_columns(df: pd.DataFrame) -> set[str]:
+        """前走データとして値を取得するカラム（PREV_RACE_COLUMNSはdfに存在するもののみ、race_key/枠番/R/馬番は存在すれば取得）"""
+        source_columns = {col for col in PreviousRaceExtractor.PREV_RACE_COLUMNS if col in df.columns}
+        source_columns.update(col for col in ["race_key", "枠番", "R", "馬番"] if col in df.columns)
+        return source_columns
+
+    @staticmethod
+    def _find_previous_positions(df: pd.DataFrame) -> tuple[np.ndarray, np.ndarray, pd.DataFrame]:
+        """
+        各行の1..N走前のレース位置を一括で算出。
+
+        Returns:
+            (processed_mask, prev_positions, all_races_df)
+            - processed_mask: 前走検索の対象となった行（馬IDあり、race_keyあり、start_datetimeが有効、かつ同一馬の検索対象レースが存在）
+            - prev_positions: (行数 × N) のall_races_df内の位置（存在しない場合は-1、1走前から新しい順）
+            - all_races_df: (血統登録番号, start_datetime)でソート済みの前走検索対象データ
+        """
+        group_col = PreviousRaceExtractor.GROUP_COLUMN_HORSE
+        time_col = PreviousRaceExtractor.TIME_COLUMN
+        num_races = PreviousRaceExtractor.PREV_RACES_COUNT
+        n_rows = len(df)
+
+        # 前走検索対象: race_keyと血統登録番号が存在し、start_datetimeが比較可能な行
+        times = pd.to_numeric(df[time_col], errors="coerce").to_numpy(dtype=float)
+        pool_mask = (df["race_key"].notna() & df[group_col].notna()).to_numpy() & ~np.isnan(times)
+        # 馬IDを整数コードに変換（NaNは-1）し、(馬, 時刻)で安定ソートを1回だけ実行
+        horse_codes, _ = pd.factorize(df[group_col])
+        pool_positions = np.flatnonzero(pool_mask)
+        order = pool_positions[np.lexsort((times[pool_positions], horse_codes[pool_positions]))]
+        all_races_df = df.iloc[order].reset_index(drop=True)
+        pool_codes = horse_codes[order]
+        pool_times = times[order]
+        pool_keys = df["race_key"].to_numpy()[order]
+
+        # 対象行: 馬IDあり、race_keyが空でない、start_datetimeが有効（NaN/0は対象外）
+        race_keys = df["race_key"].to_numpy()
+        has_key = (df["race_key"].notna() & (df["race_key"].astype(str) != "")).to_numpy()
+        group_start = np.searchsorted(pool_codes, horse_codes, side="left")
+        group_end = np.searchsorted(pool_codes, horse_codes, side="right")
+        processed_mask = (horse_codes >= 0) & has_key & ~np.isnan(times) & (times != 0) & (group_end > group_start)
+
+        prev_positions = np.full((n_rows, num_races), -1, dtype=np.int64)
+        rows = np.flatnonzero(processed_mask)
+        if len(rows) == 0:
+            return processed_mask, prev_positions, all_races_df
+
+        # 同一馬の区間内で、現在のstart_datetimeより前のレース数（=直前レースの次の位置）
+        row_start = group_start[rows]
+        row_times = times[rows]
+        past_end = PreviousRaceExtractor._searchsorted_within_groups(pool_codes, pool_times, horse_codes[rows], row_times)
+        row_keys = race_keys[rows]
+
+        # 直近から過去へ遡るlag行列を作成し、同一race_keyの過去レースを除外してN件を詰める
+        window = num_races
+        while True:
+            lags = past_end[:, None] - 1 - np.arange(window)[None, :]
+            in_group = lags >= row_start[:, None]
+            safe_lags = np.where(in_group, lags, 0)
+            keep = in_group & (pool_keys[safe_lags] != row_keys[:, None])
+            kept_count = keep.sum(axis=1)
+            # N件に満たず、さらに過去のレースが残っている行がある場合のみ探索幅を広げる
+            needs_more = (kept_count < num_races) & (past_end - window > row_start)
+            if not needs_more.any(): break
+            window += PreviousRaceExtractor._WINDOW_STEP
+
+        rank = np.cumsum(keep, axis=1)
+        for i in range(num_races):
+            selected = keep & (rank == i + 1)
+            has = selected.any(axis=1)
+            prev_positions[rows[has], i] = lags[has, selected[has].argmax(axis=1)]
+
+        return processed_mask, prev_positions, all_races_df
+
+    @staticmethod
+    def _searchsorted_within_groups(pool_codes: np.ndarray, pool_times: np.ndarray, codes: np.ndarray, times: np.ndarray) -> np.ndarray:
+        """(馬コード, 時刻)の複合キーで一括searchsorted（各行について、同一馬でtimesより前のレースの終端位置を返す）"""
+        # 時刻を密な順位に変換し、馬コードと合わせて単調な整数キーにする
+        unique_times = np.unique(np.concatenate([pool_times, times]))
+        n_times = len(unique_times) + 1
+        pool_composite = pool_codes.astype(np.int64) * n_times + np.searchsorted(unique_times, pool_times)
+        target_composite = codes.astype(np.int64) * n_times + np.searchsorted(unique_times, times)
+        return np.searchsorted(pool_composite, target_composite, side="left")
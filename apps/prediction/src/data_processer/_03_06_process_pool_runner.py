@@ -0,0 +1,142 @@
+"""特徴量抽出のプロセスプール実行（Arrow IPCファイル共有 + エンティティハッシュによるシャーディング）"""
+
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from src.utils.schema_loader import Schema
+from ._03_02_previous_race_extractor import PreviousRaceExtractor
+from ._03_03_horse_statistics import HorseStatistics
+from ._03_04_jockey_statistics import JockeyStatistics
+from ._03_05_trainer_statistics import TrainerStatistics
+
+
+class ProcessPoolRunner:
+    """
+    前走データ抽出・統計量計算をプロセスプールで実行するクラス（staticメソッドのみ）
+
+    target_dfとhistorical_stats_dfは1回だけArrow IPCファイル（非圧縮）に書き出し、各ワーカーはmemory-mapで開く。
+    タスクごとにDataFrameをpickleせず、ワーカーは自分のシャードの行だけをpandasに変換する。
+    各抽出処理はエンティティ（馬・騎手・調教師）のハッシュでシャーディングされ、1つの抽出処理でも全コアを使用できる。
+    """
+
+    # 抽出処理ごとのシャーディングキー（同一エンティティの行は必ず同じシャードに入る）
+    ENTITY_COLUMNS = {
+        "previous_races": PreviousRaceExtractor.GROUP_COLUMN_HORSE,
+        "horse_stats": HorseStatistics.GROUP_COLUMN,
+        "jockey_stats": JockeyStatistics.GROUP_COLUMN,
+        "trainer_stats": TrainerStatistics.GROUP_COLUMN,
+    }
+
+    # Arrow IPCファイル内のシャード番号カラム名のプレフィックス（ワーカーでpandas変換前に除外）
+    _SHARD_COLUMN_PREFIX = "__shard__"
+
+    # 共有ファイルの配置先（存在すればRAM上のtmpfsを使用）
+    _SHARED_MEMORY_DIR = "/dev/shm"
+
+    @staticmethod
+    def run(target_df: pd.DataFrame, historical_stats_df: pd.DataFrame, schemas: dict[str, Schema], max_workers: int) -> dict[str, pd.DataFrame]:
+        """
+        各抽出処理をエンティティ単位でシャーディングしてプロセスプールで実行。
+
+        Args:
+            target_df: 特徴量追加先のDataFrame
+            historical_stats_df: 統計量計算用DataFrame
+            schemas: 抽出処理名（ENTITY_COLUMNSのキー）→ スキーマ
+            max_workers: ワーカー数（シャード数も同じ値を使用）
+
+        Returns:
+            抽出処理名 → 結果DataFrame（ThreadPoolExecutor版と同じ内容）
+        """
+        if max_workers < 1: raise ValueError(f"max_workersは1以上である必要があります: {max_workers}")
+        missing = [name for name in ProcessPoolRunner.ENTITY_COLUMNS if name not in schemas]
+        if missing: raise ValueError(f"スキーマが指定されていない抽出処理があります: {missing}")
+
+        num_shards = max_workers
+        target_shards = {col: ProcessPoolRunner.shard_ids(target_df[col], num_shards) for col in set(ProcessPoolRunner.ENTITY_COLUMNS.values())}
+        stats_shards = {col: ProcessPoolRunner.shard_ids(historical_stats_df[col], num_shards) for col in target_shards if col in historical_stats_df.columns}
+
+        shared_dir = tempfile.mkdtemp(prefix="feature_extractor_", dir=ProcessPoolRunner._SHARED_MEMORY_DIR if os.path.isdir(ProcessPoolRunner._SHARED_MEMORY_DIR) else None)
+        try:
+            target_path = ProcessPoolRunner._write_shared_table(target_df, target_shards, Path(shared_dir) / "target.arrow")
+            stats_path = ProcessPoolRunner._write_shared_table(historical_stats_df, stats_shards, Path(shared_dir) / "historical_stats.arrow")
+
+            shard_results: dict[str, dict[int, pd.DataFrame]] = {name: {} for name in ProcessPoolRunner.ENTITY_COLUMNS}
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                futures = {}
+                for task_name, entity_col in ProcessPoolRunner.ENTITY_COLUMNS.items():
+                    for shard in range(num_shards):
+                        # 対象行がないシャードは実行しない（各抽出処理は空のtarget_dfを受け付けない）
+                        if not (target_shards[entity_col] == shard).any(): continue
+                        future = executor.submit(ProcessPoolRunner._run_task, task_name, str(target_path), str(stats_path), entity_col, shard, schemas[task_name])
+                        futures[future] = (task_name, shard)
+
+                for future in as_completed(futures):
+                    task_name, shard = futures[future]
+                    try:
+                        shard_results[task_name][shard] = future.result()
+                    except Exception as e:
+                        raise RuntimeError(f"{task_name}（シャード{shard}）でエラー: {e}") from e
+        finally:
+            shutil.rmtree(shared_dir, ignore_errors=True)
+
+        results = {}
+        for task_name, entity_col in ProcessPoolRunner.ENTITY_COLUMNS.items():
+            shards = sorted(shard_results[task_name])
+            combined = pd.concat([shard_results[task_name][shard] for shard in shards], ignore_index=True)
+            if task_name == "previous_races":
+                # 前走データは結合のベースになるため、target_dfの行順に戻す
+                positions = np.concatenate([np.flatnonzero(target_shards[entity_col] == shard) for shard in shards])
+                combined = combined.iloc[np.argsort(positions, kind="stable")].reset_index(drop=True)
+            results[task_name] = combined
+        return results
+
+    @staticmethod
+    def shard_ids(values: pd.Series, num_shards: int) -> np.ndarray:
+        """エンティティ値のハッシュからシャード番号を計算（欠損値も含めて決定的）"""
+        return (pd.util.hash_pandas_object(values, index=False).to_numpy() % np.uint64(num_shards)).astype(np.int32)
+
+    @staticmethod
+    def _write_shared_table(df: pd.DataFrame, shard_ids: dict[str, np.ndarray], path: Path) -> Path:
+        """DataFrameをシャード番号カラム付きのArrow IPCファイル（非圧縮、memory-map可能）に書き出す"""
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+            raise ValueError(f"DataFrameをArrow形式に変換できません（型が混在したobjectカラムの可能性があります）: {e}") from e
+        for col, ids in shard_ids.items():
+            table = table.append_column(f"{ProcessPoolRunner._SHARD_COLUMN_PREFIX}{col}", pa.array(ids))
+        with pa.OSFile(str(path), "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        return path
+
+    @staticmethod
+    def _read_shard(path: str, entity_col: str, shard: int) -> pd.DataFrame:
+        """memory-mapしたArrow IPCファイルから指定シャードの行のみをpandasに変換"""
+        with pa.memory_map(path, "r") as source:
+            table = pa.ipc.open_file(source).read_all()
+        shard_col = f"{ProcessPoolRunner._SHARD_COLUMN_PREFIX}{entity_col}"
+        if shard >= 0: table = table.filter(pc.equal(table[shard_col], shard))
+        table = table.drop_columns([name for name in table.column_names if name.startswith(ProcessPoolRunner._SHARD_COLUMN_PREFIX)])
+        return table.to_pandas()
+
+    @staticmethod
+    def _run_task(task_name: str, target_path: str, stats_path: str, entity_col: str, shard: int, schema: Schema) -> pd.DataFrame:
+        """ワーカープロセスで1シャード分の抽出処理を実行"""
+        target_df = ProcessPoolRunner._read_shard(target_path, entity_col, shard)
+        if task_name == "previous_races": return PreviousRaceExtractor.extract(target_df, schema)
+
+        stats_df = ProcessPoolRunner._read_shard(stats_path, entity_col, shard)
+        # シャード内に過去データが1件もない場合、対象エンティティは全データでも過去データを持たないため、全データで計算しても結果は同じ
+        if len(stats_df) == 0: stats_df = ProcessPoolRunner._read_shard(stats_path, entity_col, -1)
+
+        calculators = {"horse_stats": HorseStatistics.calculate, "jockey_stats": JockeyStatistics.calculate, "trainer_stats": TrainerStatistics.calculate}
+        if task_name not in calculators: raise ValueError(f"未知の抽出処理: {task_name}")
+        return calculators[task_name](stats_df, target_df, schema)
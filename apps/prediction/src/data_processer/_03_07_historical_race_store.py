@@ -0,0 +1,155 @@
+"""前走データ抽出用のSED/BACを複数年度の処理で共有するストア"""
+
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from src.utils.arrow_concat import ArrowConcat
+from src.utils.parquet_loader import ParquetLoader
+
+# ストアで保持するデータタイプ（SEDは統計量計算用、BACは必須チェック用）
+_DATA_TYPES = ("SED", "BAC")
+
+
+class HistoricalRaceStore:
+    """
+    前走データ抽出用のSED/BACを年度ごとに1回だけ読み込み、処理対象年度ごとの範囲をビューとして渡すクラス
+
+    全処理対象年度が参照する年度を年度順に1つのDataFrameに結合して保持し、各年度の行範囲を記録する。
+    処理対象年度が参照する年度は連続した行範囲になるため、iloc[start:stop]のスライス（コピーなし）で渡す。
+    渡したビューは読み取り専用として扱う（FeatureExtractorは変更前にcopy()する）。
+    処理済みの年度からしか参照されない年度は、その時点でストアから削除する。
+    """
+
+    def __init__(
+        self,
+        parquet_loader: ParquetLoader,
+        columns: Dict[str, Optional[List[str]]],
+        windows: Dict[int, List[int]],
+    ):
+        """
+        初期化
+
+        Args:
+            parquet_loader: 年度パックのParquetローダー
+            columns: データタイプ（SED/BAC） → 読み込むカラム（Noneの場合は全カラム）
+            windows: 処理対象年度 → 参照する年度のリスト（処理順、previous_yearsで作成）
+        """
+        self._parquet_loader = parquet_loader
+        self._columns = columns
+        self._windows = {
+            target_year: self.loadable_years(parquet_loader, years) for target_year, years in windows.items()
+        }
+        self._frames: Dict[str, Optional[pd.DataFrame]] = {}
+        self._year_ranges: Dict[str, Dict[int, Tuple[int, int]]] = {}
+        self._load(sorted({year for years in self._windows.values() for year in years}))
+
+    @staticmethod
+    def previous_years(target_year: int, available_years: Optional[Iterable[int]] = None) -> List[int]:
+        """
+        処理対象年度の前走データ抽出に使う年度を取得
+
+        Args:
+            target_year: 処理対象年度
+            available_years: 利用可能な年度のリスト（Noneの場合は最大5年前まで、前走データは最大5走前まで必要）
+
+        Returns:
+            処理対象年度より前の年度のリスト（前年度がない場合は処理対象年度のみ）
+        """
+        if available_years is not None:
+            years = [y for y in available_years if y < target_year]
+        else:
+            years = [y for y in range(target_year - 5, target_year) if y >= 2000]
+        return years or [target_year]
+
+    @staticmethod
+    def loadable_years(parquet_loader: ParquetLoader, years: Iterable[int]) -> List[int]:
+        """SED・BACの両方の年度パックが存在する年度のみを抽出"""
+        return [year for year in years if all(parquet_loader.has_annual_pack(data_type, year) for data_type in _DATA_TYPES)]
+
+    @property
+    def loaded_years(self) -> List[int]:
+        """現在ストアに保持している年度（年度順）"""
+        return sorted(self._year_ranges.get("SED", {}))
+
+    def get_views(self, target_year: int) -> Tuple[Optional[pd.DataFrame], pd.DataFrame]:
+        """
+        処理対象年度の前走データ抽出に使うSED/BACのビューを取得
+
+        取得後、残りの処理対象年度から参照されない年度はストアから削除する。
+
+        Args:
+            target_year: 処理対象年度（windowsに指定した年度）
+
+        Returns:
+            (sed_df, bac_df) - 参照する年度を年度順に並べたビュー（インデックスは0から振り直す）、SEDが空の場合はNone
+
+        Raises:
+            KeyError: windowsに指定していない年度、または取得済みの年度の場合
+            ValueError: BACデータが存在しない場合
+        """
+        years = self._windows.pop(target_year)
+        sed_df = self._view("SED", years)
+        bac_df = self._view("BAC", years)
+        self._evict()
+        if sed_df is not None and len(sed_df) == 0:
+            sed_df = None
+        if bac_df is None or len(bac_df) == 0:
+            raise ValueError(f"BACデータは必須です。{target_year}年の前走データ抽出用のBACデータが存在しません。")
+        return sed_df, bac_df
+
+    def clear(self) -> None:
+        """保持している全データを削除"""
+        self._windows.clear()
+        self._frames.clear()
+        self._year_ranges.clear()
+
+    def _load(self, years: List[int]) -> None:
+        """各年度を1回だけ読み込み、データタイプごとに年度順で1回だけ結合"""
+        for data_type in _DATA_TYPES:
+            frames = [
+                self._parquet_loader.load_annual_pack_parquet(data_type, year, columns=self._columns.get(data_type))
+                for year in years
+            ]
+            self._year_ranges[data_type] = HistoricalRaceStore._ranges(years, [0 if df is None else len(df) for df in frames])
+            self._frames[data_type] = ArrowConcat.concat_frames(frames)
+
+    def _view(self, data_type: str, years: Sequence[int]) -> Optional[pd.DataFrame]:
+        """指定年度の行範囲のビューを取得（連続していない場合のみコピー）"""
+        frame = self._frames.get(data_type)
+        if frame is None or not years:
+            return None
+        ranges = [self._year_ranges[data_type][year] for year in years]
+        if all(prev[1] == curr[0] for prev, curr in zip(ranges, ranges[1:], strict=False)):
+            view = frame.iloc[ranges[0][0]:ranges[-1][1]]
+        else:
+            view = pd.concat([frame.iloc[start:stop] for start, stop in ranges])
+        view.index = pd.RangeIndex(len(view))
+        return view
+
+    def _evict(self) -> None:
+        """残りの処理対象年度から参照されない年度を削除（削除する年度がある場合のみ残す行をコピー）"""
+        needed = {year for years in self._windows.values() for year in years}
+        for data_type in _DATA_TYPES:
+            year_ranges = self._year_ranges.get(data_type, {})
+            kept_years = [year for year in sorted(year_ranges) if year in needed]
+            if len(kept_years) == len(year_ranges):
+                continue
+            frame = self._frames.get(data_type)
+            if not kept_years or frame is None:
+                self._frames[data_type] = None
+                self._year_ranges[data_type] = {year: (0, 0) for year in kept_years}
+                continue
+            kept_ranges = [year_ranges[year] for year in kept_years]
+            self._frames[data_type] = pd.concat([frame.iloc[start:stop] for start, stop in kept_ranges], ignore_index=True)
+            self._year_ranges[data_type] = HistoricalRaceStore._ranges(kept_years, [stop - start for start, stop in kept_ranges])
+
+    @staticmethod
+    def _ranges(years: List[int], lengths: List[int]) -> Dict[int, Tuple[int, int]]:
+        """年度ごとの行数から、結合後の各年度の行範囲を計算"""
+        ranges = {}
+        start = 0
+        for year, length in zip(years, lengths, strict=True):
+            ranges[year] = (start, start + length)
+            start += length
+        return ranges
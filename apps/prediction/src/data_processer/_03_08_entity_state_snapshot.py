@@ -0,0 +1,427 @@
+"""日次予測用のエンティティ（馬・騎手・調教師）の累積成績・直近レースのスナップショット"""
+
+import json
+import logging
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from src.utils.feature_converter import FeatureConverter
+from src.utils.parquet_loader import ParquetLoader
+from src.utils.schema_loader import Schema
+from ._03_01_time_series_statistics import TimeSeriesStatistics
+from ._03_03_horse_statistics import HorseStatistics
+from ._03_04_jockey_statistics import JockeyStatistics
+from ._03_05_trainer_statistics import TrainerStatistics
+from ._03_07_historical_race_store import HistoricalRaceStore
+from ._03_feature_extractor import FeatureExtractor
+
+logger = logging.getLogger(__name__)
+
+# スナップショットの出力ディレクトリ（年度パックのディレクトリ内、entity_state/entity_state_{年度}/）
+ENTITY_STATE_DIR_NAME = "entity_state"
+
+
+class EntityStateSnapshot:
+    """
+    処理対象年度の統計量計算に使う過去年度のSEDを、エンティティごとの状態に集約して保持するクラス
+
+    エンティティごとに出走回数・勝利数・3着内数・着順合計と最終レースの情報、騎手・調教師は直近Nレースの詳細を保持する。
+    TimeSeriesStatisticsのcumulative_stats/recent_racesに統計量計算用DataFrameの代わりに渡すと、
+    スナップショット作成時点より後のレースについて、全履歴から計算した場合と同じ統計量を対象行数分の参照だけで返す。
+    対象年度の統計量は学習時と同じく前年度までの結果（HistoricalRaceStore.previous_years）から計算するため、
+    取り込むのは対象年度より前の結果のみ（対象年度の結果は翌年度のスナップショットに取り込む）。
+    """
+
+    # 保存形式・集約方法を変更した場合に上げる
+    VERSION = 1
+
+    METADATA_FILE_NAME = "metadata.json"
+    INGESTED_FILE_NAME = "ingested_race_keys.parquet"
+
+    # エンティティ（ファイル名用のプレフィックス → (グループ化カラム, 保持する直近レース数)）
+    ENTITIES = {
+        HorseStatistics.PREFIX: (HorseStatistics.GROUP_COLUMN, 0),
+        JockeyStatistics.PREFIX: (JockeyStatistics.GROUP_COLUMN, JockeyStatistics.RECENT_RACES_COUNT),
+        TrainerStatistics.PREFIX: (TrainerStatistics.GROUP_COLUMN, TrainerStatistics.RECENT_RACES_COUNT),
+    }
+
+    TIME_COLUMN = TimeSeriesStatistics.TIME_COLUMN
+    RANK_COLUMN = TimeSeriesStatistics.RANK_COLUMN
+
+    # 直近レースとして保持するカラム（騎手・調教師の直近レース抽出に使用するカラム）
+    RECENT_COLUMNS = list(dict.fromkeys(JockeyStatistics._REQUIRED_RECENT_RACE_COLUMNS + TrainerStatistics._REQUIRED_RECENT_RACE_COLUMNS))
+
+    # エンティティごとの累積状態のカラム
+    _STATE_COLUMNS = ["count", "sum_1st", "sum_3rd", "sum_rank", "last_time", "last_rank_missing"]
+
+    def __init__(self, target_year: int, window_years: List[int]):
+        """
+        初期化（空のスナップショット）
+
+        Args:
+            target_year: 処理対象年度
+            window_years: 取り込む結果の年度（処理対象年度より前）
+        """
+        self._target_year = target_year
+        self._window_years = sorted(window_years)
+        self._states: Dict[str, pd.DataFrame] = {
+            group_col: pd.DataFrame(columns=self._STATE_COLUMNS) for group_col, _ in self.ENTITIES.values()
+        }
+        self._recent: Dict[str, pd.DataFrame] = {}
+        self._recent_columns: List[str] = []
+        self._ingested_race_keys = np.zeros(0, dtype=np.int64)
+        self._row_count = 0
+        self._as_of: Optional[float] = None
+        self._source_fingerprints: Dict[str, Optional[str]] = {}
+
+    @property
+    def target_year(self) -> int:
+        """処理対象年度"""
+        return self._target_year
+
+    @property
+    def window_years(self) -> List[int]:
+        """取り込む結果の年度"""
+        return list(self._window_years)
+
+    @property
+    def as_of(self) -> Optional[float]:
+        """取り込み済みの最新レースのstart_datetime（未取り込みの場合はNone）"""
+        return self._as_of
+
+    @property
+    def columns(self) -> List[str]:
+        """直近レースとして保持しているカラム（統計量計算用DataFrameのcolumnsの代わり）"""
+        return list(self._recent_columns)
+
+    def __len__(self) -> int:
+        """取り込み済みの行数"""
+        return self._row_count
+
+    @staticmethod
+    def get_dir(parquet_base_path: Union[str, Path], target_year: int) -> Path:
+        """処理対象年度のスナップショットのディレクトリ"""
+        return Path(parquet_base_path) / ENTITY_STATE_DIR_NAME / f"entity_state_{target_year}"
+
+    @staticmethod
+    def build(
+        parquet_loader: ParquetLoader, target_year: int, full_info_schema: Union[Dict, Schema], additional_sed: Sequence[pd.DataFrame] = ()
+    ) -> "EntityStateSnapshot":
+        """
+        過去年度のSED年度パックからスナップショットを作成
+
+        Args:
+            parquet_loader: 年度パックのParquetローダー
+            target_year: 処理対象年度
+            full_info_schema: 特徴量抽出スキーマ（統計量計算に使うカラムの取得用）
+            additional_sed: 年度パックの後に取り込むSEDの結果（年度パックに未反映の週次の結果など、取り込み順に指定）
+
+        Returns:
+            作成したスナップショット（SEDが存在しない場合は空）
+        """
+        window_years = HistoricalRaceStore.previous_years(target_year)
+        snapshot = EntityStateSnapshot(target_year, window_years)
+        sed_df = parquet_loader.load_multi_year_parquet("SED", window_years, columns=FeatureExtractor.get_historical_sed_columns(full_info_schema))
+        if sed_df is not None and len(sed_df) > 0:
+            snapshot.update(sed_df, full_info_schema)
+        for additional_sed_df in additional_sed:
+            snapshot.update(additional_sed_df, full_info_schema)
+        snapshot.refresh_fingerprints(parquet_loader)
+        logger.info(f"エンティティ状態のスナップショットを作成しました: {target_year}年（{window_years}、{len(snapshot):,}行）")
+        return snapshot
+
+    def update(self, sed_df: pd.DataFrame, full_info_schema: Union[Dict, Schema]) -> int:
+        """
+        SEDの結果を取り込む（取り込み済みのレース・対象外の年度の行は除外）
+
+        Args:
+            sed_df: SEDデータ（年度パックまたは日次の結果）
+            full_info_schema: 特徴量抽出スキーマ
+
+        Returns:
+            取り込んだ行数（対象外の年度の結果しかない場合は0。対象年度の結果は翌年度のスナップショットに取り込む）
+        """
+        result_years = pd.to_numeric(FeatureConverter.safe_ymd_vectorized(sed_df["年月日"]).str[:4], errors="coerce")
+        in_window = result_years.isin(self._window_years).to_numpy()
+        if not in_window.all():
+            outside_years = sorted(int(year) for year in result_years[~in_window].dropna().unique())
+            logger.warning(
+                f"エンティティ状態（{self._target_year}年）の対象外の年度の結果は取り込みません: "
+                f"{len(sed_df) - int(in_window.sum()):,}/{len(sed_df):,}行（年度: {outside_years}、取り込み対象: {self._window_years}）"
+            )
+        sed_df = sed_df.loc[in_window]
+        if len(sed_df) == 0:
+            return 0
+        return self.ingest_stats(FeatureExtractor.prepare_historical_stats(sed_df, full_info_schema))
+
+    def ingest_stats(self, stats_df: pd.DataFrame) -> int:
+        """
+        統計量計算用DataFrame（FeatureExtractor.prepare_historical_statsの結果）を取り込む
+
+        Args:
+            stats_df: 統計量計算用DataFrame
+
+        Returns:
+            取り込んだ行数（取り込み済みのrace_keyの行は除外）
+        """
+        new_rows = ~stats_df["race_key"].isin(self._ingested_race_keys).to_numpy()
+        stats_df = stats_df.loc[new_rows]
+        if len(stats_df) == 0:
+            return 0
+        if not self._recent_columns:
+            self._recent_columns = [col for col in self.RECENT_COLUMNS if col in stats_df.columns]
+
+        for group_col, num_races in self.ENTITIES.values():
+            valid = stats_df[group_col].notna().to_numpy() & stats_df[self.TIME_COLUMN].notna().to_numpy()
+            # TimeSeriesStatisticsと同じく(エンティティ, start_datetime)の安定ソート順で集約する
+            rows = stats_df.loc[valid].sort_values([group_col, self.TIME_COLUMN], kind="stable")
+            self._states[group_col] = self._merge_states(self._states[group_col], self._aggregate(rows, group_col))
+            if num_races > 0:
+                self._recent[group_col] = self._merge_recent(self._recent.get(group_col), rows, group_col, num_races)
+
+        self._ingested_race_keys = np.union1d(self._ingested_race_keys, stats_df["race_key"].dropna().to_numpy(dtype=np.int64))
+        self._row_count += len(stats_df)
+        latest = pd.to_numeric(stats_df[self.TIME_COLUMN], errors="coerce").max()
+        if pd.notna(latest):
+            self._as_of = float(latest) if self._as_of is None else max(self._as_of, float(latest))
+        return len(stats_df)
+
+    def diff(self, expected: "EntityStateSnapshot") -> List[str]:
+        """
+        別のスナップショット（同じ入力を全件から作成したもの）と状態を比較
+
+        増分で取り込んだスナップショットが全件から再計算した場合と同じ統計量を返すことの検証に使う。
+        累積状態・直近レース・取り込み済みのrace_keyが一致すれば、統計量もすべて一致する。
+
+        Args:
+            expected: 比較対象のスナップショット
+
+        Returns:
+            差分の説明のリスト（一致する場合は空）
+        """
+        differences = []
+        for name in ["_target_year", "_window_years", "_row_count", "_as_of", "_recent_columns"]:
+            if getattr(self, name) != getattr(expected, name):
+                differences.append(f"{name.lstrip('_')}: {getattr(self, name)} != {getattr(expected, name)}")
+        if not np.array_equal(self._ingested_race_keys, expected._ingested_race_keys):
+            differences.append(f"取り込み済みのrace_key: {len(self._ingested_race_keys)}件 != {len(expected._ingested_race_keys)}件")
+
+        for prefix, (group_col, num_races) in self.ENTITIES.items():
+            frames = [(f"{prefix}の累積状態", EntityStateSnapshot._comparable_state(self._states[group_col]), EntityStateSnapshot._comparable_state(expected._states[group_col]))]
+            if num_races > 0:
+                frames.append((f"{prefix}の直近レース", self._comparable_recent(group_col), expected._comparable_recent(group_col)))
+            for label, actual_df, expected_df in frames:
+                try:
+                    pd.testing.assert_frame_equal(actual_df, expected_df, check_dtype=False, check_index_type=False, check_names=False)
+                except AssertionError as e:
+                    differences.append(f"{label}: {e}")
+        return differences
+
+    def covers(self, times: Union[pd.Series, np.ndarray]) -> bool:
+        """指定したstart_datetimeがすべて取り込み済みの最新レースより後（スナップショットで計算可能）かどうか"""
+        times = pd.to_numeric(pd.Series(times), errors="coerce").dropna()
+        return self._as_of is None or bool((times > self._as_of).all())
+
+    def lookup_cumulative(self, group_col: str, groups: np.ndarray, times: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        対象行ごとの累積出走回数と勝利数・3着内数・着順合計を取得（TimeSeriesStatistics.cumulative_statsから使用）
+
+        Returns:
+            (count, sums) - sumsは(3 × 行数)、最終レースの着順が欠損の場合は着順合計をNaN（全履歴から計算した場合と同じ）
+
+        Raises:
+            ValueError: 取り込み済みの最新レース以前のstart_datetimeの行がある場合
+        """
+        valid = pd.notna(groups) & ~np.isnan(times)
+        self._check_covers(times[valid])
+        state = self._states[group_col]
+        positions = np.full(len(groups), -1, dtype=np.int64)
+        positions[valid] = state.index.get_indexer(groups[valid])
+        found = positions >= 0
+
+        count = np.zeros(len(groups), dtype=int)
+        sums = np.zeros((3, len(groups)), dtype=float)
+        count[found] = state["count"].to_numpy(dtype=int)[positions[found]]
+        sums[0, found] = state["sum_1st"].to_numpy(dtype=float)[positions[found]]
+        sums[1, found] = state["sum_3rd"].to_numpy(dtype=float)[positions[found]]
+        sum_rank = np.where(state["last_rank_missing"].to_numpy(dtype=bool), np.nan, state["sum_rank"].to_numpy(dtype=float))
+        sums[2, found] = sum_rank[positions[found]]
+        return count, sums
+
+    def lookup_recent(
+        self, group_col: str, groups: np.ndarray, times: np.ndarray, columns: List[str], num_races: int
+    ) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
+        """
+        対象行ごとの直近Nレースの詳細を取得（TimeSeriesStatistics.recent_racesから使用）
+
+        Returns:
+            (values, race_keys) - values: カラム → (行数 × N)の値（存在しない場合はNaN）、race_keys: (行数 × N)のrace_key（存在しない場合はNone）
+
+        Raises:
+            ValueError: 取り込み済みの最新レース以前のstart_datetimeの行がある場合、または保持していない直近レース数・カラムの場合
+        """
+        valid = pd.notna(groups) & ~np.isnan(times)
+        self._check_covers(times[valid])
+        held_races = dict(self.ENTITIES.values()).get(group_col, 0)
+        if num_races > held_races or any(col not in self._recent_columns for col in columns):
+            raise ValueError(f"スナップショットに保持していない直近レースです: {group_col}, {num_races}レース, {columns}")
+
+        values = {col: np.full((len(groups), num_races), np.nan, dtype=float) for col in columns}
+        race_keys = np.full((len(groups), num_races), None, dtype=object)
+        recent = self._recent.get(group_col)
+        if recent is None or len(recent) == 0:
+            return values, race_keys
+
+        # 直近レースはエンティティごとに新しい順（recent_rank=0が1走前）に保持している
+        entity_index = pd.Index(recent[group_col].drop_duplicates())
+        entity_positions = np.full(len(groups), -1, dtype=np.int64)
+        entity_positions[valid] = entity_index.get_indexer(groups[valid])
+        recent_keys = pd.MultiIndex.from_arrays([recent[group_col], recent["recent_rank"]])
+        for i in range(num_races):
+            rows = np.flatnonzero(entity_positions >= 0)
+            lookup = pd.MultiIndex.from_arrays([entity_index[entity_positions[rows]], np.full(len(rows), i)])
+            source = recent_keys.get_indexer(lookup)
+            has = source >= 0
+            for col in columns:
+                values[col][rows[has], i] = recent[col].to_numpy()[source[has]]
+            race_keys[rows[has], i] = recent["race_key"].to_numpy()[source[has]]
+        return values, race_keys
+
+    def is_current(self, parquet_loader: ParquetLoader) -> bool:
+        """作成時（またはrefresh_fingerprints時）から取り込み対象年度のSED年度パックが変わっていないか"""
+        return self._source_fingerprints == self._fingerprints(parquet_loader)
+
+    def refresh_fingerprints(self, parquet_loader: ParquetLoader) -> None:
+        """取り込み対象年度のSED年度パックの識別ハッシュを記録（年度パックの内容を取り込み済みの場合に使用）"""
+        self._source_fingerprints = self._fingerprints(parquet_loader)
+
+    def save(self, directory: Union[str, Path]) -> None:
+        """スナップショットを保存（一時ディレクトリに書き出してから置き換え）"""
+        directory = Path(directory)
+        temporary_dir = directory.with_name(f".{directory.name}.tmp-{os.getpid()}")
+        shutil.rmtree(temporary_dir, ignore_errors=True)
+        temporary_dir.mkdir(parents=True)
+        try:
+            for prefix, (group_col, num_races) in self.ENTITIES.items():
+                self._states[group_col].rename_axis(group_col).reset_index().to_parquet(temporary_dir / f"{prefix}_state.parquet", index=False)
+                if num_races > 0 and group_col in self._recent:
+                    self._recent[group_col].to_parquet(temporary_dir / f"{prefix}_recent.parquet", index=False)
+            pd.DataFrame({"race_key": self._ingested_race_keys}).to_parquet(temporary_dir / self.INGESTED_FILE_NAME, index=False)
+            metadata = {
+                "version": self.VERSION,
+                "target_year": self._target_year,
+                "window_years": self._window_years,
+                "as_of": self._as_of,
+                "row_count": self._row_count,
+                "recent_columns": self._recent_columns,
+                "source_fingerprints": self._source_fingerprints,
+                "updated_at": datetime.now().isoformat(timespec="seconds"),
+            }
+            with open(temporary_dir / self.METADATA_FILE_NAME, "w", encoding="utf-8") as f:
+                json.dump(metadata, f, indent=2, ensure_ascii=False)
+            shutil.rmtree(directory, ignore_errors=True)
+            os.replace(temporary_dir, directory)
+        finally:
+            shutil.rmtree(temporary_dir, ignore_errors=True)
+
+    @staticmethod
+    def load(directory: Union[str, Path]) -> Optional["EntityStateSnapshot"]:
+        """
+        スナップショットを読み込む
+
+        Returns:
+            スナップショット（存在しない、または保存形式のバージョンが異なる場合はNone）
+        """
+        directory = Path(directory)
+        metadata_path = directory / EntityStateSnapshot.METADATA_FILE_NAME
+        if not metadata_path.exists():
+            return None
+        with open(metadata_path, "r", encoding="utf-8") as f:
+            metadata = json.load(f)
+        if metadata.get("version") != EntityStateSnapshot.VERSION:
+            logger.info(f"エンティティ状態のスナップショットのバージョンが異なるため使用しません: {directory}")
+            return None
+
+        snapshot = EntityStateSnapshot(metadata["target_year"], metadata["window_years"])
+        for prefix, (group_col, num_races) in EntityStateSnapshot.ENTITIES.items():
+            snapshot._states[group_col] = pd.read_parquet(directory / f"{prefix}_state.parquet").set_index(group_col)
+            recent_path = directory / f"{prefix}_recent.parquet"
+            if num_races > 0 and recent_path.exists():
+                snapshot._recent[group_col] = pd.read_parquet(recent_path)
+        snapshot._ingested_race_keys = pd.read_parquet(directory / EntityStateSnapshot.INGESTED_FILE_NAME)["race_key"].to_numpy(dtype=np.int64)
+        snapshot._recent_columns = metadata["recent_columns"]
+        snapshot._row_count = metadata["row_count"]
+        snapshot._as_of = metadata["as_of"]
+        snapshot._source_fingerprints = metadata["source_fingerprints"]
+        return snapshot
+
+    @staticmethod
+    def _comparable_state(state: pd.DataFrame) -> pd.DataFrame:
+        """比較用の累積状態（エンティティ順、数値はfloat）"""
+        state = state.sort_index()
+        return state.astype({col: float for col in ["count", "sum_1st", "sum_3rd", "sum_rank", "last_time"]}).astype({"last_rank_missing": bool})
+
+    def _comparable_recent(self, group_col: str) -> pd.DataFrame:
+        """比較用の直近レース（エンティティ・新しい順）"""
+        recent = self._recent.get(group_col)
+        if recent is None:
+            return pd.DataFrame()
+        return recent.sort_values([group_col, "recent_rank"]).reset_index(drop=True)
+
+    def _check_covers(self, times: np.ndarray) -> None:
+        """スナップショットで計算できないstart_datetimeの行がある場合はエラー"""
+        if self._as_of is not None and len(times) > 0 and times.min() <= self._as_of:
+            raise ValueError(f"取り込み済みの最新レース（{self._as_of:.0f}）以前の行はスナップショットから計算できません: {times.min():.0f}")
+
+    def _fingerprints(self, parquet_loader: ParquetLoader) -> Dict[str, Optional[str]]:
+        """取り込み対象年度のSED年度パックの識別ハッシュ"""
+        return {str(year): parquet_loader.get_annual_pack_fingerprint("SED", year) for year in self._window_years}
+
+    @staticmethod
+    def _aggregate(rows: pd.DataFrame, group_col: str) -> pd.DataFrame:
+        """ソート済みの行をエンティティごとの累積状態に集約"""
+        grouped = rows.groupby(group_col, sort=False)
+        last_rows = grouped.tail(1).set_index(group_col)
+        aggregated = pd.DataFrame({
+            "count": grouped.size(),
+            "sum_1st": grouped[TimeSeriesStatistics.RANK_1ST_COLUMN].sum(),
+            "sum_3rd": grouped[TimeSeriesStatistics.RANK_3RD_COLUMN].sum(),
+            "sum_rank": grouped[EntityStateSnapshot.RANK_COLUMN].sum(),
+        })
+        aggregated["last_time"] = last_rows[EntityStateSnapshot.TIME_COLUMN].astype(float)
+        aggregated["last_rank_missing"] = last_rows[EntityStateSnapshot.RANK_COLUMN].isna()
+        return aggregated
+
+    @staticmethod
+    def _merge_states(current: pd.DataFrame, added: pd.DataFrame) -> pd.DataFrame:
+        """累積状態に新しい行の集約結果を加算（最終レースの情報はstart_datetimeが新しい方を使用）"""
+        if len(current) == 0:
+            return added[EntityStateSnapshot._STATE_COLUMNS]
+        merged = current.reindex(current.index.union(added.index))
+        added = added.reindex(merged.index)
+        for col in ["count", "sum_1st", "sum_3rd", "sum_rank"]:
+            merged[col] = merged[col].astype(float).fillna(0) + added[col].astype(float).fillna(0)
+        newer = added["last_time"].notna() & ~(merged["last_time"].astype(float) > added["last_time"])
+        merged.loc[newer, "last_time"] = added.loc[newer, "last_time"]
+        merged.loc[newer, "last_rank_missing"] = added.loc[newer, "last_rank_missing"]
+        merged["count"] = merged["count"].astype(int)
+        merged["last_time"] = merged["last_time"].astype(float)
+        merged["last_rank_missing"] = merged["last_rank_missing"].astype(bool)
+        return merged
+
+    def _merge_recent(self, current: Optional[pd.DataFrame], rows: pd.DataFrame, group_col: str, num_races: int) -> pd.DataFrame:
+        """直近レースに新しい行を加え、エンティティごとに新しい順でN件を残す"""
+        columns = [group_col, self.TIME_COLUMN, "race_key"] + self._recent_columns
+        # 保持している直近レースは新しい順のため、古い順に戻してから結合する（同日の行の順序を全件計算と揃える）
+        frames = [rows[columns]] if current is None else [current[columns].iloc[::-1], rows[columns]]
+        combined = pd.concat(frames, ignore_index=True).sort_values([group_col, self.TIME_COLUMN], kind="stable")
+        recent = combined.groupby(group_col, sort=False).tail(num_races).iloc[::-1]
+        recent = recent.assign(recent_rank=recent.groupby(group_col, sort=False).cumcount()).reset_index(drop=True)
+        return recent
+
@@ -3,16 +3,21 @@
 import gc
 import os
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import Dict, Union
+from typing import TYPE_CHECKING, Dict, Union
 
 import pandas as pd
 
 from ._03_02_previous_race_extractor import PreviousRaceExtractor
 from src.utils.feature_converter import FeatureConverter
+from src.utils.key_codec import KeyCodec
 from src.utils.schema_loader import Schema, Column
 from ._03_03_horse_statistics import HorseStatistics
 from ._03_04_jockey_statistics import JockeyStatistics
 from ._03_05_trainer_statistics import TrainerStatistics
+from ._03_06_process_pool_runner import ProcessPoolRunner
+
+if TYPE_CHECKING:
+    from ._03_08_entity_state_snapshot import EntityStateSnapshot
 
 
 class FeatureExtractor:
@@ -26,10 +31,18 @@ class FeatureExtractor:
     
     # 統計量計算用のソース
     STATS_SOURCES = ["SED", "BAC", "KYI"]
+
+    # historical SEDのrace_key・start_datetime生成に必要なカラム（統計量計算用カラム以外に読み込む）
+    HISTORICAL_SED_KEY_COLUMNS = ["場コード", "年", "回", "日", "R", "年月日", "発走時間"]
     
     # 環境変数
     ENV_FEATURE_EXTRACTOR_MAX_WORKERS = "FEATURE_EXTRACTOR_MAX_WORKERS"
     DEFAULT_FEATURE_EXTRACTOR_WORKERS = 2
+    # 並列実行バックエンド（thread: ThreadPoolExecutor、process: ProcessPoolExecutor + エンティティ単位シャーディング）
+    ENV_FEATURE_EXTRACTOR_BACKEND = "FEATURE_EXTRACTOR_BACKEND"
+    BACKEND_THREAD = "thread"
+    BACKEND_PROCESS = "process"
+    DEFAULT_FEATURE_EXTRACTOR_BACKEND = BACKEND_THREAD
 
     @staticmethod
     def extract_all_parallel(
@@ -54,10 +67,83 @@ class FeatureExtractor:
         if bac_df is None: raise ValueError("BACデータは必須です。bac_dfがNoneです。")
         if full_info_schema is None: raise ValueError("full_info_schemaは必須です。スキーマ情報が提供されていません。")
 
-        target_df = combined_df.copy()
-        # 年齢カラムを生成（_04_01_numeric_converterの_add_computed_fieldsを呼び出し）
-        from ._04_01_numeric_converter import NumericConverter
-        NumericConverter._add_computed_fields(target_df)
+        target_df = FeatureExtractor._prepare_target(combined_df)
+        historical_stats_df = FeatureExtractor.prepare_historical_stats(historical_sed_df, full_info_schema)
+
+        # 並列処理実行
+        max_workers = int(os.environ.get(FeatureExtractor.ENV_FEATURE_EXTRACTOR_MAX_WORKERS, FeatureExtractor.DEFAULT_FEATURE_EXTRACTOR_WORKERS))
+        backend = os.environ.get(FeatureExtractor.ENV_FEATURE_EXTRACTOR_BACKEND, FeatureExtractor.DEFAULT_FEATURE_EXTRACTOR_BACKEND).strip().lower()
+        if backend not in (FeatureExtractor.BACKEND_THREAD, FeatureExtractor.BACKEND_PROCESS):
+            raise ValueError(f"{FeatureExtractor.ENV_FEATURE_EXTRACTOR_BACKEND}の値が不正です: {backend}（{FeatureExtractor.BACKEND_THREAD}または{FeatureExtractor.BACKEND_PROCESS}）")
+        schemas = {
+            "previous_races": previous_race_extractor_schema,
+            "horse_stats": horse_statistics_schema,
+            "jockey_stats": jockey_statistics_schema,
+            "trainer_stats": trainer_statistics_schema,
+        }
+        results = {}
+        try:
+            if backend == FeatureExtractor.BACKEND_PROCESS:
+                results = ProcessPoolRunner.run(target_df, historical_stats_df, schemas, max_workers)
+            else:
+                results = FeatureExtractor._run_with_threads(target_df, historical_stats_df, schemas, max_workers)
+            return FeatureExtractor._merge_results(target_df, results, feature_extraction_schema)
+        finally:
+            # クリーンアップ
+            del target_df, historical_stats_df, results
+            gc.collect()
+
+    @staticmethod
+    def extract_all_from_entity_state(
+        combined_df: pd.DataFrame, entity_state: "EntityStateSnapshot",
+        horse_statistics_schema: Union[Dict, Schema], jockey_statistics_schema: Union[Dict, Schema],
+        trainer_statistics_schema: Union[Dict, Schema], previous_race_extractor_schema: Union[Dict, Schema],
+        feature_extraction_schema: Union[Dict, Schema]
+    ) -> pd.DataFrame:
+        """
+        エンティティ状態のスナップショットを統計量計算用DataFrameの代わりに使って特徴量を抽出。
+
+        過去年度のSEDを読み込まず、対象行のエンティティの状態を参照するだけで統計量を計算する。
+        結果はスナップショットに取り込んだSEDでextract_all_parallelを実行した場合と同じ。
+
+        Args:
+            combined_df: 結合済みDataFrame（スナップショットの最新レースより後のレースのみ）
+            entity_state: エンティティ状態のスナップショット
+
+        Returns:
+            全特徴量が追加されたDataFrame（スナップショットが空の場合はcombined_dfをそのまま返す）
+        """
+        if len(entity_state) == 0: return combined_df
+
+        target_df = FeatureExtractor._prepare_target(combined_df)
+        schemas = {
+            "previous_races": previous_race_extractor_schema,
+            "horse_stats": horse_statistics_schema,
+            "jockey_stats": jockey_statistics_schema,
+            "trainer_stats": trainer_statistics_schema,
+        }
+        results = {}
+        try:
+            # 対象行数分の参照のみのため、プロセスプールは使用しない
+            max_workers = int(os.environ.get(FeatureExtractor.ENV_FEATURE_EXTRACTOR_MAX_WORKERS, FeatureExtractor.DEFAULT_FEATURE_EXTRACTOR_WORKERS))
+            results = FeatureExtractor._run_with_threads(target_df, entity_state, schemas, max_workers)
+            return FeatureExtractor._merge_results(target_df, results, feature_extraction_schema)
+        finally:
+            del target_df, results
+            gc.collect()
+
+    @staticmethod
+    def prepare_historical_stats(historical_sed_df: pd.DataFrame, full_info_schema: Union[Dict, Schema]) -> pd.DataFrame:
+        """
+        historical SEDから統計量計算用DataFrameを作成（race_key・start_datetime・rank_1st・rank_3rdを追加）
+
+        Args:
+            historical_sed_df: 複数年度のSEDデータ
+            full_info_schema: スキーマ情報（統計量計算に使うカラムの取得用）
+
+        Returns:
+            統計量計算用DataFrame（race_key生成に必要なカラム・年月日が欠損した行は除外）
+        """
         # historical SEDは一部レコードに場コード/回/Rなどの欠損が含まれることがある。
         # ここで無理な補完（fallback）は行わず、統計量計算に使えないレコードは明示的に除外する。
         required_cols = ["場コード", "回", "日", "R"]
@@ -80,14 +166,14 @@ class FeatureExtractor:
         # 年月日欠損も補完せず除外（fallback禁止）
         import logging
         logger = logging.getLogger(__name__)
-        ymd_str = historical_sed_df["年月日"].apply(FeatureConverter.safe_ymd)
+        ymd_str = FeatureConverter.safe_ymd_vectorized(historical_sed_df["年月日"])
         invalid_ymd = ymd_str.str.len() != 8
         if invalid_ymd.any():
             invalid_count = int(invalid_ymd.sum())
             logger.warning(f"historical_sed_dfの年月日不正/欠損行を除外します: {invalid_count}/{len(historical_sed_df)}")
             historical_sed_df = historical_sed_df.loc[~invalid_ymd].copy()
 
-        historical_sed_df_with_key = FeatureConverter.add_race_key_to_df(historical_sed_df, bac_df=None, use_bac_date=False)
+        historical_sed_df_with_key = KeyCodec.encode_keys(FeatureConverter.add_race_key_to_df(historical_sed_df, bac_df=None, use_bac_date=False))
         
         # 統計量計算用のDataFrameを準備
         stats_columns = FeatureExtractor._get_stats_columns_from_schema(full_info_schema)
@@ -99,60 +185,78 @@ class FeatureExtractor:
         if len(available_stats_columns) == 0: raise ValueError("統計量計算に必要なカラムがhistorical_sed_df_with_keyに存在しません。")
         
         historical_stats_df = historical_sed_df_with_key[available_stats_columns].copy()
+        del historical_sed_df_with_key
         historical_stats_df["rank_1st"] = (historical_stats_df["着順"] == 1).astype(int)
         historical_stats_df["rank_3rd"] = (historical_stats_df["着順"].isin([1, 2, 3])).astype(int)
-        historical_stats_df = FeatureConverter.add_start_datetime_to_df(historical_stats_df)
+        return FeatureConverter.add_start_datetime_to_df(historical_stats_df)
 
-        # 並列処理実行
-        max_workers = int(os.environ.get(FeatureExtractor.ENV_FEATURE_EXTRACTOR_MAX_WORKERS, FeatureExtractor.DEFAULT_FEATURE_EXTRACTOR_WORKERS))
-        results = {}
+    @staticmethod
+    def _prepare_target(combined_df: pd.DataFrame) -> pd.DataFrame:
+        """特徴量追加先のDataFrameを準備（整数キー化、年齢カラムの生成）"""
+        # race_key・エンティティコードは整数キーで扱う（JrdbCombinerの結合結果は整数化済み）
+        target_df = KeyCodec.encode_keys(combined_df)
+        # 年齢カラムを生成（_04_01_numeric_converterの_add_computed_fieldsを呼び出し）
+        from ._04_01_numeric_converter import NumericConverter
+        NumericConverter._add_computed_fields(target_df)
+        return target_df
+
+    @staticmethod
+    def _merge_results(target_df: pd.DataFrame, results: Dict[str, pd.DataFrame], feature_extraction_schema: Union[Dict, Schema]) -> pd.DataFrame:
+        """各抽出処理の結果を結合（race_keyと馬番をキーとしてマージ）し、スキーマを検証"""
+        featured_df = results["previous_races"]
+        existing_cols = set(featured_df.columns)
+
+        # 統計結果を順次結合
+        for stats_result_df in [results["horse_stats"], results["jockey_stats"], results["trainer_stats"]]:
+            new_cols = [col for col in stats_result_df.columns if col not in target_df.columns and col not in existing_cols and col not in FeatureExtractor.MERGE_KEYS]
+            if not new_cols: continue
+            stats_subset = stats_result_df[FeatureExtractor.MERGE_KEYS + new_cols]
+            featured_df = featured_df.merge(stats_subset, on=FeatureExtractor.MERGE_KEYS, how="left")
+            existing_cols.update(new_cols)
+        
+        # 重複カラムの検証
+        duplicated_cols = featured_df.columns[featured_df.columns.duplicated()].unique()
+        if len(duplicated_cols) > 0: raise ValueError(f"重複カラムが検出されました: {list(duplicated_cols)[:20]}")
+
+        # スキーマ検証（日次データなど、一部のカラムが存在しない場合は警告のみ）
+        schema_obj = Schema.from_dict(feature_extraction_schema) if isinstance(feature_extraction_schema, dict) else feature_extraction_schema
         try:
-            with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                futures = {
-                    executor.submit(PreviousRaceExtractor.extract, target_df, previous_race_extractor_schema): "previous_races",
-                    executor.submit(HorseStatistics.calculate, historical_stats_df, target_df, horse_statistics_schema): "horse_stats",
-                    executor.submit(JockeyStatistics.calculate, historical_stats_df, target_df, jockey_statistics_schema): "jockey_stats",
-                    executor.submit(TrainerStatistics.calculate, historical_stats_df, target_df, trainer_statistics_schema): "trainer_stats",
-                }
-
-                for future in as_completed(futures):
-                    task_name = futures[future]
-                    try:
-                        results[task_name] = future.result()
-                    except Exception as e:
-                        raise RuntimeError(f"{task_name}でエラー: {e}") from e
-
-            # 結果を結合（race_keyと馬番をキーとしてマージ）
-            featured_df = results["previous_races"]
-            existing_cols = set(featured_df.columns)
-
-            # 統計結果を順次結合
-            for stats_result_df in [results["horse_stats"], results["jockey_stats"], results["trainer_stats"]]:
-                new_cols = [col for col in stats_result_df.columns if col not in target_df.columns and col not in existing_cols and col not in FeatureExtractor.MERGE_KEYS]
-                if not new_cols: continue
-                stats_subset = stats_result_df[FeatureExtractor.MERGE_KEYS + new_cols]
-                featured_df = featured_df.merge(stats_subset, on=FeatureExtractor.MERGE_KEYS, how="left")
-                existing_cols.update(new_cols)
-            
-            # 重複カラムの検証
-            duplicated_cols = featured_df.columns[featured_df.columns.duplicated()].unique()
-            if len(duplicated_cols) > 0: raise ValueError(f"重複カラムが検出されました: {list(duplicated_cols)[:20]}")
-
-            # スキーマ検証（日次データなど、一部のカラムが存在しない場合は警告のみ）
-            schema_obj = Schema.from_dict(feature_extraction_schema) if isinstance(feature_extraction_schema, dict) else feature_extraction_schema
-            try:
-                schema_obj.validate(featured_df)
-            except ValueError as e:
-                # 日次データなど、一部のカラムが存在しない場合は警告のみ（エラーにはしない）
-                import logging
-                logger = logging.getLogger(__name__)
-                logger.warning(f"スキーマ検証で警告: {e}（処理は続行します）")
-
-            return featured_df
-        finally:
-            # クリーンアップ
-            del target_df, historical_sed_df_with_key, historical_stats_df, results
-            gc.collect()
+            schema_obj.validate(featured_df)
+        except ValueError as e:
+            # 日次データなど、一部のカラムが存在しない場合は警告のみ（エラーにはしない）
+            import logging
+            logger = logging.getLogger(__name__)
+            logger.warning(f"スキーマ検証で警告: {e}（処理は続行します）")
+
+        return featured_df
+
+    @staticmethod
+    def _run_with_threads(
+        target_df: pd.DataFrame, historical_stats_df: Union[pd.DataFrame, "EntityStateSnapshot"], schemas: Dict[str, Schema], max_workers: int
+    ) -> Dict[str, pd.DataFrame]:
+        """各抽出処理をThreadPoolExecutorで実行（historical_stats_dfはエンティティ状態のスナップショットでもよい）"""
+        results = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(PreviousRaceExtractor.extract, target_df, schemas["previous_races"]): "previous_races",
+                executor.submit(HorseStatistics.calculate, historical_stats_df, target_df, schemas["horse_stats"]): "horse_stats",
+                executor.submit(JockeyStatistics.calculate, historical_stats_df, target_df, schemas["jockey_stats"]): "jockey_stats",
+                executor.submit(TrainerStatistics.calculate, historical_stats_df, target_df, schemas["trainer_stats"]): "trainer_stats",
+            }
+
+            for future in as_completed(futures):
+                task_name = futures[future]
+                try:
+                    results[task_name] = future.result()
+                except Exception as e:
+                    raise RuntimeError(f"{task_name}でエラー: {e}") from e
+        return results
+
+    @staticmethod
+    def get_historical_sed_columns(full_info_schema: Union[Dict, Schema]) -> list[str]:
+        """historical SEDのParquetから読み込む必要があるカラム（統計量計算用カラム + race_key・start_datetime生成用カラム）"""
+        columns = FeatureExtractor._get_stats_columns_from_schema(full_info_schema)
+        return columns + [col for col in FeatureExtractor.HISTORICAL_SED_KEY_COLUMNS if col not in columns]
 
     @staticmethod
     def _get_stats_columns_from_schema(full_info_schema: Union[Dict, Schema]) -> list[str]:
@@ -1,21 +1,26 @@
 """メインのオーケストレーター - シンプルで明確なデータ処理フロー"""
 
 import gc
+import json
 from datetime import datetime
 from pathlib import Path
-from typing import List, Optional, Tuple, Union
+from typing import Dict, List, Optional, Tuple, Union
 
 import pandas as pd
 
+from src.utils.arrow_concat import ArrowConcat
 from src.utils.cache_manager import CacheManager
+from src.utils.feature_converter import FeatureConverter
 from src.utils.schema_loader import SchemaLoader, SchemaFile
 from src.utils.parquet_loader import ParquetLoader
 from src.utils.jrdb_format_loader import JRDBFormatLoader
+from src.utils.memory_monitor import MemoryMonitor
 from ._06_column_selector import ColumnSelector
-from ._02_jrdb_combiner import JrdbCombiner
+from ._02_01_combined_artifact import CombinedArtifactStore
 from ._04_key_converter import KeyConverter
 from ._05_time_series_splitter import TimeSeriesSplitter
 from ._03_feature_extractor import FeatureExtractor
+from ._03_07_historical_race_store import HistoricalRaceStore
 
 # 使用するデータタイプの定数定義
 _DATA_TYPES = [
@@ -26,6 +31,24 @@ _DATA_TYPES = [
     'TYB',  # 直前情報データ（出走直前の馬の状態・当日予想に最重要）
 ]
 
+# ステージごとのコードバージョン（ステージの出力が変わる変更をした場合に上げる、キャッシュキーに含まれる）
+_STAGE_VERSIONS = {
+    'featured': 1,   # 特徴量抽出（_03_、年度ごと）
+    'converted': 1,  # キー変換・数値化・型最適化（_04_、年度の範囲ごと）
+    'split': 1,      # 時系列分割・カラム選択（_05_, _06_）
+}
+
+# ステージごとのキャッシュキーに内容を含めるスキーマ（上流ステージの分は上流のキーに含まれる）
+_FEATURED_SCHEMA_FILES = [
+    SchemaFile.FEATURE_EXTRACTION,
+    SchemaFile.HORSE_STATISTICS,
+    SchemaFile.JOCKEY_STATISTICS,
+    SchemaFile.TRAINER_STATISTICS,
+    SchemaFile.PREVIOUS_RACE_EXTRACTOR_02,
+]
+_CONVERTED_SCHEMA_FILES = [SchemaFile.KEY_MAPPING, SchemaFile.TRAINING]
+_SPLIT_SCHEMA_FILES = [SchemaFile.COLUMN_SELECTION, SchemaFile.TRAINING, SchemaFile.EVALUATION]
+
 
 class DataProcessor:
     """データ処理のメインオーケストレーター"""
@@ -69,6 +92,10 @@ class DataProcessor:
         
         # Parquetローダーを初期化
         self._parquet_loader = ParquetLoader(self._parquet_base_path)
+        # 年度ごとの結合済みデータ（_02_の結果）のストア
+        self._combined_artifact_store = CombinedArtifactStore(
+            self._parquet_base_path, self._combined_schema, self._schema_loader.get_schema_path(SchemaFile.COMBINED), self._format_loader
+        )
         
         # キャッシュマネージャーを初期化（staticなパスを持つ）
         prediction_app_path = self._base_path / "apps" / "prediction"
@@ -92,71 +119,30 @@ class DataProcessor:
             ValueError: BACデータが存在しない場合
         """
         # 処理対象年度より前の年度のデータを読み込む
-        if available_years is not None:
-            previous_years = [y for y in available_years if y < target_year]
-        else:
-            # 利用可能な年度のリストが指定されていない場合、処理対象年度より前の年度を自動検出
-            # 最大5年前まで検索（前走データは最大5走前まで必要）
-            previous_years = [y for y in range(target_year - 5, target_year) if y >= 2000]
-        
-        if not previous_years:
-            # 前年度のデータがない場合は、処理対象年度のデータのみを使用
-            previous_years = [target_year]
-        
-        
-        sed_dfs = []
-        bac_dfs = []
-        try:
-            for year in previous_years:
-                try:
-                    data_dict = self._parquet_loader.load_parquet_files(["SED", "BAC"], year)
-                    if "SED" in data_dict and data_dict["SED"] is not None and len(data_dict["SED"]) > 0:
-                        sed_dfs.append(data_dict["SED"])
-                    if "BAC" in data_dict and data_dict["BAC"] is not None and len(data_dict["BAC"]) > 0:
-                        bac_dfs.append(data_dict["BAC"])
-                except (FileNotFoundError, ValueError):
-                    # 年度のデータが存在しない場合はスキップ
-                    continue
-            
-            # 空のDataFrameを除外
-            sed_dfs = [df for df in sed_dfs if len(df) > 0]
-            bac_dfs = [df for df in bac_dfs if len(df) > 0]
-            
-            # 段階的に結合（コピーを最小化）
+        previous_years = HistoricalRaceStore.previous_years(target_year, available_years)
+        
+        # 統計量計算に使うカラムのみを読み込む（BACは前走データ抽出の必須チェックにのみ使用）
+        sed_columns, bac_columns = self._historical_columns()
+        # SED・BACの両方が存在する年度のみ使用し、データタイプごとに全年度を1回で読み込む
+        # （パーティション形式の場合は1回のスキャン）
+        loadable_years = HistoricalRaceStore.loadable_years(self._parquet_loader, previous_years)
+        sed_df = self._parquet_loader.load_multi_year_parquet("SED", loadable_years, columns=sed_columns)
+        bac_df = self._parquet_loader.load_multi_year_parquet("BAC", loadable_years, columns=bac_columns)
+        if sed_df is not None and len(sed_df) == 0:
             sed_df = None
-            if sed_dfs:
-                sed_df = sed_dfs[0]  # 最初のDataFrameは参照を使用（コピーしない）
-                for df in sed_dfs[1:]:
-                    sed_df = pd.concat([sed_df, df], ignore_index=True)
-                    del df
-                    gc.collect()
-            
-            bac_df = None
-            if bac_dfs:
-                bac_df = bac_dfs[0]  # 最初のDataFrameは参照を使用（コピーしない）
-                for df in bac_dfs[1:]:
-                    bac_df = pd.concat([bac_df, df], ignore_index=True)
-                    del df
-                    gc.collect()
-            
-            # リストを削除
-            del sed_dfs, bac_dfs
-            gc.collect()
-            
-            if bac_df is None:
-                raise ValueError(f"BACデータは必須です。{target_year}年の前走データ抽出用のBACデータが存在しません。")
-            
-            return sed_df, bac_df
-        finally:
-            # クリーンアップ: 中間データを削除
-            if 'sed_dfs' in locals():
-                del sed_dfs
-            if 'bac_dfs' in locals():
-                del bac_dfs
-            gc.collect()
+        if bac_df is None or len(bac_df) == 0:
+            raise ValueError(f"BACデータは必須です。{target_year}年の前走データ抽出用のBACデータが存在しません。")
+        
+        return sed_df, bac_df
+
+    def _historical_columns(self) -> Tuple[List[str], List[str]]:
+        """前走データ抽出用に読み込むSED/BACのカラム"""
+        sed_columns = FeatureExtractor.get_historical_sed_columns(self._feature_extraction_schema)
+        bac_columns = FeatureConverter.RACE_KEY_REQUIRED_COLUMNS + ["年月日"]
+        return sed_columns, bac_columns
 
     def _process_single_year_features(
-        self, year: int, available_years: Optional[List[int]] = None
+        self, year: int, available_years: Optional[List[int]] = None, historical_store: Optional[HistoricalRaceStore] = None
     ) -> pd.DataFrame:
         """
         単一年度の特徴量抽出を実行
@@ -164,33 +150,21 @@ class DataProcessor:
         Args:
             year: 年度
             available_years: 利用可能な年度のリスト（前走データ抽出用、Noneの場合は自動検出）
+            historical_store: 複数年度で共有するSED/BACのストア（指定時はParquetを読み込まずにビューを使用）
         
         Returns:
             特徴量抽出済みDataFrame
         """
-        # 必要なデータを読み込む
-        kyi_df = self._parquet_loader.load_annual_pack_parquet("KYI", year)
-        bac_df = self._parquet_loader.load_annual_pack_parquet("BAC", year)
-        ukc_df = self._parquet_loader.load_annual_pack_parquet("UKC", year)
-        tyb_df = self._parquet_loader.load_annual_pack_parquet("TYB", year)
-        sed_df_for_combine = self._parquet_loader.load_annual_pack_parquet("SED", year)
-        
-        # 結合処理を実行
-        from src.jrdb_scraper.entities.jrdb import JRDBDataType
-        raw_df = JrdbCombiner.combine({
-            JRDBDataType.KYI: kyi_df,
-            JRDBDataType.BAC: bac_df,
-            JRDBDataType.UKC: ukc_df,
-            JRDBDataType.TYB: tyb_df,
-            JRDBDataType.SED: sed_df_for_combine,
-        }, self._combined_schema, self._format_loader)
-        
-        # 不要なDataFrameを削除
-        del kyi_df, ukc_df, tyb_df, sed_df_for_combine
-        gc.collect()
+        # 結合済みデータ（マニフェストが一致する場合のみ）を読み込み、ない場合は年度パックを読み込んで結合
+        raw_df = self._combined_artifact_store.load(year)
+        if raw_df is None:
+            raw_df = self._combined_artifact_store.combine(year)
         
         # 前走データ抽出用のSED/BACデータを読み込み
-        sed_df, bac_df = self._load_sed_bac_for_year(year, available_years)
+        if historical_store is not None:
+            sed_df, bac_df = historical_store.get_views(year)
+        else:
+            sed_df, bac_df = self._load_sed_bac_for_year(year, available_years)
         
         try:
             featured_df = FeatureExtractor.extract_all_parallel(
@@ -272,6 +246,9 @@ class DataProcessor:
         """
         複数年度のデータを処理（全年度のSED/BACデータを使用して前走データを抽出）
         
+        キャッシュ使用時は、特徴量抽出（年度ごと）・変換（年度の範囲ごと）・分割（分割日時ごと）の各ステージの結果を
+        入力の年度パック・スキーマ・コードバージョンから計算したキーで保存し、一致するステージは再計算しない。
+        
         Args:
             years: 年度のリスト
             split_date: 時系列分割日時（指定時は分割実行）
@@ -286,53 +263,127 @@ class DataProcessor:
         if not years:
             raise ValueError("yearsは空にできません。")
         
-        # 年度ごとに分割して処理（メモリ使用量を削減）
-        # 各年度で必要なデータだけを読み込む
-        featured_dfs = []
-        try:
-            for i, year in enumerate(years):
-                # 前走データ抽出用に、処理対象年度より前の年度も含めたリストを渡す
-                # ただし、利用可能な年度を自動検出する場合はNoneを渡す
-                year_featured_df = self._process_single_year_features(year, available_years=years)
-                if year_featured_df is not None and len(year_featured_df) > 0:
-                    featured_dfs.append(year_featured_df)
-                
-                # 各年度処理後にメモリを解放
-                gc.collect()
-            
-            # 年度ごとの特徴量抽出結果を結合
-            if not featured_dfs:
-                raise ValueError("特徴量抽出結果が空です。")
-            
-            # 段階的に結合してメモリ使用量を削減
-            if len(featured_dfs) == 1:
-                featured_df = featured_dfs[0]
-            else:
-                featured_df = featured_dfs[0]  # 最初のDataFrameは参照を使用
-                for i, df in enumerate(featured_dfs[1:], 1):
-                    featured_df = pd.concat([featured_df, df], ignore_index=True)
-                    del df
-                    if i % 2 == 0:
-                        gc.collect()
-        finally:
-            # クリーンアップ: 中間データを削除
-            if 'featured_dfs' in locals():
-                del featured_dfs
-            gc.collect()
-        
-        # データ変換とインデックス設定
-        converted_df, featured_df_for_eval = self._convert_and_prepare_data(featured_df, split_date)
+        # ステージごとのキャッシュキー（入力の年度パック・スキーマ・コードバージョンから計算、データの読み込みは不要）
+        featured_keys = {year: self._featured_stage_key(year, years) for year in years} if self._cache_manager else {}
+        converted_key = split_key = None
+        if featured_keys and all(featured_keys.values()):
+            converted_key = self._cache_manager.build_stage_key(
+                "converted", _STAGE_VERSIONS["converted"], {f"featured_{year}": featured_keys[year] for year in years},
+                [self._schema_loader.get_schema_path(f) for f in _CONVERTED_SCHEMA_FILES] + self._schema_loader.get_category_mapping_paths(),
+                {"years": list(years)},
+            )
+            if split_date is not None:
+                split_key = self._cache_manager.build_stage_key(
+                    "split", _STAGE_VERSIONS["split"], {"converted": converted_key},
+                    [self._schema_loader.get_schema_path(f) for f in _SPLIT_SCHEMA_FILES],
+                    {"split_date": str(split_date)},
+                )
+                cached = self._cache_manager.load_stage("split", split_key, ["train", "test", "eval"])
+                if cached is not None:
+                    return cached["train"], cached["test"], cached["eval"]
+        
+        cached = self._cache_manager.load_stage("converted", converted_key, ["converted"]) if converted_key else None
+        if cached is not None:
+            converted_df = cached["converted"]
+            # 評価用データの準備には特徴量抽出済みデータが必要（年度ごとのキャッシュを使用）
+            featured_df_for_eval = self._extract_features_for_years(years, featured_keys) if split_date is not None else None
+        else:
+            featured_df = self._extract_features_for_years(years, featured_keys)
+            # データ変換とインデックス設定
+            converted_df, featured_df_for_eval = self._convert_and_prepare_data(featured_df, split_date)
+            del featured_df
+            if converted_key:
+                self._cache_manager.save_stage("converted", converted_key, {"converted": converted_df}, {"years": list(years)})
         
         # 時系列分割とカラム選択（split_date指定時）
         if split_date is not None:
             if featured_df_for_eval is None:
                 raise ValueError("split_date指定時はfeatured_dfが必要です。")
             train_df, test_df, eval_df = self._split_and_select_columns(converted_df, featured_df_for_eval, split_date)
-            
-            # TODO: 複数年度のキャッシュ機能を実装する場合は、CacheManagerを拡張して
-            # キャッシュキーに全年度を含める必要がある。現時点ではキャッシュをスキップする。
-            
+            if split_key:
+                self._cache_manager.save_stage(
+                    "split", split_key, {"train": train_df, "test": test_df, "eval": eval_df},
+                    {"years": list(years), "split_date": str(split_date)},
+                )
             return train_df, test_df, eval_df
         
         return converted_df
 
+    def _extract_features_for_years(self, years: List[int], featured_keys: Dict[int, Optional[str]]) -> pd.DataFrame:
+        """
+        年度ごとの特徴量抽出結果を取得して年度順に結合（キャッシュがある年度は再計算しない）
+        
+        Args:
+            years: 年度のリスト
+            featured_keys: 年度 → featuredステージのキャッシュキー（Noneの年度はキャッシュを使用しない）
+        
+        Returns:
+            全年度の特徴量抽出済みDataFrame
+        
+        Raises:
+            ValueError: 特徴量抽出結果が空の場合
+        """
+        featured_by_year = {}
+        for year in dict.fromkeys(years):
+            key = featured_keys.get(year)
+            cached = self._cache_manager.load_stage("featured", key, ["featured"]) if key else None
+            if cached is not None:
+                featured_by_year[year] = cached["featured"]
+        missing_years = [year for year in dict.fromkeys(years) if year not in featured_by_year]
+        
+        if missing_years:
+            # 年度ごとに分割して処理（メモリ使用量を削減）
+            # 前走データ抽出用のSED/BACは全年度で共有し、各年度を1回だけ読み込む
+            sed_columns, bac_columns = self._historical_columns()
+            historical_store = HistoricalRaceStore(
+                self._parquet_loader,
+                {"SED": sed_columns, "BAC": bac_columns},
+                {year: HistoricalRaceStore.previous_years(year, years) for year in missing_years},
+            )
+            MemoryMonitor.print_memory_usage(f"前走データ抽出用SED/BACの読み込み（{len(historical_store.loaded_years)}年度）")
+            try:
+                for year in missing_years:
+                    # 前走データ抽出用に、処理対象年度より前の年度も含めたリストを渡す
+                    year_featured_df = self._process_single_year_features(year, available_years=years, historical_store=historical_store)
+                    if featured_keys.get(year) and year_featured_df is not None:
+                        self._cache_manager.save_stage("featured", featured_keys[year], {"featured": year_featured_df}, {"year": year})
+                    featured_by_year[year] = year_featured_df
+            finally:
+                historical_store.clear()
+        
+        # 年度ごとの特徴量抽出結果を1回で結合（結合後にfeatured_dfsは空になる）
+        featured_dfs = [featured_by_year[year] for year in years]
+        featured_by_year.clear()
+        featured_df = ArrowConcat.concat_frames(featured_dfs)
+        gc.collect()
+        if featured_df is None:
+            raise ValueError("特徴量抽出結果が空です。")
+        MemoryMonitor.print_memory_usage(f"特徴量抽出結果の結合（{len(years)}年度）")
+        return featured_df
+
+    def _featured_stage_key(self, year: int, available_years: List[int]) -> Optional[str]:
+        """
+        年度ごとの特徴量抽出結果（featuredステージ）のキャッシュキー
+        
+        入力は処理対象年度の結合済みデータの作成条件と、前走データ抽出に使うSED/BACの年度パックのみのため、
+        処理する年度の範囲が異なっても、参照する過去年度が同じであれば同じキーになる。
+        
+        Returns:
+            キャッシュキー（年度パックが揃っていない場合はNone）
+        """
+        combined_fingerprint = self._combined_artifact_store.build_fingerprint(year)
+        if combined_fingerprint is None:
+            return None
+        inputs = {"combined": json.dumps(combined_fingerprint, sort_keys=True)}
+        history_years = HistoricalRaceStore.loadable_years(
+            self._parquet_loader, HistoricalRaceStore.previous_years(year, available_years)
+        )
+        for history_year in history_years:
+            for data_type in ("SED", "BAC"):
+                inputs[f"{data_type}_{history_year}"] = self._parquet_loader.get_annual_pack_fingerprint(data_type, history_year)
+        return self._cache_manager.build_stage_key(
+            "featured", _STAGE_VERSIONS["featured"], inputs,
+            [self._schema_loader.get_schema_path(f) for f in _FEATURED_SCHEMA_FILES],
+            {"year": year, "history_years": history_years},
+        )
+
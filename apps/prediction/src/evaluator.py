@@ -7,6 +7,8 @@ from typing import Dict, Optional
 import numpy as np
 import pandas as pd
 
+from src.utils.key_codec import KeyCodec
+
 
 def calculate_ndcg(y_true: np.ndarray, y_pred: np.ndarray, k: int = 3) -> float:
     """NDCGを計算（ベクトル化）"""
@@ -93,6 +95,8 @@ def evaluate_model(
     # race_key_colを数値型に変換（必要に応じて）
     if df[race_key_col].dtype == 'object':
         df[race_key_col] = df[race_key_col].astype(str)
+    # 整数キー（KeyCodec）の場合は開催日をrace_keyから取得できる
+    race_key_is_packed = KeyCodec.is_packed(df[race_key_col])
 
     # 事前にNumPy配列を取得（高速化のため）
     rank_values_all = df[rank_col].values
@@ -228,7 +232,8 @@ def evaluate_model(
                     win5_flag_int = int(win5_flag_value)
                     if 1 <= win5_flag_int <= 5:
                         # WIN5評価は開催日（年月日）が必要。
-                        # race_keyは「場コード_回_日目_R」で日付を含まない前提のため、年月日カラムのみをソースにする。
+                        # 文字列のrace_keyは「場コード_回_日目_R」で日付を含まないため、年月日カラムをソースにする
+                        # （整数キーの場合は年月日カラムがなければrace_keyから取得する）。
                         # 年月日が欠損/不正な場合はWIN5評価をスキップ（誤った値で継続しない）。
                         date_str = None
                         if "年月日" in race_data.columns:
@@ -236,6 +241,8 @@ def evaluate_model(
                             ymd = ymd.strip()
                             if ymd.isdigit() and len(ymd) == 8:
                                 date_str = ymd
+                        elif race_key_is_packed:
+                            date_str = str(KeyCodec.race_key_dates([race_key])[0])
                         if date_str is None:
                             continue
                         if date_str not in win5_dates:
@@ -290,7 +297,8 @@ def evaluate_model(
         sample_race_data = grouped.get_group(sample_race_key)
         if rank_col in sample_race_data.columns:
             rank_values = pd.to_numeric(sample_race_data[rank_col], errors='coerce')
-            logger.warning(f"[DEBUG] サンプルレース({sample_race_key})のrank値: {rank_values.dropna().tolist()[:10]}")
+            sample_race_label = KeyCodec.decode_race_keys([sample_race_key])[0] if race_key_is_packed else sample_race_key
+            logger.warning(f"[DEBUG] サンプルレース({sample_race_label})のrank値: {rank_values.dropna().tolist()[:10]}")
             logger.warning(f"[DEBUG] rank==1.0の行数: {len(sample_race_data[rank_values == 1.0])}")
             if horse_num_col in sample_race_data.columns:
                 logger.warning(f"[DEBUG] 馬番列の有効値数: {sample_race_data[horse_num_col].notna().sum()}")
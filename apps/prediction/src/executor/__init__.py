@@ -1,6 +1,6 @@
 """日次データ予測実行モジュール"""
 
-from .prediction_executor import PredictionExecutor
-
-__all__ = ["PredictionExecutor"]
+from .prediction_executor import PredictionExecutor, PredictionResources
+from .prediction_service import PredictionService
 
+__all__ = ["PredictionExecutor", "PredictionResources", "PredictionService"]
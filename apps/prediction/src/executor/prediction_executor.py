@@ -2,25 +2,60 @@
 
 import gc
 import json
+import logging
+import os
+import tempfile
+from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple, Union
 
 import lightgbm as lgb
 import pandas as pd
 
 from src.data_processer._02_jrdb_combiner import JrdbCombiner
+from src.data_processer._03_07_historical_race_store import HistoricalRaceStore
+from src.data_processer._03_08_entity_state_snapshot import EntityStateSnapshot
 from src.data_processer._03_feature_extractor import FeatureExtractor
 from src.data_processer._04_key_converter import KeyConverter
 from src.feature_enhancers import enhance_features
 from src.features import Features
 from src.jrdb_scraper.convert_local_folder_to_parquet import convert_local_folder_to_parquet
 from src.jrdb_scraper.entities.jrdb import JRDBDataType
+from src.jrdb_scraper.partitioned_dataset import LAYOUT_FLAT, get_output_name
 from src.rank_predictor import RankPredictor
+from src.utils.feature_converter import FeatureConverter
+from src.utils.key_codec import KeyCodec
 from src.utils.jrdb_format_loader import JRDBFormatLoader
 from src.utils.parquet_loader import ParquetLoader
+from src.utils.prediction_records import patch_prediction_records
 from src.utils.schema_loader import Schema, SchemaFile, SchemaLoader
 
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PredictionResources:
+    """
+    予測に使うスキーマ・カテゴリマッピング・モデル・エンティティ状態
+
+    PredictionExecutor.load_resourcesで1回読み込み、同じ年度の予測で使い回す（常駐サービスではプロセス内で保持する）。
+    """
+    year: int
+    model_path: Path
+    model: lgb.Booster
+    format_loader: JRDBFormatLoader
+    combined_schema: Schema
+    feature_extraction_schema: Schema
+    horse_statistics_schema: Schema
+    jockey_statistics_schema: Schema
+    trainer_statistics_schema: Schema
+    previous_race_extractor_schema_02: Schema
+    key_mapping_schema: Schema
+    training_schema: Schema
+    category_mappings: Dict[str, dict]
+    entity_state: EntityStateSnapshot
+
 
 class PredictionExecutor:
     """日次データの予測を実行するクラス"""
@@ -34,6 +69,8 @@ class PredictionExecutor:
         parquet_base_path: Path,
         output_path: Optional[str] = None,
         json_indent: Optional[int] = 2,
+        resources: Optional[PredictionResources] = None,
+        race_keys: Optional[Iterable[Union[str, int]]] = None,
     ) -> pd.DataFrame:
         """
         日次データの予測を実行するメインメソッド
@@ -45,6 +82,8 @@ class PredictionExecutor:
             base_path: プロジェクトルートパス
             parquet_base_path: Parquetファイルのベースパス
             output_path: 出力先パス（オプション）
+            resources: 読み込み済みのスキーマ・モデル等（省略時は読み込む）
+            race_keys: 予測対象のrace_key（文字列または整数キー、省略時は全レース）
         
         Returns:
             予測結果のDataFrame
@@ -59,39 +98,262 @@ class PredictionExecutor:
             daily_data_path, date_str, year, daily_parquet_path
         )
         
-        # 2. 日次データを前処理（特徴量抽出まで）
+        # 2. スキーマ・モデル・エンティティ状態の読み込み
+        if resources is None:
+            resources = PredictionExecutor.load_resources(model_path, base_path, parquet_base_path, year)
+        
+        # 3. 予測実行（前処理〜予測結果の整形）
+        results_df = PredictionExecutor.predict_daily_parquet(
+            daily_parquet_path, resources, parquet_base_path, race_keys=race_keys
+        )
+        
+        # 4. JSON形式で保存
+        if output_path:
+            PredictionExecutor._save_results_to_json(
+                results_df, date_str, output_path, json_indent=json_indent
+            )
+        
+        return results_df
+
+    @staticmethod
+    def load_resources(
+        model_path: Union[str, Path],
+        base_path: Path,
+        parquet_base_path: Path,
+        year: int,
+    ) -> PredictionResources:
+        """
+        予測に使うスキーマ・カテゴリマッピング・モデル・エンティティ状態を読み込む
+        
+        Args:
+            model_path: モデルファイルのパス
+            base_path: プロジェクトルートパス
+            parquet_base_path: Parquetファイルのベースパス
+            year: 予測対象の年度
+        
+        Returns:
+            予測に使うリソース
+        """
+        schemas_base_path = base_path / "packages" / "data" / "schemas"
+        schema_loader = SchemaLoader(schemas_base_path)
+        formats_dir = base_path / "apps" / "prediction" / "src" / "jrdb_scraper" / "formats"
+        feature_extraction_schema = schema_loader.load_schema(SchemaFile.FEATURE_EXTRACTION)
+        
+        parquet_loader_annual = ParquetLoader(parquet_base_path)
+        previous_years = HistoricalRaceStore.previous_years(year)
+        if not any(parquet_loader_annual.has_annual_pack("BAC", y) for y in previous_years):
+            raise ValueError(f"前走データ抽出用のBACデータが存在しません。年度: {year}")
+        
+        return PredictionResources(
+            year=year,
+            model_path=Path(model_path),
+            model=PredictionExecutor._load_model(str(model_path)),
+            format_loader=JRDBFormatLoader(formats_dir),
+            combined_schema=PredictionExecutor._load_daily_combined_schema(schemas_base_path, schema_loader),
+            feature_extraction_schema=feature_extraction_schema,
+            horse_statistics_schema=schema_loader.load_schema(SchemaFile.HORSE_STATISTICS),
+            jockey_statistics_schema=schema_loader.load_schema(SchemaFile.JOCKEY_STATISTICS),
+            trainer_statistics_schema=schema_loader.load_schema(SchemaFile.TRAINER_STATISTICS),
+            previous_race_extractor_schema_02=schema_loader.load_schema(SchemaFile.PREVIOUS_RACE_EXTRACTOR_02),
+            key_mapping_schema=schema_loader.load_schema(SchemaFile.KEY_MAPPING),
+            training_schema=schema_loader.load_schema(SchemaFile.TRAINING),
+            category_mappings=schema_loader.load_category_mappings(),
+            entity_state=PredictionExecutor._load_entity_state(parquet_loader_annual, parquet_base_path, year, feature_extraction_schema),
+        )
+
+    @staticmethod
+    def predict_daily_parquet(
+        daily_parquet_path: Path,
+        resources: PredictionResources,
+        parquet_base_path: Path,
+        race_keys: Optional[Iterable[Union[str, int]]] = None,
+        tyb_df: Optional[pd.DataFrame] = None,
+    ) -> pd.DataFrame:
+        """
+        Parquet変換済みの日次データ（KYI/BAC/UKC/TYB）に対して予測を実行
+        
+        Args:
+            daily_parquet_path: 日次Parquetファイルのパス
+            resources: 読み込み済みのスキーマ・モデル等
+            parquet_base_path: Parquetファイルのベースパス（スナップショットで計算できない場合の過去年度のSED）
+            race_keys: 予測対象のrace_key（文字列または整数キー、省略時は全レース）
+            tyb_df: 日次ParquetのTYBの代わりに使うTYB（省略時は日次ParquetのTYB）
+        
+        Returns:
+            整形済み予測結果のDataFrame
+        """
+        # 1. 日次データを前処理（特徴量抽出まで）
         featured_df = PredictionExecutor._process_daily_data_for_prediction(
-            daily_parquet_path, year, base_path, parquet_base_path
+            daily_parquet_path, resources, parquet_base_path, race_keys=race_keys, tyb_df=tyb_df
         )
         
-        # 3. 日次データを変換（キー変換、数値化、データ型最適化）
+        # 2. 日次データを変換（キー変換、数値化、データ型最適化）
         converted_df, featured_df_sorted = PredictionExecutor._convert_daily_data(
-            featured_df, base_path
+            featured_df, resources
         )
         
-        # 4. 特徴量強化
+        # 3. 特徴量強化
         converted_df = enhance_features(converted_df, race_key_col="race_key")
         
-        # 5. モデル読み込み
-        model = PredictionExecutor._load_model(model_path)
-        
-        # 6. 予測実行（featured_df_sortedから馬番を取得するために渡す）
+        # 4. 予測実行（featured_df_sortedから馬番を取得するために渡す）
         predictions_df = PredictionExecutor._execute_prediction(
-            model, converted_df, featured_df_sorted
+            resources.model, converted_df, featured_df_sorted
         )
         
-        # 7. 予測結果を整形
-        results_df = PredictionExecutor._format_prediction_results(
+        # 5. 予測結果を整形
+        return PredictionExecutor._format_prediction_results(
             predictions_df, featured_df
         )
+
+    @staticmethod
+    def repredict_changed_races(
+        date_str: str,
+        tyb_df: pd.DataFrame,
+        daily_parquet_path: Path,
+        resources: PredictionResources,
+        parquet_base_path: Path,
+        output_path: Optional[str] = None,
+        json_indent: Optional[int] = 2,
+        apply_tyb: bool = True,
+    ) -> Tuple[List[str], List[Dict]]:
+        """
+        更新されたTYB（直前情報）で内容が変わったレースのみを予測し直す
+        
+        日次ParquetのTYB（予測結果に反映済みのTYB）と比較し、変わったレースの行のみ更新後のTYBで結合・特徴量抽出・予測する。
+        output_pathの予測結果JSONは、変わったレースの予測結果のみ置き換える。
+        日次ParquetのTYBは、予測結果をすべて置き換えた後に更新後のTYBで置き換える（途中で失敗した場合は次回も同じレースを予測し直す）。
+        
+        Args:
+            date_str: 日付文字列（例: "2025-11-30"）
+            tyb_df: 更新後のTYB（Parquet変換済み、race_keyを含む）
+            daily_parquet_path: 日次Parquetファイルのパス（予測済みの日のもの）
+            resources: 読み込み済みのスキーマ・モデル等
+            parquet_base_path: Parquetファイルのベースパス
+            output_path: 予測結果JSONのパス（オプション）
+            json_indent: JSONのインデント
+            apply_tyb: Falseの場合は日次ParquetのTYBを置き換えない（Firestore等、他の予測結果も置き換えてからapply_updated_tybを呼び出す）
+        
+        Returns:
+            (内容が変わったレースのrace_key, 予測し直したレースの予測結果の辞書のリスト)のタプル
+        """
+        tyb_path = Path(daily_parquet_path) / get_output_name(JRDBDataType.TYB.value, resources.year, LAYOUT_FLAT)
+        previous_tyb_df = pd.read_parquet(tyb_path) if tyb_path.exists() else None
+        changed_race_keys = PredictionExecutor.find_changed_races(previous_tyb_df, tyb_df)
+        if not changed_race_keys:
+            logger.info(f"TYBの内容が変わったレースはありません: {date_str}")
+            return [], []
+        logger.info(f"TYBの内容が変わったレースを予測し直します: {date_str}, {len(changed_race_keys)}レース")
+        
+        results_df = PredictionExecutor.predict_daily_parquet(
+            Path(daily_parquet_path), resources, parquet_base_path, race_keys=changed_race_keys, tyb_df=tyb_df
+        )
+        records = PredictionExecutor.to_prediction_records(results_df)
         
-        # 8. JSON形式で保存
         if output_path:
-            PredictionExecutor._save_results_to_json(
-                results_df, date_str, output_path, json_indent=json_indent
+            output_path_obj = Path(output_path)
+            predictions = []
+            if output_path_obj.exists():
+                with open(output_path_obj, "r", encoding="utf-8") as f:
+                    predictions = json.load(f).get("predictions", [])
+            patched = patch_prediction_records(predictions, records, changed_race_keys)
+            PredictionExecutor._write_results_json(patched, date_str, output_path, json_indent=json_indent)
+        
+        if apply_tyb:
+            PredictionExecutor.apply_updated_tyb(daily_parquet_path, resources.year, tyb_df)
+        return changed_race_keys, records
+
+    @staticmethod
+    def apply_updated_tyb(daily_parquet_path: Path, year: int, tyb_df: pd.DataFrame) -> None:
+        """
+        日次ParquetのTYBを更新後のTYBで置き換える（予測結果をすべて置き換えた後に呼び出す）
+        
+        以降の再予測ではこのTYBと比較し、全レースの予測にも反映する。
+        
+        Args:
+            daily_parquet_path: 日次Parquetファイルのパス
+            year: 年度
+            tyb_df: 更新後のTYB
+        """
+        tyb_path = Path(daily_parquet_path) / get_output_name(JRDBDataType.TYB.value, year, LAYOUT_FLAT)
+        temporary_path = tyb_path.with_name(f".{tyb_path.name}.tmp")
+        tyb_df.to_parquet(temporary_path, compression="snappy", index=False)
+        os.replace(temporary_path, tyb_path)
+
+    @staticmethod
+    def find_changed_races(previous_tyb_df: Optional[pd.DataFrame], current_tyb_df: pd.DataFrame) -> List[str]:
+        """
+        更新前後のTYBを比較し、内容が変わったレースのrace_keyを取得
+        
+        race_key・馬番ごとに共通のカラムの値を比較し、値が変わった行、または追加・削除された行を含むレースを対象とする。
+        
+        Args:
+            previous_tyb_df: 更新前のTYB（Noneの場合は全レースが対象）
+            current_tyb_df: 更新後のTYB
+        
+        Returns:
+            内容が変わったレースのrace_key（文字列、昇順）
+        """
+        if previous_tyb_df is None:
+            return sorted(current_tyb_df["race_key"].dropna().astype(str).unique())
+        
+        key_columns = ["race_key", "馬番"]
+        value_columns = sorted((set(previous_tyb_df.columns) & set(current_tyb_df.columns)) - set(key_columns))
+        previous_tyb_df, current_tyb_df = PredictionExecutor._align_value_dtypes(previous_tyb_df, current_tyb_df, value_columns)
+        previous_hashes = PredictionExecutor._row_hashes(previous_tyb_df, key_columns, value_columns)
+        current_hashes = PredictionExecutor._row_hashes(current_tyb_df, key_columns, value_columns)
+        
+        common = previous_hashes.index.intersection(current_hashes.index)
+        modified = common[previous_hashes.loc[common].to_numpy() != current_hashes.loc[common].to_numpy()]
+        changed = previous_hashes.index.symmetric_difference(current_hashes.index).union(modified)
+        return sorted(changed.get_level_values("race_key").unique())
+
+    @staticmethod
+    def _align_value_dtypes(
+        previous_df: pd.DataFrame, current_df: pd.DataFrame, value_columns: List[str]
+    ) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        比較するカラムのdtypeを更新前後で揃える（ハッシュはdtypeに依存するため、値が同じでもdtypeが違うと変更と判定される）
+        
+        dtypeが異なるカラムは、どちらも数値型（bool以外）の場合はFloat64、それ以外は文字列に揃える。
+        """
+        previous_df, current_df = previous_df.copy(), current_df.copy()
+        for col in value_columns:
+            previous_dtype, current_dtype = previous_df[col].dtype, current_df[col].dtype
+            if previous_dtype == current_dtype:
+                continue
+            is_numeric = all(
+                pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+                for dtype in (previous_dtype, current_dtype)
             )
+            common_dtype = "Float64" if is_numeric else "string"
+            previous_df[col] = previous_df[col].astype(common_dtype)
+            current_df[col] = current_df[col].astype(common_dtype)
+        return previous_df, current_df
+
+    @staticmethod
+    def _row_hashes(tyb_df: pd.DataFrame, key_columns: List[str], value_columns: List[str]) -> pd.Series:
+        """race_key・馬番ごとの値のハッシュ（race_keyは文字列、同じキーの行は最後の行を使用）"""
+        keyed = tyb_df.dropna(subset=["race_key"])
+        keys = pd.MultiIndex.from_arrays([keyed["race_key"].astype(str), keyed["馬番"]], names=key_columns)
+        hashes = pd.Series(pd.util.hash_pandas_object(keyed[value_columns], index=False).to_numpy(), index=keys)
+        return hashes[~hashes.index.duplicated(keep="last")]
+
+    @staticmethod
+    def load_updated_tyb(daily_data_path: str, date_str: str, year: int) -> Optional[pd.DataFrame]:
+        """
+        日次LZHファイルを一時ディレクトリにParquet変換し、更新後のTYBを読み込む
         
-        return results_df
+        Args:
+            daily_data_path: 日次データのパス
+            date_str: 日付文字列（例: "2025-11-30"）
+            year: 年度
+        
+        Returns:
+            TYBのDataFrame（TYBが存在しない場合はNone）
+        """
+        with tempfile.TemporaryDirectory() as temporary_dir:
+            PredictionExecutor._convert_daily_lzh_to_parquet(daily_data_path, date_str, year, Path(temporary_dir))
+            return ParquetLoader(Path(temporary_dir)).load_annual_pack_parquet(JRDBDataType.TYB.value, year, raise_on_not_found=False)
 
     @staticmethod
     def _convert_daily_lzh_to_parquet(
@@ -151,55 +413,46 @@ class PredictionExecutor:
         ]
         if optional_failed_results:
             warning_messages = [f"{r['dataType']}: {r.get('error', 'Unknown error')}" for r in optional_failed_results]
-            import logging
-            logger = logging.getLogger(__name__)
             logger.warning(f"オプショナルデータタイプのParquet変換に失敗しました（処理は続行します）: {', '.join(warning_messages)}")
 
+    @staticmethod
+    def _load_daily_combined_schema(schemas_base_path: Path, schema_loader: SchemaLoader) -> Schema:
+        """日次データ用の結合スキーマを読み込む（存在しない場合は通常のスキーマ）"""
+        daily_combined_schema_path = schemas_base_path / "executor" / "_02_daily_combined_schema.json"
+        if daily_combined_schema_path.exists():
+            with open(daily_combined_schema_path, "r", encoding="utf-8") as f:
+                return Schema.from_dict(json.load(f))
+        # フォールバック: 通常のスキーマを使用（警告を出す）
+        logger.warning(f"日次データ用のスキーマが見つかりません。通常のスキーマを使用します: {daily_combined_schema_path}")
+        return schema_loader.load_schema(SchemaFile.COMBINED)
+
     @staticmethod
     def _process_daily_data_for_prediction(
         daily_parquet_path: Path,
-        year: int,
-        base_path: Path,
+        resources: PredictionResources,
         parquet_base_path: Path,
+        race_keys: Optional[Iterable[Union[str, int]]] = None,
+        tyb_df: Optional[pd.DataFrame] = None,
     ) -> pd.DataFrame:
         """
         日次データを前処理（特徴量抽出まで）
         
         Args:
             daily_parquet_path: 日次Parquetファイルのパス
-            year: 年度
-            base_path: プロジェクトルートパス
+            resources: 読み込み済みのスキーマ・エンティティ状態等
             parquet_base_path: Parquetファイルのベースパス
+            race_keys: 予測対象のrace_key（省略時は全レース）
+            tyb_df: 日次ParquetのTYBの代わりに使うTYB（省略時は日次ParquetのTYB）
         
         Returns:
             特徴量抽出済みDataFrame
         """
-        # スキーマローダーを初期化
-        schemas_base_path = base_path / "packages" / "data" / "schemas"
-        schema_loader = SchemaLoader(schemas_base_path)
-        formats_dir = base_path / "apps" / "prediction" / "src" / "jrdb_scraper" / "formats"
-        format_loader = JRDBFormatLoader(formats_dir)
-        
-        # スキーマを読み込み（日次データ用のスキーマを使用）
-        # 日次データ用のスキーマファイルを直接読み込む
-        executor_schemas_dir = base_path / "packages" / "data" / "schemas" / "executor"
-        daily_combined_schema_path = executor_schemas_dir / "_02_daily_combined_schema.json"
-        if daily_combined_schema_path.exists():
-            import json
-            with open(daily_combined_schema_path, "r", encoding="utf-8") as f:
-                combined_schema_dict = json.load(f)
-            combined_schema = Schema.from_dict(combined_schema_dict)
-        else:
-            # フォールバック: 通常のスキーマを使用（警告を出す）
-            import logging
-            logger = logging.getLogger(__name__)
-            logger.warning(f"日次データ用のスキーマが見つかりません。通常のスキーマを使用します: {daily_combined_schema_path}")
-            combined_schema = schema_loader.load_schema(SchemaFile.COMBINED)
-        feature_extraction_schema = schema_loader.load_schema(SchemaFile.FEATURE_EXTRACTION)
-        horse_statistics_schema = schema_loader.load_schema(SchemaFile.HORSE_STATISTICS)
-        jockey_statistics_schema = schema_loader.load_schema(SchemaFile.JOCKEY_STATISTICS)
-        trainer_statistics_schema = schema_loader.load_schema(SchemaFile.TRAINER_STATISTICS)
-        previous_race_extractor_schema_02 = schema_loader.load_schema(SchemaFile.PREVIOUS_RACE_EXTRACTOR_02)
+        year = resources.year
+        feature_extraction_schema = resources.feature_extraction_schema
+        horse_statistics_schema = resources.horse_statistics_schema
+        jockey_statistics_schema = resources.jockey_statistics_schema
+        trainer_statistics_schema = resources.trainer_statistics_schema
+        previous_race_extractor_schema_02 = resources.previous_race_extractor_schema_02
         
         # Parquetローダーを初期化
         parquet_loader = ParquetLoader(daily_parquet_path)
@@ -208,7 +461,8 @@ class PredictionExecutor:
         kyi_df = parquet_loader.load_annual_pack_parquet("KYI", year, raise_on_not_found=True)
         bac_df = parquet_loader.load_annual_pack_parquet("BAC", year, raise_on_not_found=True)
         ukc_df = parquet_loader.load_annual_pack_parquet("UKC", year, raise_on_not_found=False)
-        tyb_df = parquet_loader.load_annual_pack_parquet("TYB", year, raise_on_not_found=False)
+        if tyb_df is None:
+            tyb_df = parquet_loader.load_annual_pack_parquet("TYB", year, raise_on_not_found=False)
         
         # データ結合（SEDは除外）
         data_dict = {
@@ -220,7 +474,9 @@ class PredictionExecutor:
         if tyb_df is not None:
             data_dict[JRDBDataType.TYB] = tyb_df
         
-        raw_df = JrdbCombiner.combine(data_dict, combined_schema, format_loader)
+        raw_df = JrdbCombiner.combine(data_dict, resources.combined_schema, resources.format_loader)
+        if race_keys is not None:
+            raw_df = PredictionExecutor._filter_races(raw_df, race_keys)
         
         # 不要なDataFrameを削除
         del kyi_df, ukc_df, tyb_df
@@ -229,38 +485,26 @@ class PredictionExecutor:
         # 前走データ抽出用のSED/BACデータを読み込み（過去年度のデータ）
         # DataProcessor._load_sed_bac_for_yearを流用
         parquet_loader_annual = ParquetLoader(parquet_base_path)
-        previous_years = [y for y in range(year - 5, year) if y >= 2000]
-        if not previous_years:
-            previous_years = [year]
-        
-        sed_dfs = []
-        bac_dfs = []
-        for prev_year in previous_years:
-            try:
-                sed_df = parquet_loader_annual.load_annual_pack_parquet("SED", prev_year, raise_on_not_found=False)
-                if sed_df is not None and len(sed_df) > 0:
-                    sed_dfs.append(sed_df)
-                bac_df_prev = parquet_loader_annual.load_annual_pack_parquet("BAC", prev_year, raise_on_not_found=False)
-                if bac_df_prev is not None and len(bac_df_prev) > 0:
-                    bac_dfs.append(bac_df_prev)
-            except (FileNotFoundError, ValueError):
-                continue
+        previous_years = HistoricalRaceStore.previous_years(year)
+
+        # エンティティ状態のスナップショットで計算できる場合は、過去年度のSEDを読み込まずに特徴量を抽出
+        entity_state = resources.entity_state
+        if "start_datetime" in raw_df.columns and entity_state.covers(raw_df["start_datetime"]):
+            return FeatureExtractor.extract_all_from_entity_state(
+                raw_df, entity_state, horse_statistics_schema, jockey_statistics_schema,
+                trainer_statistics_schema, previous_race_extractor_schema_02, feature_extraction_schema
+            )
         
-        sed_df = None
-        if sed_dfs:
-            sed_df = sed_dfs[0]
-            for df in sed_dfs[1:]:
-                sed_df = pd.concat([sed_df, df], ignore_index=True)
-                del df
-                gc.collect()
-        
-        bac_df_for_history = None
-        if bac_dfs:
-            bac_df_for_history = bac_dfs[0]
-            for df in bac_dfs[1:]:
-                bac_df_for_history = pd.concat([bac_df_for_history, df], ignore_index=True)
-                del df
-                gc.collect()
+        # スナップショットの最新レース以前の日付（取り込み済みの日の再予測など）は、過去年度のSEDから計算する
+        # 統計量計算に使うカラムのみを、データタイプごとに全年度を1回で読み込む
+        sed_columns = FeatureExtractor.get_historical_sed_columns(feature_extraction_schema)
+        bac_columns = FeatureConverter.RACE_KEY_REQUIRED_COLUMNS + ["年月日"]
+        sed_df = parquet_loader_annual.load_multi_year_parquet("SED", previous_years, columns=sed_columns)
+        bac_df_for_history = parquet_loader_annual.load_multi_year_parquet("BAC", previous_years, columns=bac_columns)
+        if sed_df is not None and len(sed_df) == 0:
+            sed_df = None
+        if bac_df_for_history is not None and len(bac_df_for_history) == 0:
+            bac_df_for_history = None
         
         if bac_df_for_history is None:
             raise ValueError(f"前走データ抽出用のBACデータが存在しません。年度: {year}")
@@ -285,29 +529,78 @@ class PredictionExecutor:
                 del bac_df_for_history
             gc.collect()
 
+    @staticmethod
+    def _load_entity_state(
+        parquet_loader: ParquetLoader, parquet_base_path: Path, year: int, feature_extraction_schema: Schema
+    ) -> EntityStateSnapshot:
+        """
+        処理対象年度のエンティティ状態のスナップショットを読み込む
+
+        存在しない、または取り込み対象年度のSED年度パックが変わっている場合は、年度パックから作成して保存する。
+
+        Args:
+            parquet_loader: 年度パックのParquetローダー
+            parquet_base_path: Parquetファイルのベースパス
+            year: 年度
+            feature_extraction_schema: 特徴量抽出スキーマ
+
+        Returns:
+            エンティティ状態のスナップショット
+        """
+        directory = EntityStateSnapshot.get_dir(parquet_base_path, year)
+        entity_state = EntityStateSnapshot.load(directory)
+        if entity_state is None or not entity_state.is_current(parquet_loader):
+            entity_state = EntityStateSnapshot.build(parquet_loader, year, feature_extraction_schema)
+            entity_state.save(directory)
+        return entity_state
+
+    @staticmethod
+    def _filter_races(raw_df: pd.DataFrame, race_keys: Iterable[Union[str, int]]) -> pd.DataFrame:
+        """
+        結合済みデータを指定したレースの行に絞り込む
+        
+        Args:
+            raw_df: 結合済みDataFrame（race_keyはインデックスまたはカラム）
+            race_keys: 文字列のrace_key（場コード_回_日_R）または整数キーのリスト
+        
+        Returns:
+            指定したレースの行のみのDataFrame
+        
+        Raises:
+            ValueError: race_keysがリストでない場合、または指定したレースが1つもない場合
+        """
+        if isinstance(race_keys, (str, bytes)) or not pd.api.types.is_list_like(race_keys):
+            raise ValueError(f"race_keysはリストで指定してください: {race_keys!r}")
+        requested = {str(race_key) for race_key in race_keys}
+        if KeyCodec.RACE_KEY_COLUMN in (raw_df.index.names or []):
+            keys = pd.Series(raw_df.index.get_level_values(KeyCodec.RACE_KEY_COLUMN))
+        else:
+            keys = raw_df[KeyCodec.RACE_KEY_COLUMN].reset_index(drop=True)
+        matched = keys.astype(str).isin(requested)
+        if KeyCodec.is_packed(keys):
+            matched |= KeyCodec.decode_race_keys(keys).isin(requested)
+        if not matched.any():
+            raise ValueError(f"指定したレースが日次データにありません: {sorted(requested)[:10]}")
+        return raw_df[matched.to_numpy()]
+
     @staticmethod
     def _convert_daily_data(
         featured_df: pd.DataFrame,
-        base_path: Path,
+        resources: PredictionResources,
     ) -> Tuple[pd.DataFrame, pd.DataFrame]:
         """
         日次データを変換（キー変換、数値化、データ型最適化）
         
         Args:
             featured_df: 特徴量抽出済みDataFrame
-            base_path: プロジェクトルートパス
+            resources: 読み込み済みのスキーマ・カテゴリマッピング
         
         Returns:
             (変換済みDataFrame, ソート済みfeatured_df)のタプル
         """
-        # スキーマローダーを初期化
-        schemas_base_path = base_path / "packages" / "data" / "schemas"
-        schema_loader = SchemaLoader(schemas_base_path)
-        
-        # スキーマを読み込み
-        key_mapping_schema = schema_loader.load_schema(SchemaFile.KEY_MAPPING)
-        training_schema = schema_loader.load_schema(SchemaFile.TRAINING)
-        category_mappings = schema_loader.load_category_mappings()
+        key_mapping_schema = resources.key_mapping_schema
+        training_schema = resources.training_schema
+        category_mappings = resources.category_mappings
         
         # データ変換前にfeatured_dfの順序を保持（race_keyと馬番でソート）
         featured_df_sorted = featured_df.copy()
@@ -457,7 +750,8 @@ class PredictionExecutor:
         if "predict" in results_df.columns:
             results_df = results_df.rename(columns={"predict": "predicted_score"})
         
-        return results_df
+        # 整数キーを出力用の文字列race_key（場コード_回_日_R）に戻す（JSON・Firestore保存用）
+        return KeyCodec.decode_keys(results_df)
 
     @staticmethod
     def _save_results_to_json(
@@ -475,12 +769,48 @@ class PredictionExecutor:
             output_path: 出力先パス
             json_indent: JSONのインデント（None=1行、2=2スペース、4=4スペースなど）
         """
-        # 予測順位でソート
-        results_df_sorted = results_df.sort_values(["race_key", "predicted_rank"])
-        
+        PredictionExecutor._write_results_json(
+            PredictionExecutor.to_prediction_records(results_df), date_str, output_path, json_indent=json_indent
+        )
+
+    @staticmethod
+    def _write_results_json(
+        predictions: List[Dict],
+        date_str: str,
+        output_path: str,
+        json_indent: Optional[int] = 2,
+    ) -> None:
+        """予測結果の辞書のリストをJSON形式で保存"""
         output_path_obj = Path(output_path)
         output_path_obj.parent.mkdir(parents=True, exist_ok=True)
         
+        # JSON形式で保存（dateとpredictionsを含む）
+        output_data = {
+            "date": date_str,
+            "predictions": predictions
+        }
+        
+        # JSONの出力形式を制御
+        # indent=None: 1行で出力（コンパクト形式）
+        # indent=2: 2スペースでインデント（読みやすい形式）
+        # indent=4: 4スペースでインデント
+        with open(output_path_obj, "w", encoding="utf-8") as f:
+            json.dump(output_data, f, ensure_ascii=False, indent=json_indent)
+
+    @staticmethod
+    def to_prediction_records(results_df: pd.DataFrame) -> List[Dict]:
+        """
+        予測結果をJSON出力用の辞書のリストに変換（race_key・予測順位の順）
+        
+        Args:
+            results_df: 整形済み予測結果のDataFrame
+        
+        Returns:
+            予測結果の辞書のリスト
+        """
+        # 予測順位でソート
+        results_df_sorted = results_df.sort_values(["race_key", "predicted_rank"])
+        
         # 予測結果を配列として構築
         predictions = []
         for _, row in results_df_sorted.iterrows():
@@ -499,17 +829,4 @@ class PredictionExecutor:
                 "predicted_rank": int(row.get("predicted_rank", 0)),
             }
             predictions.append(prediction)
-        
-        # JSON形式で保存（dateとpredictionsを含む）
-        output_data = {
-            "date": date_str,
-            "predictions": predictions
-        }
-        
-        # JSONの出力形式を制御
-        # indent=None: 1行で出力（コンパクト形式）
-        # indent=2: 2スペースでインデント（読みやすい形式）
-        # indent=4: 4スペースでインデント
-        with open(output_path_obj, "w", encoding="utf-8") as f:
-            json.dump(output_data, f, ensure_ascii=False, indent=json_indent)
-
+        return predictions
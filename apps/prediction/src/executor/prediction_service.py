@@ -0,0 +1,318 @@
+"""
+常駐予測サービス
+スキーマ・カテゴリマッピング・LightGBMモデル・エンティティ状態をプロセス内に保持し、HTTPで予測リクエストを受け付ける。
+レース当日のTYB（直前情報）更新ごとに、読み込み済みのリソースで日次データのみを前処理・予測する。
+"""
+
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import pandas as pd
+
+from src.data_processer._03_08_entity_state_snapshot import EntityStateSnapshot
+from src.utils.parquet_loader import ParquetLoader
+from .prediction_executor import PredictionExecutor, PredictionResources
+
+logger = logging.getLogger(__name__)
+
+
+class PredictionService:
+    """
+    予測に使うリソースを年度ごとに保持して予測を実行するクラス
+
+    モデルファイルの更新日時、エンティティ状態のスナップショットのメタデータの更新日時（update_entity_state.py等による書き換え）、
+    またはエンティティ状態の取り込み対象のSED年度パックが変わった場合は、次のリクエストで読み直す。予測は1件ずつ直列に実行する。
+    """
+
+    def __init__(
+        self,
+        model_path: Union[str, Path],
+        base_path: Path,
+        parquet_base_path: Path,
+        daily_data_path: Union[str, Path],
+        output_dir: Optional[Union[str, Path]] = None,
+    ):
+        """
+        初期化
+
+        Args:
+            model_path: モデルファイルのパス
+            base_path: プロジェクトルートパス
+            parquet_base_path: Parquetファイルのベースパス
+            daily_data_path: 日次データのパス（`data/daily`）
+            output_dir: HTTPリクエストで予測結果JSONの出力先に指定できるディレクトリ（Noneの場合は指定不可）
+        """
+        self._model_path = Path(model_path)
+        self._base_path = Path(base_path)
+        self._parquet_base_path = Path(parquet_base_path)
+        self._daily_data_path = Path(daily_data_path)
+        self._output_dir = Path(output_dir) if output_dir is not None else None
+        self._parquet_loader = ParquetLoader(self._parquet_base_path)
+        self._resources: Dict[int, PredictionResources] = {}
+        self._model_mtimes: Dict[int, float] = {}
+        self._entity_state_mtimes: Dict[int, Optional[int]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def model_path(self) -> Path:
+        """モデルファイルのパス"""
+        return self._model_path
+
+    @property
+    def parquet_base_path(self) -> Path:
+        """Parquetファイルのベースパス"""
+        return self._parquet_base_path
+
+    @property
+    def output_dir(self) -> Optional[Path]:
+        """HTTPリクエストで予測結果JSONの出力先に指定できるディレクトリ"""
+        return self._output_dir
+
+    @property
+    def loaded_years(self) -> List[int]:
+        """リソースを読み込み済みの年度"""
+        return sorted(self._resources)
+
+    def get_resources(self, year: int) -> PredictionResources:
+        """
+        年度のリソースを取得（未読み込み、またはモデル・エンティティ状態・SED年度パックが更新されている場合は読み込む）
+
+        Args:
+            year: 予測対象の年度
+
+        Returns:
+            予測に使うリソース
+        """
+        with self._lock:
+            return self._get_resources(year)
+
+    def reload(self) -> None:
+        """読み込み済みのリソースを破棄（次のリクエストで読み直す）"""
+        with self._lock:
+            self._resources.clear()
+            self._model_mtimes.clear()
+            self._entity_state_mtimes.clear()
+
+    def predict(
+        self,
+        date_str: str,
+        daily_parquet_path: Optional[Union[str, Path]] = None,
+        race_keys: Optional[Iterable[Union[str, int]]] = None,
+    ) -> pd.DataFrame:
+        """
+        日次データの予測を実行
+
+        Args:
+            date_str: 日付文字列（例: "2025-11-30"）
+            daily_parquet_path: Parquet変換済みの日次データのパス（省略時は日次LZHファイルを変換する）
+            race_keys: 予測対象のrace_key（文字列または整数キー、省略時は全レース）
+
+        Returns:
+            整形済み予測結果のDataFrame
+        """
+        year = datetime.strptime(date_str, "%Y-%m-%d").year
+        with self._lock:
+            if daily_parquet_path is None:
+                # TYBの更新を反映するため、日次LZHファイルはリクエストごとに変換する
+                daily_parquet_path = self._parquet_base_path / "daily" / date_str
+                PredictionExecutor._convert_daily_lzh_to_parquet(str(self._daily_data_path), date_str, year, daily_parquet_path)
+            resources = self._get_resources(year)
+            return PredictionExecutor.predict_daily_parquet(
+                Path(daily_parquet_path), resources, self._parquet_base_path, race_keys=race_keys
+            )
+
+    def repredict(
+        self,
+        date_str: str,
+        tyb_parquet_path: Optional[Union[str, Path]] = None,
+        output_path: Optional[Union[str, Path]] = None,
+    ) -> Tuple[List[str], List[Dict]]:
+        """
+        更新されたTYB（直前情報）で内容が変わったレースのみを予測し直す
+
+        Args:
+            date_str: 日付文字列（例: "2025-11-30"、予測済みの日）
+            tyb_parquet_path: 更新後のTYBのParquetファイル（省略時は日次LZHファイルを変換する）
+            output_path: 変わったレースのみ置き換える予測結果JSONのパス（オプション）
+
+        Returns:
+            (内容が変わったレースのrace_key, 予測し直したレースの予測結果の辞書のリスト)のタプル
+        """
+        year = datetime.strptime(date_str, "%Y-%m-%d").year
+        daily_parquet_path = self._parquet_base_path / "daily" / date_str
+        if not daily_parquet_path.exists():
+            raise FileNotFoundError(f"予測済みの日次Parquetが見つかりません（先に全レースを予測してください）: {daily_parquet_path}")
+        with self._lock:
+            if tyb_parquet_path is not None:
+                tyb_df = pd.read_parquet(tyb_parquet_path)
+            else:
+                tyb_df = PredictionExecutor.load_updated_tyb(str(self._daily_data_path), date_str, year)
+                if tyb_df is None:
+                    raise FileNotFoundError(f"日次データにTYBが存在しません: {date_str}")
+            resources = self._get_resources(year)
+            return PredictionExecutor.repredict_changed_races(
+                date_str, tyb_df, daily_parquet_path, resources, self._parquet_base_path,
+                output_path=str(output_path) if output_path else None,
+            )
+
+    def create_server(self, host: str = "127.0.0.1", port: int = 8765) -> ThreadingHTTPServer:
+        """
+        予測リクエストを受け付けるHTTPサーバーを作成
+
+        エンドポイント:
+            GET  /health  読み込み済みの年度とモデルパス
+            POST /predict {"date", "daily_parquet_path"（省略可）, "race_keys"（省略可、リスト）}の予測結果
+            POST /repredict {"date", "tyb_parquet_path"（省略可）, "output_path"（省略可）}のTYBで変わったレースの予測結果
+            POST /reload  読み込み済みのリソースを破棄
+
+        リクエストで指定するパスは、daily_parquet_pathは`{parquet_base_path}/daily`、tyb_parquet_pathはparquet_base_path、
+        output_pathはoutput_dirの中のもののみ受け付ける（相対パスはそれぞれのディレクトリからのパス）。
+
+        Args:
+            host: 待ち受けるホスト
+            port: 待ち受けるポート
+
+        Returns:
+            HTTPサーバー（serve_foreverで開始）
+        """
+        return ThreadingHTTPServer((host, port), _create_handler(self))
+
+    def _get_resources(self, year: int) -> PredictionResources:
+        """年度のリソースを取得（ロック取得済みの状態で呼び出す）"""
+        resources = self._resources.get(year)
+        model_mtime = self._model_path.stat().st_mtime if self._model_path.exists() else None
+        if (
+            resources is not None
+            and model_mtime == self._model_mtimes.get(year)
+            and self._entity_state_mtime(year) == self._entity_state_mtimes.get(year)
+            and resources.entity_state.is_current(self._parquet_loader)
+        ):
+            return resources
+
+        start_time = time.perf_counter()
+        resources = PredictionExecutor.load_resources(self._model_path, self._base_path, self._parquet_base_path, year)
+        self._resources[year] = resources
+        self._model_mtimes[year] = model_mtime
+        # 読み込み時にスナップショットを作り直して保存する場合があるため、読み込み後の更新日時を記録する
+        self._entity_state_mtimes[year] = self._entity_state_mtime(year)
+        logger.info(f"予測リソースを読み込みました: {year}年, モデル: {self._model_path}（{time.perf_counter() - start_time:.1f}秒）")
+        return resources
+
+    def _entity_state_mtime(self, year: int) -> Optional[int]:
+        """エンティティ状態のスナップショットのメタデータの更新日時（ナノ秒、存在しない場合はNone）"""
+        metadata_path = EntityStateSnapshot.get_dir(self._parquet_base_path, year) / EntityStateSnapshot.METADATA_FILE_NAME
+        try:
+            return metadata_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+
+def _resolve_request_path(path: Optional[str], base_dir: Optional[Path], name: str) -> Optional[Path]:
+    """
+    リクエストで指定されたパスをbase_dirの中のパスに解決（base_dirの外を指す場合はValueError）
+
+    Args:
+        path: リクエストで指定されたパス（相対パスはbase_dirからのパス、Noneの場合はNone）
+        base_dir: 指定できるディレクトリ（Noneの場合は指定不可）
+        name: エラーメッセージに使う項目名
+
+    Returns:
+        解決したパス
+    """
+    if path is None:
+        return None
+    if not isinstance(path, str):
+        raise ValueError(f"{name}は文字列で指定してください")
+    if base_dir is None:
+        raise ValueError(f"{name}は指定できません")
+    base_dir = base_dir.resolve()
+    resolved = (base_dir / path).resolve()
+    if not resolved.is_relative_to(base_dir):
+        raise ValueError(f"{name}は{base_dir}の中のパスを指定してください: {path}")
+    return resolved
+
+
+def _create_handler(service: PredictionService) -> type:
+    """PredictionServiceに予測を委譲するリクエストハンドラのクラスを作成"""
+
+    class PredictionRequestHandler(BaseHTTPRequestHandler):
+        """予測サービスのHTTPリクエストハンドラ"""
+
+        def do_GET(self) -> None:
+            if self.path != "/health":
+                self._send_json(HTTPStatus.NOT_FOUND, {"error": f"存在しないパスです: {self.path}"})
+                return
+            self._send_json(HTTPStatus.OK, {"status": "ok", "model_path": str(service.model_path), "loaded_years": service.loaded_years})
+
+        def do_POST(self) -> None:
+            try:
+                request = self._read_json()
+                if self.path == "/predict":
+                    if not isinstance(request.get("date"), str):
+                        raise ValueError("dateが指定されていません（YYYY-MM-DD形式の文字列）")
+                    race_keys = request.get("race_keys")
+                    if race_keys is not None and not isinstance(race_keys, list):
+                        raise ValueError("race_keysはリストで指定してください")
+                    daily_parquet_path = _resolve_request_path(
+                        request.get("daily_parquet_path"), service.parquet_base_path / "daily", "daily_parquet_path"
+                    )
+                    start_time = time.perf_counter()
+                    results_df = service.predict(request["date"], daily_parquet_path, race_keys)
+                    self._send_json(HTTPStatus.OK, {
+                        "date": request["date"],
+                        "elapsed_seconds": round(time.perf_counter() - start_time, 3),
+                        "predictions": PredictionExecutor.to_prediction_records(results_df),
+                    })
+                elif self.path == "/repredict":
+                    if not isinstance(request.get("date"), str):
+                        raise ValueError("dateが指定されていません（YYYY-MM-DD形式の文字列）")
+                    tyb_parquet_path = _resolve_request_path(request.get("tyb_parquet_path"), service.parquet_base_path, "tyb_parquet_path")
+                    output_path = _resolve_request_path(request.get("output_path"), service.output_dir, "output_path")
+                    start_time = time.perf_counter()
+                    race_keys, predictions = service.repredict(request["date"], tyb_parquet_path, output_path)
+                    self._send_json(HTTPStatus.OK, {
+                        "date": request["date"],
+                        "elapsed_seconds": round(time.perf_counter() - start_time, 3),
+                        "race_keys": race_keys,
+                        "predictions": predictions,
+                    })
+                elif self.path == "/reload":
+                    service.reload()
+                    self._send_json(HTTPStatus.OK, {"status": "reloaded"})
+                else:
+                    self._send_json(HTTPStatus.NOT_FOUND, {"error": f"存在しないパスです: {self.path}"})
+            except (ValueError, FileNotFoundError) as e:
+                self._send_json(HTTPStatus.BAD_REQUEST, {"error": str(e)})
+            except Exception as e:
+                logger.exception(f"予測リクエストの処理エラー: {self.path}")
+                self._send_json(HTTPStatus.INTERNAL_SERVER_ERROR, {"error": f"{type(e).__name__}: {e}"})
+
+        def log_message(self, format: str, *args) -> None:
+            logger.info(f"{self.address_string()} - {format % args}")
+
+        def _read_json(self) -> Dict:
+            """リクエストボディのJSONを読み込む（ボディが空の場合は空の辞書）"""
+            length = int(self.headers.get("Content-Length") or 0)
+            if length == 0:
+                return {}
+            request = json.loads(self.rfile.read(length).decode("utf-8"))
+            if not isinstance(request, dict):
+                raise ValueError("リクエストボディはJSONオブジェクトで指定してください")
+            return request
+
+        def _send_json(self, status: HTTPStatus, body: Dict) -> None:
+            payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    return PredictionRequestHandler
@@ -0,0 +1,189 @@
+"""
+InferencePlan - 学習済みLightGBMモデルの推論計画
+
+モデルの特徴量順（Booster.feature_name()）の入力行列の作り方をモデルごとに1回だけ作成し、
+予測ごとにはカラムの取り出し（連続したfloat64行列への書き込み）とBooster.predictのみを行う。
+"""
+
+import os
+import threading
+import weakref
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+
+
+class InferencePlan:
+    """
+    学習済みBoosterの推論計画
+
+    入力DataFrameのカラム構成（カラム名とdtype）ごとに、モデルの特徴量がどのカラムのどの位置に対応するかを1回だけ求めて保持する。
+    モデルにないカラムは無視し、入力にない特徴量は0で補完する。数値型以外のカラムはpd.to_numericで変換する（変換できない値は欠損）。
+    入力行列はモデルごとに確保したfloat64行列を使い回す（同じモデルの予測はロックで直列化する）。
+    使い回すのはREUSED_MATRIX_MAX_ROWS行までで、それを超える予測（学習時の評価データ全体等）は予測ごとに確保して保持しない。
+    start_datetime（約2e11）や2^24を超えるIDはfloat32では丸められて分岐が変わるため、DataFrameをそのまま渡した場合と同じfloat64にする。
+    """
+
+    # 予測時のスレッド数を指定する環境変数（未指定の場合は学習時と同じLIGHTGBM_NUM_THREADS、どちらもない場合はLightGBMの既定値）
+    ENV_NUM_THREADS = "LIGHTGBM_PREDICT_NUM_THREADS"
+    ENV_TRAIN_NUM_THREADS = "LIGHTGBM_NUM_THREADS"
+
+    # モデルごとに保持して使い回す入力行列の最大行数（日次予測の規模。超える場合は予測ごとに確保する）
+    REUSED_MATRIX_MAX_ROWS = 16384
+
+    _plans: "weakref.WeakKeyDictionary[lgb.Booster, InferencePlan]" = weakref.WeakKeyDictionary()
+    _plans_lock = threading.Lock()
+
+    def __init__(
+        self,
+        model: lgb.Booster,
+        default_feature_names: Optional[Sequence[str]] = None,
+        num_threads: Optional[int] = None,
+    ):
+        """
+        初期化
+
+        Args:
+            model: 学習済みLightGBMモデル
+            default_feature_names: モデルに特徴量名が保存されていない場合に使う特徴量名（モデルの特徴量順）
+            num_threads: 予測時のスレッド数（Noneの場合は環境変数、0の場合はLightGBMの既定値）
+        """
+        feature_names = list(model.feature_name() or default_feature_names or [])
+        if not feature_names:
+            raise ValueError("モデルに特徴量名が保存されていません。default_feature_namesを指定してください。")
+        if len(feature_names) != model.num_feature():
+            raise ValueError(f"特徴量名の数がモデルの特徴量数と一致しません: {len(feature_names)} vs {model.num_feature()}")
+
+        # モデルが破棄されたときに推論計画も破棄されるよう、モデルは弱参照で保持する
+        self._model_ref = weakref.ref(model)
+        self._feature_names = feature_names
+        self._num_iteration = model.best_iteration
+        self._num_threads = InferencePlan.get_num_threads() if num_threads is None else num_threads
+        self._layouts: Dict[Tuple, Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]] = {}
+        self._matrix = np.zeros((0, len(feature_names)), dtype=np.float64)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def for_model(model: lgb.Booster, default_feature_names: Optional[Sequence[str]] = None) -> "InferencePlan":
+        """
+        モデルの推論計画を取得（モデルごとに1回だけ作成して使い回す）
+
+        Args:
+            model: 学習済みLightGBMモデル
+            default_feature_names: モデルに特徴量名が保存されていない場合に使う特徴量名
+
+        Returns:
+            推論計画
+        """
+        with InferencePlan._plans_lock:
+            plan = InferencePlan._plans.get(model)
+            if plan is None:
+                plan = InferencePlan(model, default_feature_names)
+                InferencePlan._plans[model] = plan
+            return plan
+
+    @staticmethod
+    def get_num_threads() -> int:
+        """予測時のスレッド数（環境変数から取得、未指定の場合は0=LightGBMの既定値）"""
+        value = os.getenv(InferencePlan.ENV_NUM_THREADS) or os.getenv(InferencePlan.ENV_TRAIN_NUM_THREADS)
+        return int(value) if value else 0
+
+    @property
+    def feature_names(self) -> List[str]:
+        """モデルの特徴量名（モデルの特徴量順）"""
+        return list(self._feature_names)
+
+    @property
+    def num_threads(self) -> int:
+        """予測時のスレッド数"""
+        return self._num_threads
+
+    def missing_features(self, df: pd.DataFrame) -> List[str]:
+        """モデルの特徴量のうち、DataFrameに存在しないもの（モデルの特徴量順）"""
+        columns = set(df.columns)
+        return [feature for feature in self._feature_names if feature not in columns]
+
+    def predict(self, df: pd.DataFrame) -> np.ndarray:
+        """
+        予測を実行
+
+        Args:
+            df: 予測対象のDataFrame（モデルの特徴量をカラムに含む、カラムの順序は任意）
+
+        Returns:
+            予測値（dfの行順）
+        """
+        model = self._model_ref()
+        if model is None:
+            raise ValueError("推論計画のモデルが破棄されています")
+
+        layout = self._get_layout(df)
+        with self._lock:
+            matrix = self._fill_matrix(df, layout)
+            params = {"num_threads": self._num_threads} if self._num_threads > 0 else {}
+            return model.predict(matrix, num_iteration=self._num_iteration, **params)
+
+    def _get_layout(self, df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        カラム構成に対応する取り出し位置を取得（カラム構成ごとに1回だけ作成）
+
+        Returns:
+            (数値カラムの位置, 数値カラムの書き込み先の特徴量位置, それ以外のカラムの位置, それ以外のカラムの書き込み先の特徴量位置)
+        """
+        key = (tuple(df.columns), tuple(df.dtypes))
+        layout = self._layouts.get(key)
+        if layout is not None:
+            return layout
+
+        if df.columns.has_duplicates:
+            raise ValueError(f"重複カラムがあります: {df.columns[df.columns.duplicated()].unique().tolist()[:10]}")
+        positions = df.columns.get_indexer(self._feature_names)
+        if (positions < 0).all():
+            raise ValueError(f"特徴量が見つかりません。利用可能な列: {df.columns.tolist()[:10]}")
+
+        dtypes = df.dtypes
+        is_numeric = np.array([
+            position >= 0
+            and pd.api.types.is_numeric_dtype(dtypes.iloc[position])
+            and not isinstance(dtypes.iloc[position], pd.CategoricalDtype)
+            for position in positions
+        ], dtype=bool)
+        targets = np.arange(len(self._feature_names))
+        present = positions >= 0
+        layout = (
+            positions[present & is_numeric],
+            targets[present & is_numeric],
+            positions[present & ~is_numeric],
+            targets[present & ~is_numeric],
+        )
+        self._layouts[key] = layout
+        return layout
+
+    def _fill_matrix(self, df: pd.DataFrame, layout: Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]) -> np.ndarray:
+        """入力行列（float64、C連続）にカラムの値を書き込む（ロック取得済みの状態で呼び出す）"""
+        numeric_positions, numeric_targets, other_positions, other_targets = layout
+        row_count = len(df)
+        if row_count > self.REUSED_MATRIX_MAX_ROWS:
+            matrix = np.empty((row_count, len(self._feature_names)), dtype=np.float64)
+        else:
+            if self._matrix.shape[0] < row_count:
+                self._matrix = np.empty((row_count, len(self._feature_names)), dtype=np.float64)
+            matrix = self._matrix[:row_count]
+
+        if len(numeric_targets) + len(other_targets) < len(self._feature_names):
+            # 入力にない特徴量は0で補完
+            matrix.fill(0.0)
+        if len(numeric_positions):
+            values = df.iloc[:, numeric_positions].to_numpy(dtype=np.float64, na_value=np.nan)
+            if len(numeric_targets) == len(self._feature_names):
+                matrix[:] = values
+            else:
+                matrix[:, numeric_targets] = values
+        for position, target in zip(other_positions, other_targets, strict=True):
+            column = df.iloc[:, position]
+            if isinstance(column.dtype, pd.CategoricalDtype):
+                column = column.astype(object)
+            matrix[:, target] = pd.to_numeric(column, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+        return matrix
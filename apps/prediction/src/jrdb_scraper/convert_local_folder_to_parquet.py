@@ -3,28 +3,42 @@
 """
 
 import logging
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
 from pathlib import Path
-from typing import Dict, List, Optional, Union
+from typing import Dict, List, Optional, Tuple, Union
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 
-from .converter import convert_lzh_to_parquet
+from .converter import convert_lzh_to_parquet, extract_and_parse_lzh_data, requires_bac_date
 from .entities.jrdb import (
     JRDBDataType,
     get_annual_pack_supported_data_types,
     get_all_data_types,
     get_jrdb_data_type_info
 )
+from .parquet_manifest import build_fingerprint, compute_hash, is_up_to_date, load_manifest, record_outputs
+from .partitioned_dataset import LAYOUT_FLAT, get_output_name, publish_output, validate_layout
+from src.utils.feature_converter import FeatureConverter
 
 logger = logging.getLogger(__name__)
 
+# BACの日付マッピングの配置先（存在すればRAM上のtmpfsを使用）
+_SHARED_MEMORY_DIR = '/dev/shm'
+
 
 def convert_single_local_file(
     lzhFilePath: Union[str, Path],
     dataType: JRDBDataType,
     year: int,
     outputDir: Union[str, Path],
-    bac_df: Optional[pd.DataFrame] = None
+    bac_df: Optional[pd.DataFrame] = None,
+    layout: str = LAYOUT_FLAT
 ) -> Dict[str, Union[str, int, bool, Optional[str]]]:
     """単一のLZHファイルをParquetに変換（内部関数）
     
@@ -33,6 +47,7 @@ def convert_single_local_file(
         dataType: データタイプ
         year: 年度（例: 2024）
         outputDir: 出力ディレクトリ
+        layout: 出力形式（'flat': {データタイプ}_{年度}.parquet、'partitioned': type=/year=/month=のパーティション）
     
     Returns:
         結果辞書
@@ -64,15 +79,17 @@ def convert_single_local_file(
         fileName = f'{actualDataType}_{year}'
         parquetFilePath = outputPath / f'{fileName}.parquet'
         
-        _, records = convert_lzh_to_parquet(lzhBuffer, actualDataType, year, parquetFilePath, bac_df=bac_df)
+        _, recordCount = convert_lzh_to_parquet(lzhBuffer, actualDataType, year, parquetFilePath, bac_df=bac_df)
         
-        if len(records) == 0:
+        if recordCount == 0:
             raise ValueError('パースされたレコードが0件です')
         
+        parquetFilePath = publish_output(parquetFilePath, outputPath, actualDataType, year, layout)
+        
         logger.info('ローカルLZHファイル変換完了', extra={
             'dataType': actualDataType,
             'year': year,
-            'recordCount': len(records),
+            'recordCount': recordCount,
             'outputPath': str(parquetFilePath)
         })
         
@@ -80,7 +97,7 @@ def convert_single_local_file(
             'year': year,
             'dataType': actualDataType,
             'success': True,
-            'recordCount': len(records),
+            'recordCount': recordCount,
             'outputPath': str(parquetFilePath),
             'fileName': fileName
         }
@@ -147,8 +164,11 @@ def convert_local_folder_to_parquet(
     folderPath: Union[str, Path],
     year: int,
     dataTypes: List[JRDBDataType],
-    outputDir: Union[str, Path] = 'cache/jrdb/parquet'
-) -> List[Dict[str, Union[str, int, bool, Optional[str]]]]:
+    outputDir: Union[str, Path] = 'cache/jrdb/parquet',
+    maxWorkers: Optional[int] = None,
+    force: bool = False,
+    layout: str = LAYOUT_FLAT
+) -> List[Dict[str, Union[str, int, float, bool, Optional[str]]]]:
     """ローカルフォルダ内のLZHファイルをParquetに変換
     
     Args:
@@ -156,13 +176,46 @@ def convert_local_folder_to_parquet(
         year: 年度（例: 2024）
         dataTypes: データタイプの配列（年度パックをサポートしているもののみ処理される）
         outputDir: 出力ディレクトリ（デフォルト: 'cache/jrdb/parquet'）
+        maxWorkers: 並列プロセス数（デフォルト: CPU数、1の場合は逐次実行）
+        force: Trueの場合はマニフェストに関係なく全て再変換する
+        layout: 出力形式（'flat'または'partitioned'）
     
     Returns:
-        結果のリスト
+        結果のリスト（dataTypesの順）
     """
+    return convert_local_folders_to_parquet({year: folderPath}, dataTypes, outputDir, maxWorkers=maxWorkers, force=force, layout=layout)
+
+
+def convert_local_folders_to_parquet(
+    yearFolders: Dict[int, Union[str, Path]],
+    dataTypes: List[JRDBDataType],
+    outputDir: Union[str, Path] = 'cache/jrdb/parquet',
+    maxWorkers: Optional[int] = None,
+    force: bool = False,
+    layout: str = LAYOUT_FLAT
+) -> List[Dict[str, Union[str, int, float, bool, Optional[str]]]]:
+    """複数年度のローカルフォルダ内のLZHファイルをプロセスプールで並列にParquetへ変換
+    
+    年度ごとにBACを先に変換し、race_key生成用の日付マッピング（race_key必須カラム + 年月日）を一時ファイルに1回だけ書き出す。
+    年月日を持つデータタイプはBACを待たずに、KYI等の年月日がないデータタイプは同じ年度のBACの完了後に実行する。
+    出力ディレクトリのマニフェスト（parquet_manifest）と変換条件が一致する出力ファイルは再変換しない。
+    
+    Args:
+        yearFolders: 年度 → LZHファイルが格納されているフォルダパス
+        dataTypes: データタイプの配列（年度パックをサポートしているもののみ処理される）
+        outputDir: 出力ディレクトリ（デフォルト: 'cache/jrdb/parquet'）
+        maxWorkers: 並列プロセス数（デフォルト: CPU数、1の場合は逐次実行）
+        force: Trueの場合はマニフェストに関係なく全て再変換する
+        layout: 出力形式（'flat': {データタイプ}_{年度}.parquet、'partitioned': type=/year=/month=のパーティション）
+    
+    Returns:
+        結果のリスト（年度順・dataTypesの順）。各結果には処理時間（elapsedSeconds）と再変換を省略したか（skipped）を含む
+    """
+    if maxWorkers is not None and maxWorkers < 1: raise ValueError(f'maxWorkersは1以上である必要があります: {maxWorkers}')
+    validate_layout(layout)
+    
     logger.info('ローカルフォルダ変換開始（複数データタイプ）', extra={
-        'folderPath': str(folderPath),
-        'year': year,
+        'yearFolders': {year: str(folder) for year, folder in yearFolders.items()},
         'dataTypes': [dt.value for dt in dataTypes]
     })
     
@@ -183,78 +236,263 @@ def convert_local_folder_to_parquet(
             'supportedDataTypes': [dt.value for dt in supportedDataTypes]
         })
     
-    results: List[Dict[str, Union[str, int, bool, Optional[str]]]] = []
-    
-    # KYI等の年月日がないデータタイプのrace_key生成用に、BACデータを事前に読み込む
-    bac_df = None
-    if JRDBDataType.BAC in supportedDataTypes:
-        try:
-            bac_files = find_lzh_files_in_folder(folderPath, JRDBDataType.BAC)
-            if bac_files:
-                from .converter import extract_and_parse_lzh_data
-                with open(bac_files[0], 'rb') as f:
-                    bac_buffer = f.read()
-                _, bac_records = extract_and_parse_lzh_data(bac_buffer, JRDBDataType.BAC)
-                if bac_records:
-                    bac_df = pd.DataFrame(bac_records)
-                logger.info('BACデータを読み込みました（KYI等のrace_key生成用）', extra={'year': year, 'recordCount': len(bac_records) if bac_records else 0})
-        except Exception as e:
-            logger.warning('BACデータの読み込みに失敗しました（KYI等のrace_key生成に影響する可能性があります）', extra={'year': year, 'error': str(e)})
-    
-    for dataType in supportedDataTypes:
-        try:
-            # フォルダ内から該当データタイプのLZHファイルを検索
-            lzhFiles = find_lzh_files_in_folder(folderPath, dataType)
-            
-            if not lzhFiles:
-                logger.warning('該当データタイプのLZHファイルが見つかりません', extra={
-                    'year': year,
-                    'dataType': dataType.value,
-                    'folderPath': str(folderPath)
-                })
-                results.append({
+    # (年度, データタイプ) → 結果。ファイルがないものはこの時点で結果が確定する
+    results: Dict[Tuple[int, JRDBDataType], Dict[str, Union[str, int, float, bool, Optional[str]]]] = {}
+    tasks: Dict[Tuple[int, JRDBDataType], Path] = {}
+    for year, folderPath in yearFolders.items():
+        for dataType in supportedDataTypes:
+            lzhFile = _find_single_lzh_file(folderPath, dataType, year)
+            if lzhFile is None:
+                results[(year, dataType)] = {
                     'year': year,
                     'dataType': dataType.value,
                     'success': False,
                     'recordCount': 0,
                     'error': f'LZHファイルが見つかりません: {folderPath}'
-                })
+                }
                 continue
-            
-            # 最初に見つかったファイルを使用（複数ファイルがある場合は最初の1つ）
-            lzhFile = lzhFiles[0]
-            if len(lzhFiles) > 1:
-                logger.warning('複数のLZHファイルが見つかりました。最初のファイルを使用します', extra={
-                    'dataType': dataType.value,
-                    'fileCount': len(lzhFiles),
-                    'selectedFile': str(lzhFile)
-                })
-            
-            # KYI等の年月日がないデータタイプの場合は、BACデータを渡す
-            result = convert_single_local_file(lzhFile, dataType, year, outputDir, bac_df=bac_df if dataType != JRDBDataType.BAC else None)
-            results.append(result)
-        except Exception as error:
-            errorMessage = str(error)
-            logger.error('データタイプ変換エラー', extra={
-                'year': year,
-                'dataType': dataType.value,
-                'error': errorMessage
-            })
-            results.append({
-                'year': year,
-                'dataType': dataType.value,
-                'success': False,
-                'recordCount': 0,
-                'error': errorMessage
-            })
-    
-    successCount = sum(1 for r in results if r.get('success', False))
+            tasks[(year, dataType)] = lzhFile
+    
+    # 変換元・フォーマット定義・コンバーターのバージョンがマニフェストと一致する出力は再変換しない
+    fingerprints = _build_fingerprints(tasks)
+    cachedResults: Dict[Tuple[int, JRDBDataType], Dict[str, Union[str, int, float, bool, Optional[str]]]] = {}
+    if not force:
+        manifest = load_manifest(outputDir)
+        for (year, dataType) in tasks:
+            fileName = get_output_name(dataType.value, year, layout)
+            if is_up_to_date(manifest, outputDir, fileName, fingerprints[(year, dataType)]):
+                cachedResults[(year, dataType)] = _skipped_result(year, dataType, Path(outputDir) / fileName, manifest[fileName])
+    
+    # BACは、同じ年度にBACの年月日が必要な再変換対象がある場合のみ実行する（変換済みなら日付マッピングの公開のみ）
+    yearsNeedingBac = {year for (year, dataType) in tasks if (year, dataType) not in cachedResults and requires_bac_date(dataType)}
+    pendingTasks = {key: lzhFile for key, lzhFile in tasks.items() if key not in cachedResults or (key[1] == JRDBDataType.BAC and key[0] in yearsNeedingBac)}
+    results.update({key: result for key, result in cachedResults.items() if key not in pendingTasks})
+    if cachedResults:
+        logger.info('変換済みのため再変換を省略します', extra={'files': sorted(f'{dataType.value}_{year}' for year, dataType in cachedResults)})
+    
+    # BACの日付マッピングは年度ごとに1ファイルだけ書き出し、各ワーカーはmemory-mapで読む
+    mappingDir = tempfile.mkdtemp(prefix='bac_date_mapping_', dir=_SHARED_MEMORY_DIR if os.path.isdir(_SHARED_MEMORY_DIR) else None)
+    try:
+        workers = maxWorkers or os.cpu_count() or 1
+        if workers == 1 or len(pendingTasks) <= 1:
+            convertedResults = _run_tasks_sequentially(pendingTasks, outputDir, Path(mappingDir), cachedResults, layout)
+        else:
+            convertedResults = _run_tasks_in_process_pool(pendingTasks, outputDir, Path(mappingDir), cachedResults, min(workers, len(pendingTasks)), layout)
+    finally:
+        shutil.rmtree(mappingDir, ignore_errors=True)
+    results.update(convertedResults)
+    
+    # 変換に成功した出力をマニフェストに記録（ワーカーは書き込まず、親プロセスでまとめて保存）
+    record_outputs(outputDir, {
+        get_output_name(key[1].value, key[0], layout): {**fingerprints[key], 'dataType': key[1].value, 'year': key[0], 'recordCount': result['recordCount']}
+        for key, result in convertedResults.items() if result.get('success', False) and not result.get('skipped', False)
+    })
+    
+    orderedResults = [results[(year, dataType)] for year in yearFolders for dataType in supportedDataTypes]
+    
+    # データタイプ別の処理時間（全年度の合計）
+    timings: Dict[str, float] = {}
+    for result in orderedResults:
+        timings[str(result['dataType'])] = round(timings.get(str(result['dataType']), 0.0) + float(result.get('elapsedSeconds', 0.0)), 3)
+    
+    successCount = sum(1 for r in orderedResults if r.get('success', False))
     logger.info('ローカルフォルダ変換完了', extra={
-        'folderPath': str(folderPath),
-        'year': year,
+        'years': list(yearFolders),
         'totalDataTypes': len(supportedDataTypes),
-        'successCount': successCount
+        'successCount': successCount,
+        'elapsedSecondsByDataType': timings
     })
     
+    return orderedResults
+
+
+def _find_single_lzh_file(folderPath: Union[str, Path], dataType: JRDBDataType, year: int) -> Optional[Path]:
+    """フォルダ内から該当データタイプのLZHファイルを1つ選ぶ（複数ある場合は最初の1つ）"""
+    lzhFiles = find_lzh_files_in_folder(folderPath, dataType)
+    
+    if not lzhFiles:
+        logger.warning('該当データタイプのLZHファイルが見つかりません', extra={
+            'year': year,
+            'dataType': dataType.value,
+            'folderPath': str(folderPath)
+        })
+        return None
+    
+    if len(lzhFiles) > 1:
+        logger.warning('複数のLZHファイルが見つかりました。最初のファイルを使用します', extra={
+            'dataType': dataType.value,
+            'fileCount': len(lzhFiles),
+            'selectedFile': str(lzhFiles[0])
+        })
+    return lzhFiles[0]
+
+
+def _build_fingerprints(tasks: Dict[Tuple[int, JRDBDataType], Path]) -> Dict[Tuple[int, JRDBDataType], Dict]:
+    """(年度, データタイプ) ごとの変換条件。BACの年月日でrace_keyを作るデータタイプは、同じ年度のBACのハッシュも含める"""
+    sourceHashes = {key: compute_hash(lzhFile) for key, lzhFile in tasks.items()}
+    fingerprints = {}
+    for (year, dataType), sourceHash in sourceHashes.items():
+        bacHash = sourceHashes.get((year, JRDBDataType.BAC))
+        dependencyHashes = {JRDBDataType.BAC.value: bacHash} if bacHash is not None and requires_bac_date(dataType) else None
+        fingerprints[(year, dataType)] = build_fingerprint(sourceHash, dataType, dependencyHashes)
+    return fingerprints
+
+
+def _skipped_result(year: int, dataType: JRDBDataType, parquetFilePath: Path, entry: Dict) -> Dict[str, Union[str, int, float, bool, Optional[str]]]:
+    """マニフェストと一致したため再変換しなかった出力の結果辞書"""
+    return {
+        'year': year,
+        'dataType': dataType.value,
+        'success': True,
+        'recordCount': int(entry.get('recordCount', 0)),
+        'outputPath': str(parquetFilePath),
+        'fileName': f'{dataType.value}_{year}',
+        'skipped': True,
+        'elapsedSeconds': 0.0
+    }
+
+
+def _run_tasks_sequentially(
+    tasks: Dict[Tuple[int, JRDBDataType], Path],
+    outputDir: Union[str, Path],
+    mappingDir: Path,
+    cachedResults: Dict[Tuple[int, JRDBDataType], Dict[str, Union[str, int, float, bool, Optional[str]]]],
+    layout: str = LAYOUT_FLAT
+) -> Dict[Tuple[int, JRDBDataType], Dict[str, Union[str, int, float, bool, Optional[str]]]]:
+    """年度ごとにBAC → その他のデータタイプの順で逐次変換"""
+    results = {}
+    mappingPaths: Dict[int, Optional[str]] = {}
+    for (year, dataType), lzhFile in sorted(tasks.items(), key=lambda item: item[0][1] != JRDBDataType.BAC):
+        if dataType == JRDBDataType.BAC:
+            results[(year, dataType)], mappingPaths[year] = _convert_bac_task(str(lzhFile), year, str(outputDir), str(mappingDir / f'{year}.arrow'), cachedResults.get((year, dataType)), layout)
+        else:
+            results[(year, dataType)] = _convert_task(str(lzhFile), dataType, year, str(outputDir), mappingPaths.get(year), layout)
     return results
 
+
+def _run_tasks_in_process_pool(
+    tasks: Dict[Tuple[int, JRDBDataType], Path],
+    outputDir: Union[str, Path],
+    mappingDir: Path,
+    cachedResults: Dict[Tuple[int, JRDBDataType], Dict[str, Union[str, int, float, bool, Optional[str]]]],
+    maxWorkers: int,
+    layout: str = LAYOUT_FLAT
+) -> Dict[Tuple[int, JRDBDataType], Dict[str, Union[str, int, float, bool, Optional[str]]]]:
+    """BACと年月日を持つデータタイプを先に投入し、年月日がないデータタイプは同じ年度のBACの完了後に投入する"""
+    bacYears = {year for year, dataType in tasks if dataType == JRDBDataType.BAC}
+    waiting = {key: lzhFile for key, lzhFile in tasks.items() if key[0] in bacYears and requires_bac_date(key[1])}
+    
+    results = {}
+    with ProcessPoolExecutor(max_workers=maxWorkers) as executor:
+        futures: Dict[Future, Tuple[int, JRDBDataType]] = {}
+        for (year, dataType), lzhFile in tasks.items():
+            if (year, dataType) in waiting:
+                continue
+            if dataType == JRDBDataType.BAC:
+                future = executor.submit(_convert_bac_task, str(lzhFile), year, str(outputDir), str(mappingDir / f'{year}.arrow'), cachedResults.get((year, dataType)), layout)
+            else:
+                future = executor.submit(_convert_task, str(lzhFile), dataType, year, str(outputDir), None, layout)
+            futures[future] = (year, dataType)
+        
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                year, dataType = futures.pop(future)
+                try:
+                    result = future.result()
+                except Exception as error:
+                    # ワーカープロセスの異常終了など（変換自体のエラーは結果辞書で返る）
+                    result = _error_result(year, dataType, str(error))
+                    if dataType == JRDBDataType.BAC:
+                        result = (result, None)
+                
+                if dataType != JRDBDataType.BAC:
+                    results[(year, dataType)] = result
+                    continue
+                
+                # BACの日付マッピングが公開されたら、同じ年度の年月日がないデータタイプを投入
+                results[(year, dataType)], mappingPath = result
+                for key in [key for key in waiting if key[0] == year]:
+                    future = executor.submit(_convert_task, str(waiting.pop(key)), key[1], year, str(outputDir), mappingPath, layout)
+                    futures[future] = key
+    return results
+
+
+def _convert_task(
+    lzhFilePath: str,
+    dataType: JRDBDataType,
+    year: int,
+    outputDir: str,
+    mappingPath: Optional[str],
+    layout: str = LAYOUT_FLAT
+) -> Dict[str, Union[str, int, float, bool, Optional[str]]]:
+    """ワーカープロセスで1データタイプ・1年度分を変換（BACの日付マッピングがあればrace_key生成に使用）"""
+    startTime = time.perf_counter()
+    try:
+        bac_df = _read_bac_date_mapping(mappingPath) if mappingPath is not None else None
+        result = convert_single_local_file(lzhFilePath, dataType, year, outputDir, bac_df=bac_df, layout=layout)
+    except Exception as error:
+        logger.error('データタイプ変換エラー', extra={'year': year, 'dataType': dataType.value, 'error': str(error)})
+        result = _error_result(year, dataType, str(error))
+    result['skipped'] = False
+    result['elapsedSeconds'] = round(time.perf_counter() - startTime, 3)
+    return result
+
+
+def _convert_bac_task(
+    lzhFilePath: str,
+    year: int,
+    outputDir: str,
+    mappingPath: str,
+    cachedResult: Optional[Dict[str, Union[str, int, float, bool, Optional[str]]]] = None,
+    layout: str = LAYOUT_FLAT
+) -> Tuple[Dict[str, Union[str, int, float, bool, Optional[str]]], Optional[str]]:
+    """ワーカープロセスでBACを変換し、race_key生成用の日付マッピングをArrow IPCファイルに書き出す
+    cachedResultがある場合（マニフェストと一致）は変換せず、既存のParquetから日付マッピングのみ作成する
+    
+    Returns:
+        (結果辞書, 日付マッピングのパス（書き出せなかった場合はNone）)
+    """
+    startTime = time.perf_counter()
+    result = dict(cachedResult) if cachedResult is not None else _convert_task(lzhFilePath, JRDBDataType.BAC, year, outputDir, None, layout)
+    
+    columns = FeatureConverter.RACE_KEY_REQUIRED_COLUMNS + ['年月日']
+    publishedPath: Optional[str] = None
+    try:
+        if result.get('success', False):
+            # 変換済みのParquet（パーティション形式の場合は年度のディレクトリ）から必要なカラムのみ読む（BACを再度展開・パースしない）
+            mapping = pq.read_table(str(result['outputPath']), columns=columns)
+        else:
+            # 変換に失敗した場合も、パースできれば日付マッピングは作成する（従来と同じ）
+            with open(lzhFilePath, 'rb') as f:
+                _, bacRecords = extract_and_parse_lzh_data(f.read(), JRDBDataType.BAC)
+            mapping = bacRecords.select(columns)
+        
+        if mapping.num_rows > 0:
+            with pa.OSFile(mappingPath, 'wb') as sink:
+                with pa.ipc.new_file(sink, mapping.schema) as writer:
+                    writer.write_table(mapping)
+            publishedPath = mappingPath
+        logger.info('BACデータを読み込みました（KYI等のrace_key生成用）', extra={'year': year, 'recordCount': mapping.num_rows})
+    except Exception as e:
+        logger.warning('BACデータの読み込みに失敗しました（KYI等のrace_key生成に影響する可能性があります）', extra={'year': year, 'error': str(e)})
+    
+    result['elapsedSeconds'] = round(time.perf_counter() - startTime, 3)
+    return (result, publishedPath)
+
+
+def _read_bac_date_mapping(mappingPath: str) -> pd.DataFrame:
+    """memory-mapしたArrow IPCファイルからBACの日付マッピングを読み込む"""
+    with pa.memory_map(mappingPath, 'r') as source:
+        return pa.ipc.open_file(source).read_all().to_pandas()
+
+
+def _error_result(year: int, dataType: JRDBDataType, errorMessage: str) -> Dict[str, Union[str, int, float, bool, Optional[str]]]:
+    """変換失敗時の結果辞書"""
+    return {
+        'year': year,
+        'dataType': dataType.value,
+        'success': False,
+        'recordCount': 0,
+        'error': errorMessage
+    }
@@ -2,30 +2,43 @@
 パース済みデータをParquet形式に変換
 """
 
+import itertools
 import logging
+import os
 from pathlib import Path
-from typing import Dict, List, Optional, Union
+from typing import Dict, Iterable, Iterator, List, Optional, Union
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 
 from .entities.jrdb import JRDBDataType
-from .lzh_extractor import extract_data_type_from_file_name, extract_lzh_file
-from .parsers.jrdb_parser import parse_jrdb_data_from_buffer
+from .lzh_extractor import extract_data_type_from_file_name, extract_lzh_file, iter_lzh_file
+from .parsers.format_loader import load_format_definition
+from .parsers.jrdb_parser import iter_jrdb_tables_from_buffer, parse_jrdb_table_from_buffer
 from src.utils.feature_converter import FeatureConverter
 
 logger = logging.getLogger(__name__)
 
+# コンバーターのバージョン（出力Parquetの内容が変わる変更をしたら上げる。マニフェストで再変換の要否判定に使用）
+CONVERTER_VERSION = 1
+
+# ストリーミング変換で1回にパースするレコード数（= Parquetの行グループサイズ）
+# 年度パック1ファイル分（SEDで約5万レコード）が1〜数チャンクに収まり、行グループごとの統計情報も粗すぎない大きさ
+PARQUET_BATCH_SIZE = 65536
+
 
 def convert_to_parquet(
-    records: List[Dict[str, Union[int, str, None]]],
+    records: Union[pa.Table, List[Dict[str, Union[int, str, None]]]],
     outputFilePath: Union[str, Path],
     dataType: Optional[Union[JRDBDataType, str]] = None,
     bac_df: Optional[pd.DataFrame] = None
 ) -> None:
-    """レコード配列をParquet形式で保存
+    """レコード（pyarrow Tableまたはレコード配列）をParquet形式で保存
     
     Args:
-        records: レコード配列
+        records: パース済みレコード（pyarrow Tableまたはレコード配列）
         outputFilePath: 出力Parquetファイルパス
         dataType: データタイプ（race_key生成に使用、オプション）
         bac_df: BACデータ（KYI等の年月日がないデータタイプのrace_key生成に使用、オプション）
@@ -41,39 +54,22 @@ def convert_to_parquet(
     outputPath.parent.mkdir(parents=True, exist_ok=True)
     
     # DataFrameに変換
-    df = pd.DataFrame(records)
+    df = records.to_pandas() if isinstance(records, pa.Table) else pd.DataFrame(records)
     
     # race_key生成に必要なカラムをチェック（データタイプに関係なく）
     required_columns = FeatureConverter.RACE_KEY_REQUIRED_COLUMNS
     has_required_columns = all(col in df.columns for col in required_columns)
     
+    data_type_str = _data_type_label(dataType)
     if has_required_columns:
         # 必要なカラムが全て存在する場合は、race_keyを追加
-        data_type_str = dataType.value if isinstance(dataType, JRDBDataType) else str(dataType) if dataType is not None else "unknown"
         logger.info(f"データタイプ '{data_type_str}' にrace_keyを追加中... (必要なカラムが揃っています)")
-        
-        # 年月日カラムがないデータタイプ（KYI等）の場合は、BACデータから日付を取得
-        use_bac_date = bac_df is not None and "年月日" not in df.columns
-        try:
-            df = FeatureConverter.add_race_key_to_df(df, bac_df=bac_df, use_bac_date=use_bac_date)
-        except Exception as e:
-            na_counts = {c: int(df[c].isna().sum()) for c in required_columns if c in df.columns}
-            sample = df[required_columns].head(5).to_dict(orient="records")
-            raise RuntimeError(
-                f"race_key追加に失敗しました: dataType={data_type_str}, use_bac_date={use_bac_date}, "
-                f"na_counts={na_counts}, sample_required_rows={sample}"
-            ) from e
-        
-        if "race_key" not in df.columns:
-            logger.error(f"データタイプ '{data_type_str}' にrace_keyの追加に失敗しました。利用可能なカラム: {list(df.columns)[:10]}")
-            raise ValueError(f"データタイプ '{data_type_str}' にrace_keyの追加に失敗しました。")
-        
+        df = _add_race_key(df, data_type_str, bac_df)
         race_key_count = df['race_key'].notna().sum()
         logger.info(f"データタイプ '{data_type_str}' にrace_keyを追加しました。race_keyの行数: {race_key_count}/{len(df)}")
     else:
         # 必要なカラムが揃っていない場合は、race_keyを追加しない
         missing_columns = [col for col in required_columns if col not in df.columns]
-        data_type_str = dataType.value if isinstance(dataType, JRDBDataType) else str(dataType) if dataType is not None else "unknown"
         logger.info(f"データタイプ '{data_type_str}' にrace_keyを追加しません。必要なカラムが不足しています: {missing_columns}")
     
     # Parquet形式で保存
@@ -90,19 +86,161 @@ def convert_to_parquet(
     })
 
 
+def write_tables_to_parquet(
+    tables: Iterable[pa.Table],
+    outputFilePath: Union[str, Path],
+    dataType: Optional[Union[JRDBDataType, str]] = None,
+    bac_df: Optional[pd.DataFrame] = None,
+    rowGroupSize: int = PARQUET_BATCH_SIZE
+) -> int:
+    """パース済みTableのチャンクを順にrace_keyを付与してParquetファイルに追記（convert_to_parquetのストリーミング版）
+    チャンクはrowGroupSize行ずつに詰め直して書き込むため、メモリに保持するのは高々2行グループ分。
+    書き込みは一時ファイルに行い、全チャンク成功後に出力パスへ置き換える
+    
+    Args:
+        tables: パース済みレコードのTable（スキーマは全チャンクで共通）
+        outputFilePath: 出力Parquetファイルパス
+        dataType: データタイプ（ログ出力に使用、オプション）
+        bac_df: BACデータ（KYI等の年月日がないデータタイプのrace_key生成に使用、オプション）
+        rowGroupSize: Parquetの行グループの最大行数
+    
+    Returns:
+        書き込んだレコード数（0件の場合はファイルを作成しない）
+    """
+    outputPath = Path(outputFilePath)
+    temporaryPath = outputPath.with_name(f'{outputPath.name}.tmp')
+    data_type_str = _data_type_label(dataType)
+    required_columns = FeatureConverter.RACE_KEY_REQUIRED_COLUMNS
+    
+    writer: Optional[pq.ParquetWriter] = None
+    totalRows = 0
+    try:
+        for table in _rebatch_tables(tables, rowGroupSize):
+            # race_keyはチャンクごとに生成（行単位の変換のため、一括変換と同じ結果になる）
+            if all(col in table.column_names for col in required_columns):
+                table = _add_race_key_to_table(table, data_type_str, bac_df)
+            
+            if writer is None:
+                if 'race_key' in table.column_names:
+                    logger.info(f"データタイプ '{data_type_str}' にrace_keyを追加しながら書き込みます")
+                else:
+                    missing_columns = [col for col in required_columns if col not in table.column_names]
+                    logger.info(f"データタイプ '{data_type_str}' にrace_keyを追加しません。必要なカラムが不足しています: {missing_columns}")
+                outputPath.parent.mkdir(parents=True, exist_ok=True)
+                writer = pq.ParquetWriter(temporaryPath, table.schema, compression='snappy')
+            
+            writer.write_table(table, row_group_size=rowGroupSize)
+            totalRows += table.num_rows
+        
+        if writer is not None:
+            writer.close()
+            writer = None
+            os.replace(temporaryPath, outputPath)
+    finally:
+        if writer is not None:
+            writer.close()
+        temporaryPath.unlink(missing_ok=True)
+    
+    if totalRows > 0:
+        logger.info(f'Parquetファイルを保存しました: {outputPath}', extra={
+            'rows': totalRows,
+            'rowGroupSize': rowGroupSize
+        })
+    return totalRows
+
+
+def _rebatch_tables(tables: Iterable[pa.Table], batchSize: int) -> Iterator[pa.Table]:
+    """Tableの列をbatchSize行ずつに詰め直す（日単位ファイルのような小さいTableを1つの行グループにまとめる）"""
+    pending: List[pa.Table] = []
+    pendingRows = 0
+    for table in tables:
+        if table.num_rows == 0:
+            continue
+        pending.append(table)
+        pendingRows += table.num_rows
+        if pendingRows < batchSize:
+            continue
+        
+        combined = pa.concat_tables(pending)
+        fullRows = pendingRows - pendingRows % batchSize
+        for start in range(0, fullRows, batchSize):
+            yield combined.slice(start, batchSize)
+        pending = [combined.slice(fullRows)] if fullRows < pendingRows else []
+        pendingRows -= fullRows
+    
+    if pendingRows > 0:
+        yield pa.concat_tables(pending)
+
+
+def _data_type_label(dataType: Optional[Union[JRDBDataType, str]]) -> str:
+    """ログ・エラーメッセージ用のデータタイプ文字列"""
+    return dataType.value if isinstance(dataType, JRDBDataType) else str(dataType) if dataType is not None else "unknown"
+
+
+def requires_bac_date(dataType: JRDBDataType) -> bool:
+    """race_key生成にBACの年月日が必要なデータタイプか（race_key必須カラムはあるが年月日がない: KYI等）"""
+    format = load_format_definition(dataType)
+    if dataType == JRDBDataType.BAC or format is None:
+        return False
+    fieldNames = {field['name'] for field in format['fields']}
+    return all(col in fieldNames for col in FeatureConverter.RACE_KEY_REQUIRED_COLUMNS) and '年月日' not in fieldNames
+
+
+def _add_race_key(df: pd.DataFrame, data_type_str: str, bac_df: Optional[pd.DataFrame]) -> pd.DataFrame:
+    """DataFrameにrace_keyと年月日を追加（失敗時は欠損状況を含めたRuntimeError）"""
+    required_columns = FeatureConverter.RACE_KEY_REQUIRED_COLUMNS
+    
+    # 年月日カラムがないデータタイプ（KYI等）の場合は、BACデータから日付を取得
+    use_bac_date = bac_df is not None and "年月日" not in df.columns
+    try:
+        df = FeatureConverter.add_race_key_to_df(df, bac_df=bac_df, use_bac_date=use_bac_date)
+    except Exception as e:
+        na_counts = {c: int(df[c].isna().sum()) for c in required_columns if c in df.columns}
+        sample = df[required_columns].head(5).to_dict(orient="records")
+        raise RuntimeError(
+            f"race_key追加に失敗しました: dataType={data_type_str}, use_bac_date={use_bac_date}, "
+            f"na_counts={na_counts}, sample_required_rows={sample}"
+        ) from e
+    
+    if "race_key" not in df.columns:
+        logger.error(f"データタイプ '{data_type_str}' にrace_keyの追加に失敗しました。利用可能なカラム: {list(df.columns)[:10]}")
+        raise ValueError(f"データタイプ '{data_type_str}' にrace_keyの追加に失敗しました。")
+    return df
+
+
+def _add_race_key_to_table(table: pa.Table, data_type_str: str, bac_df: Optional[pd.DataFrame]) -> pa.Table:
+    """Tableにrace_keyと年月日を追加（pandasに変換するのはrace_keyの生成に必要なカラムのみ）"""
+    keyColumns = FeatureConverter.RACE_KEY_REQUIRED_COLUMNS + (["年月日"] if "年月日" in table.column_names else [])
+    keyDf = _add_race_key(table.select(keyColumns).to_pandas(), data_type_str, bac_df)
+    if len(keyDf) != table.num_rows:
+        raise ValueError(f"race_key追加で行数が変わりました（BACの日付マッピングに重複キーがある可能性があります）: dataType={data_type_str}, {table.num_rows} -> {len(keyDf)}")
+    
+    table = _set_column(table, "年月日", pa.array(keyDf["年月日"].to_numpy(dtype=np.int64)))
+    return _set_column(table, "race_key", pa.array(keyDf["race_key"], type=pa.string()))
+
+
+def _set_column(table: pa.Table, name: str, values: pa.Array) -> pa.Table:
+    """同名カラムがあれば同じ位置で置き換え、なければ末尾に追加"""
+    index = table.schema.get_field_index(name)
+    if index >= 0:
+        return table.set_column(index, name, values)
+    return table.append_column(name, values)
+
+
 def extract_and_parse_lzh_data(
     lzhBuffer: bytes,
     dataType: Optional[Union[JRDBDataType, str]]
-) -> tuple[Union[JRDBDataType, str], List[Dict[str, Union[int, str, None]]]]:
+) -> tuple[Union[JRDBDataType, str], pa.Table]:
     """LZHファイルからデータを抽出・パースする共通処理
     年度パック（複数ファイルを含む）にも対応
+    各ファイルは列指向デコーダーでpyarrow Tableに変換し、最後に1回だけ結合する
     
     Args:
         lzhBuffer: LZHファイルのバイト列
         dataType: データタイプ（オプション）
     
     Returns:
-        (実際のデータタイプ, レコード配列)
+        (実際のデータタイプ, パース済みレコードのpyarrow Table)
     
     Raises:
         ValueError: 展開やパースに失敗した場合
@@ -110,26 +248,30 @@ def extract_and_parse_lzh_data(
     extractedFiles = extract_lzh_file(lzhBuffer)
     if not extractedFiles:
         raise ValueError('展開されたファイルが見つかりません')
+    actualDataType = _resolve_data_type(extractedFiles[0][1], dataType)
     
-    # データタイプを決定（最初のファイルから推測、または引数で指定）
-    if dataType is not None:
-        actualDataType = dataType
-    else:
-        extractedDataType = extract_data_type_from_file_name(extractedFiles[0][1])
-        if not extractedDataType:
-            raise ValueError(f'データ種別の推測に失敗しました。ファイル名: {extractedFiles[0][1]}')
-        actualDataType = extractedDataType
-    
-    # すべてのファイルをパースしてレコードを結合
-    allRecords: List[Dict[str, Union[int, str, None]]] = []
-    for extractedBuffer, _ in extractedFiles:
-        fileRecords = parse_jrdb_data_from_buffer(extractedBuffer, actualDataType)
-        allRecords.extend(fileRecords)
-    
-    if len(allRecords) == 0:
+    # すべてのファイルをパースしてレコードを結合（フォーマット定義から型が決まるため、スキーマは全ファイルで共通）
+    fileTables = [parse_jrdb_table_from_buffer(extractedBuffer, actualDataType) for extractedBuffer, _ in extractedFiles]
+    fileTables = [table for table in fileTables if table.num_rows > 0]
+    
+    if len(fileTables) == 0:
         raise ValueError('パースされたレコードが0件です')
     
-    return (actualDataType, allRecords)
+    return (actualDataType, pa.concat_tables(fileTables))
+
+
+def _resolve_data_type(
+    firstFileName: str,
+    dataType: Optional[Union[JRDBDataType, str]]
+) -> Union[JRDBDataType, str]:
+    """データタイプを決定（引数で指定、または展開した最初のファイル名から推測）"""
+    if dataType is not None:
+        return dataType
+    
+    extractedDataType = extract_data_type_from_file_name(firstFileName)
+    if not extractedDataType:
+        raise ValueError(f'データ種別の推測に失敗しました。ファイル名: {firstFileName}')
+    return extractedDataType
 
 
 def convert_lzh_to_parquet(
@@ -137,9 +279,12 @@ def convert_lzh_to_parquet(
     dataType: Optional[Union[JRDBDataType, str]],
     year: int,
     outputFilePath: Union[str, Path],
-    bac_df: Optional[pd.DataFrame] = None
-) -> tuple[Union[JRDBDataType, str], List[Dict[str, Union[int, str, None]]]]:
-    """lzhファイルからParquetファイルへの変換処理
+    bac_df: Optional[pd.DataFrame] = None,
+    batchSize: int = PARQUET_BATCH_SIZE
+) -> tuple[Union[JRDBDataType, str], int]:
+    """lzhファイルからParquetファイルへの変換処理（ストリーミング）
+    書庫のメンバーを展開した順にbatchSizeレコードずつパースし、race_keyを付与して順にParquetへ追記する。
+    年度パック全体をメモリに展開しないため、ピークメモリはパック内のレコード数によらずほぼ一定
     
     Args:
         lzhBuffer: LZHファイルのバイト列
@@ -147,11 +292,23 @@ def convert_lzh_to_parquet(
         year: 年
         outputFilePath: 出力Parquetファイルパス
         bac_df: BACデータ（KYI等の年月日がないデータタイプのrace_key生成に使用、オプション）
+        batchSize: 1チャンクあたりのレコード数（Parquetの行グループサイズ）
     
     Returns:
-        (実際のデータタイプ, レコード配列)
+        (実際のデータタイプ, 書き込んだレコード数)
+    
+    Raises:
+        ValueError: 展開やパースに失敗した場合、レコードが0件の場合
     """
-    actualDataType, records = extract_and_parse_lzh_data(lzhBuffer, dataType)
-    convert_to_parquet(records, outputFilePath, dataType=actualDataType, bac_df=bac_df)
-    return (actualDataType, records)
-
+    extractedFiles = iter_lzh_file(lzhBuffer)
+    firstFile = next(extractedFiles, None)
+    if firstFile is None:
+        raise ValueError('展開されたファイルが見つかりません')
+    actualDataType = _resolve_data_type(firstFile[1], dataType)
+    
+    tables = (table for extractedBuffer, _ in itertools.chain([firstFile], extractedFiles) for table in iter_jrdb_tables_from_buffer(extractedBuffer, actualDataType, batchSize))
+    recordCount = write_tables_to_parquet(tables, outputFilePath, dataType=actualDataType, bac_df=bac_df, rowGroupSize=batchSize)
+    if recordCount == 0:
+        raise ValueError('パースされたレコードが0件です')
+    
+    return (actualDataType, recordCount)
@@ -0,0 +1,420 @@
+"""JRDBダウンロードマネージャー
+複数のURLをスレッドプールで並列にダウンロードし、ファイルに保存する
+
+- 接続の再利用: スレッドごとにホスト単位のHTTP接続（keep-alive）を保持する
+- リトライ: 接続エラー・タイムアウト・408/429/5xxは指数バックオフ（ジッター付き）で再試行する
+- 再開: 途中までのデータは `{ファイル名}.part` に残し、Rangeリクエスト（If-Range付き）で続きから取得する
+- 取得済みの省略: ETag/Last-Modifiedを `{ファイル名}.meta.json` に保存し、条件付きリクエストで304の場合は再取得しない
+"""
+
+import base64
+import http.client
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+from .downloader import extract_file_name_from_url, get_jrdb_credentials
+
+logger = logging.getLogger(__name__)
+
+# 同時ダウンロード数のデフォルト（JRDBサーバーへの負荷を考慮して小さめにする）
+DEFAULT_MAX_WORKERS = 4
+
+# ダウンロード結果のステータス
+STATUS_DOWNLOADED = 'downloaded'
+STATUS_RESUMED = 'resumed'
+STATUS_NOT_MODIFIED = 'not_modified'
+
+# 途中までのデータと検証用メタデータのファイル名サフィックス
+PART_SUFFIX = '.part'
+META_SUFFIX = '.meta.json'
+
+# 再試行するHTTPステータス
+RETRYABLE_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+
+_REDIRECT_STATUSES = frozenset({301, 302, 303, 307, 308})
+_MAX_REDIRECTS = 10
+_CHUNK_SIZE = 1 << 20
+_CONTENT_RANGE_PATTERN = re.compile(r'bytes\s+(\d+)-(\d+)/(\d+|\*)')
+
+DownloadResult = Dict[str, Union[str, int, float, bool, None]]
+
+
+class DownloadError(Exception):
+    """ダウンロードの失敗（retryable=Trueの場合は再試行する）"""
+
+    def __init__(self, message: str, retryable: bool = False, retryAfter: Optional[float] = None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retryAfter = retryAfter
+
+
+class DownloadManager:
+    """複数ファイルの並列ダウンロード（接続の再利用・リトライ・再開・条件付きリクエスト）
+
+    Args:
+        maxWorkers: 同時ダウンロード数
+        maxRetries: 1ファイルあたりの再試行回数（初回を含まない）
+        backoffSeconds: 1回目の再試行までの待機秒数（以降は2倍ずつ増加）
+        maxBackoffSeconds: 再試行までの待機秒数の上限
+        timeout: ソケットのタイムアウト秒数
+        username: Basic認証のユーザー名（オプション）
+        password: Basic認証のパスワード（オプション）
+    """
+
+    def __init__(
+        self,
+        maxWorkers: int = DEFAULT_MAX_WORKERS,
+        maxRetries: int = 3,
+        backoffSeconds: float = 1.0,
+        maxBackoffSeconds: float = 30.0,
+        timeout: float = 60.0,
+        username: Optional[str] = None,
+        password: Optional[str] = None
+    ):
+        if maxWorkers < 1: raise ValueError(f'maxWorkersは1以上である必要があります: {maxWorkers}')
+        if maxRetries < 0: raise ValueError(f'maxRetriesは0以上である必要があります: {maxRetries}')
+
+        self.maxWorkers = maxWorkers
+        self.maxRetries = maxRetries
+        self.backoffSeconds = backoffSeconds
+        self.maxBackoffSeconds = maxBackoffSeconds
+        self.timeout = timeout
+        self._authorization: Optional[str] = None
+        if username and password:
+            token = base64.b64encode(f'{username}:{password}'.encode('utf-8')).decode('utf-8')
+            self._authorization = f'Basic {token}'
+
+        self._local = threading.local()
+        self._connectionsLock = threading.Lock()
+        self._allConnections: List[http.client.HTTPConnection] = []
+
+    def __enter__(self) -> 'DownloadManager':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """全スレッドで開いたHTTP接続を閉じる"""
+        with self._connectionsLock:
+            connections, self._allConnections = self._allConnections, []
+        for connection in connections:
+            connection.close()
+
+    def download_many(self, requests: Sequence[Tuple[str, Union[str, Path]]]) -> List[DownloadResult]:
+        """複数のURLを並列にダウンロード
+
+        Args:
+            requests: (URL, 保存先ファイルパス) のリスト
+
+        Returns:
+            requestsと同じ順序の結果辞書のリスト（失敗したファイルもsuccess=Falseの結果として含む）
+        """
+        if not requests:
+            return []
+
+        logger.info('並列ダウンロード開始', extra={'fileCount': len(requests), 'maxWorkers': self.maxWorkers})
+        if self.maxWorkers == 1 or len(requests) == 1:
+            results = [self.download(url, outputPath) for url, outputPath in requests]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.maxWorkers, len(requests)), thread_name_prefix='jrdb-download') as executor:
+                results = list(executor.map(lambda request: self.download(*request), requests))
+
+        logger.info('並列ダウンロード完了', extra={
+            'fileCount': len(results),
+            'successCount': sum(1 for r in results if r['success']),
+            'notModifiedCount': sum(1 for r in results if r.get('status') == STATUS_NOT_MODIFIED)
+        })
+        return results
+
+    def download(self, url: str, outputPath: Union[str, Path]) -> DownloadResult:
+        """1ファイルをダウンロード（失敗しても例外は送出せず、success=Falseの結果を返す）
+
+        Args:
+            url: ダウンロードするURL
+            outputPath: 保存先ファイルパス
+
+        Returns:
+            結果辞書（url, outputPath, success, status, size, attempts, elapsedSeconds, 失敗時はerror）
+        """
+        outputPath = Path(outputPath)
+        outputPath.parent.mkdir(parents=True, exist_ok=True)
+        startTime = time.perf_counter()
+
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                status, size = self._fetch(url, outputPath)
+                logger.info('ダウンロード完了', extra={'url': url, 'outputPath': str(outputPath), 'status': status, 'size': size, 'attempts': attempt})
+                return {
+                    'url': url,
+                    'outputPath': str(outputPath),
+                    'success': True,
+                    'status': status,
+                    'size': size,
+                    'attempts': attempt,
+                    'elapsedSeconds': time.perf_counter() - startTime
+                }
+            except (DownloadError, OSError, http.client.HTTPException) as error:
+                retryable = error.retryable if isinstance(error, DownloadError) else True
+                if not retryable or attempt > self.maxRetries:
+                    logger.error('ダウンロードエラー', extra={'url': url, 'attempts': attempt, 'error': str(error)})
+                    return {
+                        'url': url,
+                        'outputPath': str(outputPath),
+                        'success': False,
+                        'status': None,
+                        'size': 0,
+                        'attempts': attempt,
+                        'elapsedSeconds': time.perf_counter() - startTime,
+                        'error': f'{type(error).__name__}: {error}'
+                    }
+
+                delay = self._backoff_delay(attempt, error.retryAfter if isinstance(error, DownloadError) else None)
+                logger.warning('ダウンロードを再試行します', extra={'url': url, 'attempt': attempt, 'delaySeconds': delay, 'error': str(error)})
+                time.sleep(delay)
+
+    def _backoff_delay(self, attempt: int, retryAfter: Optional[float]) -> float:
+        """attempt回目の失敗後の待機秒数（指数バックオフ + ジッター、Retry-Afterがあればそれ以上待つ）"""
+        delay = min(self.maxBackoffSeconds, self.backoffSeconds * (2 ** (attempt - 1)))
+        delay *= 0.5 + random.random() / 2
+        if retryAfter is not None:
+            delay = max(delay, min(retryAfter, self.maxBackoffSeconds))
+        return delay
+
+    def _fetch(self, url: str, outputPath: Path) -> Tuple[str, int]:
+        """リダイレクトを辿って1回ダウンロードを試行し、(ステータス, ファイルサイズ) を返す"""
+        partPath = outputPath.with_name(outputPath.name + PART_SUFFIX)
+        meta = load_download_meta(outputPath)
+
+        # 途中までのデータがあり、同じ内容であることを検証できる場合は続きから取得する
+        offset = partPath.stat().st_size if partPath.exists() else 0
+        partValidator = meta.get('partEtag') or meta.get('partLastModified')
+        if offset > 0 and not partValidator:
+            partPath.unlink()
+            offset = 0
+
+        headers = {'User-Agent': 'Mozilla/5.0', 'Accept-Encoding': 'identity'}
+        if self._authorization:
+            headers['Authorization'] = self._authorization
+        if offset > 0:
+            headers['Range'] = f'bytes={offset}-'
+            headers['If-Range'] = partValidator
+        elif outputPath.exists():
+            if meta.get('etag'): headers['If-None-Match'] = meta['etag']
+            if meta.get('lastModified'): headers['If-Modified-Since'] = meta['lastModified']
+
+        for _ in range(_MAX_REDIRECTS + 1):
+            # リダイレクト先に進む前に、レスポンスは要求したホストの接続として解放する
+            requestUrl = url
+            connection, response = self._request(requestUrl, headers)
+            try:
+                if response.status in _REDIRECT_STATUSES:
+                    location = response.getheader('Location')
+                    if not location:
+                        raise DownloadError(f'リダイレクト先が見つかりません: {url}')
+                    redirectUrl = urllib.parse.urljoin(url, location)
+                    if urllib.parse.urlsplit(redirectUrl).netloc != urllib.parse.urlsplit(url).netloc:
+                        # 別のホストにはJRDBの認証情報を送らない
+                        headers.pop('Authorization', None)
+                    url = redirectUrl
+                    continue
+
+                if response.status == 304 and ('If-None-Match' in headers or 'If-Modified-Since' in headers):
+                    return STATUS_NOT_MODIFIED, outputPath.stat().st_size
+
+                if response.status == 416 and offset > 0:
+                    # 途中までのデータがサーバー上のファイルより大きい（ファイルが差し替えられた）ため最初から取得し直す
+                    partPath.unlink(missing_ok=True)
+                    raise DownloadError(f'Range指定が不正なため最初から再取得します: {url}', retryable=True, retryAfter=0)
+
+                if response.status in RETRYABLE_STATUSES:
+                    raise DownloadError(f'HTTP {response.status}: {url}', retryable=True, retryAfter=_parse_retry_after(response.getheader('Retry-After')))
+
+                if response.status == 206 and offset > 0:
+                    if _content_range_start(response.getheader('Content-Range')) != offset:
+                        partPath.unlink(missing_ok=True)
+                        raise DownloadError(f'Content-Rangeが要求と一致しません: {url}', retryable=True, retryAfter=0)
+                    size = self._write_body(response, partPath, meta, outputPath, append=True)
+                    return STATUS_RESUMED, self._complete(partPath, outputPath, meta, url, size)
+
+                if response.status == 200:
+                    size = self._write_body(response, partPath, meta, outputPath, append=False)
+                    return STATUS_DOWNLOADED, self._complete(partPath, outputPath, meta, url, size)
+
+                raise DownloadError(f'HTTP {response.status}: {url}')
+            finally:
+                self._release(connection, response, requestUrl)
+
+        raise DownloadError(f'リダイレクトが多すぎます: {url}')
+
+    def _write_body(self, response: http.client.HTTPResponse, partPath: Path, meta: Dict[str, Optional[str]], outputPath: Path, append: bool) -> int:
+        """レスポンス本文を.partファイルに書き込み、書き込み後の.partファイルのサイズを返す
+        中断時に続きから取得できるよう、書き込み前に検証用のETag/Last-Modifiedを保存する
+        """
+        if not append:
+            meta['partEtag'] = response.getheader('ETag')
+            meta['partLastModified'] = response.getheader('Last-Modified')
+            save_download_meta(outputPath, meta)
+
+        expectedLength = response.getheader('Content-Length')
+        received = 0
+        with open(partPath, 'ab' if append else 'wb') as f:
+            while True:
+                chunk = response.read(_CHUNK_SIZE)
+                if not chunk:
+                    break
+                f.write(chunk)
+                received += len(chunk)
+
+        if expectedLength is not None and received < int(expectedLength):
+            raise DownloadError(f'受信データが不足しています（{received}/{expectedLength}バイト）', retryable=True)
+        return partPath.stat().st_size
+
+    def _complete(self, partPath: Path, outputPath: Path, meta: Dict[str, Optional[str]], url: str, size: int) -> int:
+        """.partファイルを保存先に置き換え、ETag/Last-Modifiedを完了済みファイルのものとして記録"""
+        os.replace(partPath, outputPath)
+        save_download_meta(outputPath, {
+            'url': url,
+            'etag': meta.get('partEtag'),
+            'lastModified': meta.get('partLastModified'),
+            'size': size,
+            'downloadedAt': datetime.now(timezone.utc).isoformat(timespec='seconds')
+        })
+        return size
+
+    def _request(self, url: str, headers: Dict[str, str]) -> Tuple[http.client.HTTPConnection, http.client.HTTPResponse]:
+        """スレッドの保持する接続でGETリクエストを送信（切断済みの再利用接続は1回だけ張り直す）"""
+        parsed = urllib.parse.urlsplit(url)
+        if parsed.scheme not in ('http', 'https'):
+            raise DownloadError(f'未対応のURLスキームです: {url}')
+        target = urllib.parse.urlunsplit(('', '', parsed.path or '/', parsed.query, ''))
+
+        for reused in (True, False):
+            connection, isReused = self._get_connection(parsed.scheme, parsed.netloc)
+            try:
+                connection.request('GET', target, headers=headers)
+                return connection, connection.getresponse()
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                # keep-alive接続がサーバー側で閉じられていた場合は新しい接続で送り直す
+                self._drop_connection(parsed.scheme, parsed.netloc)
+                if not (reused and isReused):
+                    raise
+            except Exception:
+                self._drop_connection(parsed.scheme, parsed.netloc)
+                raise
+        raise AssertionError('unreachable')
+
+    def _get_connection(self, scheme: str, netloc: str) -> Tuple[http.client.HTTPConnection, bool]:
+        """スレッドごと・ホストごとのHTTP接続を返す（(接続, 再利用かどうか)）"""
+        connections = self._connections()
+        key = (scheme, netloc)
+        if key in connections:
+            return connections[key], True
+
+        connectionClass = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        connection = connectionClass(netloc, timeout=self.timeout)
+        connections[key] = connection
+        with self._connectionsLock:
+            self._allConnections.append(connection)
+        return connection, False
+
+    def _release(self, connection: http.client.HTTPConnection, response: http.client.HTTPResponse, url: str) -> None:
+        """レスポンスを読み切って接続を再利用可能にする（読み切れない・サーバーが閉じる場合は接続を破棄）"""
+        parsed = urllib.parse.urlsplit(url)
+        try:
+            response.read()
+        except (OSError, http.client.HTTPException):
+            self._drop_connection(parsed.scheme, parsed.netloc)
+            return
+        if response.will_close:
+            self._drop_connection(parsed.scheme, parsed.netloc)
+
+    def _drop_connection(self, scheme: str, netloc: str) -> None:
+        connection = self._connections().pop((scheme, netloc), None)
+        if connection is None:
+            return
+        connection.close()
+        with self._connectionsLock:
+            if connection in self._allConnections:
+                self._allConnections.remove(connection)
+
+    def _connections(self) -> Dict[Tuple[str, str], http.client.HTTPConnection]:
+        if not hasattr(self._local, 'connections'):
+            self._local.connections = {}
+        return self._local.connections
+
+
+def load_download_meta(outputPath: Union[str, Path]) -> Dict[str, Optional[str]]:
+    """保存先ファイルに対応するメタデータ（ETag/Last-Modified等）を読み込む（存在しない・壊れている場合は空）"""
+    metaPath = Path(str(outputPath) + META_SUFFIX)
+    if not metaPath.exists():
+        return {}
+    try:
+        with open(metaPath, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_download_meta(outputPath: Union[str, Path], meta: Dict[str, Optional[str]]) -> None:
+    """保存先ファイルに対応するメタデータを保存（一時ファイル経由で置き換え）"""
+    metaPath = Path(str(outputPath) + META_SUFFIX)
+    temporaryPath = metaPath.with_name(metaPath.name + '.tmp')
+    with open(temporaryPath, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    os.replace(temporaryPath, metaPath)
+
+
+def download_jrdb_files(
+    urls: Sequence[str],
+    outputDir: Union[str, Path],
+    maxWorkers: int = DEFAULT_MAX_WORKERS,
+    maxRetries: int = 3
+) -> List[DownloadResult]:
+    """JRDBの複数のURLを並列にダウンロードしてoutputDirに保存（ファイル名はURLのファイル名）
+    認証情報は環境変数から取得
+
+    Args:
+        urls: ダウンロードするURLのリスト
+        outputDir: 保存先ディレクトリ
+        maxWorkers: 同時ダウンロード数
+        maxRetries: 1ファイルあたりの再試行回数
+
+    Returns:
+        urlsと同じ順序の結果辞書のリスト
+
+    Raises:
+        ValueError: 環境変数が設定されていない場合
+    """
+    username, password = get_jrdb_credentials()
+    outputPath = Path(outputDir)
+    with DownloadManager(maxWorkers=maxWorkers, maxRetries=maxRetries, username=username, password=password) as manager:
+        return manager.download_many([(url, outputPath / extract_file_name_from_url(url)) for url in urls])
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-Afterヘッダー（秒数形式のみ対応）"""
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+def _content_range_start(value: Optional[str]) -> Optional[int]:
+    """Content-Rangeヘッダーの開始位置"""
+    match = _CONTENT_RANGE_PATTERN.match(value or '')
+    return int(match.group(1)) if match else None
@@ -7,11 +7,29 @@ import logging
 import os
 import urllib.parse
 import urllib.request
-from typing import Optional
+from typing import Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
 
+def get_jrdb_credentials() -> Tuple[str, str]:
+    """環境変数からJRDBの認証情報を取得
+    
+    Returns:
+        (ユーザー名, パスワード)
+    
+    Raises:
+        ValueError: 環境変数が設定されていない場合
+    """
+    jrdbUsername = os.getenv('JRDB_USERNAME')
+    jrdbPassword = os.getenv('JRDB_PASSWORD')
+    
+    if not jrdbUsername or not jrdbPassword:
+        raise ValueError('JRDB_USERNAME and JRDB_PASSWORD environment variables are required')
+    
+    return jrdbUsername, jrdbPassword
+
+
 def download_jrdb_file(url: str) -> bytes:
     """JRDBのURLからlzhファイルをダウンロード
     認証が必要な場合は環境変数から取得
@@ -26,11 +44,7 @@ def download_jrdb_file(url: str) -> bytes:
         ValueError: 環境変数が設定されていない場合
         Exception: ダウンロードに失敗した場合
     """
-    jrdbUsername = os.getenv('JRDB_USERNAME')
-    jrdbPassword = os.getenv('JRDB_PASSWORD')
-    
-    if not jrdbUsername or not jrdbPassword:
-        raise ValueError('JRDB_USERNAME and JRDB_PASSWORD environment variables are required')
+    jrdbUsername, jrdbPassword = get_jrdb_credentials()
     
     logger.info('Downloading JRDB file', extra={'url': url})
     
@@ -4,10 +4,17 @@
 
 import logging
 from pathlib import Path
-from typing import Dict, List, Optional, Union
+from typing import Dict, List, Optional, Tuple, Union
 
-from .converter import convert_lzh_to_parquet
+import pandas as pd
+import pyarrow.parquet as pq
+
+from .converter import convert_lzh_to_parquet, requires_bac_date
+from .download_manager import DEFAULT_MAX_WORKERS, download_jrdb_files
 from .downloader import download_jrdb_file
+from .parquet_manifest import build_fingerprint, compute_hash, is_up_to_date, load_manifest, record_outputs
+from .partitioned_dataset import LAYOUT_FLAT, get_output_name, publish_output
+from src.utils.feature_converter import FeatureConverter
 from .entities.jrdb import (
     JRDBDataType,
     generate_annual_pack_url,
@@ -22,14 +29,22 @@ logger = logging.getLogger(__name__)
 def fetch_single_annual_data_type(
     year: int,
     dataType: JRDBDataType,
-    outputDir: Union[str, Path]
+    outputDir: Union[str, Path],
+    force: bool = False,
+    lzhFilePath: Optional[Union[str, Path]] = None,
+    layout: str = LAYOUT_FLAT
 ) -> Dict[str, Union[str, int, bool, Optional[str]]]:
     """単一のデータタイプの年度パックを取得してParquetに保存（内部関数）
+    ダウンロードしたLZH・フォーマット定義・コンバーターのバージョンがマニフェストと一致する場合は再変換しない
+    KYI等のrace_key生成にBACの年月日が必要なデータタイプは、同じ年度の変換済みBACを使い、そのハッシュも変換条件に含める
     
     Args:
         year: 年度（例: 2024）
         dataType: データタイプ
         outputDir: 出力ディレクトリ
+        force: Trueの場合はマニフェストに関係なく再変換する
+        lzhFilePath: ダウンロード済みの年度パックLZHファイル（指定しない場合はここでダウンロードする）
+        layout: 出力形式（'flat': {データタイプ}_{年度}.parquet、'partitioned': type=/year=/month=のパーティション）
     
     Returns:
         結果辞書
@@ -52,8 +67,12 @@ def fetch_single_annual_data_type(
             'sourceUrl': sourceUrl
         })
         
-        lzhBuffer = download_jrdb_file(sourceUrl)
-        logger.info('年度パックLZHファイルをダウンロードしました', extra={
+        if lzhFilePath is not None:
+            with open(lzhFilePath, 'rb') as f:
+                lzhBuffer = f.read()
+        else:
+            lzhBuffer = download_jrdb_file(sourceUrl)
+        logger.info('年度パックLZHファイルを取得しました', extra={
             'dataType': actualDataType,
             'year': year,
             'url': sourceUrl,
@@ -62,16 +81,42 @@ def fetch_single_annual_data_type(
         
         fileName = f'{actualDataType}_{year}'
         parquetFilePath = outputPath / f'{fileName}.parquet'
+        outputName = get_output_name(actualDataType, year, layout)
+        
+        manifest = load_manifest(outputPath)
+        bacHash, bacDf = _load_bac_dependency(manifest, outputPath, dataType, year, layout)
+        dependencyHashes = {JRDBDataType.BAC.value: bacHash} if bacHash is not None else None
+        fingerprint = build_fingerprint(compute_hash(lzhBuffer), dataType, dependencyHashes)
+        if not force and is_up_to_date(manifest, outputPath, outputName, fingerprint):
+            recordCount = int(manifest[outputName].get('recordCount', 0))
+            logger.info('変換済みのため再変換を省略します', extra={
+                'dataType': actualDataType,
+                'year': year,
+                'recordCount': recordCount,
+                'outputPath': str(outputPath / outputName)
+            })
+            return {
+                'year': year,
+                'dataType': actualDataType,
+                'success': True,
+                'recordCount': recordCount,
+                'outputPath': str(outputPath / outputName),
+                'fileName': fileName,
+                'skipped': True
+            }
         
-        _, records = convert_lzh_to_parquet(lzhBuffer, actualDataType, year, parquetFilePath)
+        _, recordCount = convert_lzh_to_parquet(lzhBuffer, actualDataType, year, parquetFilePath, bac_df=bacDf)
         
-        if len(records) == 0:
+        if recordCount == 0:
             raise ValueError('パースされたレコードが0件です')
         
+        parquetFilePath = publish_output(parquetFilePath, outputPath, actualDataType, year, layout)
+        record_outputs(outputPath, {outputName: {**fingerprint, 'dataType': actualDataType, 'year': year, 'recordCount': recordCount}})
+        
         logger.info('年度パックデータ取得完了', extra={
             'dataType': actualDataType,
             'year': year,
-            'recordCount': len(records),
+            'recordCount': recordCount,
             'outputPath': str(parquetFilePath)
         })
         
@@ -79,9 +124,10 @@ def fetch_single_annual_data_type(
             'year': year,
             'dataType': actualDataType,
             'success': True,
-            'recordCount': len(records),
+            'recordCount': recordCount,
             'outputPath': str(parquetFilePath),
-            'fileName': fileName
+            'fileName': fileName,
+            'skipped': False
         }
     except Exception as error:
         errorMessage = str(error)
@@ -103,14 +149,23 @@ def fetch_single_annual_data_type(
 def fetch_annual_data(
     year: int,
     dataTypes: List[JRDBDataType],
-    outputDir: Union[str, Path] = 'cache/jrdb/parquet'
+    outputDir: Union[str, Path] = 'cache/jrdb/parquet',
+    force: bool = False,
+    downloadDir: Optional[Union[str, Path]] = None,
+    maxWorkers: int = DEFAULT_MAX_WORKERS,
+    layout: str = LAYOUT_FLAT
 ) -> List[Dict[str, Union[str, int, bool, Optional[str]]]]:
     """年度単位で指定されたデータタイプの年度パックを取得してParquetに保存
+    年度パックは先にまとめて並列ダウンロードし、サーバー上で更新されていないLZHは再取得しない
     
     Args:
         year: 年度（例: 2024）
         dataTypes: データタイプの配列（年度パックをサポートしているもののみ処理される）
         outputDir: 出力ディレクトリ（デフォルト: 'cache/jrdb/parquet'）
+        force: Trueの場合はマニフェストに関係なく再変換する
+        downloadDir: 年度パックLZHの保存先（デフォルト: outputDirと同じ階層の 'lzh/{year}'）
+        maxWorkers: 同時ダウンロード数
+        layout: 出力形式（'flat'または'partitioned'）
     
     Returns:
         結果のリスト
@@ -137,11 +192,27 @@ def fetch_annual_data(
             'supportedDataTypes': [dt.value for dt in supportedDataTypes]
         })
     
+    # KYI等はBACの年月日でrace_keyを作るため、BACを先に変換する
+    supportedDataTypes = sorted(supportedDataTypes, key=lambda dt: dt != JRDBDataType.BAC)
+    
+    lzhFilePaths = _download_annual_packs(year, supportedDataTypes, downloadDir if downloadDir is not None else Path(outputDir).parent / 'lzh' / str(year), maxWorkers)
+    
     results: List[Dict[str, Union[str, int, bool, Optional[str]]]] = []
     
     for dataType in supportedDataTypes:
+        if dataType in lzhFilePaths and not lzhFilePaths[dataType]['success']:
+            results.append({
+                'year': year,
+                'dataType': dataType.value,
+                'success': False,
+                'recordCount': 0,
+                'error': lzhFilePaths[dataType]['error']
+            })
+            continue
+        
         try:
-            result = fetch_single_annual_data_type(year, dataType, outputDir)
+            lzhFilePath = lzhFilePaths[dataType]['outputPath'] if dataType in lzhFilePaths else None
+            result = fetch_single_annual_data_type(year, dataType, outputDir, force=force, lzhFilePath=lzhFilePath, layout=layout)
             results.append(result)
         except Exception as error:
             errorMessage = str(error)
@@ -167,3 +238,49 @@ def fetch_annual_data(
     
     return results
 
+
+def _load_bac_dependency(
+    manifest: Dict,
+    outputPath: Path,
+    dataType: JRDBDataType,
+    year: int,
+    layout: str
+) -> Tuple[Optional[str], Optional[pd.DataFrame]]:
+    """race_key生成にBACの年月日が必要なデータタイプの場合、同じ年度の変換済みBACのハッシュと日付マッピングを取得
+    （convert_local_folder_to_parquetと同じく、BACの変換元LZHのハッシュを依存ハッシュとする）
+    
+    Returns:
+        (BACの変換元LZHのハッシュ, race_key生成用のBACの日付マッピング)のタプル（不要・BACが未変換の場合は(None, None)）
+    """
+    if not requires_bac_date(dataType):
+        return (None, None)
+    bacOutputName = get_output_name(JRDBDataType.BAC.value, year, layout)
+    entry = manifest.get(bacOutputName)
+    if entry is None or not (outputPath / bacOutputName).exists():
+        logger.warning('変換済みのBACがないため、BACの年月日を使わずにrace_keyを生成します', extra={'year': year, 'dataType': dataType.value})
+        return (None, None)
+    
+    columns = FeatureConverter.RACE_KEY_REQUIRED_COLUMNS + ['年月日']
+    bacDf = pq.read_table(str(outputPath / bacOutputName), columns=columns).to_pandas()
+    return (entry.get('sourceHash'), bacDf)
+
+
+def _download_annual_packs(
+    year: int,
+    dataTypes: List[JRDBDataType],
+    downloadDir: Union[str, Path],
+    maxWorkers: int
+) -> Dict[JRDBDataType, Dict[str, Union[str, int, float, bool, None]]]:
+    """年度パックLZHをまとめて並列ダウンロード（データタイプ → ダウンロード結果）
+    認証情報がない等で一括ダウンロードできない場合は空を返し、データタイプごとの取得に任せる
+    """
+    urls = [generate_annual_pack_url(dataType, year) for dataType in dataTypes]
+    try:
+        downloads = download_jrdb_files(urls, downloadDir, maxWorkers=maxWorkers)
+    except Exception as error:
+        logger.warning('年度パックの一括ダウンロードができないため、データタイプごとに取得します', extra={
+            'year': year,
+            'error': str(error)
+        })
+        return {}
+    return dict(zip(dataTypes, downloads, strict=True))
@@ -10,7 +10,8 @@ from typing import Dict, List, Optional, Union
 import pandas as pd
 
 from .converter import convert_lzh_to_parquet
-from .downloader import download_jrdb_file
+from .download_manager import DEFAULT_MAX_WORKERS, download_jrdb_files
+from .downloader import download_jrdb_file, extract_file_name_from_url
 from .entities.jrdb import JRDBDataType
 from .race_key_generator import generate_jrdb_data_file_url
 from .utils.date_formatter import create_date_from_ymd, format_date_iso, format_date_jrdb
@@ -25,7 +26,8 @@ def fetch_single_data_type(
     dataType: JRDBDataType,
     outputDir: Union[str, Path],
     dateStr: str,
-    bac_df: Optional[pd.DataFrame] = None
+    bac_df: Optional[pd.DataFrame] = None,
+    downloaded: bool = False
 ) -> Dict[str, Union[str, int, bool, Optional[str]]]:
     """単一のデータタイプのデータを取得してParquetに保存（内部関数）
     
@@ -37,6 +39,7 @@ def fetch_single_data_type(
         outputDir: 出力ディレクトリ
         dateStr: 日付文字列（ISO形式）
         bac_df: BACデータ（KYI等の年月日がないデータタイプのrace_key生成に使用、オプション）
+        downloaded: TrueのときはoutputDirにダウンロード済みのLZHファイルを使用する
     
     Returns:
         結果辞書
@@ -50,26 +53,30 @@ def fetch_single_data_type(
         actualDataType = dataType.value
         dateObj = create_date_from_ymd(year, month, day)
         dateStrJRDB = format_date_jrdb(year, month, day)
-        sourceUrl = generate_jrdb_data_file_url(actualDataType, dateObj)
-        lzhBuffer = download_jrdb_file(sourceUrl)
         fileName = f'{actualDataType}{dateStrJRDB}'
         
         # LZHファイルも保存（PredictionExecutorで使用するため）
         lzhFilePath = outputPath / f'{fileName}.lzh'
-        with open(lzhFilePath, 'wb') as f:
-            f.write(lzhBuffer)
+        if downloaded:
+            with open(lzhFilePath, 'rb') as f:
+                lzhBuffer = f.read()
+        else:
+            sourceUrl = generate_jrdb_data_file_url(actualDataType, dateObj)
+            lzhBuffer = download_jrdb_file(sourceUrl)
+            with open(lzhFilePath, 'wb') as f:
+                f.write(lzhBuffer)
         
         # Parquetファイルも保存
         parquetFilePath = outputPath / f'{fileName}.parquet'
-        _, records = convert_lzh_to_parquet(lzhBuffer, actualDataType, year, parquetFilePath, bac_df=bac_df)
+        _, recordCount = convert_lzh_to_parquet(lzhBuffer, actualDataType, year, parquetFilePath, bac_df=bac_df)
         
-        if len(records) == 0:
+        if recordCount == 0:
             raise ValueError('パースされたレコードが0件です')
         
         logger.info('日単位データ取得完了', extra={
             'dataType': actualDataType,
             'date': dateStr,
-            'recordCount': len(records),
+            'recordCount': recordCount,
             'lzhPath': str(lzhFilePath),
             'parquetPath': str(parquetFilePath)
         })
@@ -78,7 +85,7 @@ def fetch_single_data_type(
             'date': dateStr,
             'dataType': actualDataType,
             'success': True,
-            'recordCount': len(records),
+            'recordCount': recordCount,
             'outputPath': str(parquetFilePath),
             'lzhPath': str(lzhFilePath),
             'fileName': fileName
@@ -104,9 +111,11 @@ def fetch_daily_data(
     month: int,
     day: int,
     dataTypes: List[JRDBDataType],
-    outputDir: Union[str, Path] = 'cache/jrdb/parquet'
+    outputDir: Union[str, Path] = 'cache/jrdb/parquet',
+    maxWorkers: int = DEFAULT_MAX_WORKERS
 ) -> List[Dict[str, Union[str, int, bool, Optional[str]]]]:
     """日単位で指定されたデータタイプのデータを取得してParquetに保存
+    LZHファイルは先にまとめて並列ダウンロードし、サーバー上で更新されていないファイルは再取得しない
     
     Args:
         year: 年
@@ -114,6 +123,7 @@ def fetch_daily_data(
         day: 日
         dataTypes: データタイプの配列
         outputDir: 出力ディレクトリ（デフォルト: 'cache/jrdb/parquet'）
+        maxWorkers: 同時ダウンロード数
     
     Returns:
         結果のリスト
@@ -125,6 +135,8 @@ def fetch_daily_data(
         'dataTypes': [dt.value for dt in dataTypes]
     })
     
+    downloads = _download_daily_files(year, month, day, dataTypes, outputDir, maxWorkers)
+    
     # KYI等の年月日がないデータタイプのrace_key生成用に、BACデータを事前に読み込む
     bac_df: Optional[pd.DataFrame] = None
     bac_result: Optional[Dict[str, Union[str, int, bool, Optional[str]]]] = None
@@ -132,7 +144,7 @@ def fetch_daily_data(
     # BACが含まれている場合は、先に処理する
     if JRDBDataType.BAC in dataTypes:
         try:
-            bac_result = fetch_single_data_type(year, month, day, JRDBDataType.BAC, outputDir, dateStr)
+            bac_result = _fetch_downloaded_data_type(year, month, day, JRDBDataType.BAC, outputDir, dateStr, downloads)
             if bac_result.get('success', False) and bac_result.get('outputPath'):
                 bac_parquet_path = Path(bac_result['outputPath'])
                 if bac_parquet_path.exists():
@@ -160,8 +172,8 @@ def fetch_daily_data(
         
         try:
             # KYI等の年月日がないデータタイプの場合は、BACデータを渡す
-            result = fetch_single_data_type(
-                year, month, day, dataType, outputDir, dateStr,
+            result = _fetch_downloaded_data_type(
+                year, month, day, dataType, outputDir, dateStr, downloads,
                 bac_df=bac_df
             )
             results.append(result)
@@ -186,3 +198,55 @@ def fetch_daily_data(
     
     return results
 
+
+
+def _download_daily_files(
+    year: int,
+    month: int,
+    day: int,
+    dataTypes: List[JRDBDataType],
+    outputDir: Union[str, Path],
+    maxWorkers: int
+) -> Dict[JRDBDataType, Dict[str, Union[str, int, float, bool, None]]]:
+    """日単位のLZHファイルをまとめてoutputDirに並列ダウンロード（データタイプ → ダウンロード結果）
+    認証情報がない等で一括ダウンロードできない場合は空を返し、データタイプごとの取得に任せる
+    """
+    try:
+        dateObj = create_date_from_ymd(year, month, day)
+        dateStrJRDB = format_date_jrdb(year, month, day)
+        urls = [generate_jrdb_data_file_url(dataType.value, dateObj) for dataType in dataTypes]
+        # 保存先はfetch_single_data_typeと同じ '{dataType}{YYMMDD}.lzh'
+        fileNames = [f'{dataType.value}{dateStrJRDB}.lzh' for dataType in dataTypes]
+        if any(extract_file_name_from_url(url) != fileName for url, fileName in zip(urls, fileNames, strict=True)):
+            raise ValueError('URLのファイル名が保存先のファイル名と一致しません')
+        downloads = download_jrdb_files(urls, outputDir, maxWorkers=maxWorkers)
+    except Exception as error:
+        logger.warning('日単位データの一括ダウンロードができないため、データタイプごとに取得します', extra={
+            'date': format_date_iso(year, month, day),
+            'error': str(error)
+        })
+        return {}
+    return dict(zip(dataTypes, downloads, strict=True))
+
+
+def _fetch_downloaded_data_type(
+    year: int,
+    month: int,
+    day: int,
+    dataType: JRDBDataType,
+    outputDir: Union[str, Path],
+    dateStr: str,
+    downloads: Dict[JRDBDataType, Dict[str, Union[str, int, float, bool, None]]],
+    bac_df: Optional[pd.DataFrame] = None
+) -> Dict[str, Union[str, int, bool, Optional[str]]]:
+    """一括ダウンロードの結果に応じてfetch_single_data_typeを実行（ダウンロードに失敗した場合はエラー結果を返す）"""
+    download = downloads.get(dataType)
+    if download is not None and not download['success']:
+        return {
+            'date': dateStr,
+            'dataType': dataType.value,
+            'success': False,
+            'recordCount': 0,
+            'error': download['error']
+        }
+    return fetch_single_data_type(year, month, day, dataType, outputDir, dateStr, bac_df=bac_df, downloaded=download is not None)
@@ -0,0 +1,418 @@
+"""LZH（LHA）書庫のインプロセス展開
+外部コマンド（lha）を使わず、メモリ上のバイト列から -lh0- / -lh5- / -lh6- / -lh7- のメンバーを展開する
+"""
+
+import logging
+import threading
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 圧縮方式 → 辞書サイズのビット数（-lh0-は無圧縮）
+_DICTIONARY_BITS = {b'-lh5-': 13, b'-lh6-': 15, b'-lh7-': 16}
+_STORED_METHODS = {b'-lh0-', b'-lz4-'}
+
+# LHA（-lh5-系）の符号化パラメータ
+_NC = 510  # 文字・一致長の記号数（256 + 最大一致長256 - THRESHOLD + 2）
+_NT = 19  # 符号長の符号化に使う記号数
+_TBIT = 5
+_CBIT = 9
+_THRESHOLD = 3  # 最小一致長
+_MAX_CODE_BITS = 16  # LHAの符号長の上限
+_BUFFER_MASK = (1 << 64) - 1  # ビットバッファの保持幅（補充は不足時に32ビットずつ）
+
+# メンバーのCRC16（多項式0xA001）の1バイトごとのテーブル
+_CRC16_TABLE = []
+for _byte in range(256):
+    _crc = _byte
+    for _ in range(8):
+        _crc = (_crc >> 1) ^ 0xA001 if _crc & 1 else _crc >> 1
+    _CRC16_TABLE.append(_crc)
+del _byte, _crc
+# ブロック単位のCRC16: 長さ_CRC16_BLOCK_BYTESのブロックのiバイト目の値bが、ブロックのCRCにXORされる値
+# （初期値0のCRCは線形なので、ブロックのCRCは各バイトの寄与のXORになる。末尾のバイトの寄与が_CRC16_TABLE）
+_CRC16_BLOCK_BYTES = 256
+_CRC16_POSITION_TABLE = np.empty((_CRC16_BLOCK_BYTES, 256), dtype=np.uint16)
+_CRC16_POSITION_TABLE[-1] = _CRC16_TABLE
+for _position in range(_CRC16_BLOCK_BYTES - 2, -1, -1):
+    _next = _CRC16_POSITION_TABLE[_position + 1]
+    _CRC16_POSITION_TABLE[_position] = (_next >> 8) ^ _CRC16_POSITION_TABLE[-1][_next & 0xFF]
+del _position, _next
+_CRC16_POSITION_OFFSETS = np.arange(_CRC16_BLOCK_BYTES, dtype=np.intp) * 256
+# CRC16の状態をゼロバイト _CRC16_BLOCK_BYTES * 2**i 個ぶん進める表（状態65536通りぶん、必要になった段まで作る）
+_CRC16_ZERO_SHIFT_TABLES: List[np.ndarray] = []
+_CRC16_ZERO_SHIFT_TABLES_LOCK = threading.Lock()
+
+# 拡張ヘッダーの種類
+_EXTENDED_FILE_NAME = 0x01
+_EXTENDED_DIRECTORY_NAME = 0x02
+
+
+class LzhDecodeError(ValueError):
+    """インプロセス展開に失敗した場合（未対応の形式・壊れた書庫）"""
+
+
+def iter_lzh_members(lzhBuffer: bytes) -> Iterator[Tuple[bytes, str]]:
+    """LZH書庫のメンバーを先頭から順に展開
+    メンバーごとに展開が終わった時点で返すため、呼び出し側は前のメンバーの処理と展開を交互に進められる
+
+    Args:
+        lzhBuffer: LZHファイルのバイト列
+
+    Yields:
+        (展開されたバイト列, ファイル名)（ディレクトリ名は含まない）
+
+    Raises:
+        LzhDecodeError: 未対応のヘッダーレベル・圧縮方式、または書庫が壊れている場合（展開結果がヘッダーのCRC16と一致しない場合を含む）
+    """
+    data = memoryview(lzhBuffer)
+    offset = 0
+    while offset < len(data) and data[offset] != 0:
+        method, compressedSize, originalSize, fileName, dataOffset, crc = _parse_header(data, offset)
+        dataEnd = dataOffset + compressedSize
+        if dataEnd > len(data):
+            raise LzhDecodeError(f'圧縮データが途中で切れています: {fileName}')
+
+        if method in _DICTIONARY_BITS:
+            content = _decode_lh5(data[dataOffset:dataEnd], originalSize, _DICTIONARY_BITS[method])
+        elif method in _STORED_METHODS:
+            content = bytes(data[dataOffset:dataEnd])
+        else:
+            raise LzhDecodeError(f'未対応の圧縮方式です: {method.decode("ascii", "replace")} ({fileName})')
+
+        if len(content) != originalSize:
+            raise LzhDecodeError(f'展開後のサイズが一致しません: {fileName} ({len(content)} != {originalSize})')
+        if crc is not None and _crc16(content) != crc:
+            raise LzhDecodeError(f'展開後のCRC16が一致しません: {fileName}')
+
+        yield (content, fileName)
+        offset = dataEnd
+
+
+def _crc16(content: bytes) -> int:
+    """展開後のデータのCRC16（LHAのメンバーヘッダーに記録される値）
+
+    先頭をゼロ埋め（初期値0のCRCは変わらない）してブロック数を2の累乗にそろえ、全ブロックのCRCを表引きとXORでまとめて求めた後、
+    隣り合うブロックのCRCを「左側をゼロバイトでブロック長ぶん進めて右側とXOR」で2つずつ結合する。
+    """
+    size = len(content)
+    if size < _CRC16_BLOCK_BYTES:
+        crc = 0
+        table = _CRC16_TABLE
+        for byte in content:
+            crc = (crc >> 8) ^ table[(crc ^ byte) & 0xFF]
+        return crc
+
+    blockCount = 1 << (-(-size // _CRC16_BLOCK_BYTES) - 1).bit_length()
+    padded = np.zeros(blockCount * _CRC16_BLOCK_BYTES, dtype=np.uint8)
+    padded[len(padded) - size:] = np.frombuffer(content, dtype=np.uint8)
+    blocks = padded.reshape(blockCount, _CRC16_BLOCK_BYTES)
+    crcs = np.bitwise_xor.reduce(_CRC16_POSITION_TABLE.ravel()[_CRC16_POSITION_OFFSETS + blocks], axis=1)
+
+    level = 0
+    while len(crcs) > 1:
+        crcs = _crc16_zero_shift_table(level)[crcs[0::2]] ^ crcs[1::2]
+        level += 1
+    return int(crcs[0])
+
+
+def _crc16_zero_shift_table(level: int) -> np.ndarray:
+    """CRC16の状態をゼロバイト _CRC16_BLOCK_BYTES * 2**level 個ぶん進める表"""
+    tables = _CRC16_ZERO_SHIFT_TABLES
+    if len(tables) <= level:
+        with _CRC16_ZERO_SHIFT_TABLES_LOCK:
+            if not tables:
+                table = np.arange(1 << 16, dtype=np.uint16)
+                for _ in range(_CRC16_BLOCK_BYTES):
+                    table = (table >> 8) ^ _CRC16_POSITION_TABLE[-1][table & 0xFF]
+                tables.append(table)
+            while len(tables) <= level:
+                # 2倍の長さ進める表は、同じ表を2回適用したもの
+                tables.append(tables[-1][tables[-1]])
+    return tables[level]
+
+
+def _parse_header(data: memoryview, offset: int) -> Tuple[bytes, int, int, str, int, Optional[int]]:
+    """メンバーヘッダーを解析して (圧縮方式, 圧縮サイズ, 元サイズ, ファイル名, データ開始位置, CRC16) を返す（CRC16がないヘッダーはNone）"""
+    if offset + 22 > len(data):
+        raise LzhDecodeError('ヘッダーが途中で切れています')
+
+    method = bytes(data[offset + 2:offset + 7])
+    compressedSize = int.from_bytes(data[offset + 7:offset + 11], 'little')
+    originalSize = int.from_bytes(data[offset + 11:offset + 15], 'little')
+    level = data[offset + 20]
+
+    if level in (0, 1):
+        headerEnd = offset + 2 + data[offset]
+        nameLength = data[offset + 21]
+        fileName = _decode_name(data[offset + 22:offset + 22 + nameLength])
+        # CRC16はファイル名の直後（古いレベル0ヘッダーには含まれない場合がある）
+        crcOffset = offset + 22 + nameLength
+        crc = int.from_bytes(data[crcOffset:crcOffset + 2], 'little') if crcOffset + 2 <= headerEnd else None
+        if level == 0:
+            return (method, compressedSize, originalSize, fileName, headerEnd, crc)
+
+        # レベル1: 基本ヘッダーの末尾2バイトが最初の拡張ヘッダーのサイズ。圧縮サイズは拡張ヘッダーを含む
+        nextSize = int.from_bytes(data[headerEnd - 2:headerEnd], 'little')
+        position = headerEnd
+        directory = ''
+        while nextSize > 0:
+            if position + nextSize > len(data):
+                raise LzhDecodeError('拡張ヘッダーが途中で切れています')
+            fileName, directory = _apply_extended_header(data[position:position + nextSize], fileName, directory)
+            compressedSize -= nextSize
+            position += nextSize
+            nextSize = int.from_bytes(data[position - 2:position], 'little')
+        return (method, compressedSize, originalSize, fileName, position, crc)
+
+    if level == 2:
+        # レベル2: 先頭2バイトがヘッダー全体のサイズ、24バイト目から拡張ヘッダーが並ぶ
+        headerEnd = offset + int.from_bytes(data[offset:offset + 2], 'little')
+        crc = int.from_bytes(data[offset + 21:offset + 23], 'little')
+        position = offset + 24
+        nextSize = int.from_bytes(data[position:position + 2], 'little')
+        position += 2
+        fileName, directory = '', ''
+        while nextSize > 0:
+            if position + nextSize > headerEnd:
+                raise LzhDecodeError('拡張ヘッダーが途中で切れています')
+            fileName, directory = _apply_extended_header(data[position:position + nextSize], fileName, directory)
+            position += nextSize
+            nextSize = int.from_bytes(data[position - 2:position], 'little')
+        return (method, compressedSize, originalSize, fileName, headerEnd, crc)
+
+    raise LzhDecodeError(f'未対応のヘッダーレベルです: {level}')
+
+
+def _apply_extended_header(header: memoryview, fileName: str, directory: str) -> Tuple[str, str]:
+    """拡張ヘッダー（種類1バイト + 内容 + 次のヘッダーサイズ2バイト）からファイル名・ディレクトリ名を取得"""
+    kind = header[0]
+    if kind == _EXTENDED_FILE_NAME:
+        return (_decode_name(header[1:-2]), directory)
+    if kind == _EXTENDED_DIRECTORY_NAME:
+        return (fileName, _decode_name(header[1:-2]).replace('\xff', '/'))
+    return (fileName, directory)
+
+
+def _decode_name(raw: memoryview) -> str:
+    """ヘッダー内のファイル名をデコード（ShiftJIS、区切り文字を除いたベース名）"""
+    name = bytes(raw).replace(b'\xff', b'/').replace(b'\\', b'/').decode('shift_jis', errors='replace')
+    return name.rsplit('/', 1)[-1]
+
+
+def _decode_lh5(compressed: memoryview, originalSize: int, dictionaryBits: int) -> bytes:
+    """-lh5- / -lh6- / -lh7- のデータを展開
+    静的ハフマン符号のブロック列を、最大符号長ぶん先読みする復号表（記号・符号長）で1記号ずつ復号する
+    """
+    source = bytes(compressed) + b'\x00' * 8  # 末尾の先読み用
+    positionSymbols = dictionaryBits + 1
+    positionBits = 4 if dictionaryBits == 13 else 5
+
+    # 参照が書庫の先頭より前を指す場合に備え、LHAと同じく辞書を空白で初期化しておく
+    dictionarySize = 1 << dictionaryBits
+    output = bytearray(b' ' * dictionarySize)
+    outputEnd = dictionarySize + originalSize
+
+    bitBuffer = 0
+    bitCount = 0
+    bytePosition = 0
+    blockRemaining = 0
+    codeSymbols: List[int] = []
+    codeLengths: List[int] = []
+    codeBits = codeMask = 0
+    positionTableSymbols: List[int] = []
+    positionTableLengths: List[int] = []
+    positionTableBits = positionTableMask = 0
+    append = output.append
+
+    while len(output) < outputEnd:
+        if blockRemaining == 0:
+            reader = _BitReader(source, bytePosition, bitBuffer, bitCount)
+            blockRemaining = reader.read(16)
+            if blockRemaining == 0:
+                raise LzhDecodeError('ブロックサイズが0です')
+            treeLengths = _read_pt_lengths(reader, _NT, _TBIT, 3)
+            codeLengthList = _read_c_lengths(reader, treeLengths)
+            codeSymbols, codeLengths, codeBits = _build_table(codeLengthList)
+            positionTableSymbols, positionTableLengths, positionTableBits = _build_table(_read_pt_lengths(reader, positionSymbols, positionBits, -1))
+            bytePosition, bitBuffer, bitCount = reader.position, reader.buffer, reader.count
+            codeMask = (1 << codeBits) - 1
+            positionTableMask = (1 << positionTableBits) - 1
+
+        # 文字・一致長の符号（最大16ビット）の前に補充
+        if bitCount < _MAX_CODE_BITS:
+            bitBuffer = ((bitBuffer << 32) | int.from_bytes(source[bytePosition:bytePosition + 4], 'big')) & _BUFFER_MASK
+            bytePosition += 4
+            bitCount += 32
+
+        index = (bitBuffer >> (bitCount - codeBits)) & codeMask
+        symbol = codeSymbols[index]
+        bitCount -= codeLengths[index]
+        blockRemaining -= 1
+
+        if symbol < 256:
+            append(symbol)
+            continue
+
+        # 位置の符号（最大16ビット）と追加ビット（最大15ビット）の前に補充
+        if bitCount < 31:
+            bitBuffer = ((bitBuffer << 32) | int.from_bytes(source[bytePosition:bytePosition + 4], 'big')) & _BUFFER_MASK
+            bytePosition += 4
+            bitCount += 32
+
+        length = symbol - 256 + _THRESHOLD
+        index = (bitBuffer >> (bitCount - positionTableBits)) & positionTableMask
+        distanceBits = positionTableSymbols[index]
+        bitCount -= positionTableLengths[index]
+        if distanceBits > 1:
+            bitCount -= distanceBits - 1
+            distance = (1 << (distanceBits - 1)) + ((bitBuffer >> bitCount) & ((1 << (distanceBits - 1)) - 1))
+        else:
+            distance = distanceBits
+
+        start = len(output) - distance - 1
+        if start < 0:
+            raise LzhDecodeError('参照位置が辞書の範囲外です')
+        if distance + 1 >= length:
+            output += output[start:start + length]
+        else:
+            # 参照範囲と出力が重なる場合は、周期distance + 1のパターンの繰り返しになる
+            pattern = output[start:]
+            output += (pattern * (length // len(pattern) + 1))[:length]
+
+        if bytePosition > len(source):
+            raise LzhDecodeError('圧縮データが途中で切れています')
+
+    if len(output) != outputEnd:
+        raise LzhDecodeError('展開後のサイズが元サイズを超えています')
+    return bytes(output[dictionarySize:])
+
+
+class _BitReader:
+    """ブロックヘッダー（符号長の表）読み取り用のビットリーダー"""
+
+    def __init__(self, source: bytes, position: int, buffer: int, count: int):
+        self.source = source
+        self.position = position
+        self.buffer = buffer
+        self.count = count
+
+    def peek(self, bits: int) -> int:
+        while self.count < bits:
+            if self.position >= len(self.source):
+                raise LzhDecodeError('圧縮データが途中で切れています')
+            self.buffer = ((self.buffer << 8) | self.source[self.position]) & _BUFFER_MASK
+            self.position += 1
+            self.count += 8
+        return (self.buffer >> (self.count - bits)) & ((1 << bits) - 1)
+
+    def skip(self, bits: int) -> None:
+        self.peek(bits)
+        self.count -= bits
+
+    def read(self, bits: int) -> int:
+        value = self.peek(bits)
+        self.count -= bits
+        return value
+
+
+def _read_pt_lengths(reader: _BitReader, numSymbols: int, countBits: int, special: int) -> List[int]:
+    """符号長（位置符号・符号長符号用）を読み取る"""
+    count = reader.read(countBits)
+    if count == 0:
+        # 記号が1種類のみ（符号長0で常にその記号）
+        symbol = reader.read(countBits)
+        if symbol >= numSymbols:
+            raise LzhDecodeError('不正な符号表です')
+        lengths = [0] * numSymbols
+        lengths[symbol] = -1
+        return lengths
+    if count > numSymbols:
+        raise LzhDecodeError('不正な符号表です')
+
+    lengths = [0] * numSymbols
+    i = 0
+    while i < count:
+        length = reader.peek(3)
+        if length == 7:
+            # 7以上は「1」の連続で表す
+            reader.skip(3)
+            while reader.read(1) == 1:
+                length += 1
+                if length > _MAX_CODE_BITS:
+                    raise LzhDecodeError('不正な符号長です')
+        else:
+            reader.skip(3)
+        lengths[i] = length
+        i += 1
+        if i == special:
+            i += reader.read(2)
+    return lengths
+
+
+def _read_c_lengths(reader: _BitReader, treeLengths: List[int]) -> List[int]:
+    """文字・一致長の符号長を読み取る（符号長自体も前段の符号で符号化されている）"""
+    count = reader.read(_CBIT)
+    if count == 0:
+        symbol = reader.read(_CBIT)
+        if symbol >= _NC:
+            raise LzhDecodeError('不正な符号表です')
+        lengths = [0] * _NC
+        lengths[symbol] = -1
+        return lengths
+    if count > _NC:
+        raise LzhDecodeError('不正な符号表です')
+
+    treeSymbols, treeCodeLengths, treeBits = _build_table(treeLengths)
+    lengths = [0] * _NC
+    i = 0
+    while i < count:
+        index = reader.peek(treeBits)
+        symbol = treeSymbols[index]
+        reader.skip(treeCodeLengths[index])
+        if symbol == 0:
+            i += 1
+        elif symbol == 1:
+            i += reader.read(4) + 3
+        elif symbol == 2:
+            i += reader.read(_CBIT) + 20
+        else:
+            if i >= _NC:
+                raise LzhDecodeError('不正な符号表です')
+            lengths[i] = symbol - 2
+            i += 1
+    if i > _NC:
+        raise LzhDecodeError('不正な符号表です')
+    return lengths
+
+
+def _build_table(lengths: List[int]) -> Tuple[List[int], List[int], int]:
+    """符号長から先読み復号表（記号, 符号長, 参照ビット数）を作成
+    LHAの符号は符号長順・記号順に割り当てる正準ハフマン符号。参照ビット数はブロック内の最大符号長にする。
+    符号長-1は記号が1種類のみ（0ビット）を表す
+    """
+    if -1 in lengths:
+        return ([lengths.index(-1)], [0], 0)
+
+    entries = sorted((length, symbol) for symbol, length in enumerate(lengths) if length > 0)
+    if not entries:
+        return ([0], [0], 0)
+
+    tableBits = entries[-1][0]
+    symbols = [0] * (1 << tableBits)
+    codeLengths = [0] * (1 << tableBits)
+    code = 0
+    previousLength = entries[0][0]
+    for length, symbol in entries:
+        code <<= length - previousLength
+        previousLength = length
+        span = 1 << (tableBits - length)
+        start = code * span
+        if start + span > len(symbols):
+            raise LzhDecodeError('不正な符号表です')
+        symbols[start:start + span] = [symbol] * span
+        codeLengths[start:start + span] = [length] * span
+        code += 1
+    return (symbols, codeLengths, tableBits)
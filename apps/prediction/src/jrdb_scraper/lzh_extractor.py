@@ -1,5 +1,5 @@
 """LZHファイル展開
-lhaコマンドを使用して解凍
+インプロセスのデコーダーで展開し、未対応の書庫のみlhaコマンドで解凍
 """
 
 import logging
@@ -7,9 +7,10 @@ import shutil
 import subprocess
 import tempfile
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import Iterator, List, Optional, Tuple
 
 from .entities.jrdb import JRDBDataType
+from .lzh_decoder import LzhDecodeError, iter_lzh_members
 from .parsers.jrdb_parser import parse_jrdb_file_name
 
 logger = logging.getLogger(__name__)
@@ -17,7 +18,54 @@ logger = logging.getLogger(__name__)
 
 def extract_lzh_file(lzhBuffer: bytes) -> List[Tuple[bytes, str]]:
     """lzhファイルを展開してすべてのテキストファイルを取得
-    lhaコマンドを使用して解凍
+    インプロセスのデコーダー（-lh0-/-lh5-/-lh6-/-lh7-）で展開し、対応できない書庫はlhaコマンドで解凍する
+    
+    Args:
+        lzhBuffer: LZHファイルのバイト列
+    
+    Returns:
+        展開されたすべての.txtファイルのバッファとファイル名のリスト
+    
+    Raises:
+        ValueError: 解凍に失敗した場合
+    """
+    return list(iter_lzh_file(lzhBuffer))
+
+
+def iter_lzh_file(lzhBuffer: bytes) -> Iterator[Tuple[bytes, str]]:
+    """lzhファイルの.txtメンバーを展開が終わった順に返す（extract_lzh_fileの逐次版）
+    インプロセス展開が途中で失敗した場合は、lhaコマンドで解凍してまだ返していないメンバーを返す
+    
+    Args:
+        lzhBuffer: LZHファイルのバイト列
+    
+    Yields:
+        展開された.txtファイルのバッファとファイル名
+    
+    Raises:
+        ValueError: 解凍に失敗した場合、.txtファイルが1件もない場合
+    """
+    yieldedNames = set()
+    try:
+        for buffer, name in iter_lzh_members(lzhBuffer):
+            if not name.endswith('.txt'):
+                continue
+            yieldedNames.add(name)
+            yield (buffer, name)
+    except LzhDecodeError as e:
+        logger.warning('インプロセスのLZH展開に失敗したため、lhaコマンドで解凍します', extra={'error': str(e), 'extractedFiles': len(yieldedNames)})
+        for buffer, name in extract_lzh_file_with_lha(lzhBuffer):
+            if name in yieldedNames:
+                continue
+            yieldedNames.add(name)
+            yield (buffer, name)
+    
+    if not yieldedNames:
+        raise ValueError('LZH解凍に失敗しました: 解凍された.txtファイルが見つかりません')
+
+
+def extract_lzh_file_with_lha(lzhBuffer: bytes) -> List[Tuple[bytes, str]]:
+    """lhaコマンドでlzhファイルを展開してすべてのテキストファイルを取得
     エミュレータ環境では、事前にlhaコマンドをインストールする必要があります（macOS: brew install lhasa）
     
     Args:
@@ -0,0 +1,140 @@
+"""Parquet出力のマニフェスト
+出力ファイルごとに、変換元LZHのハッシュ・フォーマット定義JSONのハッシュ・コンバーターのバージョンを記録し、
+すべて一致する場合は再変換を省略できるようにする
+"""
+
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+from .converter import CONVERTER_VERSION
+from .entities.jrdb import JRDBDataType
+from .parsers.format_loader import get_formats_dir
+
+logger = logging.getLogger(__name__)
+
+# 出力ディレクトリ直下に置くマニフェストのファイル名
+MANIFEST_FILE_NAME = 'manifest.json'
+
+# 変換結果を左右する値（すべて一致すれば出力ファイルは再利用できる）
+FINGERPRINT_KEYS = ('sourceHash', 'formatHash', 'converterVersion', 'dependencyHashes')
+
+ManifestEntry = Dict[str, Union[str, int, Dict[str, str], None]]
+
+
+def compute_hash(data: Union[bytes, str, Path]) -> str:
+    """バイト列またはファイルのSHA-256（16進文字列）"""
+    if isinstance(data, bytes):
+        return hashlib.sha256(data).hexdigest()
+
+    digest = hashlib.sha256()
+    with open(data, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def compute_format_hash(dataType: JRDBDataType) -> Optional[str]:
+    """データタイプのフォーマット定義JSONのSHA-256（定義ファイルがない場合はNone）"""
+    formatFile = get_formats_dir() / f'{dataType.value.lower()}.json'
+    if not formatFile.exists():
+        return None
+    return compute_hash(formatFile)
+
+
+def build_fingerprint(
+    sourceHash: str,
+    dataType: JRDBDataType,
+    dependencyHashes: Optional[Dict[str, str]] = None
+) -> ManifestEntry:
+    """出力ファイルの変換条件（変換元・フォーマット定義・コンバーターのバージョン）を作成
+
+    Args:
+        sourceHash: 変換元LZHのSHA-256
+        dataType: データタイプ
+        dependencyHashes: 変換結果に影響する他の入力のハッシュ（例: KYI等のrace_key生成に使うBAC）
+
+    Returns:
+        マニフェストのエントリに記録する変換条件
+    """
+    return {
+        'sourceHash': sourceHash,
+        'formatHash': compute_format_hash(dataType),
+        'converterVersion': CONVERTER_VERSION,
+        'dependencyHashes': dict(sorted(dependencyHashes.items())) if dependencyHashes else None,
+    }
+
+
+def load_manifest(outputDir: Union[str, Path]) -> Dict[str, ManifestEntry]:
+    """マニフェストを読み込む（存在しない・壊れている場合は空）"""
+    manifestPath = Path(outputDir) / MANIFEST_FILE_NAME
+    if not manifestPath.exists():
+        return {}
+    try:
+        with open(manifestPath, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        return manifest.get('files', {})
+    except (OSError, ValueError) as e:
+        logger.warning('マニフェストを読み込めないため、全ファイルを再変換します', extra={'manifestPath': str(manifestPath), 'error': str(e)})
+        return {}
+
+
+def is_up_to_date(
+    manifest: Dict[str, ManifestEntry],
+    outputDir: Union[str, Path],
+    fileName: str,
+    fingerprint: ManifestEntry
+) -> bool:
+    """出力ファイルが存在し、記録された変換条件がfingerprintとすべて一致するか"""
+    entry = manifest.get(fileName)
+    if entry is None or not (Path(outputDir) / fileName).exists():
+        return False
+    return all(entry.get(key) == fingerprint.get(key) for key in FINGERPRINT_KEYS)
+
+
+def record_outputs(outputDir: Union[str, Path], entries: Dict[str, ManifestEntry]) -> None:
+    """変換した出力ファイルのエントリをマニフェストに追記して保存（一時ファイル経由で置き換え）
+
+    Args:
+        outputDir: 出力ディレクトリ
+        entries: 出力ファイル名 → 変換条件と結果（recordCount等）
+    """
+    if not entries:
+        return
+
+    outputPath = Path(outputDir)
+    outputPath.mkdir(parents=True, exist_ok=True)
+    manifest = load_manifest(outputPath)
+    convertedAt = datetime.now(timezone.utc).isoformat(timespec='seconds')
+    for fileName, entry in entries.items():
+        manifest[fileName] = {**entry, 'convertedAt': convertedAt}
+    _save_manifest(outputPath, manifest)
+
+
+def rename_outputs(outputDir: Union[str, Path], renames: Dict[str, str]) -> None:
+    """出力ファイルを移動した場合にマニフェストのエントリのキーを付け替えて保存（変換条件・convertedAtは維持）
+
+    Args:
+        outputDir: 出力ディレクトリ
+        renames: 旧キー（出力ファイル名） → 新キー（出力ディレクトリからの相対パス）
+    """
+    manifest = load_manifest(outputDir)
+    moved = {oldName: newName for oldName, newName in renames.items() if oldName in manifest}
+    if not moved:
+        return
+    for oldName, newName in moved.items():
+        manifest[newName] = manifest.pop(oldName)
+    _save_manifest(Path(outputDir), manifest)
+
+
+def _save_manifest(outputPath: Path, manifest: Dict[str, ManifestEntry]) -> None:
+    """マニフェストを保存（一時ファイル経由で置き換え）"""
+    manifestPath = outputPath / MANIFEST_FILE_NAME
+    temporaryPath = manifestPath.with_name(f'{MANIFEST_FILE_NAME}.tmp')
+    with open(temporaryPath, 'w', encoding='utf-8') as f:
+        json.dump({'files': dict(sorted(manifest.items()))}, f, ensure_ascii=False, indent=2)
+    os.replace(temporaryPath, manifestPath)
@@ -0,0 +1,208 @@
+"""JRDB固定長レコードの列指向デコーダー
+バッファを (レコード数, recordLength) のバイト行列として扱い、フィールド単位で全レコードを一括変換する
+"""
+
+import logging
+from typing import Dict, Iterator, List, Optional, Union
+
+import numpy as np
+import pyarrow as pa
+
+from .field_parser import JRDBFieldType, decode_field_bytes
+from .format_parser import JRDBFieldDefinition, JRDBFormatDefinition, convert_kka_race_key
+
+logger = logging.getLogger(__name__)
+
+# バイト定数
+_SPACE = 0x20
+_PLUS = 0x2B
+_MINUS = 0x2D
+_DIGIT_0 = 0x30
+_DIGIT_9 = 0x39
+_LF = 0x0A
+_CR = 0x0D
+
+# 数値型（9型/Z型）
+_INTEGER_TYPES = {JRDBFieldType.INTEGER_NINE.value, JRDBFieldType.INTEGER_ZERO_BLANK.value}
+
+
+def parse_table_from_buffer(buffer: bytes, format: JRDBFormatDefinition) -> pa.Table:
+    """ShiftJISバッファからJRDBデータを列指向でパース（parse_data_from_bufferと同じ値をpyarrow Tableで返す）
+
+    - 数値（9/Z型）: 空白と数字（先頭の符号を含む）だけのセルはベクトル化した桁演算で変換し、
+      それ以外のセルのみ従来のフィールド変換（ShiftJISデコード + int()）を行う
+    - 文字（X/F型）: 重複を除いたセル値のみShiftJISからデコードする
+
+    Args:
+        buffer: ShiftJISでエンコードされたバッファ
+        format: フォーマット定義
+
+    Returns:
+        フィールド名をカラムに持つpyarrow Table（数値はint64、文字はstring、欠損はnull）
+    """
+    logger.info('JRDBデータの列指向パース開始（ShiftJISバッファ）', extra={
+        'dataType': format['dataType'],
+        'bufferLength': len(buffer)
+    })
+
+    records = _to_record_matrix(np.frombuffer(buffer, dtype=np.uint8), format['recordLength'])
+    table = _decode_records(records, format)
+    logger.info('JRDBデータの列指向パース完了（ShiftJISバッファ）', extra={
+        'dataType': format['dataType'],
+        'totalRecords': table.num_rows
+    })
+    return table
+
+
+def iter_tables_from_buffer(buffer: bytes, format: JRDBFormatDefinition, chunkSize: int) -> Iterator[pa.Table]:
+    """ShiftJISバッファからJRDBデータをchunkSizeレコードずつ列指向でパース
+    レコード行列はバッファのビューのため、デコード済みの列はチャンク分だけメモリに保持される
+
+    Args:
+        buffer: ShiftJISでエンコードされたバッファ
+        format: フォーマット定義
+        chunkSize: 1チャンクあたりのレコード数
+
+    Yields:
+        チャンクごとのpyarrow Table（スキーマは全チャンクで共通、レコードがない場合は何も返さない）
+    """
+    if chunkSize < 1: raise ValueError(f'chunkSizeは1以上である必要があります: {chunkSize}')
+
+    records = _to_record_matrix(np.frombuffer(buffer, dtype=np.uint8), format['recordLength'])
+    for start in range(0, len(records), chunkSize):
+        yield _decode_records(records[start:start + chunkSize], format)
+
+
+def _decode_records(records: np.ndarray, format: JRDBFormatDefinition) -> pa.Table:
+    """(レコード数, recordLength) のバイト行列を全フィールド分デコードしてTableにする"""
+    recordLength = format['recordLength']
+
+    # 同名フィールド（予備など）は後に定義されたものの値を使用し、カラム位置は最初の定義に合わせる（辞書レコードと同じ挙動）
+    fieldsByName: Dict[str, JRDBFieldDefinition] = {}
+    for field in format['fields']:
+        fieldsByName[field['name']] = field
+
+    columns: Dict[str, pa.Array] = {}
+    for name, field in fieldsByName.items():
+        columns[name] = _decode_column(records, field, recordLength)
+
+    # KKAのレースキーの「日」フィールド（6バイト目）は16進数形式（TYPE F）
+    if format['dataType'] == 'KKA' and 'レースキー' in columns:
+        columns['レースキー'] = pa.array([convert_kka_race_key(value) for value in columns['レースキー'].to_pylist()], type=columns['レースキー'].type)
+
+    return pa.table(columns)
+
+
+def _to_record_matrix(data: np.ndarray, recordLength: int) -> np.ndarray:
+    """バッファを (レコード数, recordLength) のバイト行列に変換
+    レコード区切り（CRLF/LF/なし）が全レコードで共通の場合はコピーなしのビューを返す
+    """
+    offsets = _uniform_record_offsets(data, recordLength)
+    if offsets is not None:
+        numRecords, stride = offsets
+        return np.lib.stride_tricks.as_strided(data, shape=(numRecords, recordLength), strides=(stride, 1), writeable=False)
+
+    # 区切りが混在する場合は、parse_data_from_bufferと同じ規則でレコード開始位置を順に求める
+    starts: List[int] = []
+    offset = 0
+    while offset + recordLength <= len(data):
+        starts.append(offset)
+        offset += recordLength
+        if offset < len(data):
+            if offset + 1 < len(data) and data[offset] == _CR and data[offset + 1] == _LF:
+                offset += 2
+            elif data[offset] == _LF:
+                offset += 1
+    return data[np.asarray(starts, dtype=np.int64)[:, None] + np.arange(recordLength)[None, :]] if starts else np.zeros((0, recordLength), dtype=np.uint8)
+
+
+def _uniform_record_offsets(data: np.ndarray, recordLength: int) -> Optional[tuple[int, int]]:
+    """全レコードが同じ区切り（CRLF/LF/なし）で並んでいる場合に (レコード数, ストライド) を返す"""
+    if len(data) < recordLength:
+        return (0, recordLength)
+
+    for separatorLength in (2, 1, 0):
+        stride = recordLength + separatorLength
+        numRecords = (len(data) - recordLength) // stride + 1
+        # 各レコード直後の区切り位置（バッファ末尾に達したものは対象外）
+        separatorStarts = np.arange(numRecords, dtype=np.int64) * stride + recordLength
+        separatorStarts = separatorStarts[separatorStarts < len(data)]
+        first = data[separatorStarts]
+        second = data[np.minimum(separatorStarts + 1, len(data) - 1)]
+        hasSecond = separatorStarts + 1 < len(data)
+        isCrlf = (first == _CR) & (second == _LF) & hasSecond
+        isLf = first == _LF
+        if separatorLength == 2 and isCrlf.all():
+            return (numRecords, stride)
+        if separatorLength == 1 and (isLf & ~isCrlf).all():
+            return (numRecords, stride)
+        if separatorLength == 0 and not (isLf | isCrlf).any():
+            return (numRecords, stride)
+    return None
+
+
+def _decode_column(records: np.ndarray, field: JRDBFieldDefinition, recordLength: int) -> pa.Array:
+    """1フィールド分の全レコードをデコード"""
+    isInteger = field['type'] in _INTEGER_TYPES
+    arrowType = pa.int64() if isInteger else pa.string()
+    startIndex = field['start'] - 1  # 1ベースから0ベースに変換（仕様書は1ベース）
+    endIndex = startIndex + field['length']
+
+    # レコード範囲外のフィールドはnull（extract_field_value_from_bufferと同じ）
+    if startIndex < 0 or endIndex > recordLength or field['length'] <= 0:
+        return pa.nulls(len(records), type=arrowType)
+
+    cells = records[:, startIndex:endIndex]
+    if isInteger:
+        return _decode_integer_column(cells, field)
+    return pa.array(_decode_cells(cells, field), type=pa.string())
+
+
+def _decode_integer_column(cells: np.ndarray, field: JRDBFieldDefinition) -> pa.Array:
+    """数値フィールドを桁演算で一括変換（空白・数字・先頭符号以外を含むセルのみ従来の変換を使用）"""
+    numRecords, width = cells.shape
+    isDigit = (cells >= _DIGIT_0) & (cells <= _DIGIT_9)
+    isNonSpace = cells != _SPACE
+    hasValue = isNonSpace.any(axis=1)
+
+    # 空白を除いた値の範囲 [first, last]
+    first = np.argmax(isNonSpace, axis=1)
+    last = width - 1 - np.argmax(isNonSpace[:, ::-1], axis=1)
+    rows = np.arange(numRecords)
+    firstByte = cells[rows, first]
+    hasSign = (firstByte == _PLUS) | (firstByte == _MINUS)
+    digitStart = first + hasSign
+
+    # 単純なセル: [first, last]に空白を含まず、符号の後が全て数字
+    digitCount = isDigit.sum(axis=1)
+    isSimple = hasValue & (digitStart <= last) & (isNonSpace.sum(axis=1) == last - first + 1) & (digitCount == last - digitStart + 1)
+
+    # 各桁の重み（最下位桁が10^0）。JRDBの数値フィールドは最大18桁のためint64に収まる
+    exponents = last[:, None] - np.arange(width)[None, :]
+    weights = np.where(isDigit & (exponents >= 0), np.power(np.int64(10), np.clip(exponents, 0, None)), 0)
+    values = ((cells.astype(np.int64) - _DIGIT_0) * weights).sum(axis=1)
+    values = np.where(firstByte == _MINUS, -values, values)
+    isValid = isSimple.copy()
+
+    # 単純でないセル（全角数字、制御文字、不正な値など）は従来の変換で処理（空白のみのセルはnull）
+    complexRows = np.flatnonzero(hasValue & ~isSimple)
+    if len(complexRows) > 0:
+        decoded = _decode_cells(cells[complexRows], field)
+        for row, value in zip(complexRows, decoded, strict=True):
+            if value is None: continue
+            values[row] = value
+            isValid[row] = True
+
+    return pa.array(values, type=pa.int64(), mask=~isValid)
+
+
+def _decode_cells(cells: np.ndarray, field: JRDBFieldDefinition) -> np.ndarray:
+    """セルごとに従来のフィールド変換を適用（同じバイト列は1回だけデコード）"""
+    numRecords, width = cells.shape
+    if numRecords == 0:
+        return np.empty(0, dtype=object)
+
+    packed = np.ascontiguousarray(cells).view(np.dtype((np.void, width))).ravel()
+    uniqueCells, inverse = np.unique(packed, return_inverse=True)
+    decoded: List[Union[int, str, None]] = [decode_field_bytes(cell.tobytes(), field) for cell in uniqueCells]
+    return np.array(decoded, dtype=object)[inverse.ravel()]
@@ -52,6 +52,19 @@ def extract_field_value_from_buffer(buffer: bytes, field: 'JRDBFieldDefinition')
     if len(fieldBuffer) == 0:
         return None
     
+    return decode_field_bytes(fieldBuffer, field)
+
+
+def decode_field_bytes(fieldBuffer: bytes, field: 'JRDBFieldDefinition') -> Optional[Union[int, str]]:
+    """切り出し済みのフィールドバイト列（ShiftJIS）を値に変換
+    
+    Args:
+        fieldBuffer: フィールド1つ分のバイト列
+        field: フィールド定義
+    
+    Returns:
+        変換された値（int, str, None）
+    """
     # 抽出したバイト列をShiftJISからUTF-8に変換
     try:
         rawValue = codecs.decode(fieldBuffer, 'shift_jis').strip()
@@ -116,21 +116,32 @@ def parse_record_from_buffer(recordBuffer: bytes, format: JRDBFormatDefinition)
         record[field['name']] = value
     
     # KKAのレースキーの「日」フィールド（6バイト目）は16進数形式（TYPE F）
-    # 仕様書: https://jrdb.com/program/Kka/kka_doc.txt
-    # 「日 1 F 6 16進数(日付 or 開催回数、日目)」
-    # レースキー全体をパースした後、6バイト目（0ベースで5番目）の文字を16進数→10進数に変換
     if format['dataType'] == 'KKA' and 'レースキー' in record:
-        raceKey = record['レースキー']
-        if raceKey and isinstance(raceKey, str) and len(raceKey) >= 6:
-            try:
-                # 6バイト目（0ベースで5番目）の文字を16進数から10進数に変換
-                hexChar = raceKey[5]
-                decimalValue = int(hexChar, 16)
-                if 0 <= decimalValue <= 15:
-                    record['レースキー'] = raceKey[:5] + str(decimalValue) + raceKey[6:]
-            except (ValueError, IndexError):
-                # 変換失敗時は元の値を保持
-                pass
+        record['レースキー'] = convert_kka_race_key(record['レースキー'])
     
     return record
 
+
+def convert_kka_race_key(raceKey: Union[int, str, None]) -> Union[int, str, None]:
+    """KKAのレースキーの「日」（6バイト目）を16進数から10進数に変換
+    仕様書: https://jrdb.com/program/Kka/kka_doc.txt
+    「日 1 F 6 16進数(日付 or 開催回数、日目)」
+    レースキー全体をパースした後、6バイト目（0ベースで5番目）の文字を16進数→10進数に変換
+    
+    Args:
+        raceKey: パース済みのレースキー
+    
+    Returns:
+        変換後のレースキー（変換できない場合は元の値）
+    """
+    if raceKey and isinstance(raceKey, str) and len(raceKey) >= 6:
+        try:
+            # 6バイト目（0ベースで5番目）の文字を16進数から10進数に変換
+            hexChar = raceKey[5]
+            decimalValue = int(hexChar, 16)
+            if 0 <= decimalValue <= 15:
+                return raceKey[:5] + str(decimalValue) + raceKey[6:]
+        except (ValueError, IndexError):
+            # 変換失敗時は元の値を保持
+            pass
+    return raceKey
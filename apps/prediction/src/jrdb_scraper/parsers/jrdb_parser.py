@@ -3,9 +3,12 @@
 """
 
 import logging
-from typing import Dict, List, Optional, Union
+from typing import Dict, Iterator, List, Optional, Union
+
+import pyarrow as pa
 
 from ..entities.jrdb import JRDBDataType
+from .columnar_parser import iter_tables_from_buffer, parse_table_from_buffer
 from .format_parser import JRDBFormatDefinition, parse_data_from_buffer
 from .format_loader import load_format_definition
 
@@ -122,3 +125,59 @@ def parse_jrdb_data_from_buffer(
     
     return parse_data_from_buffer(buffer, format)
 
+
+
+def parse_jrdb_table_from_buffer(
+    buffer: bytes,
+    dataType: Union[JRDBDataType, str]
+) -> pa.Table:
+    """JRDBデータを列指向でパース（parse_jrdb_data_from_bufferのpyarrow Table版）
+    
+    Args:
+        buffer: ShiftJISでエンコードされたバッファ
+        dataType: データ種別（enumまたは文字列）
+    
+    Returns:
+        パースされたレコードのpyarrow Table（対応していないデータ種別の場合は空のTable）
+    """
+    format: Optional[JRDBFormatDefinition] = None
+    
+    if isinstance(dataType, str):
+        format = get_format_definition_from_string(dataType)
+    else:
+        format = load_format_definition(dataType)
+    
+    if not format:
+        logger.warning('対応していないデータ種別です', extra={'dataType': dataType})
+        return pa.table({})
+    
+    return parse_table_from_buffer(buffer, format)
+
+
+def iter_jrdb_tables_from_buffer(
+    buffer: bytes,
+    dataType: Union[JRDBDataType, str],
+    chunkSize: int
+) -> Iterator[pa.Table]:
+    """JRDBデータをchunkSizeレコードずつ列指向でパース（parse_jrdb_table_from_bufferのストリーミング版）
+    
+    Args:
+        buffer: ShiftJISでエンコードされたバッファ
+        dataType: データ種別（enumまたは文字列）
+        chunkSize: 1チャンクあたりのレコード数
+    
+    Yields:
+        チャンクごとのpyarrow Table（対応していないデータ種別の場合は何も返さない）
+    """
+    format: Optional[JRDBFormatDefinition] = None
+    
+    if isinstance(dataType, str):
+        format = get_format_definition_from_string(dataType)
+    else:
+        format = load_format_definition(dataType)
+    
+    if not format:
+        logger.warning('対応していないデータ種別です', extra={'dataType': dataType})
+        return
+    
+    yield from iter_tables_from_buffer(buffer, format, chunkSize)
@@ -0,0 +1,285 @@
+"""年度パックParquetのHiveパーティション形式
+出力ディレクトリ直下に type={データタイプ}/year={年度}/month={月}/part-0.parquet の形式で保存し、
+複数年度の読み込みを1つのpyarrow.datasetのスキャン（パーティションによる枝刈り付き）で行えるようにする。
+従来の {データタイプ}_{年度}.parquet（フラット形式）と同じディレクトリに共存でき、移行はmigrate_flat_to_partitionedで行う
+"""
+
+import logging
+import os
+import re
+import shutil
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+
+logger = logging.getLogger(__name__)
+
+# 出力形式
+LAYOUT_FLAT = 'flat'
+LAYOUT_PARTITIONED = 'partitioned'
+LAYOUTS = (LAYOUT_FLAT, LAYOUT_PARTITIONED)
+
+# パーティションのカラム（読み込み時にデータカラムと区別するため英字名）
+PARTITION_SCHEMA = pa.schema([('type', pa.string()), ('year', pa.int16()), ('month', pa.int8())])
+PARTITION_COLUMNS = tuple(PARTITION_SCHEMA.names)
+
+# 月を決めるカラム（存在しない・欠損の行は月のパーティションがnullになる）
+MONTH_SOURCE_COLUMN = '年月日'
+
+# 書き込み時に1回に処理する行数
+_WRITE_BATCH_SIZE = 65536
+
+_FLAT_FILE_PATTERN = re.compile(r'^(?P<dataType>[A-Z]+)_(?P<year>\d{4})\.parquet$')
+_PARTITION_DIR_PATTERN = re.compile(r'^(?P<key>[a-z]+)=(?P<value>.+)$')
+_NULL_PARTITION = '__HIVE_DEFAULT_PARTITION__'
+
+
+def get_output_name(dataType: str, year: int, layout: str = LAYOUT_FLAT) -> str:
+    """出力先の出力ディレクトリからの相対パス（マニフェストのキーにも使用）
+
+    Args:
+        dataType: データタイプ（例: 'SED'）
+        year: 年度
+        layout: 出力形式（LAYOUT_FLATまたはLAYOUT_PARTITIONED）
+
+    Returns:
+        'SED_2024.parquet' または 'type=SED/year=2024'
+    """
+    validate_layout(layout)
+    if layout == LAYOUT_PARTITIONED:
+        return f'type={dataType}/year={year}'
+    return f'{dataType}_{year}.parquet'
+
+
+def get_partition_dir(baseDir: Union[str, Path], dataType: str, year: Optional[int] = None) -> Path:
+    """データタイプ（yearを指定した場合は年度）のパーティションディレクトリ"""
+    typeDir = Path(baseDir) / f'type={dataType}'
+    return typeDir if year is None else typeDir / f'year={year}'
+
+
+def list_partitioned_years(baseDir: Union[str, Path], dataType: str) -> List[int]:
+    """パーティション形式で保存されている年度（昇順）"""
+    typeDir = get_partition_dir(baseDir, dataType)
+    if not typeDir.is_dir():
+        return []
+    years = []
+    for child in typeDir.iterdir():
+        match = _PARTITION_DIR_PATTERN.match(child.name)
+        if child.is_dir() and match and match.group('key') == 'year' and match.group('value').isdigit():
+            years.append(int(match.group('value')))
+    return sorted(years)
+
+
+def list_partition_files(baseDir: Union[str, Path], dataType: str, years: Iterable[int]) -> List[Path]:
+    """指定年度のパーティションファイルを年度・月の順に列挙（存在しない年度は無視、月がnullのファイルは年度の最後）"""
+    files: List[Tuple[Tuple[int, int, str], Path]] = []
+    for year in sorted(set(years)):
+        yearDir = get_partition_dir(baseDir, dataType, year)
+        if not yearDir.is_dir():
+            continue
+        for filePath in yearDir.rglob('*.parquet'):
+            if any(part.startswith(('.', '_')) for part in filePath.relative_to(yearDir).parts):
+                continue
+            month = _partition_value(filePath.parent.name, 'month')
+            files.append(((year, month if month is not None else 99, filePath.name), filePath))
+    return [filePath for _, filePath in sorted(files)]
+
+
+def open_partitioned_dataset(baseDir: Union[str, Path], dataType: str, years: Iterable[int]) -> Optional[ds.Dataset]:
+    """指定年度のパーティションを1つのDatasetとして開く（年度ごとにスキーマが異なる場合は統合したスキーマを使用）
+
+    Returns:
+        Dataset（データカラム + type/year/monthのパーティションカラム）。該当するファイルがない場合はNone
+    """
+    files = list_partition_files(baseDir, dataType, years)
+    if not files:
+        return None
+    schemas = [pq.read_schema(filePath) for filePath in files]
+    dataSchema = pa.unify_schemas(schemas, promote_options='permissive')
+    partitionFields = [PARTITION_SCHEMA.field(name) for name in PARTITION_COLUMNS if name not in dataSchema.names]
+    schema = pa.schema(list(dataSchema) + partitionFields, metadata=dataSchema.metadata)
+    partitioning = ds.partitioning(PARTITION_SCHEMA, flavor='hive')
+    return ds.dataset([str(filePath) for filePath in files], schema=schema, format='parquet', partitioning=partitioning, partition_base_dir=str(baseDir))
+
+
+def write_partitioned_dataset(
+    sourceParquetPath: Union[str, Path],
+    baseDir: Union[str, Path],
+    dataType: str,
+    year: int
+) -> int:
+    """フラット形式のParquetファイルを type/year/month のパーティションに書き出す（同じ年度の既存パーティションは置き換える）
+
+    行グループ単位で読み込みながら書き込むため、ファイル全体をメモリに展開しない。
+    一時ディレクトリに書き込んでから置き換えるため、途中で失敗しても既存のパーティションは残る
+
+    Args:
+        sourceParquetPath: 書き出すParquetファイル
+        baseDir: 出力ディレクトリ（パーティションのルート）
+        dataType: データタイプ
+        year: 年度
+
+    Returns:
+        書き込んだレコード数
+    """
+    yearDir = get_partition_dir(baseDir, dataType, year)
+    temporaryDir = yearDir.with_name(f'.{yearDir.name}.tmp')
+    shutil.rmtree(temporaryDir, ignore_errors=True)
+
+    parquetFile = pq.ParquetFile(sourceParquetPath)
+    sourceSchema = parquetFile.schema_arrow
+    hasMonthSource = MONTH_SOURCE_COLUMN in sourceSchema.names
+    schema = sourceSchema.append(PARTITION_SCHEMA.field('month'))
+    rowCount = 0
+
+    def batches() -> Iterator[pa.RecordBatch]:
+        nonlocal rowCount
+        for batch in parquetFile.iter_batches(batch_size=_WRITE_BATCH_SIZE):
+            rowCount += batch.num_rows
+            month = _month_array(batch.column(MONTH_SOURCE_COLUMN) if hasMonthSource else None, batch.num_rows)
+            yield pa.RecordBatch.from_arrays(batch.columns + [month], schema=schema)
+
+    try:
+        ds.write_dataset(
+            batches(),
+            temporaryDir,
+            schema=schema,
+            format='parquet',
+            partitioning=ds.partitioning(pa.schema([PARTITION_SCHEMA.field('month')]), flavor='hive'),
+            basename_template='part-{i}.parquet',
+            existing_data_behavior='overwrite_or_ignore',
+            file_options=ds.ParquetFileFormat().make_write_options(compression='snappy'),
+            max_rows_per_group=_WRITE_BATCH_SIZE,
+            use_threads=False
+        )
+        _replace_dir(temporaryDir, yearDir)
+    finally:
+        shutil.rmtree(temporaryDir, ignore_errors=True)
+
+    logger.info('パーティション形式で保存しました', extra={'dataType': dataType, 'year': year, 'rows': rowCount, 'outputPath': str(yearDir)})
+    return rowCount
+
+
+def publish_output(
+    parquetFilePath: Union[str, Path],
+    baseDir: Union[str, Path],
+    dataType: str,
+    year: int,
+    layout: str = LAYOUT_FLAT
+) -> Path:
+    """変換済みのフラット形式のParquetファイルを指定した出力形式で公開する
+
+    パーティション形式の場合はパーティションに書き出してフラット形式のファイルを削除する。
+    フラット形式の場合は、同じ年度の古いパーティション（読み込み時に優先されるため）を削除する
+
+    Returns:
+        出力先のパス（フラット形式のファイルまたは年度のパーティションディレクトリ）
+    """
+    validate_layout(layout)
+    if layout == LAYOUT_PARTITIONED:
+        write_partitioned_dataset(parquetFilePath, baseDir, dataType, year)
+        Path(parquetFilePath).unlink(missing_ok=True)
+        return get_partition_dir(baseDir, dataType, year)
+
+    staleDir = get_partition_dir(baseDir, dataType, year)
+    if staleDir.is_dir():
+        logger.info('フラット形式で再変換したため古いパーティションを削除します', extra={'dataType': dataType, 'year': year, 'outputPath': str(staleDir)})
+        shutil.rmtree(staleDir)
+    return Path(parquetFilePath)
+
+
+def migrate_flat_to_partitioned(
+    baseDir: Union[str, Path],
+    dataTypes: Optional[Iterable[str]] = None,
+    years: Optional[Iterable[int]] = None,
+    keepFlat: bool = False
+) -> List[Dict[str, Union[str, int, bool, None]]]:
+    """既存のフラット形式のParquetファイル（{データタイプ}_{年度}.parquet）をパーティション形式に移行
+
+    マニフェストのエントリもパーティションのキーに付け替えるため、移行後も再変換は省略される
+
+    Args:
+        baseDir: Parquetファイルのディレクトリ
+        dataTypes: 移行するデータタイプ（Noneの場合は全て）
+        years: 移行する年度（Noneの場合は全て）
+        keepFlat: Trueの場合は移行後もフラット形式のファイルを残す
+
+    Returns:
+        ファイルごとの結果辞書のリスト（データタイプ・年度順）
+    """
+    # parquet_manifest → converter → src.utils → parquet_loader の循環インポートを避けるため関数内でインポート
+    from .parquet_manifest import rename_outputs
+
+    basePath = Path(baseDir)
+    targetTypes = set(dataTypes) if dataTypes is not None else None
+    targetYears = set(years) if years is not None else None
+
+    flatFiles = []
+    for filePath in basePath.glob('*.parquet'):
+        match = _FLAT_FILE_PATTERN.match(filePath.name)
+        if match is None:
+            continue
+        dataType, year = match.group('dataType'), int(match.group('year'))
+        if (targetTypes is None or dataType in targetTypes) and (targetYears is None or year in targetYears):
+            flatFiles.append((dataType, year, filePath))
+
+    results = []
+    renames = {}
+    for dataType, year, filePath in sorted(flatFiles):
+        try:
+            recordCount = write_partitioned_dataset(filePath, basePath, dataType, year)
+            renames[filePath.name] = get_output_name(dataType, year, LAYOUT_PARTITIONED)
+            if not keepFlat:
+                filePath.unlink()
+            results.append({'dataType': dataType, 'year': year, 'success': True, 'recordCount': recordCount, 'outputPath': str(get_partition_dir(basePath, dataType, year))})
+        except Exception as error:
+            logger.error('パーティション形式への移行エラー', extra={'dataType': dataType, 'year': year, 'filePath': str(filePath), 'error': str(error)})
+            results.append({'dataType': dataType, 'year': year, 'success': False, 'recordCount': 0, 'error': str(error)})
+
+    rename_outputs(basePath, renames)
+    logger.info('パーティション形式への移行完了', extra={'fileCount': len(flatFiles), 'successCount': sum(1 for r in results if r['success'])})
+    return results
+
+
+def validate_layout(layout: str) -> None:
+    """出力形式の検証"""
+    if layout not in LAYOUTS:
+        raise ValueError(f'出力形式が不正です: {layout}（{"/".join(LAYOUTS)}）')
+
+
+def _month_array(ymd: Optional[pa.Array], length: int) -> pa.Array:
+    """年月日（YYYYMMDD）から月のパーティション値を作成（年月日がない・不正な行はnull）"""
+    if ymd is None:
+        return pa.nulls(length, type=pa.int8())
+    values = pd.to_numeric(ymd.to_pandas(), errors='coerce').to_numpy(dtype=float)
+    month = np.floor(values / 100) % 100
+    invalid = np.isnan(month) | (month < 1) | (month > 12)
+    return pa.array(np.where(invalid, 0, month).astype(np.int8), type=pa.int8(), mask=invalid)
+
+
+def _partition_value(dirName: str, key: str) -> Optional[int]:
+    """パーティションディレクトリ名（例: month=3）から値を取得（null・別のキーの場合はNone）"""
+    match = _PARTITION_DIR_PATTERN.match(dirName)
+    if match is None or match.group('key') != key or match.group('value') == _NULL_PARTITION:
+        return None
+    return int(match.group('value'))
+
+
+def _replace_dir(sourceDir: Path, targetDir: Path) -> None:
+    """sourceDirでtargetDirを置き換える（既存のtargetDirは退避してから削除）"""
+    targetDir.parent.mkdir(parents=True, exist_ok=True)
+    if not sourceDir.exists():
+        # 0件の場合はwrite_datasetがディレクトリを作らない
+        sourceDir.mkdir(parents=True)
+    backupDir = targetDir.with_name(f'.{targetDir.name}.old')
+    shutil.rmtree(backupDir, ignore_errors=True)
+    if targetDir.exists():
+        os.replace(targetDir, backupDir)
+    os.replace(sourceDir, targetDir)
+    shutil.rmtree(backupDir, ignore_errors=True)
@@ -0,0 +1,54 @@
+"""Arrowテーブル・DataFrameを1回で結合するユーティリティ"""
+
+from typing import Iterable, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+
+
+class ArrowConcat:
+    """複数のテーブルを1回のコピーで結合するクラス（staticメソッドのみ）"""
+
+    @staticmethod
+    def concat_tables_to_pandas(tables: Iterable[Optional[pa.Table]]) -> Optional[pd.DataFrame]:
+        """
+        Arrowテーブルをpa.concat_tablesで結合してから、1回だけDataFrameに変換
+
+        pa.concat_tablesはチャンクを並べるだけでデータをコピーしないため、
+        DataFrameに変換した後に結合する場合と比べてコピーが1回で済む。
+        年度によってカラムが異なる場合は、カラムの和集合（存在しない年度は欠損）で結合する。
+
+        Args:
+            tables: Arrowテーブル（Noneは無視）
+
+        Returns:
+            結合したDataFrame（テーブルが1つもない場合はNone）
+        """
+        tables = [table for table in tables if table is not None]
+        if not tables:
+            return None
+        if len(tables) == 1:
+            return tables[0].to_pandas()
+        return pa.concat_tables(tables, promote_options="permissive").to_pandas()
+
+    @staticmethod
+    def concat_frames(frames: List[pd.DataFrame]) -> Optional[pd.DataFrame]:
+        """
+        DataFrameのリストを1回のpd.concatで結合
+
+        1つずつ結合するとそれまでの結果を毎回コピーするため、まとめて1回で結合する。
+        結合後は渡したリストを空にし、元のDataFrameを解放できるようにする。
+
+        Args:
+            frames: DataFrameのリスト（Noneと空のDataFrameは無視、結合後は空になる）
+
+        Returns:
+            結合したDataFrame（2つ以上の場合はインデックスを振り直す、DataFrameが1つもない場合はNone）
+        """
+        non_empty = [df for df in frames if df is not None and len(df) > 0]
+        frames.clear()
+        if not non_empty:
+            return None
+        if len(non_empty) == 1:
+            return non_empty[0]
+        return pd.concat(non_empty, ignore_index=True)
@@ -2,9 +2,13 @@
 
 import hashlib
 import json
+import os
+import shutil
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple, Union
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
 import pandas as pd
 
@@ -12,22 +16,47 @@ import pandas as pd
 class CacheManager:
     """前処理済みデータのキャッシュ管理クラス（staticなパスを持つ）"""
 
-    def __init__(self, prediction_app_path: Optional[Union[str, Path]] = None):
+    # ステージ単位のキャッシュのディレクトリ（cache/stages/{ステージ}/{キャッシュキー}/）
+    STAGES_DIR_NAME = "stages"
+    STAGE_METADATA_FILE_NAME = "metadata.json"
+
+    # キャッシュエントリのインデックス（サイズ・作成日時・最終アクセス日時・ヒット数）
+    INDEX_FILE_NAME = "cache_index.json"
+    # インデックスの読み込み〜書き出しをプロセス間で排他するロックファイル
+    INDEX_LOCK_FILE_NAME = "cache_index.json.lock"
+    # キャッシュ全体の容量上限（GB、未設定の場合は無制限）
+    ENV_CACHE_MAX_SIZE_GB = "PREDICTION_CACHE_MAX_SIZE_GB"
+    # 年度・データタイプ単位のキャッシュ（{キャッシュキー}_*.parquet）のインデックス上の区分
+    LEGACY_STAGE_NAME = "legacy"
+
+    def __init__(self, prediction_app_path: Optional[Union[str, Path]] = None, max_size_bytes: Optional[int] = None):
         """
         初期化
-        
+
         Args:
             prediction_app_path: apps/predictionディレクトリのパス（デフォルト: 自動検出）
+            max_size_bytes: キャッシュ全体の容量上限（バイト、Noneの場合は環境変数PREDICTION_CACHE_MAX_SIZE_GB、未設定なら無制限）。
+                保存時に上限を超えた場合は最終アクセスが古いエントリから削除する
         """
         if prediction_app_path is None:
             # apps/predictionディレクトリを自動検出（このファイルから2階層上）
             prediction_app_path = Path(__file__).parent.parent.parent
         self._prediction_app_path = Path(prediction_app_path)
-        
+
         # staticなキャッシュディレクトリパス
         self._cache_dir = self._prediction_app_path / "cache"
         self._cache_dir.mkdir(parents=True, exist_ok=True)
 
+        if max_size_bytes is None and os.environ.get(CacheManager.ENV_CACHE_MAX_SIZE_GB):
+            max_size_bytes = int(float(os.environ[CacheManager.ENV_CACHE_MAX_SIZE_GB]) * 1024 ** 3)
+        self._max_size_bytes = max_size_bytes
+        self._index_lock_state = threading.local()
+
+    @property
+    def max_size_bytes(self) -> Optional[int]:
+        """キャッシュ全体の容量上限（バイト、Noneの場合は無制限）"""
+        return self._max_size_bytes
+
     def _generate_cache_key(
         self,
         data_types: List[str],
@@ -68,6 +97,377 @@ class CacheManager:
         
         return cache_key
 
+    @staticmethod
+    def build_stage_key(
+        stage: str,
+        version: int,
+        inputs: Optional[Dict[str, Optional[str]]] = None,
+        files: Iterable[Path] = (),
+        params: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """
+        ステージの入力からキャッシュキーを生成
+
+        入力（上流ステージのキー・年度パックの識別ハッシュ）・ファイル（スキーマJSON・カテゴリマッピング）の内容・
+        パラメータ・ステージのコードバージョンのいずれかが変わるとキーが変わる。
+        上流ステージのキーを入力に含めることで、スキーマの変更はそのスキーマを使うステージ以降のみを無効にする。
+
+        Args:
+            stage: ステージ名（例: featured, converted, split）
+            version: ステージのコードバージョン（出力が変わる変更をした場合に上げる）
+            inputs: 入力名 → ハッシュ
+            files: 内容をキーに含めるファイル（存在しないファイルはNoneとして扱う）
+            params: その他のパラメータ（JSONに変換できる値）
+
+        Returns:
+            キャッシュキー（SHA-256の先頭32文字）
+        """
+        payload = {
+            "stage": stage,
+            "version": version,
+            "inputs": dict(sorted((inputs or {}).items())),
+            "files": {Path(path).name: CacheManager._file_hash(Path(path)) for path in files},
+            "params": params or {},
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str).encode()).hexdigest()[:32]
+
+    def get_stage_dir(self, stage: str, key: str) -> Path:
+        """ステージのキャッシュディレクトリ"""
+        return self._cache_dir / CacheManager.STAGES_DIR_NAME / stage / key
+
+    def save_stage(self, stage: str, key: str, frames: Dict[str, pd.DataFrame], metadata: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        ステージの出力をキャッシュに保存（一時ディレクトリに書き出してから置き換え）
+
+        Args:
+            stage: ステージ名
+            key: build_stage_keyで生成したキャッシュキー
+            frames: 出力名 → DataFrame（インデックスも保存）
+            metadata: メタデータに追記する値
+
+        Returns:
+            保存できた場合True（Parquetに変換できない場合などはFalse、キャッシュは任意のため例外は投げない）
+        """
+        stage_dir = self.get_stage_dir(stage, key)
+        temporary_dir = stage_dir.with_name(f".{key}.tmp-{os.getpid()}")
+        try:
+            shutil.rmtree(temporary_dir, ignore_errors=True)
+            temporary_dir.mkdir(parents=True)
+            for name, df in frames.items():
+                self._save_dataframe(df, temporary_dir / f"{name}.parquet")
+            stage_metadata = {
+                "stage": stage,
+                "key": key,
+                "created_at": datetime.now().isoformat(timespec="seconds"),
+                "frames": {name: {"rows": len(df), "columns": len(df.columns)} for name, df in frames.items()},
+                **(metadata or {}),
+            }
+            with open(temporary_dir / CacheManager.STAGE_METADATA_FILE_NAME, "w", encoding="utf-8") as f:
+                json.dump(stage_metadata, f, indent=2, ensure_ascii=False, default=str)
+            shutil.rmtree(stage_dir, ignore_errors=True)
+            os.replace(temporary_dir, stage_dir)
+            print(f"[_07_] {stage}ステージをキャッシュに保存: {stage_dir}")
+            self._register_entry(self._stage_entry_id(stage, key), stage, [stage_dir], stage_metadata["created_at"])
+            return True
+        except Exception as e:
+            shutil.rmtree(temporary_dir, ignore_errors=True)
+            print(f"[_07_] {stage}ステージのキャッシュを保存できませんでした: {e}")
+            return False
+
+    def load_stage(self, stage: str, key: str, names: Iterable[str]) -> Optional[Dict[str, pd.DataFrame]]:
+        """
+        ステージの出力をキャッシュから読み込み
+
+        Args:
+            stage: ステージ名
+            key: build_stage_keyで生成したキャッシュキー
+            names: 読み込む出力名
+
+        Returns:
+            出力名 → DataFrame（キャッシュが存在しない・不完全な場合はNone）
+        """
+        stage_dir = self.get_stage_dir(stage, key)
+        if not (stage_dir / CacheManager.STAGE_METADATA_FILE_NAME).exists():
+            self._record_access(None, stage, hit=False)
+            return None
+        try:
+            frames = {name: self._load_dataframe(stage_dir / f"{name}.parquet") for name in names}
+        except Exception as e:
+            print(f"[_07_] {stage}ステージのキャッシュの読み込み中にエラーが発生しました: {e}")
+            self._record_access(None, stage, hit=False)
+            return None
+        print(f"[_07_] {stage}ステージをキャッシュから読み込み: {stage_dir} ({', '.join(f'{n}: {len(df):,}件' for n, df in frames.items())})")
+        self._record_access(self._stage_entry_id(stage, key), stage, hit=True, paths=[stage_dir])
+        return frames
+
+    def list_entries(self) -> List[Dict[str, Any]]:
+        """
+        キャッシュエントリの一覧を取得（ディスク上の状態とインデックスを同期してから取得）
+
+        Returns:
+            エントリのリスト（id, stage, paths, size_bytes, created_at, last_accessed_at, hits、最終アクセスが古い順）
+        """
+        with self._index_lock():
+            index = self._sync_index()
+        entries = [{"id": entry_id, **entry} for entry_id, entry in index["entries"].items()]
+        return sorted(entries, key=lambda entry: entry["last_accessed_at"])
+
+    def get_stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        ステージごとのキャッシュの読み込み結果を取得
+
+        Returns:
+            ステージ名 → {"hits": ヒット数, "misses": ミス数}
+        """
+        with self._index_lock():
+            return self._load_index()["stats"]
+
+    def get_total_size(self) -> int:
+        """インデックスに登録されているキャッシュの合計サイズ（バイト）"""
+        with self._index_lock():
+            return sum(entry["size_bytes"] for entry in self._sync_index()["entries"].values())
+
+    def get_eviction_candidates(self, max_size_bytes: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        容量上限を守るために削除するエントリを取得（最終アクセスが古い順）
+
+        Args:
+            max_size_bytes: 容量上限（Noneの場合はこのインスタンスの上限、上限がなければ空リスト）
+
+        Returns:
+            削除するエントリのリスト（list_entriesと同じ形式）
+        """
+        max_size_bytes = self._max_size_bytes if max_size_bytes is None else max_size_bytes
+        entries = self.list_entries()
+        if max_size_bytes is None:
+            return []
+        total_size = sum(entry["size_bytes"] for entry in entries)
+        candidates = []
+        for entry in entries:
+            if total_size <= max_size_bytes:
+                break
+            candidates.append(entry)
+            total_size -= entry["size_bytes"]
+        return candidates
+
+    def evict(self, max_size_bytes: Optional[int] = None, protected: Iterable[str] = ()) -> List[str]:
+        """
+        容量上限を超えている場合、最終アクセスが古いエントリから削除（LRU）
+
+        Args:
+            max_size_bytes: 容量上限（Noneの場合はこのインスタンスの上限、上限がなければ何もしない）
+            protected: 削除しないエントリID（保存直後のエントリなど）
+
+        Returns:
+            削除したエントリIDのリスト
+        """
+        max_size_bytes = self._max_size_bytes if max_size_bytes is None else max_size_bytes
+        if max_size_bytes is None:
+            return []
+        protected = set(protected)
+        with self._index_lock():
+            index = self._sync_index()
+            total_size = sum(entry["size_bytes"] for entry in index["entries"].values())
+            evicted = []
+            for entry_id, entry in sorted(index["entries"].items(), key=lambda item: item[1]["last_accessed_at"]):
+                if total_size <= max_size_bytes:
+                    break
+                if entry_id in protected:
+                    continue
+                self._remove_paths(entry["paths"])
+                del index["entries"][entry_id]
+                total_size -= entry["size_bytes"]
+                evicted.append(entry_id)
+                print(f"[_07_] キャッシュを削除（容量上限）: {entry_id} ({entry['size_bytes'] / 1024 ** 2:.1f}MB)")
+            if evicted:
+                self._write_index(index)
+        return evicted
+
+    @staticmethod
+    def _stage_entry_id(stage: str, key: str) -> str:
+        """ステージ単位のキャッシュのエントリID"""
+        return f"{CacheManager.STAGES_DIR_NAME}/{stage}/{key}"
+
+    @contextmanager
+    def _index_lock(self) -> Iterator[None]:
+        """
+        インデックスの読み込み〜書き出しをプロセス間で排他（ロックファイルのロック、同じスレッドからは再入可能）
+
+        インデックスを更新する処理は、読み込みから書き出しまでをこのロックの中で行う。
+        POSIXではfcntl.flock、Windowsではmsvcrt.locking（ロックファイルの先頭1バイト）を使う。
+        """
+        if getattr(self._index_lock_state, "held", False):
+            yield
+            return
+        lock_fd = os.open(self._cache_dir / CacheManager.INDEX_LOCK_FILE_NAME, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.name == "nt":
+                import msvcrt
+                while True:
+                    # LK_LOCKは約10秒取れないとOSErrorになるため、取れるまで繰り返す
+                    try:
+                        msvcrt.locking(lock_fd, msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        continue
+            else:
+                import fcntl
+                fcntl.flock(lock_fd, fcntl.LOCK_EX)
+            self._index_lock_state.held = True
+            try:
+                yield
+            finally:
+                self._index_lock_state.held = False
+                if os.name == "nt":
+                    os.lseek(lock_fd, 0, os.SEEK_SET)
+                    msvcrt.locking(lock_fd, msvcrt.LK_UNLCK, 1)
+                else:
+                    fcntl.flock(lock_fd, fcntl.LOCK_UN)
+        finally:
+            os.close(lock_fd)
+
+    def _load_index(self) -> Dict[str, Any]:
+        """インデックスを読み込み（存在しない・壊れている場合はディスク上のキャッシュから作り直す）"""
+        index_path = self._cache_dir / CacheManager.INDEX_FILE_NAME
+        if index_path.exists():
+            try:
+                with open(index_path, "r", encoding="utf-8") as f:
+                    index = json.load(f)
+                index.setdefault("entries", {})
+                index.setdefault("stats", {})
+                return index
+            except (OSError, ValueError) as e:
+                print(f"[_07_] キャッシュのインデックスを読み込めないため作り直します: {e}")
+        return self._sync_index({"entries": {}, "stats": {}})
+
+    def _write_index(self, index: Dict[str, Any]) -> None:
+        """インデックスを書き出し（一時ファイルに書き出してから置き換え）"""
+        index_path = self._cache_dir / CacheManager.INDEX_FILE_NAME
+        temporary_path = index_path.with_name(f".{CacheManager.INDEX_FILE_NAME}.tmp-{os.getpid()}")
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            json.dump(index, f, indent=2, ensure_ascii=False)
+        os.replace(temporary_path, index_path)
+
+    def _sync_index(self, index: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        ディスク上のキャッシュとインデックスを同期（削除されたエントリを除き、未登録のエントリを追加）
+
+        未登録のエントリの最終アクセス日時は作成日時とする。
+        """
+        index = self._load_index() if index is None else index
+        on_disk = self._scan_entries()
+        for entry_id in list(index["entries"]):
+            if entry_id not in on_disk:
+                del index["entries"][entry_id]
+        for entry_id, (stage, paths, created_at) in on_disk.items():
+            entry = index["entries"].get(entry_id)
+            if entry is None:
+                index["entries"][entry_id] = self._new_entry(stage, paths, created_at)
+            else:
+                entry["paths"] = [self._relative_path(path) for path in paths]
+                entry["size_bytes"] = sum(CacheManager._path_size(path) for path in paths)
+        self._write_index(index)
+        return index
+
+    def _scan_entries(self) -> Dict[str, Tuple[str, List[Path], str]]:
+        """ディスク上のキャッシュエントリを検出（エントリID → (区分, パス, 作成日時)）"""
+        entries = {}
+        for metadata_path in self._cache_dir.glob(f"*_{CacheManager.STAGE_METADATA_FILE_NAME}"):
+            cache_key = metadata_path.name[: -len(f"_{CacheManager.STAGE_METADATA_FILE_NAME}")]
+            paths = [path for path in self._get_cache_paths(cache_key).values() if path.exists()]
+            paths += [path for path in self._get_cache_paths(cache_key, split_date="").values() if path.exists() and path not in paths]
+            entries[cache_key] = (CacheManager.LEGACY_STAGE_NAME, paths, CacheManager._mtime_isoformat(metadata_path))
+        stages_dir = self._cache_dir / CacheManager.STAGES_DIR_NAME
+        for metadata_path in stages_dir.glob(f"*/*/{CacheManager.STAGE_METADATA_FILE_NAME}"):
+            stage_dir = metadata_path.parent
+            try:
+                with open(metadata_path, "r", encoding="utf-8") as f:
+                    created_at = json.load(f)["created_at"]
+            except (OSError, ValueError, KeyError):
+                created_at = CacheManager._mtime_isoformat(metadata_path)
+            entries[self._stage_entry_id(stage_dir.parent.name, stage_dir.name)] = (stage_dir.parent.name, [stage_dir], created_at)
+        return entries
+
+    def _new_entry(self, stage: str, paths: List[Path], created_at: str) -> Dict[str, Any]:
+        """インデックスのエントリを作成"""
+        return {
+            "stage": stage,
+            "paths": [self._relative_path(path) for path in paths],
+            "size_bytes": sum(CacheManager._path_size(path) for path in paths),
+            "created_at": created_at,
+            "last_accessed_at": created_at,
+            "hits": 0,
+        }
+
+    def _register_entry(self, entry_id: str, stage: str, paths: List[Path], created_at: str) -> None:
+        """保存したエントリをインデックスに登録し、容量上限を超えた場合は古いエントリを削除"""
+        try:
+            with self._index_lock():
+                index = self._load_index()
+                entry = self._new_entry(stage, paths, created_at)
+                entry["last_accessed_at"] = datetime.now().isoformat()
+                index["entries"][entry_id] = entry
+                self._write_index(index)
+                if self._max_size_bytes is not None:
+                    self.evict(protected=[entry_id])
+        except OSError as e:
+            print(f"[_07_] キャッシュのインデックスを更新できませんでした: {e}")
+
+    def _record_access(self, entry_id: Optional[str], stage: str, hit: bool, paths: Iterable[Path] = ()) -> None:
+        """読み込み結果（ヒット・ミス）をインデックスに記録し、ヒットしたエントリの最終アクセス日時を更新"""
+        try:
+            with self._index_lock():
+                index = self._load_index()
+                stats = index["stats"].setdefault(stage, {"hits": 0, "misses": 0})
+                stats["hits" if hit else "misses"] += 1
+                if entry_id is not None:
+                    entry = index["entries"].get(entry_id)
+                    if entry is None:
+                        paths = list(paths)
+                        entry = index["entries"][entry_id] = self._new_entry(stage, paths, datetime.now().isoformat())
+                    entry["last_accessed_at"] = datetime.now().isoformat()
+                    entry["hits"] += 1
+                self._write_index(index)
+        except OSError as e:
+            print(f"[_07_] キャッシュのインデックスを更新できませんでした: {e}")
+
+    def _record_legacy_access(self, cache_key: str, cache_paths: Dict[str, Path], hit: bool) -> None:
+        """年度・データタイプ単位のキャッシュの読み込み結果をインデックスに記録"""
+        paths = [path for path in cache_paths.values() if path.exists()]
+        self._record_access(cache_key if hit else None, CacheManager.LEGACY_STAGE_NAME, hit=hit, paths=paths)
+
+    def _relative_path(self, path: Path) -> str:
+        """キャッシュディレクトリからの相対パス"""
+        return Path(path).relative_to(self._cache_dir).as_posix()
+
+    def _remove_paths(self, relative_paths: Iterable[str]) -> None:
+        """エントリのファイル・ディレクトリを削除"""
+        for relative_path in relative_paths:
+            path = self._cache_dir / relative_path
+            if path.is_dir():
+                shutil.rmtree(path, ignore_errors=True)
+            elif path.exists():
+                path.unlink()
+
+    @staticmethod
+    def _path_size(path: Path) -> int:
+        """ファイル・ディレクトリのサイズ（バイト）"""
+        if path.is_dir():
+            return sum(child.stat().st_size for child in path.rglob("*") if child.is_file())
+        return path.stat().st_size if path.exists() else 0
+
+    @staticmethod
+    def _mtime_isoformat(path: Path) -> str:
+        """ファイルの更新日時（ISO形式）"""
+        return datetime.fromtimestamp(path.stat().st_mtime).isoformat()
+
+    @staticmethod
+    def _file_hash(path: Path) -> Optional[str]:
+        """ファイル内容のSHA-256（存在しない場合はNone）"""
+        if not path.exists():
+            return None
+        return hashlib.sha256(path.read_bytes()).hexdigest()
+
     def _get_cache_paths(
         self, cache_key: str, split_date: Optional[Union[str, datetime]] = None
     ) -> Dict[str, Path]:
@@ -183,6 +583,12 @@ class CacheManager:
         # メタデータを保存
         with open(cache_paths["metadata"], "w", encoding="utf-8") as f:
             json.dump(metadata, f, indent=2, ensure_ascii=False)
+        self._register_entry(
+            cache_key,
+            CacheManager.LEGACY_STAGE_NAME,
+            [path for path in cache_paths.values() if path.exists()],
+            datetime.now().isoformat(timespec="seconds"),
+        )
 
     def _save_dataframe(self, df: pd.DataFrame, path: Path) -> None:
         """
@@ -228,6 +634,7 @@ class CacheManager:
         # メタデータを確認
         metadata_path = cache_paths["metadata"]
         if not metadata_path.exists():
+            self._record_access(None, CacheManager.LEGACY_STAGE_NAME, hit=False)
             return None
 
         try:
@@ -263,16 +670,20 @@ class CacheManager:
                     print(f"[_07_] 評価用データをキャッシュから読み込み: {cache_paths['eval']} ({len(eval_df):,}件)")
 
                 if train_df is not None and test_df is not None and eval_df is not None:
+                    self._record_legacy_access(cache_key, cache_paths, hit=True)
                     return train_df, test_df, eval_df
                 else:
+                    self._record_legacy_access(cache_key, cache_paths, hit=False)
                     return None
             else:
                 # 単一データを読み込み
                 if cache_paths["data"].exists():
                     df = self._load_dataframe(cache_paths["data"])
                     print(f"[_07_] 前処理済みデータをキャッシュから読み込み: {cache_paths['data']} ({len(df):,}件)")
+                    self._record_legacy_access(cache_key, cache_paths, hit=True)
                     return df
                 else:
+                    self._record_legacy_access(cache_key, cache_paths, hit=False)
                     return None
 
         except Exception as e:
@@ -303,9 +714,11 @@ class CacheManager:
         if cache_paths["featured"].exists():
             featured_df = self._load_dataframe(cache_paths["featured"])
             print(f"[_07_] 特徴量抽出データをキャッシュから読み込み: {cache_paths['featured']} ({len(featured_df):,}件)")
+            self._record_legacy_access(cache_key, cache_paths, hit=True)
             return featured_df
         else:
             print(f"[_07_] [DEBUG] 特徴量抽出データのキャッシュが見つかりません: {cache_paths['featured']}")
+            self._record_legacy_access(cache_key, cache_paths, hit=False)
             return None
 
     def _load_dataframe(self, path: Path) -> pd.DataFrame:
@@ -348,11 +761,15 @@ class CacheManager:
                 if path.exists():
                     path.unlink()
                     print(f"[_07_] キャッシュを削除: {path}")
+            with self._index_lock():
+                self._sync_index()
         else:
-            # すべてのキャッシュを削除
-            for path in self._cache_dir.glob("*.parquet"):
-                path.unlink()
-            for path in self._cache_dir.glob("*.json"):
-                path.unlink()
+            # すべてのキャッシュを削除（インデックスも*.jsonとして削除される）
+            with self._index_lock():
+                for path in self._cache_dir.glob("*.parquet"):
+                    path.unlink()
+                for path in self._cache_dir.glob("*.json"):
+                    path.unlink()
+                shutil.rmtree(self._cache_dir / CacheManager.STAGES_DIR_NAME, ignore_errors=True)
             print(f"[_07_] すべてのキャッシュを削除: {self._cache_dir}")
 
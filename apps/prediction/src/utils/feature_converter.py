@@ -71,6 +71,60 @@ class FeatureConverter:
             ymd_str = ymd_str.split(".")[0]
         return ymd_str.zfill(8)
 
+    @staticmethod
+    def safe_ymd_vectorized(values: pd.Series) -> pd.Series:
+        """
+        safe_ymdのベクトル化版（values.apply(FeatureConverter.safe_ymd)と同一の結果を返す）
+
+        年月日はデータ件数に対してユニーク値が少ないため、factorizeしたユニーク値のみを
+        dtypeに応じたNumPy/pandasの文字列操作で変換し、コードで全行に展開する。
+
+        Args:
+            values: 年月日（int・float・文字列・欠損が混在していてもよい）
+
+        Returns:
+            8桁の年月日文字列（変換できない値は""）のSeries（object型、valuesと同じインデックス）
+        """
+        codes, uniques = pd.factorize(values, use_na_sentinel=True)
+        formatted = np.empty(len(uniques) + 1, dtype=object)
+        formatted[:-1] = FeatureConverter._format_ymd_uniques(np.asarray(uniques))
+        # 欠損（factorizeのsentinel=-1）は末尾の""を参照する
+        formatted[-1] = ""
+        return pd.Series(formatted[codes], index=values.index, name=values.name, dtype=object)
+
+    @staticmethod
+    def _format_ymd_uniques(uniques: np.ndarray) -> np.ndarray:
+        """年月日のユニーク値（欠損を含まない）をsafe_ymdと同じ規則で文字列に変換"""
+        if uniques.dtype.kind in "biu":
+            # int/bool: str(int(value)).zfill(8)
+            integers = uniques.astype(np.int64) if uniques.dtype.kind == "b" else uniques
+            return pd.Series(integers.astype(str), dtype=object).str.zfill(8).to_numpy()
+
+        if uniques.dtype.kind == "f":
+            # float: 小数部を切り捨ててint → zfill（inf等の変換できない値は""）
+            result = np.full(len(uniques), "", dtype=object)
+            in_range = np.isfinite(uniques) & (np.abs(uniques) < 2.0 ** 63)
+            if in_range.any():
+                result[in_range] = pd.Series(np.trunc(uniques[in_range]).astype(np.int64).astype(str), dtype=object).str.zfill(8).to_numpy()
+            overflow = np.isfinite(uniques) & ~in_range
+            result[overflow] = [FeatureConverter.safe_ymd(float(value)) for value in uniques[overflow]]
+            return result
+
+        if pd.api.types.infer_dtype(uniques, skipna=False) == "string":
+            # 文字列: ".0"と"."を除去してzfill
+            return (
+                pd.Series(uniques, dtype=object)
+                .str.replace(".0", "", regex=False)
+                .str.replace(".", "", regex=False)
+                .str.zfill(8)
+                .to_numpy()
+            )
+
+        # 型が混在する場合はユニーク値ごとに変換
+        result = np.empty(len(uniques), dtype=object)
+        result[:] = [FeatureConverter.safe_ymd(value) for value in uniques]
+        return result
+
     @staticmethod
     def generate_race_key(
         year: int,
@@ -126,14 +180,14 @@ class FeatureConverter:
         - year_colだけから年月日を補完するようなfallbackは行わない（問題の隠蔽を防ぐ）
         """
         if ymd_fallback_col and ymd_fallback_col in df.columns:
-            ymd_str = df[ymd_fallback_col].apply(FeatureConverter.safe_ymd)
+            ymd_str = FeatureConverter.safe_ymd_vectorized(df[ymd_fallback_col])
             mask_fallback = ymd_str.str.len() == 8
         else:
             ymd_str = pd.Series("", index=df.index)
             mask_fallback = pd.Series(False, index=df.index)
 
         if ymd_col in df.columns:
-            ymd_str_primary = df[ymd_col].apply(FeatureConverter.safe_ymd)
+            ymd_str_primary = FeatureConverter.safe_ymd_vectorized(df[ymd_col])
             mask_primary = ymd_str_primary.str.len() == 8
         else:
             ymd_str_primary = pd.Series("", index=df.index)
@@ -173,42 +227,25 @@ class FeatureConverter:
     @staticmethod
     def create_bac_date_mapping(bac_df: pd.DataFrame) -> dict[tuple, str]:
         """BACデータから年月日マッピングを作成（場コード、回、日、R）-> 年月日"""
-        # 必要なカラムのみを抽出してメモリ使用量を削減
-        required_cols = FeatureConverter.RACE_KEY_REQUIRED_COLUMNS + ["年月日"]
-        bac_df_subset = bac_df[required_cols].copy()
-        if bac_df_subset[FeatureConverter.RACE_KEY_REQUIRED_COLUMNS].isna().any().any():
-            missing_cols = [
-                c for c in FeatureConverter.RACE_KEY_REQUIRED_COLUMNS
-                if bac_df_subset[c].isna().any()
-            ]
-            raise ValueError(f"BACデータにrace_key必須カラムの欠損があります: {missing_cols}")
-        bac_df_subset["key"] = (
-            bac_df_subset["場コード"].astype(int).astype(str).str.zfill(2)
-            + "_"
-            + bac_df_subset["回"].astype(int).astype(str)  # 回はzfillしない（仕様: 1桁）
-            + "_"
-            + bac_df_subset["日"].astype(str).str.lower()
-            + "_"
-            + bac_df_subset["R"].astype(int).astype(str).str.zfill(2)
+        bac_df_filtered = FeatureConverter._create_bac_date_frame(bac_df)
+        keys = zip(
+            bac_df_filtered["場コード"].astype(int).tolist(),
+            bac_df_filtered["回"].astype(int).tolist(),
+            bac_df_filtered["日"].astype(str).str.lower().tolist(),
+            bac_df_filtered["R"].astype(int).tolist(),
+            strict=True,
         )
-        bac_df_subset["ymd"] = bac_df_subset["年月日"].apply(FeatureConverter.safe_ymd)
-        bac_df_filtered = bac_df_subset[bac_df_subset["ymd"].str.len() == 8]
-
-        date_map = {}
-        for _, row in bac_df_filtered.iterrows():
-            key = (
-                FeatureConverter.safe_int(row["場コード"]),
-                FeatureConverter.safe_int(row["回"]),
-                str(row["日"]).lower(),
-                FeatureConverter.safe_int(row["R"]),
-            )
-            date_map[key] = row["ymd"]
-
-        return date_map
+        # 同じキーが複数ある場合は後の行の年月日を使用する
+        return dict(zip(keys, bac_df_filtered["ymd"].tolist(), strict=True))
 
     @staticmethod
     def create_bac_date_mapping_for_merge(bac_df: pd.DataFrame) -> pd.DataFrame:
         """BACデータから年月日マッピングを作成（マージ用DataFrame形式）"""
+        return FeatureConverter._create_bac_date_frame(bac_df)[["key", "ymd"]]
+
+    @staticmethod
+    def _create_bac_date_frame(bac_df: pd.DataFrame) -> pd.DataFrame:
+        """BACデータにkey（場コード_回_日_R）とymd（8桁の年月日）を追加し、年月日が取得できる行のみを返す"""
         # 必要なカラムのみを抽出してメモリ使用量を削減
         required_cols = FeatureConverter.RACE_KEY_REQUIRED_COLUMNS + ["年月日"]
         bac_df_subset = bac_df[required_cols].copy()
@@ -218,19 +255,11 @@ class FeatureConverter:
                 if bac_df_subset[c].isna().any()
             ]
             raise ValueError(f"BACデータにrace_key必須カラムの欠損があります: {missing_cols}")
-        bac_df_subset["key"] = (
-            bac_df_subset["場コード"].astype(int).astype(str).str.zfill(2)
-            + "_"
-            + bac_df_subset["回"].astype(int).astype(str)  # 回はzfillしない（仕様: 1桁）
-            + "_"
-            + bac_df_subset["日"].astype(str).str.lower()
-            + "_"
-            + bac_df_subset["R"].astype(int).astype(str).str.zfill(2)
+        bac_df_subset["key"] = FeatureConverter.generate_race_key_vectorized(
+            bac_df_subset["場コード"], bac_df_subset["回"], bac_df_subset["日"], bac_df_subset["R"]
         )
-        bac_df_subset["ymd"] = bac_df_subset["年月日"].apply(FeatureConverter.safe_ymd)
-        bac_df_filtered = bac_df_subset[bac_df_subset["ymd"].str.len() == 8]
-
-        return bac_df_filtered[["key", "ymd"]]
+        bac_df_subset["ymd"] = FeatureConverter.safe_ymd_vectorized(bac_df_subset["年月日"])
+        return bac_df_subset[bac_df_subset["ymd"].str.len() == 8]
 
     @staticmethod
     def generate_race_key_vectorized(
@@ -344,7 +373,7 @@ class FeatureConverter:
             if "年月日" not in df.columns:
                 raise ValueError("start_datetime算出に必要な年月日カラムが存在しません。")
 
-            ymd_str = df["年月日"].apply(FeatureConverter.safe_ymd)
+            ymd_str = FeatureConverter.safe_ymd_vectorized(df["年月日"])
             invalid_ymd = ymd_str.str.len() != 8
             if invalid_ymd.any():
                 sample = ymd_str[invalid_ymd].head(10).tolist()
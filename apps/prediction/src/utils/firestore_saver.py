@@ -5,7 +5,9 @@ import os
 import json
 from datetime import datetime
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import Iterable, List, Dict, Any, Optional
+from urllib.error import HTTPError
+from urllib.parse import urlencode
 from urllib.request import Request, urlopen
 
 try:
@@ -14,6 +16,8 @@ try:
 except ImportError:
     raise ImportError("firebase-adminがインストールされていません。pip install firebase-admin でインストールしてください。")
 
+from .prediction_records import patch_prediction_records
+
 logger = logging.getLogger(__name__)
 
 # Firebase Admin SDKの初期化（一度だけ実行）
@@ -72,6 +76,47 @@ def _to_firestore_map(fields: Dict[str, Any]) -> Dict[str, Any]:
     return {"mapValue": {"fields": {k: _to_firestore_value(v) for k, v in fields.items()}}}
 
 
+def _from_firestore_value(value: Dict[str, Any]) -> Any:
+    if "mapValue" in value:
+        return {k: _from_firestore_value(v) for k, v in value["mapValue"].get("fields", {}).items()}
+    if "arrayValue" in value:
+        return [_from_firestore_value(v) for v in value["arrayValue"].get("values", [])]
+    if "integerValue" in value:
+        return int(value["integerValue"])
+    if "doubleValue" in value:
+        return float(value["doubleValue"])
+    for key in ("stringValue", "booleanValue", "timestampValue"):
+        if key in value:
+            return value[key]
+    if "nullValue" in value:
+        return None
+    raise ValueError(f"Unsupported Firestore value: {list(value)}")
+
+
+def _prediction_to_firestore_map(p: Dict[str, Any]) -> Dict[str, Any]:
+    return _to_firestore_map({
+        "race_key": p["race_key"],
+        "horse_number": int(p["horse_number"]),
+        "horse_name": p["horse_name"],
+        "jockey_name": p["jockey_name"],
+        "trainer_name": p["trainer_name"],
+        "predicted_score": float(p["predicted_score"]),
+        "predicted_rank": int(p["predicted_rank"]),
+    })
+
+
+def _get_firestore_doc(url: str) -> Optional[Dict[str, Any]]:
+    req = Request(url, method='GET')
+    req.add_header('Authorization', 'Bearer owner')
+    try:
+        with urlopen(req, timeout=60) as resp:
+            return json.loads(resp.read().decode('utf-8'))
+    except HTTPError as e:
+        if e.code == 404:
+            return None
+        raise
+
+
 def _patch_firestore_doc(url: str, body: Dict[str, Any]) -> Dict[str, Any]:
     payload = json.dumps(body).encode('utf-8')
     req = Request(url, data=payload, method='PATCH')
@@ -142,18 +187,7 @@ def save_predictions_to_firestore(
                 "updated_at": {"timestampValue": now},
                 "predictions": {
                     "arrayValue": {
-                        "values": [
-                            _to_firestore_map({
-                                "race_key": p["race_key"],
-                                "horse_number": int(p["horse_number"]),
-                                "horse_name": p["horse_name"],
-                                "jockey_name": p["jockey_name"],
-                                "trainer_name": p["trainer_name"],
-                                "predicted_score": float(p["predicted_score"]),
-                                "predicted_rank": int(p["predicted_rank"]),
-                            })
-                            for p in predictions
-                        ]
+                        "values": [_prediction_to_firestore_map(p) for p in predictions]
                     }
                 },
             }
@@ -182,6 +216,69 @@ def save_predictions_to_firestore(
     return 1
 
 
+def update_race_predictions_in_firestore(
+    date_str: str,
+    race_predictions: List[Dict[str, Any]],
+    race_keys: Iterable[str],
+    collection_name: str = "predictions"
+) -> int:
+    """
+    Firestoreの予測結果のうち、指定したレースの予測結果のみを置き換える（直前情報の更新による再予測用）
+    
+    Args:
+        date_str: 日付文字列（YYYY-MM-DD形式）
+        race_predictions: 指定したレースの新しい予測結果のリスト
+        race_keys: 置き換えるレースのrace_key
+        collection_name: Firestoreコレクション名（デフォルト: "predictions"）
+    
+    Returns:
+        置き換え後の予測結果の件数
+    """
+    doc_id = f"date_{date_str.replace('-', '_')}"
+    race_keys = list(race_keys)
+    logger.info(f"予測結果をFirestoreで部分更新中: {collection_name}/{doc_id} ({len(race_keys)}レース, {len(race_predictions)}件)")
+
+    if _use_emulator():
+        url = _firestore_emulator_doc_url(collection_name, doc_id)
+        doc = _get_firestore_doc(url)
+        existing = _from_firestore_value(doc["fields"]["predictions"]) if doc and "predictions" in doc.get("fields", {}) else []
+        merged = patch_prediction_records(existing, race_predictions, race_keys)
+        now = datetime.utcnow().isoformat(timespec='seconds') + "Z"
+        fields = {
+            "date": {"stringValue": date_str},
+            "total_count": {"integerValue": str(len(merged))},
+            "updated_at": {"timestampValue": now},
+            "predictions": {"arrayValue": {"values": [_prediction_to_firestore_map(p) for p in merged]}},
+        }
+        # created_atなど、更新しないフィールドは残す
+        update_mask = urlencode([("updateMask.fieldPaths", name) for name in fields])
+        _patch_firestore_doc(f"{url}?{update_mask}", {"fields": fields})
+        logger.info(f"予測結果の部分更新完了: {collection_name}/{doc_id} ({len(merged)}件)")
+        return len(merged)
+
+    _initialize_firebase()
+    db = firestore.client()
+    doc_ref = db.collection(collection_name).document(doc_id)
+
+    # 読み込みから書き込みまでをトランザクションで行う（同時に更新された予測結果を失わない）
+    @firestore.transactional
+    def _update(transaction) -> int:
+        snapshot = doc_ref.get(transaction=transaction)
+        existing = (snapshot.to_dict() or {}).get('predictions', []) if snapshot.exists else []
+        merged = patch_prediction_records(existing, race_predictions, race_keys)
+        transaction.set(doc_ref, {
+            'date': date_str,
+            'updated_at': firestore.SERVER_TIMESTAMP,
+            'predictions': merged,
+            'total_count': len(merged),
+        }, merge=True)
+        return len(merged)
+
+    total_count = _update(db.transaction())
+    logger.info(f"予測結果の部分更新完了: {collection_name}/{doc_id} ({total_count}件)")
+    return total_count
+
+
 def get_predictions_from_firestore(
     date_str: str,
     collection_name: str = "predictions"
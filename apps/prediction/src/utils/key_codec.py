@@ -0,0 +1,241 @@
+"""
+キーの整数エンコード
+race_keyを（年月日, 場コード, 回, 日, R）をまとめたint64に、血統登録番号・騎手コード・調教師コードをInt32に変換する。
+データ処理中の結合・groupby・インデックスは整数キーで行い、文字列への復元はJSON・Firestore・評価レポートなどの出力時のみ行う。
+"""
+
+import logging
+from typing import Dict, Union
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+class KeyCodec:
+    """
+    race_key・エンティティコードの整数エンコード/デコードを行うクラス（staticメソッドのみ）
+
+    race_keyは10進数の桁位置で各要素を保持する（例: 2024年7月1日 函館1回1日目1R → 2024070102010101）。
+      YYYYMMDD（8桁） | 場コード（2桁） | 回（2桁） | 日（2桁、16進数の値） | R（2桁）
+    文字列のrace_key（場コード_回_日_R）は日付を含まないため、整数キーは年度をまたいでも一意になる。
+    """
+
+    RACE_KEY_COLUMN = "race_key"
+    # 整数キーの生成に必要なカラム（年月日 + race_key生成に必要なカラム）
+    RACE_KEY_COMPONENT_COLUMNS = ["年月日", "場コード", "回", "日", "R"]
+
+    # エンティティコードのカラムと桁数（文字列への復元時に0埋めする桁数）
+    ENTITY_CODE_WIDTHS = {"血統登録番号": 8, "騎手コード": 5, "調教師コード": 5}
+    ENTITY_CODE_DTYPE = "Int32"
+
+    _DATE_FACTOR = 10 ** 8
+    _PLACE_FACTOR = 10 ** 6
+    _ROUND_FACTOR = 10 ** 4
+    _DAY_FACTOR = 10 ** 2
+
+    @staticmethod
+    def pack_race_keys(
+        ymd: pd.Series,
+        place_code: pd.Series,
+        kaisai_round: pd.Series,
+        kaisai_day: pd.Series,
+        race_number: pd.Series,
+    ) -> pd.Series:
+        """
+        race_keyの各要素から整数キー（int64）を生成（ベクトル化版）
+
+        Args:
+            ymd: 年月日（YYYYMMDD）
+            place_code: 場コード（0〜99）
+            kaisai_round: 回（0〜99）
+            kaisai_day: 日（16進数1桁、例: "1", "a"）
+            race_number: R（0〜99）
+
+        Returns:
+            整数キーのSeries（int64、ymdと同じインデックス）
+
+        Raises:
+            ValueError: 欠損値または桁数に収まらない値がある場合
+        """
+        components = {
+            "年月日": (ymd, 10_000_101, 99_991_231),
+            "場コード": (place_code, 0, 99),
+            "回": (kaisai_round, 0, 99),
+            "R": (race_number, 0, 99),
+        }
+        values: Dict[str, np.ndarray] = {}
+        for name, (series, lower, upper) in components.items():
+            numeric = pd.to_numeric(series, errors="coerce").to_numpy(dtype=float)
+            invalid = np.isnan(numeric) | (numeric != np.floor(numeric)) | (numeric < lower) | (numeric > upper)
+            if invalid.any():
+                sample = pd.Series(series).to_numpy()[invalid][:10].tolist()
+                raise ValueError(f"整数race_keyの生成に使用できない{name}があります: invalid={int(invalid.sum())}, sample={sample}")
+            values[name] = numeric.astype(np.int64)
+
+        day = KeyCodec._hex_day_values(kaisai_day)
+        packed = (
+            values["年月日"] * KeyCodec._DATE_FACTOR
+            + values["場コード"] * KeyCodec._PLACE_FACTOR
+            + values["回"] * KeyCodec._ROUND_FACTOR
+            + day * KeyCodec._DAY_FACTOR
+            + values["R"]
+        )
+        return pd.Series(packed, index=ymd.index, name=KeyCodec.RACE_KEY_COLUMN, dtype="int64")
+
+    @staticmethod
+    def pack_race_key_column(df: pd.DataFrame) -> pd.Series:
+        """DataFrameの年月日・場コード・回・日・Rから整数キーを生成"""
+        missing = [col for col in KeyCodec.RACE_KEY_COMPONENT_COLUMNS if col not in df.columns]
+        if missing:
+            raise ValueError(f"整数race_keyの生成に必要なカラムが存在しません: {missing}。parquetファイルを再生成してください。")
+        return KeyCodec.pack_race_keys(df["年月日"], df["場コード"], df["回"], df["日"], df["R"])
+
+    @staticmethod
+    def decode_race_keys(packed: Union[pd.Series, np.ndarray]) -> pd.Series:
+        """
+        整数キーを従来の文字列race_key（場コード_回_日_R、例: "01_2_a_11"）に復元（出力用）
+
+        Args:
+            packed: 整数キー（欠損はNoneとして復元）
+
+        Returns:
+            文字列race_keyのSeries（object型）
+        """
+        series = packed if isinstance(packed, pd.Series) else pd.Series(packed)
+        codes, uniques = pd.factorize(series, use_na_sentinel=True)
+        decoded = np.array([KeyCodec._format_race_key(int(value)) for value in uniques] + [None], dtype=object)
+        return pd.Series(decoded[codes], index=series.index, name=series.name)
+
+    @staticmethod
+    def race_key_dates(packed: Union[pd.Series, np.ndarray]) -> np.ndarray:
+        """整数キーから年月日（YYYYMMDD、int64）を取り出す"""
+        return np.asarray(packed, dtype=np.int64) // KeyCodec._DATE_FACTOR
+
+    @staticmethod
+    def is_packed(values: Union[pd.Series, pd.Index]) -> bool:
+        """race_keyが整数キーかどうか"""
+        return pd.api.types.is_integer_dtype(values.dtype)
+
+    @staticmethod
+    def encode_entity_codes(values: pd.Series, width: int) -> pd.Series:
+        """
+        エンティティコード（血統登録番号など）をInt32に変換
+
+        数字のみ（width桁以内）の値はその数値に、それ以外の値（空白・不正な文字を含む値）は欠損に変換する。
+
+        Args:
+            values: エンティティコード（文字列または数値）
+            width: コードの桁数
+
+        Returns:
+            Int32のSeries
+        """
+        if pd.api.types.is_numeric_dtype(values.dtype):
+            numeric = values.to_numpy(dtype=float, na_value=np.nan)
+        else:
+            codes, uniques = pd.factorize(values, use_na_sentinel=True)
+            parsed = np.array([KeyCodec._parse_entity_code(value, width) for value in uniques] + [np.nan], dtype=float)
+            numeric = parsed[codes]
+        valid = ~np.isnan(numeric) & (numeric == np.floor(numeric)) & (numeric >= 0) & (numeric < 10 ** width)
+
+        invalid_count = int((values.notna().to_numpy() & ~valid).sum())
+        if invalid_count > 0:
+            logger.warning(f"{values.name}に数値コードに変換できない値があるため欠損として扱います: {invalid_count}/{len(values)}")
+        encoded = pd.array(np.where(valid, numeric, 0).astype(np.int32), dtype=KeyCodec.ENTITY_CODE_DTYPE)
+        encoded[~valid] = pd.NA
+        return pd.Series(encoded, index=values.index, name=values.name)
+
+    @staticmethod
+    def decode_entity_codes(codes: pd.Series, width: int) -> pd.Series:
+        """Int32のエンティティコードを0埋めした文字列に復元（欠損はNone、出力用）"""
+        valid = codes.notna().to_numpy()
+        decoded = np.full(len(codes), None, dtype=object)
+        if valid.any():
+            decoded[valid] = pd.Series(codes.to_numpy()[valid].astype(np.int64)).astype(str).str.zfill(width).to_numpy()
+        return pd.Series(decoded, index=codes.index, name=codes.name)
+
+    @staticmethod
+    def encode_keys(df: pd.DataFrame) -> pd.DataFrame:
+        """
+        DataFrameのrace_key（カラムまたはインデックス）とエンティティコードを整数に変換
+
+        既に整数化済みのカラムはそのまま使用する。元のDataFrameは変更しない。
+
+        Args:
+            df: 文字列のrace_key（年月日・場コード・回・日・Rを含む）やエンティティコードを持つDataFrame
+
+        Returns:
+            整数キーに変換したDataFrame
+        """
+        index_names = [name for name in df.index.names if name is not None]
+        key_in_index = KeyCodec.RACE_KEY_COLUMN in index_names
+        if key_in_index:
+            df = df.reset_index()
+        else:
+            df = df.copy(deep=False)
+
+        if KeyCodec.RACE_KEY_COLUMN in df.columns and not KeyCodec.is_packed(df[KeyCodec.RACE_KEY_COLUMN]):
+            df[KeyCodec.RACE_KEY_COLUMN] = KeyCodec.pack_race_key_column(df)
+
+        for column, width in KeyCodec.ENTITY_CODE_WIDTHS.items():
+            if column in df.columns and str(df[column].dtype) != KeyCodec.ENTITY_CODE_DTYPE:
+                df[column] = KeyCodec.encode_entity_codes(df[column], width)
+
+        if key_in_index:
+            df = df.set_index(index_names)
+        return df
+
+    @staticmethod
+    def decode_keys(df: pd.DataFrame) -> pd.DataFrame:
+        """
+        DataFrameの整数キー（race_keyのカラム/インデックス、エンティティコード）を文字列に復元（出力用）
+
+        Args:
+            df: 整数キーを持つDataFrame
+
+        Returns:
+            従来の文字列キーに戻したDataFrame（元のDataFrameは変更しない）
+        """
+        df = df.copy(deep=False)
+        if KeyCodec.RACE_KEY_COLUMN in df.columns and KeyCodec.is_packed(df[KeyCodec.RACE_KEY_COLUMN]):
+            df[KeyCodec.RACE_KEY_COLUMN] = KeyCodec.decode_race_keys(df[KeyCodec.RACE_KEY_COLUMN])
+        if df.index.name == KeyCodec.RACE_KEY_COLUMN and KeyCodec.is_packed(df.index):
+            df.index = pd.Index(KeyCodec.decode_race_keys(df.index.to_numpy()).to_numpy(), name=KeyCodec.RACE_KEY_COLUMN)
+
+        for column, width in KeyCodec.ENTITY_CODE_WIDTHS.items():
+            if column in df.columns and str(df[column].dtype) == KeyCodec.ENTITY_CODE_DTYPE:
+                df[column] = KeyCodec.decode_entity_codes(df[column], width)
+        return df
+
+    @staticmethod
+    def _hex_day_values(kaisai_day: pd.Series) -> np.ndarray:
+        """日（16進数1桁の文字列または数値）を数値に変換（文字列race_keyの日と同じ表記に戻せる値のみ許可）"""
+        if kaisai_day.isna().any():
+            raise ValueError(f"整数race_keyの生成に必要な日が欠損しています: missing={int(kaisai_day.isna().sum())}")
+        codes, uniques = pd.factorize(kaisai_day.astype(str).str.strip().str.lower())
+        mapped = []
+        for value in uniques:
+            if len(value) != 1 or value not in "0123456789abcdef":
+                invalid = kaisai_day[codes == len(mapped)].head(10).tolist()
+                raise ValueError(f"整数race_keyの生成に使用できない日があります: {value!r}, sample={invalid}")
+            mapped.append(int(value, 16))
+        return np.asarray(mapped, dtype=np.int64)[codes] if mapped else np.zeros(0, dtype=np.int64)
+
+    @staticmethod
+    def _format_race_key(packed: int) -> str:
+        """整数キー1件を文字列race_keyに変換（回はzfillしない: FeatureConverter.generate_race_key_vectorizedと同じ表記）"""
+        place = packed // KeyCodec._PLACE_FACTOR % 100
+        kaisai_round = packed // KeyCodec._ROUND_FACTOR % 100
+        day = packed // KeyCodec._DAY_FACTOR % 100
+        race_number = packed % 100
+        return f"{place:02d}_{kaisai_round}_{day:x}_{race_number:02d}"
+
+    @staticmethod
+    def _parse_entity_code(value, width: int) -> float:
+        """文字列のエンティティコードを数値に変換（数字のみでwidth桁以内の場合のみ）"""
+        text = str(value).strip()
+        if not text or len(text) > width or not text.isdigit() or not text.isascii():
+            return np.nan
+        return float(text)
@@ -1,7 +1,14 @@
 """メモリ使用量を監視するユーティリティ"""
 
+import sys
 from typing import Optional
 
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:
+    RESOURCE_AVAILABLE = False
+
 try:
     import psutil
     PSUTIL_AVAILABLE = True
@@ -30,6 +37,28 @@ class MemoryMonitor:
         except Exception:
             return None
 
+    @staticmethod
+    def get_peak_memory_usage_mb() -> Optional[float]:
+        """
+        現在のプロセスの起動以降のピークメモリ使用量（最大RSS）をMB単位で取得
+        
+        Returns:
+            ピークメモリ使用量（MB）、取得できない場合はNone
+        """
+        if RESOURCE_AVAILABLE:
+            max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            # macOSはバイト単位、Linuxはキロバイト単位
+            return max_rss / (1024 * 1024) if sys.platform == "darwin" else max_rss / 1024
+        if not PSUTIL_AVAILABLE:
+            return None
+        
+        try:
+            # Windowsではpeak_wsetがピークのワーキングセット
+            peak_bytes = getattr(psutil.Process().memory_info(), "peak_wset", None)
+            return peak_bytes / (1024 * 1024) if peak_bytes is not None else None
+        except Exception:
+            return None
+
     @staticmethod
     def print_memory_usage(step_name: str, before_mb: Optional[float] = None) -> Optional[float]:
         """
@@ -48,12 +77,14 @@ class MemoryMonitor:
             print(f"[MEM] {step_name}: メモリ使用量の取得に失敗しました（psutilがインストールされていない可能性があります）")
             return None
         
+        peak_mb = MemoryMonitor.get_peak_memory_usage_mb()
+        peak_text = f" [ピーク: {peak_mb:,.0f}MB ({peak_mb/1024:.2f}GB)]" if peak_mb is not None else ""
         if before_mb is not None:
             diff_mb = current_mb - before_mb
             diff_gb = diff_mb / 1024
-            print(f"[MEM] {step_name}: {current_mb:,.0f}MB ({current_mb/1024:.2f}GB) [差分: {diff_mb:+,.0f}MB ({diff_gb:+.2f}GB)]")
+            print(f"[MEM] {step_name}: {current_mb:,.0f}MB ({current_mb/1024:.2f}GB) [差分: {diff_mb:+,.0f}MB ({diff_gb:+.2f}GB)]{peak_text}")
         else:
-            print(f"[MEM] {step_name}: {current_mb:,.0f}MB ({current_mb/1024:.2f}GB)")
+            print(f"[MEM] {step_name}: {current_mb:,.0f}MB ({current_mb/1024:.2f}GB){peak_text}")
         
         return current_mb
 
@@ -1,11 +1,32 @@
 """Parquetファイルの読み込み処理"""
 
+import hashlib
+import json
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 from tqdm import tqdm
 
+from src.jrdb_scraper.partitioned_dataset import (
+    LAYOUT_FLAT,
+    LAYOUT_PARTITIONED,
+    PARTITION_COLUMNS,
+    get_output_name,
+    get_partition_dir,
+    list_partition_files,
+    list_partitioned_years,
+    open_partitioned_dataset,
+)
+from src.utils.arrow_concat import ArrowConcat
+
+# 行フィルタ（pyarrowのExpression、またはpd.read_parquetと同じ(カラム, 演算子, 値)のタプルのリスト）
+ParquetFilter = Union[pc.Expression, Sequence[Tuple], Sequence[Sequence[Tuple]]]
+
 
 class ParquetLoader:
     """Parquetファイルの読み込みを担当するクラス"""
@@ -33,24 +54,41 @@ class ParquetLoader:
             print(f"見つかった{year}年度のParquetファイル: {len(parquet_files)}件")
             for parquet_file in parquet_files[:max_display]:
                 print(f"  - {parquet_file.name}")
+            partition_dirs = list(self._base_path.glob(f'type=*/year={year}'))
+            if partition_dirs:
+                print(f"見つかった{year}年度のパーティション: {len(partition_dirs)}件")
+                for partition_dir in partition_dirs[:max_display]:
+                    print(f"  - {partition_dir.relative_to(self._base_path)}")
         else:
             print(f"警告: {self._base_path} が存在しません")
 
-    def load_parquet_files(self, data_types: List[str], year: int) -> Dict[str, pd.DataFrame]:
+    def load_parquet_files(
+        self,
+        data_types: List[str],
+        year: int,
+        columns: Optional[Dict[str, List[str]]] = None,
+        filters: Optional[Dict[str, ParquetFilter]] = None,
+    ) -> Dict[str, pd.DataFrame]:
         """
         各データタイプのParquetファイルを読み込む
         
         Args:
             data_types: データタイプのリスト
             year: 年度
+            columns: データタイプごとの読み込むカラム（指定のないデータタイプは全カラム）
+            filters: データタイプごとの行フィルタ（指定のないデータタイプは全行）
         
         Returns:
             データタイプをキー、DataFrameを値とする辞書
         """
+        columns = columns or {}
+        filters = filters or {}
         data_dict = {}
         for data_type in tqdm(data_types, desc="データタイプ読み込み"):
             try:
-                data_dict[data_type] = self.load_annual_pack_parquet(data_type, year)
+                data_dict[data_type] = self.load_annual_pack_parquet(
+                    data_type, year, columns=columns.get(data_type), filters=filters.get(data_type)
+                )
             except FileNotFoundError:
                 if data_type == "SEC" and "SED" in data_types:
                     continue
@@ -62,14 +100,26 @@ class ParquetLoader:
         
         return data_dict
 
-    def load_annual_pack_parquet(self, data_type: str, year: int, raise_on_not_found: bool = True) -> Optional[pd.DataFrame]:
+    def load_annual_pack_parquet(
+        self,
+        data_type: str,
+        year: int,
+        raise_on_not_found: bool = True,
+        columns: Optional[Iterable[str]] = None,
+        filters: Optional[ParquetFilter] = None,
+    ) -> Optional[pd.DataFrame]:
         """
         年度パックParquetファイルを読み込む
+
+        columns・filtersを指定した場合はpyarrowのDatasetスキャナーに渡し、
+        不要なカラムと行（行グループの統計情報で除外できるものを含む）をデコードせずに読み込む。
         
         Args:
             data_type: データタイプ
             year: 年度
             raise_on_not_found: ファイルが見つからない場合にエラーを投げるかどうか（デフォルト: True）
+            columns: 読み込むカラム（ファイルに存在しないカラムは無視、Noneの場合は全カラム）
+            filters: 行フィルタ（Noneの場合は全行、date_range_filter・isin_filterで作成可能）
         
         Returns:
             DataFrame（ファイルが存在しない場合でraise_on_not_found=Falseの場合はNone）
@@ -77,9 +127,11 @@ class ParquetLoader:
         Raises:
             FileNotFoundError: ファイルが見つからず、raise_on_not_found=Trueの場合
         """
-        file_name = f"{data_type}_{year}.parquet"
-        file_path = self._base_path / file_name
-        
+        # パーティション形式とフラット形式の両方がある場合はパーティション形式を優先する
+        if get_partition_dir(self._base_path, data_type, year).is_dir():
+            return self.load_multi_year_parquet(data_type, [year], columns=columns, filters=filters)
+
+        file_path = self._flat_file_path(data_type, year)
         if not file_path.exists():
             if raise_on_not_found:
                 raise FileNotFoundError(
@@ -88,5 +140,144 @@ class ParquetLoader:
                 )
             return None
         
-        return pd.read_parquet(file_path)
+        if columns is None and filters is None:
+            return pd.read_parquet(file_path)
+        return ParquetLoader._scan_parquet(file_path, columns, filters).to_pandas()
+
+    def has_annual_pack(self, data_type: str, year: int) -> bool:
+        """年度パックのデータ（パーティション形式またはフラット形式）が存在するか"""
+        return get_partition_dir(self._base_path, data_type, year).is_dir() or self._flat_file_path(data_type, year).exists()
+
+    def load_multi_year_parquet(
+        self,
+        data_type: str,
+        years: Iterable[int],
+        columns: Optional[Iterable[str]] = None,
+        filters: Optional[ParquetFilter] = None,
+    ) -> Optional[pd.DataFrame]:
+        """
+        複数年度の年度パックを1つのDataFrameとして読み込む
+
+        パーティション形式（type=/year=/month=）の連続する年度は1つのDatasetとしてまとめてスキャンし、
+        年度はパーティションで枝刈りする。フラット形式の年度はファイルごとに読み込んで結合する。
+
+        Args:
+            data_type: データタイプ
+            years: 年度のリスト（データが存在しない年度は無視）
+            columns: 読み込むカラム（存在しないカラムは無視、Noneの場合は全カラム）
+            filters: 行フィルタ（パーティションのyear・monthも参照可能）
+
+        Returns:
+            年度順に結合したDataFrame（パーティションのカラムは含まない）。どの年度も存在しない場合はNone
+        """
+        years = sorted(set(years))
+        partitioned_years = set(list_partitioned_years(self._base_path, data_type)) & set(years)
+        # 全年度をArrowテーブルのまま集めて、DataFrameへの変換は結合後の1回のみ行う
+        tables = []
+        # 形式が混在する場合も年度順になるよう、連続するパーティション形式の年度ごとにまとめてスキャンする
+        partitioned_run: List[int] = []
+        for year in years:
+            if year in partitioned_years:
+                partitioned_run.append(year)
+                continue
+            if partitioned_run:
+                tables.append(ParquetLoader._scan_partitioned(self._base_path, data_type, partitioned_run, columns, filters))
+                partitioned_run = []
+            file_path = self._flat_file_path(data_type, year)
+            if file_path.exists():
+                tables.append(ParquetLoader._scan_parquet(file_path, columns, filters))
+        if partitioned_run:
+            tables.append(ParquetLoader._scan_partitioned(self._base_path, data_type, partitioned_run, columns, filters))
+        return ArrowConcat.concat_tables_to_pandas(tables)
+
+    def get_annual_pack_fingerprint(self, data_type: str, year: int) -> Optional[str]:
+        """
+        年度パックの識別ハッシュ（読み込まれる形式のもの、キャッシュの変更検知用）
+
+        年度パックのマニフェストのエントリ（変換元LZH・フォーマット定義・コンバーターのバージョン）と、
+        ファイルのサイズ・更新日時から作成する。
+
+        Returns:
+            SHA-256（16進文字列）。年度パックが存在しない場合はNone
+        """
+        # parquet_manifest → converter → src.utils → parquet_loader の循環インポートを避けるため関数内でインポート
+        from src.jrdb_scraper.parquet_manifest import FINGERPRINT_KEYS, load_manifest
+
+        if get_partition_dir(self._base_path, data_type, year).is_dir():
+            output_name = get_output_name(data_type, year, LAYOUT_PARTITIONED)
+            files = list_partition_files(self._base_path, data_type, [year])
+        else:
+            output_name = get_output_name(data_type, year, LAYOUT_FLAT)
+            files = [self._flat_file_path(data_type, year)]
+            if not files[0].exists():
+                return None
+
+        entry = load_manifest(self._base_path).get(output_name) or {}
+        identity = {
+            "output": output_name,
+            "manifest": {key: entry.get(key) for key in FINGERPRINT_KEYS},
+            "files": [
+                [file_path.relative_to(self._base_path).as_posix(), file_path.stat().st_size, file_path.stat().st_mtime_ns]
+                for file_path in files
+            ],
+        }
+        return hashlib.sha256(json.dumps(identity, sort_keys=True).encode()).hexdigest()
+
+    def _flat_file_path(self, data_type: str, year: int) -> Path:
+        """フラット形式の年度パックファイルのパス"""
+        return self._base_path / f"{data_type}_{year}.parquet"
+
+    @staticmethod
+    def date_range_filter(start: Optional[int] = None, end: Optional[int] = None, column: str = "年月日") -> Optional[pc.Expression]:
+        """
+        年月日の範囲の行フィルタを作成
+
+        Args:
+            start: 開始年月日（YYYYMMDD、この日を含む、Noneの場合は下限なし）
+            end: 終了年月日（YYYYMMDD、この日を含まない、Noneの場合は上限なし）
+            column: 年月日のカラム名
+
+        Returns:
+            行フィルタ（start・endともにNoneの場合はNone）
+        """
+        expression = None
+        if start is not None:
+            expression = pc.field(column) >= start
+        if end is not None:
+            upper = pc.field(column) < end
+            expression = upper if expression is None else expression & upper
+        return expression
+
+    @staticmethod
+    def isin_filter(column: str, values: Iterable) -> pc.Expression:
+        """カラムの値が指定した値のいずれかに一致する行フィルタを作成（例: 血統登録番号の集合）"""
+        return pc.field(column).isin(list(dict.fromkeys(values)))
+
+    @staticmethod
+    def _scan_partitioned(
+        base_path: Path, data_type: str, years: List[int], columns: Optional[Iterable[str]], filters: Optional[ParquetFilter]
+    ) -> Optional[pa.Table]:
+        """パーティション形式の複数年度を1回のスキャンでArrowテーブルとして読み込む"""
+        dataset = open_partitioned_dataset(base_path, data_type, years)
+        if dataset is None:
+            return None
+        data_columns = [name for name in dataset.schema.names if name not in PARTITION_COLUMNS]
+        projected = data_columns if columns is None else [col for col in dict.fromkeys(columns) if col in data_columns]
+        expression = pc.field("year").isin(years)
+        if filters is not None:
+            expression = expression & (filters if isinstance(filters, pc.Expression) else pq.filters_to_expression(filters))
+        return dataset.to_table(columns=projected, filter=expression)
+
+    @staticmethod
+    def _scan_parquet(file_path: Path, columns: Optional[Iterable[str]], filters: Optional[ParquetFilter]) -> pa.Table:
+        """DatasetスキャナーでカラムとフィルタをpushdownしてParquetファイルをArrowテーブルとして読み込む"""
+        dataset = ds.dataset(file_path, format="parquet")
+        projected = None
+        if columns is not None:
+            available = set(dataset.schema.names)
+            projected = [col for col in dict.fromkeys(columns) if col in available]
+        expression = filters
+        if filters is not None and not isinstance(filters, pc.Expression):
+            expression = pq.filters_to_expression(filters)
+        return dataset.to_table(columns=projected, filter=expression)
 
@@ -0,0 +1,24 @@
+"""予測結果の辞書のリスト（予測結果JSON・Firestoreに保存する形式）の操作"""
+
+from typing import Any, Dict, Iterable, List
+
+
+def patch_prediction_records(
+    predictions: List[Dict[str, Any]],
+    updated_predictions: List[Dict[str, Any]],
+    race_keys: Iterable[str],
+) -> List[Dict[str, Any]]:
+    """
+    予測結果のうち、指定したレースの予測結果のみを置き換える
+
+    Args:
+        predictions: 置き換え前の予測結果
+        updated_predictions: 指定したレースの新しい予測結果
+        race_keys: 置き換えるレースのrace_key（文字列）
+
+    Returns:
+        race_key・予測順位の順に並べた予測結果（指定していないレースの予測結果はそのまま残す）
+    """
+    replaced = {str(race_key) for race_key in race_keys}
+    patched = [prediction for prediction in predictions if prediction["race_key"] not in replaced] + list(updated_predictions)
+    return sorted(patched, key=lambda prediction: (prediction["race_key"], prediction["predicted_rank"]))
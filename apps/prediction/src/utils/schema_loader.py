@@ -101,6 +101,9 @@ class SchemaFile(str, Enum):
 class SchemaLoader:
     """スキーマファイルの読み込みを担当するクラス"""
 
+    # カテゴリマッピングのファイル名
+    CATEGORY_FILES = ["course_type.json", "weather.json", "ground_condition.json", "sex.json"]
+
     def __init__(self, schemas_base_path: Path):
         """初期化（schemas_base_path: スキーマディレクトリのベースパス）"""
         if schemas_base_path is None: raise ValueError('schemas_base_pathは必須です')
@@ -108,9 +111,13 @@ class SchemaLoader:
         self._schemas_dir = self._schemas_base_path / "jrdb_processed"
         self._categories_dir = self._schemas_base_path / "categories"
     
+    def get_schema_path(self, schema_file: SchemaFile) -> Path:
+        """スキーマファイルのパス（スキーマの変更検知用）"""
+        return self._schemas_dir / schema_file.value
+
     def load_schema(self, schema_file: SchemaFile) -> Schema:
         """スキーマファイルを読み込んでSchemaインスタンスを返す"""
-        schema_path = self._schemas_dir / schema_file.value
+        schema_path = self.get_schema_path(schema_file)
         if not schema_path.exists(): raise FileNotFoundError(f"スキーマファイルが見つかりません: {schema_path}") 
         with open(schema_path, "r", encoding="utf-8") as f:
             schema_dict = json.load(f)
@@ -139,15 +146,16 @@ class SchemaLoader:
             カテゴリ名をキー、カテゴリデータを値とする辞書
         """
         mappings = {}
-        category_files = ["course_type.json", "weather.json", "ground_condition.json", "sex.json"]
         
-        for category_file in category_files:
-            file_path = self._categories_dir / category_file
-            if file_path.exists():
-                with open(file_path, "r", encoding="utf-8") as f:
-                    cat_data = json.load(f)
-                    mappings[cat_data["name"]] = cat_data
+        for file_path in self.get_category_mapping_paths():
+            with open(file_path, "r", encoding="utf-8") as f:
+                cat_data = json.load(f)
+                mappings[cat_data["name"]] = cat_data
         
         return mappings
 
+    def get_category_mapping_paths(self) -> List[Path]:
+        """存在するカテゴリマッピングのファイルパス（読み込み順、変更検知用）"""
+        return [self._categories_dir / name for name in SchemaLoader.CATEGORY_FILES if (self._categories_dir / name).exists()]
+
 
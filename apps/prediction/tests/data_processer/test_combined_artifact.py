@@ -0,0 +1,80 @@
+"""CombinedArtifactStoreのテスト - 結合済みデータが結合処理と同じ結果になり、入力・スキーマの変更で無効になることを確認"""
+
+import os
+
+import pandas as pd
+import pytest
+
+from src.data_processer._02_01_combined_artifact import COMBINED_DIR_NAME, CombinedArtifactStore
+from src.jrdb_scraper.entities.jrdb import JRDBDataType
+from src.utils.jrdb_format_loader import JRDBFormatLoader
+from tests.data_processer.test_jrdb_combiner import FORMATS_DIR, build_data_dict
+
+
+def _normalize_nulls(df: pd.DataFrame) -> pd.DataFrame:
+    """object型のカラムの欠損をNoneに揃える（Parquetから読み込んだ場合と同じ）"""
+    df = df.copy()
+    for col in df.select_dtypes(include="object").columns:
+        df[col] = df[col].astype(object).where(df[col].notna(), None)
+    return df
+
+
+@pytest.fixture
+def store(tmp_path):
+    """2024年度の年度パック（KYI/BAC/SED/UKC/TYB）と結合スキーマ"""
+    parquet_dir = tmp_path / "parquet"
+    parquet_dir.mkdir()
+    for data_type, df in build_data_dict().items():
+        df.to_parquet(parquet_dir / f"{data_type.value}_2024.parquet", index=False)
+    schema_path = tmp_path / "_02_combined_schema.json"
+    schema_path.write_text('{"columns": []}', encoding="utf-8")
+    return CombinedArtifactStore(parquet_dir, None, schema_path, JRDBFormatLoader(FORMATS_DIR))
+
+
+class TestCombinedArtifactStore:
+    """CombinedArtifactStoreのテストクラス"""
+
+    def test_build_and_load(self, store):
+        """作成した結合済みデータが結合処理の結果と一致し、2回目の作成は省略されること"""
+        assert store.load(2024) is None
+
+        result = store.build(2024)
+        second = store.build(2024)
+
+        assert result["success"] and not result["skipped"]
+        assert second["skipped"] and second["recordCount"] == result["recordCount"]
+        expected = store.combine(2024)
+        actual = store.load(2024)
+        pd.testing.assert_frame_equal(actual, _normalize_nulls(expected))
+        assert list(actual.index.names) == ["race_key", "馬番"]
+        assert "start_datetime" in actual.columns
+
+    def test_invalidated_by_schema_change(self, store, tmp_path):
+        """結合スキーマが変更された場合は読み込まず、再作成されること"""
+        store.build(2024)
+
+        (tmp_path / "_02_combined_schema.json").write_text('{"columns": [1]}', encoding="utf-8")
+
+        assert store.load(2024) is None
+        assert not store.build(2024)["skipped"]
+        assert store.load(2024) is not None
+
+    def test_invalidated_by_input_change(self, store, tmp_path):
+        """入力の年度パックが書き換えられた場合は読み込まないこと"""
+        store.build(2024)
+        tyb_path = tmp_path / "parquet" / "TYB_2024.parquet"
+
+        build_data_dict()[JRDBDataType.TYB].head(1).to_parquet(tyb_path, index=False)
+        os.utime(tyb_path, ns=(1, 1))
+
+        assert store.load(2024) is None
+
+    def test_missing_pack(self, store, tmp_path):
+        """年度パックが揃っていない年度は作成せず、読み込みもしないこと"""
+        (tmp_path / "parquet" / "UKC_2024.parquet").unlink()
+
+        result = store.build(2024)
+
+        assert not result["success"] and "UKC" in result["error"]
+        assert store.load(2024) is None
+        assert not (tmp_path / "parquet" / COMBINED_DIR_NAME).exists()
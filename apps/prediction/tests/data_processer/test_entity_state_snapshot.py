@@ -0,0 +1,184 @@
+"""EntityStateSnapshotのテスト - 全履歴から計算した統計量と一致することを確認"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.data_processer._03_06_process_pool_runner import ProcessPoolRunner
+from src.data_processer._03_08_entity_state_snapshot import EntityStateSnapshot
+from src.data_processer._03_feature_extractor import FeatureExtractor
+from src.utils.parquet_loader import ParquetLoader
+from src.utils.schema_loader import Schema
+
+
+def _normalize(df: pd.DataFrame) -> pd.DataFrame:
+    """比較用に行順とreset_index由来の連番カラムを揃える"""
+    df = df.drop(columns=[col for col in ["index", "level_0"] if col in df.columns])
+    return df.sort_values(FeatureExtractor.MERGE_KEYS).reset_index(drop=True)
+
+
+def _races(rng: np.random.Generator, days: range, race_key_offset: int = 0) -> pd.DataFrame:
+    """統計量計算用DataFrameと同じ形式のレース結果（1日3レース、1レース8頭）"""
+    rows = []
+    for day in days:
+        ymd = 20230101 + (day // 28) * 100 + day % 28
+        for race_no in range(1, 4):
+            horses = rng.choice(40, size=8, replace=False)
+            for umaban, horse in enumerate(horses, 1):
+                rows.append({
+                    "race_key": race_key_offset + day * 10 + race_no, "馬番": umaban,
+                    "血統登録番号": 1000 + int(horse), "騎手コード": int(rng.integers(0, 9)), "調教師コード": int(rng.integers(0, 7)),
+                    "着順": float(umaban), "タイム": float(rng.integers(1000, 2000)), "距離": 1600, "頭数": 8, "芝ダ障害コード": 1, "馬場状態": 1, "R": race_no,
+                    "start_datetime": ymd * 10000,
+                })
+    df = pd.DataFrame(rows)
+    df["rank_1st"] = (df["着順"] == 1).astype(int)
+    df["rank_3rd"] = df["着順"].isin([1, 2, 3]).astype(int)
+    return df
+
+
+class TestEntityStateSnapshot:
+    """EntityStateSnapshotのテストクラス"""
+
+    @pytest.fixture
+    def sample_data(self):
+        """統計量計算用データ（30日分、着順の欠損・騎手コードの欠損を含む）と、その翌日の対象データ"""
+        rng = np.random.default_rng(0)
+        stats_df = _races(rng, range(30))
+        stats_df.loc[stats_df.sample(20, random_state=0).index, "着順"] = np.nan
+        stats_df.loc[[3, 50], "騎手コード"] = None
+        target_df = _races(rng, range(30, 31), race_key_offset=100000).drop(columns=["rank_1st", "rank_3rd"])
+        target_df.loc[0, "血統登録番号"] = 9999
+        return target_df.set_index(FeatureExtractor.MERGE_KEYS), stats_df
+
+    @pytest.fixture
+    def schemas(self):
+        """検証対象カラムを持たない最小スキーマ"""
+        schema = Schema(description="test", columns=[], identifierColumns=FeatureExtractor.MERGE_KEYS)
+        return {name: schema for name in ProcessPoolRunner.ENTITY_COLUMNS}
+
+    def _assert_same_as_full_history(self, snapshot, target_df, stats_df, schemas):
+        expected = FeatureExtractor._run_with_threads(target_df, stats_df, schemas, max_workers=1)
+        actual = FeatureExtractor._run_with_threads(target_df, snapshot, schemas, max_workers=1)
+        for task_name in ["horse_stats", "jockey_stats", "trainer_stats"]:
+            pd.testing.assert_frame_equal(_normalize(actual[task_name]), _normalize(expected[task_name]), check_like=True)
+
+    def test_matches_full_history(self, sample_data, schemas):
+        """スナップショットから計算した馬・騎手・調教師の統計量が全履歴から計算した結果と一致すること"""
+        target_df, stats_df = sample_data
+        snapshot = EntityStateSnapshot(2024, [2023])
+        assert snapshot.ingest_stats(stats_df) == len(stats_df)
+
+        self._assert_same_as_full_history(snapshot, target_df, stats_df, schemas)
+
+    def test_incremental_update_and_reload(self, sample_data, schemas, tmp_path):
+        """分割して取り込み、保存・読み込みしても同じ結果になり、取り込み済みのレースは二重に数えないこと"""
+        target_df, stats_df = sample_data
+        first, second = stats_df.iloc[:400], stats_df.iloc[400:]
+        snapshot = EntityStateSnapshot(2024, [2023])
+        snapshot.ingest_stats(first)
+        snapshot.save(tmp_path / "state")
+        snapshot = EntityStateSnapshot.load(tmp_path / "state")
+
+        assert snapshot.ingest_stats(stats_df) == len(second)
+        assert snapshot.ingest_stats(second) == 0
+        assert len(snapshot) == len(stats_df)
+        self._assert_same_as_full_history(snapshot, target_df, stats_df, schemas)
+
+    def test_rejects_rows_before_snapshot(self, sample_data, schemas):
+        """取り込み済みの最新レース以前の行はスナップショットから計算しないこと"""
+        _, stats_df = sample_data
+        snapshot = EntityStateSnapshot(2024, [2023])
+        snapshot.ingest_stats(stats_df)
+        past_df = stats_df.drop(columns=["rank_1st", "rank_3rd"]).set_index(FeatureExtractor.MERGE_KEYS)
+
+        assert not snapshot.covers(past_df["start_datetime"])
+        with pytest.raises(RuntimeError):
+            FeatureExtractor._run_with_threads(past_df, snapshot, schemas, max_workers=1)
+
+    def test_update_filters_window_years(self, tmp_path, caplog):
+        """update()は取り込み対象年度のSEDのみを取り込み、対象外の年度の行は警告すること"""
+        sed_df = pd.DataFrame({
+            "場コード": [5, 5], "年": [23, 24], "回": [1, 1], "日": [1, 1], "R": [1, 1], "馬番": [1, 1],
+            "年月日": [20231230, 20240106], "発走時間": [1000, 1000], "血統登録番号": [1001, 1001],
+            "騎手コード": [1, 1], "調教師コード": [1, 1], "着順": [1.0, 2.0],
+        })
+        schema = Schema.from_dict({
+            "description": "test", "identifierColumns": FeatureExtractor.MERGE_KEYS,
+            "columns": [{"name": name, "source": "SED"} for name in ["馬番", "血統登録番号", "騎手コード", "調教師コード", "着順", "R"]],
+        })
+        snapshot = EntityStateSnapshot(2024, [2023])
+
+        assert snapshot.update(sed_df, schema) == 1
+        assert snapshot.as_of == 20231230 * 10000
+        assert "1/2行（年度: [2024]" in caplog.text
+
+        # 対象年度（2024年）の結果のみの場合は何も取り込まない
+        caplog.clear()
+        assert snapshot.update(sed_df.iloc[1:], schema) == 0
+        assert "1/1行（年度: [2024]" in caplog.text
+
+
+def _raw_sed(rng: np.random.Generator, dates: list[int]) -> pd.DataFrame:
+    """SED年度パックと同じ形式の成績データ（1日2レース、1レース6頭）"""
+    rows = []
+    for day_index, ymd in enumerate(dates):
+        for race_no in range(1, 3):
+            for umaban, horse in enumerate(rng.choice(30, size=6, replace=False), 1):
+                rows.append({
+                    "場コード": "05", "年": str(ymd // 10000 % 100), "回": "1", "日": str(day_index % 9 + 1), "R": race_no, "馬番": umaban,
+                    "年月日": ymd, "発走時間": "1000", "血統登録番号": f"{20180000 + int(horse):08d}",
+                    "騎手コード": f"{int(rng.integers(1, 8)):05d}", "調教師コード": f"{int(rng.integers(1, 6)):05d}",
+                    "着順": float(rng.permutation(6)[umaban - 1] + 1) if rng.random() > 0.05 else np.nan,
+                    "タイム": float(rng.integers(1000, 2000)), "距離": 1600, "頭数": 6, "芝ダ障害コード": "1", "馬場状態": "1",
+                })
+    return pd.DataFrame(rows)
+
+
+class TestEntityStateSnapshotIncrementalUpdate:
+    """週次のSEDの取り込みと検証のテストクラス"""
+
+    @pytest.fixture
+    def schema(self):
+        """統計量計算用カラムを持つ特徴量抽出スキーマ"""
+        columns = ["馬番", "血統登録番号", "騎手コード", "調教師コード", "着順", "タイム", "距離", "芝ダ障害コード", "馬場状態", "頭数", "R"]
+        return Schema.from_dict({
+            "description": "test", "identifierColumns": FeatureExtractor.MERGE_KEYS,
+            "columns": [{"name": name, "source": "SED"} for name in columns],
+        })
+
+    @pytest.fixture
+    def packs(self, tmp_path):
+        """2022年度のSED年度パックと、2023年度の週次の成績データ（3週分）"""
+        rng = np.random.default_rng(1)
+        _raw_sed(rng, [20220105 + day for day in range(0, 20, 7)]).to_parquet(tmp_path / "SED_2022.parquet", index=False)
+        weekly = [_raw_sed(rng, [20230107 + week * 7, 20230108 + week * 7]) for week in range(3)]
+        return ParquetLoader(tmp_path), weekly
+
+    def test_weekly_updates_match_rebuild(self, packs, schema, tmp_path):
+        """週次の成績データを順に取り込んだ結果が、全件から作成した結果と一致すること"""
+        loader, weekly = packs
+        directory = EntityStateSnapshot.get_dir(tmp_path, 2024)
+        EntityStateSnapshot.build(loader, 2024, schema).save(directory)
+
+        for sed_df in weekly:
+            snapshot = EntityStateSnapshot.load(directory)
+            assert snapshot.update(sed_df, schema) == len(sed_df)
+            snapshot.save(directory)
+        snapshot = EntityStateSnapshot.load(directory)
+
+        assert snapshot.diff(EntityStateSnapshot.build(loader, 2024, schema, additional_sed=weekly)) == []
+        # 年度パックに反映された後の全件からの作成結果とも一致する
+        pd.concat(weekly, ignore_index=True).to_parquet(tmp_path / "SED_2023.parquet", index=False)
+        assert not snapshot.is_current(loader)
+        assert snapshot.diff(EntityStateSnapshot.build(loader, 2024, schema)) == []
+
+    def test_diff_reports_mismatch(self, packs, schema):
+        """取り込んでいない結果がある場合は差分を返すこと"""
+        loader, weekly = packs
+        snapshot = EntityStateSnapshot.build(loader, 2024, schema, additional_sed=weekly[:2])
+
+        differences = snapshot.diff(EntityStateSnapshot.build(loader, 2024, schema, additional_sed=weekly))
+
+        assert any(difference.startswith("row_count") for difference in differences)
+        assert any("horseの累積状態" in difference for difference in differences)
@@ -0,0 +1,83 @@
+"""HistoricalRaceStoreのテスト - 年度ごとの読み込みと同じデータを、各年度1回の読み込みとビューで渡すことを確認"""
+
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.data_processer._03_07_historical_race_store import HistoricalRaceStore
+from src.utils.parquet_loader import ParquetLoader
+
+COLUMNS = {"SED": ["場コード", "年月日", "着順"], "BAC": ["場コード", "年月日"]}
+
+
+@pytest.fixture
+def parquet_loader(tmp_path):
+    """2019〜2023年度のSED/BAC（2021年度はBACが存在しない）"""
+    for year in range(2019, 2024):
+        df = pd.DataFrame({
+            "場コード": np.arange(year % 10 + 2) % 10 + 1,
+            "年月日": [year * 10000 + 101 + i for i in range(year % 10 + 2)],
+            "着順": pd.array(range(1, year % 10 + 3), dtype="Int32"),
+            "馬名": "馬",
+        })
+        df.to_parquet(tmp_path / f"SED_{year}.parquet", index=False)
+        if year != 2021:
+            df.to_parquet(tmp_path / f"BAC_{year}.parquet", index=False)
+    return ParquetLoader(tmp_path)
+
+
+def _expected(loader: ParquetLoader, data_type: str, years):
+    """年度ごとに読み込む従来の処理の結果"""
+    return loader.load_multi_year_parquet(data_type, HistoricalRaceStore.loadable_years(loader, years), columns=COLUMNS[data_type])
+
+
+class TestHistoricalRaceStore:
+    """HistoricalRaceStoreのテストクラス"""
+
+    def test_views_match_per_year_load(self, parquet_loader):
+        """各処理対象年度のビューが従来の読み込み結果と一致し、各年度は1回だけ読み込まれること"""
+        years = [2019, 2020, 2021, 2022, 2023]
+        windows = {year: HistoricalRaceStore.previous_years(year, years) for year in years}
+        expected = {year: (_expected(parquet_loader, "SED", w), _expected(parquet_loader, "BAC", w)) for year, w in windows.items()}
+
+        with patch.object(parquet_loader, "load_annual_pack_parquet", wraps=parquet_loader.load_annual_pack_parquet) as load:
+            store = HistoricalRaceStore(parquet_loader, COLUMNS, windows)
+            for year in years:
+                sed_df, bac_df = store.get_views(year)
+                pd.testing.assert_frame_equal(sed_df, expected[year][0])
+                pd.testing.assert_frame_equal(bac_df, expected[year][1])
+
+        loaded = [call.args[:2] for call in load.call_args_list]
+        # 2021年度はBACがなく、2023年度はどの処理対象年度からも参照されない
+        assert loaded == [("SED", 2019), ("SED", 2020), ("SED", 2022), ("BAC", 2019), ("BAC", 2020), ("BAC", 2022)]
+
+    def test_views_are_not_copied(self, parquet_loader):
+        """連続した年度のビューはストアのデータをコピーせずに参照すること"""
+        store = HistoricalRaceStore(parquet_loader, COLUMNS, {2023: [2019, 2020, 2021, 2022], 2024: [2019, 2020, 2022, 2023]})
+
+        sed_df, _ = store.get_views(2023)
+
+        assert np.shares_memory(sed_df["着順"].array._data, store._frames["SED"]["着順"].array._data)
+
+    def test_evicts_years_out_of_window(self, parquet_loader):
+        """残りの処理対象年度から参照されない年度はストアから削除されること"""
+        windows = {year: HistoricalRaceStore.previous_years(year) for year in (2022, 2023, 2024)}
+        store = HistoricalRaceStore(parquet_loader, COLUMNS, windows)
+        assert store.loaded_years == [2019, 2020, 2022, 2023]
+
+        store.get_views(2022)
+        assert store.loaded_years == [2019, 2020, 2022, 2023]
+        store.get_views(2023)
+        assert store.loaded_years == [2019, 2020, 2022, 2023]
+        sed_df, bac_df = store.get_views(2024)
+        assert store.loaded_years == []
+        pd.testing.assert_frame_equal(sed_df, _expected(parquet_loader, "SED", windows[2024]))
+
+    def test_missing_bac(self, parquet_loader):
+        """参照する年度にBACが存在しない場合はエラーになること"""
+        store = HistoricalRaceStore(parquet_loader, COLUMNS, {2022: [2021]})
+
+        with pytest.raises(ValueError, match="BACデータは必須です"):
+            store.get_views(2022)
@@ -0,0 +1,125 @@
+"""JrdbCombinerのテスト - ハッシュによる行位置の結合が従来のmergeの繰り返しと同じ結果になることを確認"""
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.data_processer._02_jrdb_combiner import JrdbCombiner
+from src.jrdb_scraper.entities.jrdb import JRDBDataType
+from src.utils.feature_converter import FeatureConverter
+from src.utils.jrdb_format_loader import JRDBFormatLoader
+from src.utils.key_codec import KeyCodec
+
+FORMATS_DIR = Path(__file__).resolve().parents[2] / "src" / "jrdb_scraper" / "formats"
+
+
+@pytest.fixture
+def format_loader():
+    return JRDBFormatLoader(FORMATS_DIR)
+
+
+@pytest.fixture
+def data_dict():
+    return build_data_dict()
+
+
+def build_data_dict():
+    """重複・不一致・カラム名の衝突・欠損キー・型の異なるキーを含む各データタイプ"""
+    race_keys = np.array([2024010106010101, 2024010106010102, 2024010205010101], dtype=np.int64)
+    kyi = pd.DataFrame({
+        "race_key": np.repeat(race_keys, 3),
+        "馬番": np.tile([1, 2, 3], 3),
+        "血統登録番号": pd.array([21100001, 21100002, None, 21100004, 21100001, 21100006, 21100007, 21100008, 21100009], dtype="Int32"),
+        "馬名": [f"馬{i}" for i in range(9)],
+    }).iloc[::-1]
+    bac = pd.DataFrame({
+        "race_key": np.concatenate([race_keys, race_keys[:1]]),
+        "年月日": [20240101, 20240101, 20240102, 19990101],
+        "距離": [1200, 1600, 2000, 9999],
+    })
+    sed = pd.DataFrame({
+        "race_key": np.repeat(race_keys[:2], 3)[[0, 1, 1, 3, 4, 5]],
+        "馬番": [1, 2, 2, 1, 2, 3],
+        "着順": [1, 2, 99, 3, 1, 2],
+        "確定": [True, False, True, True, True, False],
+        "馬名": [f"SED{i}" for i in range(6)],
+    })
+    ukc = pd.DataFrame({
+        "血統登録番号": pd.array([21100001, None, 21100004, 21100001, 21100099], dtype="Int32"),
+        "性別コード": ["1", "2", "1", "9", "2"],
+        "生年月日": pd.to_datetime(["2021-03-01", "2021-04-01", "2021-05-01", "2000-01-01", "2021-06-01"]),
+    })
+    tyb = pd.DataFrame({
+        "race_key": race_keys[[0, 2]].repeat(2),
+        "馬番": [1.0, 3.0, 2.0, np.nan],
+        "馬名": ["TYB0", "TYB1", "TYB2", "TYB3"],
+        "オッズ": pd.array([1.5, None, 3.2, 4.0], dtype="Float64"),
+    })
+    return {JRDBDataType.KYI: kyi, JRDBDataType.BAC: bac, JRDBDataType.SED: sed, JRDBDataType.UKC: ukc, JRDBDataType.TYB: tyb}
+
+
+def _legacy_combine(data_dict, format_loader) -> pd.DataFrame:
+    """従来のcombine（データタイプごとにdrop_duplicates + merge）"""
+    base_format = format_loader.load_format_definition(JrdbCombiner.BASE_DATA_TYPE)
+    combined_df = KeyCodec.encode_keys(data_dict[JrdbCombiner.BASE_DATA_TYPE])
+    for target_data_type in JrdbCombiner.TARGET_DATA_TYPES:
+        if target_data_type not in data_dict:
+            continue
+        target_df = KeyCodec.encode_keys(data_dict[target_data_type])
+        identifier_columns = format_loader.load_format_definition(target_data_type)["identifierColumns"]
+        join_keys = JrdbCombiner._resolve_join_keys(
+            target_data_type, identifier_columns, JrdbCombiner.BASE_DATA_TYPE, set(base_format["identifierColumns"]), list(combined_df.columns)
+        )
+        source_df = target_df.drop_duplicates(subset=[c for c in identifier_columns if c in target_df.columns], keep="first")
+        actual_join_keys = [k for k in join_keys if k in combined_df.columns and k in source_df.columns]
+        combined_df = combined_df.merge(source_df, on=actual_join_keys, how="left", suffixes=("", f"_{target_data_type.value}"))
+    combined_df = FeatureConverter.add_start_datetime_to_df(combined_df)
+    index_columns = [c for c in base_format["identifierColumns"] if c in combined_df.columns]
+    if len(index_columns) == len(base_format["identifierColumns"]):
+        combined_df = combined_df.set_index(index_columns)
+    return combined_df
+
+
+class TestJrdbCombiner:
+    """JrdbCombinerのテストクラス"""
+
+    def test_matches_legacy_merge(self, data_dict, format_loader):
+        """結合結果（行順・カラム順・型・欠損の扱い）が従来のmergeと一致すること"""
+        expected = _legacy_combine(data_dict, format_loader)
+
+        actual = JrdbCombiner.combine(data_dict, None, format_loader)
+
+        pd.testing.assert_frame_equal(actual, expected)
+        assert "馬名_SED" in actual.columns and "馬名_TYB" in actual.columns
+        assert str(actual["着順"].dtype) == "float64"
+
+    def test_optional_data_types(self, data_dict, format_loader):
+        """オプショナルなデータタイプがない場合も従来と一致し、入力は変更しないこと"""
+        subset = {t: data_dict[t] for t in (JRDBDataType.KYI, JRDBDataType.BAC, JRDBDataType.UKC)}
+        originals = {t: df.copy() for t, df in subset.items()}
+
+        actual = JrdbCombiner.combine(subset, None, format_loader)
+
+        pd.testing.assert_frame_equal(actual, _legacy_combine(subset, format_loader))
+        for data_type, df in subset.items():
+            pd.testing.assert_frame_equal(df, originals[data_type])
+
+    def test_non_unique_keys_fall_back_to_merge(self, data_dict, format_loader):
+        """結合キーが一意にならない場合（行が増える場合）はmergeと同じ結果になること"""
+        subset = {t: data_dict[t] for t in (JRDBDataType.KYI, JRDBDataType.BAC, JRDBDataType.SED)}
+        subset[JRDBDataType.KYI] = data_dict[JRDBDataType.KYI].drop(columns=["馬番"])
+
+        actual = JrdbCombiner.combine(subset, None, format_loader)
+
+        expected = _legacy_combine(subset, format_loader)
+        pd.testing.assert_frame_equal(actual, expected)
+        assert len(actual) > len(subset[JRDBDataType.KYI])
+
+    def test_missing_base(self, data_dict, format_loader):
+        """KYI・BACがない場合はエラーになること"""
+        with pytest.raises(ValueError, match="KYI"):
+            JrdbCombiner.combine({JRDBDataType.BAC: data_dict[JRDBDataType.BAC]}, None, format_loader)
+        with pytest.raises(ValueError, match="BAC"):
+            JrdbCombiner.combine({JRDBDataType.KYI: data_dict[JRDBDataType.KYI]}, None, format_loader)
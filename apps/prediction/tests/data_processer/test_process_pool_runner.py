@@ -0,0 +1,74 @@
+"""ProcessPoolRunnerのテスト - ThreadPoolExecutor版と同じ結果になることを確認"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.data_processer._03_06_process_pool_runner import ProcessPoolRunner
+from src.data_processer._03_feature_extractor import FeatureExtractor
+from src.utils.schema_loader import Schema
+
+
+def _normalize(df: pd.DataFrame) -> pd.DataFrame:
+    """比較用に行順とreset_index由来の連番カラムを揃える"""
+    df = df.drop(columns=[col for col in ["index", "level_0"] if col in df.columns])
+    return df.sort_values(FeatureExtractor.MERGE_KEYS).reset_index(drop=True)
+
+
+class TestProcessPoolRunner:
+    """ProcessPoolRunnerのテストクラス"""
+
+    @pytest.fixture
+    def sample_data(self):
+        """複数年度の統計量計算用データと、最終年度の対象データ"""
+        rng = np.random.default_rng(0)
+        rows = []
+        for day in range(30):
+            ymd = 20230101 + (day // 28) * 100 + day % 28
+            for race_no in range(1, 4):
+                horses = rng.choice(40, size=8, replace=False)
+                for umaban, horse in enumerate(horses, 1):
+                    rows.append({
+                        "race_key": f"{day % 5 + 1:02d}_{day // 5 + 1}_{day % 2 + 1}_{race_no:02d}", "馬番": umaban + day * 10,
+                        "血統登録番号": f"H{horse:04d}", "騎手コード": f"J{rng.integers(0, 9):03d}", "調教師コード": f"T{rng.integers(0, 7):03d}",
+                        "着順": float(umaban), "タイム": float(rng.integers(1000, 2000)), "距離": 1600, "頭数": 8, "芝ダ障害コード": 1, "馬場状態": 1, "R": race_no,
+                        "start_datetime": ymd * 10000,
+                    })
+        stats_df = pd.DataFrame(rows)
+        stats_df["rank_1st"] = (stats_df["着順"] == 1).astype(int)
+        stats_df["rank_3rd"] = stats_df["着順"].isin([1, 2, 3]).astype(int)
+        target_df = stats_df.drop(columns=["rank_1st", "rank_3rd"]).set_index(FeatureExtractor.MERGE_KEYS)
+        return target_df, stats_df
+
+    @pytest.fixture
+    def schemas(self):
+        """検証対象カラムを持たない最小スキーマ"""
+        schema = Schema(description="test", columns=[], identifierColumns=FeatureExtractor.MERGE_KEYS)
+        return {name: schema for name in ProcessPoolRunner.ENTITY_COLUMNS}
+
+    def test_run_matches_thread_backend(self, sample_data, schemas):
+        """エンティティ単位でシャーディングしても、ThreadPoolExecutor版と同じ結果になること"""
+        target_df, stats_df = sample_data
+        expected = FeatureExtractor._run_with_threads(target_df, stats_df, schemas, max_workers=2)
+        actual = ProcessPoolRunner.run(target_df, stats_df, schemas, max_workers=3)
+
+        assert set(actual) == set(expected)
+        for task_name in expected:
+            pd.testing.assert_frame_equal(_normalize(actual[task_name]), _normalize(expected[task_name]), check_like=True)
+
+    def test_previous_races_keeps_target_order(self, sample_data, schemas):
+        """前走データの結果はtarget_dfの行順に戻されること"""
+        target_df, stats_df = sample_data
+        actual = ProcessPoolRunner.run(target_df, stats_df, schemas, max_workers=3)
+
+        assert list(actual["previous_races"]["race_key"]) == list(target_df.index.get_level_values("race_key"))
+        assert list(actual["previous_races"]["馬番"]) == list(target_df.index.get_level_values("馬番"))
+
+    def test_shard_ids_are_deterministic(self):
+        """同じエンティティ値は（欠損値も含めて）常に同じシャードに割り当てられること"""
+        values = pd.Series(["J001", None, "J002", "J001", None])
+        shard_ids = ProcessPoolRunner.shard_ids(values, 4)
+
+        assert shard_ids[0] == shard_ids[3]
+        assert shard_ids[1] == shard_ids[4]
+        assert ((shard_ids >= 0) & (shard_ids < 4)).all()
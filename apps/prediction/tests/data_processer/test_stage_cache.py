@@ -0,0 +1,106 @@
+"""DataProcessorのステージ単位のキャッシュのテスト - 変更のあったステージ以降のみ再計算されることを確認"""
+
+import shutil
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from src.data_processer.main import DataProcessor
+from tests.data_processer.test_jrdb_combiner import build_data_dict
+
+PROJECT_ROOT = Path(__file__).resolve().parents[4]
+
+
+class _Calls:
+    """処理の呼び出し回数を記録するスタブ"""
+
+    def __init__(self):
+        self.featured = []
+        self.converted = 0
+        self.split = 0
+
+    def process_single_year_features(self, year, available_years=None, historical_store=None):
+        self.featured.append(year)
+        return pd.DataFrame({"year": [year, year], "value": [1.0, 2.0]})
+
+    def convert_and_prepare_data(self, featured_df, split_date):
+        self.converted += 1
+        return featured_df.assign(value=featured_df["value"] * 10), (featured_df if split_date is not None else None)
+
+    def split_and_select_columns(self, converted_df, featured_df, split_date):
+        self.split += 1
+        return converted_df.head(1), converted_df.tail(1), featured_df
+
+
+@pytest.fixture
+def processor(tmp_path, monkeypatch):
+    """2022〜2024年度の年度パックと、コピーしたスキーマを使うDataProcessor（抽出・変換・分割はスタブ）"""
+    shutil.copytree(PROJECT_ROOT / "packages" / "data" / "schemas", tmp_path / "packages" / "data" / "schemas")
+    formats_dir = tmp_path / "apps" / "prediction" / "src" / "jrdb_scraper" / "formats"
+    formats_dir.parent.mkdir(parents=True)
+    formats_dir.symlink_to(PROJECT_ROOT / "apps" / "prediction" / "src" / "jrdb_scraper" / "formats")
+    parquet_dir = tmp_path / "parquet"
+    parquet_dir.mkdir()
+    for year in (2022, 2023, 2024):
+        for data_type, df in build_data_dict().items():
+            df.to_parquet(parquet_dir / f"{data_type.value}_{year}.parquet", index=False)
+
+    calls = _Calls()
+    monkeypatch.setattr(DataProcessor, "_process_single_year_features", lambda self, *a, **k: calls.process_single_year_features(*a, **k))
+    monkeypatch.setattr(DataProcessor, "_convert_and_prepare_data", lambda self, *a: calls.convert_and_prepare_data(*a))
+    monkeypatch.setattr(DataProcessor, "_split_and_select_columns", lambda self, *a: calls.split_and_select_columns(*a))
+    return DataProcessor(tmp_path, parquet_dir), calls, tmp_path
+
+
+class TestStageCache:
+    """ステージ単位のキャッシュのテストクラス"""
+
+    def test_second_run_loads_split(self, processor):
+        """同じ条件の2回目は分割結果をキャッシュから読み込み、再計算しないこと"""
+        data_processor, calls, _ = processor
+
+        first = data_processor.process_multiple_years([2022, 2023], split_date="2023-06-01")
+        second = data_processor.process_multiple_years([2022, 2023], split_date="2023-06-01")
+
+        assert calls.featured == [2022, 2023] and calls.converted == 1 and calls.split == 1
+        for expected, actual in zip(first, second, strict=True):
+            pd.testing.assert_frame_equal(actual, expected)
+
+    def test_featured_reused_across_year_ranges(self, processor):
+        """年度の範囲が異なっても、参照する過去年度が同じ年度の特徴量抽出結果は再利用されること"""
+        data_processor, calls, _ = processor
+
+        data_processor.process_multiple_years([2022, 2023])
+        result = data_processor.process_multiple_years([2022, 2023, 2024])
+
+        assert calls.featured == [2022, 2023, 2024]
+        assert calls.converted == 2
+        assert result["year"].tolist() == [2022, 2022, 2023, 2023, 2024, 2024]
+
+    def test_schema_change_invalidates_downstream_only(self, processor):
+        """カラム選択スキーマの変更は分割のみ、学習スキーマの変更は変換以降のみを再計算すること"""
+        data_processor, calls, base_path = processor
+        schemas_dir = base_path / "packages" / "data" / "schemas" / "jrdb_processed"
+        data_processor.process_multiple_years([2022, 2023], split_date="2023-06-01")
+
+        with open(schemas_dir / "_06_column_selection_schema.json", "a", encoding="utf-8") as f:
+            f.write("\n")
+        data_processor.process_multiple_years([2022, 2023], split_date="2023-06-01")
+        assert calls.featured == [2022, 2023] and calls.converted == 1 and calls.split == 2
+
+        with open(schemas_dir / "_04_training_schema.json", "a", encoding="utf-8") as f:
+            f.write("\n")
+        data_processor.process_multiple_years([2022, 2023], split_date="2023-06-01")
+        assert calls.featured == [2022, 2023] and calls.converted == 2 and calls.split == 3
+
+    def test_cache_disabled(self, processor):
+        """use_cache=Falseの場合は毎回再計算すること"""
+        _, calls, base_path = processor
+        data_processor = DataProcessor(base_path, base_path / "parquet", use_cache=False)
+
+        data_processor.process_multiple_years([2022])
+        data_processor.process_multiple_years([2022])
+
+        assert calls.featured == [2022, 2022]
+        assert not (base_path / "apps" / "prediction" / "cache" / "stages").exists()
@@ -0,0 +1,87 @@
+"""TimeSeriesStatisticsのテスト - 行ごとの素朴な計算結果と一致することを確認"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.data_processer._03_01_time_series_statistics import TimeSeriesStatistics
+
+
+def _naive_stats(stats_df: pd.DataFrame, target_df: pd.DataFrame, group_col: str) -> pd.DataFrame:
+    """対象行ごとに、同一エンティティでstart_datetimeより前のレースを直接集計（基準実装）"""
+    rows = []
+    for _, row in target_df.iterrows():
+        past = stats_df[(stats_df[group_col] == row[group_col]) & (stats_df["start_datetime"] < row["start_datetime"])]
+        count = len(past)
+        rows.append({
+            "勝率": past["rank_1st"].sum() / count if count > 0 else 0.0,
+            "連対率": past["rank_3rd"].sum() / count if count > 0 else 0.0,
+            "平均着順": past["着順"].sum() / count if count > 0 else 0.0,
+            "出走回数": count,
+        })
+    return pd.DataFrame(rows)
+
+
+class TestTimeSeriesStatistics:
+    """TimeSeriesStatisticsのテストクラス"""
+
+    @pytest.fixture
+    def sample_df(self):
+        """騎手コードに欠損を含むサンプルデータ"""
+        rng = np.random.default_rng(0)
+        n = 300
+        df = pd.DataFrame({
+            "race_key": [f"{i // 10:04d}" for i in range(n)],
+            "馬番": [i % 10 + 1 for i in range(n)],
+            "騎手コード": rng.choice(["J1", "J2", "J3", "J4"], size=n).astype(object),
+            "start_datetime": 202401010000 + (np.arange(n) // 10) * 10000,
+            "着順": rng.integers(1, 11, size=n).astype(float),
+        })
+        df.loc[[5, 77], "騎手コード"] = None
+        df["rank_1st"] = (df["着順"] == 1).astype(int)
+        df["rank_3rd"] = (df["着順"] <= 3).astype(int)
+        return df
+
+    def test_cumulative_stats_matches_naive(self, sample_df):
+        """累積統計量が行ごとの素朴な集計と一致すること（同日レースは除外、欠損エンティティは0）"""
+        result = TimeSeriesStatistics.cumulative_stats(sample_df, sample_df, "騎手コード", "start_datetime", "騎手", ["race_key", "馬番"])
+        expected = _naive_stats(sample_df, sample_df, "騎手コード")
+
+        assert list(result["race_key"]) == list(sample_df["race_key"])
+        for suffix in TimeSeriesStatistics.STAT_SUFFIXES:
+            np.testing.assert_allclose(result[f"騎手{suffix}"].to_numpy(dtype=float), expected[suffix].to_numpy(dtype=float))
+
+    def test_unknown_entity_is_zero(self, sample_df):
+        """統計量計算用データに存在しないエンティティは0で埋められること"""
+        target_df = sample_df.head(3).copy()
+        target_df["騎手コード"] = "UNKNOWN"
+        result = TimeSeriesStatistics.cumulative_stats(sample_df, target_df, "騎手コード", "start_datetime", "騎手", ["race_key", "馬番"])
+
+        assert (result["騎手出走回数"] == 0).all()
+        assert (result["騎手勝率"] == 0.0).all()
+
+    def test_recent_races_matches_naive(self, sample_df):
+        """直近Nレースの詳細が、start_datetimeより前のレースを新しい順に並べたものと一致すること"""
+        num_races = 3
+        result = TimeSeriesStatistics.recent_races(sample_df, sample_df, "騎手コード", "start_datetime", "騎手", ["着順"], num_races, ["race_key", "馬番"])
+
+        for row_idx, row in sample_df.iterrows():
+            past = sample_df[(sample_df["騎手コード"] == row["騎手コード"]) & (sample_df["start_datetime"] < row["start_datetime"])].iloc[::-1]
+            for i in range(1, num_races + 1):
+                actual_rank = result.at[row_idx, f"騎手直近{i}着順"]
+                actual_key = result.at[row_idx, f"騎手直近{i}レースキー_SED"]
+                if len(past) >= i:
+                    assert actual_rank == past["着順"].iloc[i - 1]
+                    assert actual_key == past["race_key"].iloc[i - 1]
+                else:
+                    assert np.isnan(actual_rank)
+                    assert actual_key is None
+
+    def test_grouped_cumsum_skips_nan(self):
+        """グループ単位の累積和がpandasのgroupby().cumsum()と一致すること"""
+        codes = np.array([0, 0, 0, 1, 1, 2])
+        values = np.array([1.0, np.nan, 2.0, 3.0, 4.0, np.nan])
+        result = TimeSeriesStatistics.grouped_cumsum(values, TimeSeriesStatistics.group_start_positions(codes))
+        expected = pd.Series(values).groupby(codes).cumsum().to_numpy()
+
+        np.testing.assert_allclose(result, expected)
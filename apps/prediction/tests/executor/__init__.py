@@ -0,0 +1 @@
+"""executorモジュールのテスト"""
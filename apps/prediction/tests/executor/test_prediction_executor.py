@@ -0,0 +1,238 @@
+"""PredictionExecutorのテスト - 読み込み済みリソースの利用とレースの絞り込み"""
+
+import json
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+from src.executor.prediction_executor import PredictionExecutor
+from src.utils.key_codec import KeyCodec
+
+
+def _results_df(race_keys):
+    """整形済み予測結果（1レース2頭）"""
+    rows = []
+    for race_key in race_keys:
+        for horse_number, rank in [(1, 2), (2, 1)]:
+            rows.append({
+                "race_key": race_key, "horse_number": horse_number, "horse_name": f"馬{horse_number}",
+                "jockey_name": "騎手", "trainer_name": "調教師", "predict": 1.0 / rank, "predicted_rank": rank,
+            })
+    return pd.DataFrame(rows)
+
+
+class TestExecuteDailyPrediction:
+    """execute_daily_predictionのテスト（日次LZHの変換・予測は置き換え）"""
+
+    @pytest.fixture
+    def calls(self, monkeypatch):
+        calls = {"convert": [], "load_resources": [], "predict": []}
+
+        def convert(daily_data_path, date_str, year, daily_parquet_path):
+            calls["convert"].append((date_str, year, daily_parquet_path))
+
+        def load_resources(model_path, base_path, parquet_base_path, year):
+            resources = SimpleNamespace(year=year)
+            calls["load_resources"].append(resources)
+            return resources
+
+        def predict_daily_parquet(daily_parquet_path, resources, parquet_base_path, race_keys=None):
+            calls["predict"].append((daily_parquet_path, resources, race_keys))
+            return _results_df(["06_5_1_01"])
+
+        monkeypatch.setattr(PredictionExecutor, "_convert_daily_lzh_to_parquet", staticmethod(convert))
+        monkeypatch.setattr(PredictionExecutor, "load_resources", staticmethod(load_resources))
+        monkeypatch.setattr(PredictionExecutor, "predict_daily_parquet", staticmethod(predict_daily_parquet))
+        return calls
+
+    def test_loads_resources_when_not_given(self, calls, tmp_path):
+        """リソースを指定しない場合は読み込んで予測し、予測結果JSONを保存すること"""
+        output_path = tmp_path / "output" / "prediction_results_2025-11-30.json"
+
+        results_df = PredictionExecutor.execute_daily_prediction(
+            "2025-11-30", "model.txt", "data/daily", tmp_path, tmp_path / "parquet", output_path=str(output_path)
+        )
+
+        assert len(calls["load_resources"]) == 1
+        assert calls["convert"] == [("2025-11-30", 2025, tmp_path / "parquet" / "daily" / "2025-11-30")]
+        assert calls["predict"][0][1] is calls["load_resources"][0]
+        assert len(results_df) == 2
+        saved = json.loads(output_path.read_text(encoding="utf-8"))
+        assert saved["date"] == "2025-11-30"
+        assert [p["predicted_rank"] for p in saved["predictions"]] == [1, 2]
+
+    def test_uses_preloaded_resources(self, calls, tmp_path):
+        """読み込み済みのリソースを指定した場合は読み込まずに使うこと"""
+        resources = SimpleNamespace(year=2025)
+
+        PredictionExecutor.execute_daily_prediction(
+            "2025-11-30", "model.txt", "data/daily", tmp_path, tmp_path / "parquet", resources=resources, race_keys=["06_5_1_01"]
+        )
+
+        assert calls["load_resources"] == []
+        assert calls["predict"] == [(tmp_path / "parquet" / "daily" / "2025-11-30", resources, ["06_5_1_01"])]
+
+
+class TestFilterRaces:
+    """_filter_racesのテスト"""
+
+    @pytest.fixture
+    def raw_df(self):
+        """整数キーのrace_keyをインデックスに持つ結合済みデータ"""
+        packed = KeyCodec.pack_race_keys(
+            pd.Series([20251130] * 4), pd.Series([6, 6, 6, 5]), pd.Series([5, 5, 5, 1]), pd.Series(["1", "1", "1", "a"]), pd.Series([1, 1, 2, 11])
+        )
+        return pd.DataFrame({"馬番": [1, 2, 1, 1]}, index=pd.Index(packed, name=KeyCodec.RACE_KEY_COLUMN))
+
+    def test_filters_by_string_and_packed_keys(self, raw_df):
+        """文字列のrace_keyと整数キーのどちらでも絞り込めること"""
+        by_string = PredictionExecutor._filter_races(raw_df, ["06_5_1_01", "05_1_a_11"])
+        by_packed = PredictionExecutor._filter_races(raw_df, [int(raw_df.index[2])])
+
+        assert by_string["馬番"].tolist() == [1, 2, 1]
+        assert by_packed.index.tolist() == [raw_df.index[2]]
+
+    def test_filters_race_key_column(self):
+        """race_keyがカラムの場合も絞り込めること"""
+        raw_df = pd.DataFrame({"race_key": ["06_5_1_01", "06_5_1_02"], "馬番": [1, 2]})
+
+        assert PredictionExecutor._filter_races(raw_df, ["06_5_1_02"])["馬番"].tolist() == [2]
+
+    @pytest.mark.parametrize("race_keys", ["06_5_1_01", 2025113006050101])
+    def test_rejects_non_list(self, raw_df, race_keys):
+        """race_keysがリストでない場合（1文字ずつの絞り込みにしない）はValueErrorになること"""
+        with pytest.raises(ValueError, match="リストで指定"):
+            PredictionExecutor._filter_races(raw_df, race_keys)
+
+    def test_raises_when_nothing_matches(self, raw_df):
+        """指定したレースが1つもない場合はValueErrorになること"""
+        with pytest.raises(ValueError, match="日次データにありません"):
+            PredictionExecutor._filter_races(raw_df, ["01_1_1_01"])
+
+
+def _tyb_df(rows):
+    """TYB（race_key・馬番・オッズ・馬体重）"""
+    return pd.DataFrame(rows, columns=["race_key", "馬番", "単勝オッズ", "馬体重"])
+
+
+class TestFindChangedRaces:
+    """find_changed_racesのテスト"""
+
+    @pytest.fixture
+    def previous(self):
+        return _tyb_df([
+            ("06_5_1_01", 1, 2.5, 480), ("06_5_1_01", 2, 5.0, 470),
+            ("06_5_1_02", 1, 1.8, 500), ("06_5_1_03", 1, 3.0, 450),
+        ])
+
+    def test_detects_changed_added_and_removed_rows(self, previous):
+        """値が変わった行・追加された行・削除された行を含むレースを検出すること"""
+        current = previous.copy()
+        current.loc[1, "単勝オッズ"] = 4.2
+        current = pd.concat([current, _tyb_df([("06_5_1_02", 2, 9.9, 430)])], ignore_index=True)
+        current = current[current["race_key"] != "06_5_1_03"]
+        current = pd.concat([current, _tyb_df([("06_5_1_04", 1, 1.2, 460)])], ignore_index=True)
+
+        assert PredictionExecutor.find_changed_races(previous, current) == ["06_5_1_01", "06_5_1_02", "06_5_1_03", "06_5_1_04"]
+
+    def test_unchanged_rows_in_different_order(self, previous):
+        """行の順序が違うだけの場合は変更なしとすること"""
+        assert PredictionExecutor.find_changed_races(previous, previous.iloc[::-1]) == []
+
+    def test_dtype_only_difference_is_not_a_change(self, previous):
+        """値が同じでdtypeだけが違う場合は変更なしとし、値が変わった場合は検出すること"""
+        current = previous.astype({"馬番": "Int32", "馬体重": "float64", "単勝オッズ": "Float64"})
+        current["race_key"] = current["race_key"].astype("category")
+
+        assert PredictionExecutor.find_changed_races(previous, current) == []
+        current.loc[3, "馬体重"] = pd.NA
+        assert PredictionExecutor.find_changed_races(previous, current) == ["06_5_1_03"]
+
+    def test_all_races_without_previous(self, previous):
+        """更新前のTYBがない場合は全レースを対象とすること"""
+        assert PredictionExecutor.find_changed_races(None, previous) == ["06_5_1_01", "06_5_1_02", "06_5_1_03"]
+
+
+class TestRepredictChangedRaces:
+    """repredict_changed_racesのテスト（予測は置き換え）"""
+
+    @pytest.fixture
+    def daily_dir(self, tmp_path):
+        """全レースを予測済みの日次Parquet（TYBのみ）"""
+        daily_dir = tmp_path / "daily" / "2025-11-30"
+        daily_dir.mkdir(parents=True)
+        _tyb_df([("06_5_1_01", 1, 2.5, 480), ("06_5_1_02", 1, 1.8, 500)]).to_parquet(daily_dir / "TYB_2025.parquet", index=False)
+        return daily_dir
+
+    @pytest.fixture
+    def output_path(self, tmp_path):
+        """全レースの予測結果JSON"""
+        output_path = tmp_path / "prediction_results_2025-11-30.json"
+        predictions = PredictionExecutor.to_prediction_records(_results_df(["06_5_1_01", "06_5_1_02"]))
+        output_path.write_text(json.dumps({"date": "2025-11-30", "predictions": predictions}), encoding="utf-8")
+        return output_path
+
+    @pytest.fixture
+    def predicted(self, monkeypatch):
+        """予測したrace_keyと予測に使ったTYBを記録する"""
+        calls = []
+
+        def predict_daily_parquet(daily_parquet_path, resources, parquet_base_path, race_keys=None, tyb_df=None):
+            calls.append((race_keys, tyb_df))
+            return _results_df(race_keys).assign(predict=0.1)
+
+        monkeypatch.setattr(PredictionExecutor, "predict_daily_parquet", staticmethod(predict_daily_parquet))
+        return calls
+
+    @staticmethod
+    def _updated_tyb():
+        return _tyb_df([("06_5_1_01", 1, 2.5, 480), ("06_5_1_02", 1, 3.6, 500)])
+
+    def test_patches_json_and_applies_tyb(self, daily_dir, output_path, predicted, tmp_path):
+        """変わったレースのみ予測し直して予測結果JSONを置き換え、その後に日次ParquetのTYBを置き換えること"""
+        updated_tyb = self._updated_tyb()
+
+        race_keys, records = PredictionExecutor.repredict_changed_races(
+            "2025-11-30", updated_tyb, daily_dir, SimpleNamespace(year=2025), tmp_path, output_path=str(output_path)
+        )
+
+        assert race_keys == ["06_5_1_02"]
+        assert predicted[0][0] == ["06_5_1_02"]
+        pd.testing.assert_frame_equal(predicted[0][1], updated_tyb)
+        assert {r["race_key"] for r in records} == {"06_5_1_02"}
+        saved = json.loads(output_path.read_text(encoding="utf-8"))["predictions"]
+        assert [p["predicted_score"] for p in saved if p["race_key"] == "06_5_1_01"] == [1.0, 0.5]
+        assert [p["predicted_score"] for p in saved if p["race_key"] == "06_5_1_02"] == [0.1, 0.1]
+        pd.testing.assert_frame_equal(pd.read_parquet(daily_dir / "TYB_2025.parquet"), updated_tyb)
+
+        # 置き換え後は同じTYBで変わったレースはない
+        assert PredictionExecutor.repredict_changed_races("2025-11-30", updated_tyb, daily_dir, SimpleNamespace(year=2025), tmp_path) == ([], [])
+
+    def test_tyb_is_kept_when_prediction_fails(self, daily_dir, output_path, monkeypatch, tmp_path):
+        """予測結果の置き換えまでに失敗した場合は日次ParquetのTYBを置き換えず、次回も同じレースを予測し直すこと"""
+        previous_tyb = pd.read_parquet(daily_dir / "TYB_2025.parquet")
+        previous_json = output_path.read_text(encoding="utf-8")
+
+        def fail(*args, **kwargs):
+            raise RuntimeError("予測に失敗")
+
+        monkeypatch.setattr(PredictionExecutor, "predict_daily_parquet", staticmethod(fail))
+        with pytest.raises(RuntimeError):
+            PredictionExecutor.repredict_changed_races(
+                "2025-11-30", self._updated_tyb(), daily_dir, SimpleNamespace(year=2025), tmp_path, output_path=str(output_path)
+            )
+
+        pd.testing.assert_frame_equal(pd.read_parquet(daily_dir / "TYB_2025.parquet"), previous_tyb)
+        assert output_path.read_text(encoding="utf-8") == previous_json
+
+    def test_apply_tyb_later(self, daily_dir, predicted, tmp_path):
+        """apply_tyb=Falseの場合はTYBを置き換えず、apply_updated_tybで置き換えること"""
+        updated_tyb = self._updated_tyb()
+
+        PredictionExecutor.repredict_changed_races("2025-11-30", updated_tyb, daily_dir, SimpleNamespace(year=2025), tmp_path, apply_tyb=False)
+        assert PredictionExecutor.find_changed_races(pd.read_parquet(daily_dir / "TYB_2025.parquet"), updated_tyb) == ["06_5_1_02"]
+
+        PredictionExecutor.apply_updated_tyb(daily_dir, 2025, updated_tyb)
+        pd.testing.assert_frame_equal(pd.read_parquet(daily_dir / "TYB_2025.parquet"), updated_tyb)
+        assert not list(daily_dir.glob(".*.tmp"))
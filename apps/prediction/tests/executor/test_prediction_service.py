@@ -0,0 +1,193 @@
+"""PredictionService（常駐予測サービス）のテスト - リソースの再利用・読み直しとHTTPのステータスコード"""
+
+import json
+import os
+import threading
+from types import SimpleNamespace
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+import pandas as pd
+import pytest
+
+from src.data_processer._03_08_entity_state_snapshot import EntityStateSnapshot
+from src.executor.prediction_executor import PredictionExecutor
+from src.executor.prediction_service import PredictionService
+
+
+class _StubEntityState:
+    """is_currentの結果を切り替えられるエンティティ状態"""
+
+    def __init__(self):
+        self.current = True
+
+    def is_current(self, parquet_loader) -> bool:
+        return self.current
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    """PredictionExecutor.load_resourcesを置き換え、読み込んだリソースを記録する"""
+    loaded = []
+
+    def load_resources(model_path, base_path, parquet_base_path, year):
+        resources = SimpleNamespace(year=year, entity_state=_StubEntityState())
+        loaded.append(resources)
+        return resources
+
+    monkeypatch.setattr(PredictionExecutor, "load_resources", staticmethod(load_resources))
+    return loaded
+
+
+@pytest.fixture
+def service(tmp_path):
+    model_path = tmp_path / "model.txt"
+    model_path.write_text("model", encoding="utf-8")
+    (tmp_path / "parquet").mkdir()
+    return PredictionService(model_path, tmp_path, tmp_path / "parquet", tmp_path / "daily", output_dir=tmp_path / "output")
+
+
+class TestPredictionServiceResources:
+    """年度ごとのリソースの保持のテスト"""
+
+    def test_reuses_resources(self, service, loads):
+        """同じ年度のリソースは読み込み済みのものを使い回すこと"""
+        first = service.get_resources(2025)
+
+        assert service.get_resources(2025) is first
+        assert service.get_resources(2024) is not first
+        assert len(loads) == 2
+        assert service.loaded_years == [2024, 2025]
+
+    def test_reloads_when_model_changes(self, service, loads):
+        """モデルファイルの更新日時が変わった場合は読み直すこと"""
+        first = service.get_resources(2025)
+        stat = service.model_path.stat()
+        os.utime(service.model_path, (stat.st_atime, stat.st_mtime + 10))
+
+        assert service.get_resources(2025) is not first
+        assert len(loads) == 2
+
+    def test_reloads_when_entity_state_is_stale(self, service, loads):
+        """エンティティ状態の取り込み対象のSED年度パックが変わった場合は読み直すこと"""
+        first = service.get_resources(2025)
+        first.entity_state.current = False
+
+        assert service.get_resources(2025) is not first
+        assert len(loads) == 2
+
+    def test_reloads_when_entity_state_snapshot_is_rewritten(self, service, loads):
+        """SED年度パックが変わらなくても、スナップショットが書き換えられた場合は読み直すこと"""
+        metadata_path = EntityStateSnapshot.get_dir(service.parquet_base_path, 2025) / EntityStateSnapshot.METADATA_FILE_NAME
+        metadata_path.parent.mkdir(parents=True)
+        metadata_path.write_text('{"as_of": 1.0}', encoding="utf-8")
+        first = service.get_resources(2025)
+        assert service.get_resources(2025) is first
+
+        metadata_path.write_text('{"as_of": 2.0}', encoding="utf-8")
+        stat = metadata_path.stat()
+        os.utime(metadata_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+        assert service.get_resources(2025) is not first
+        assert len(loads) == 2
+
+    def test_reload_clears_resources(self, service, loads):
+        """reload()で読み込み済みのリソースを破棄し、次の取得で読み直すこと"""
+        first = service.get_resources(2025)
+        service.reload()
+
+        assert service.loaded_years == []
+        assert service.get_resources(2025) is not first
+
+
+class TestPredictionServiceHandler:
+    """HTTPリクエストハンドラのテスト"""
+
+    @pytest.fixture
+    def base_url(self, service, loads):
+        server = service.create_server("127.0.0.1", 0)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+        server.shutdown()
+        server.server_close()
+
+    @staticmethod
+    def _request(url, body=None, method="POST"):
+        """リクエストを送信し、(ステータスコード, レスポンスのJSON)を返す"""
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        request = Request(url, data=data, method=method, headers={"Content-Type": "application/json"})
+        try:
+            with urlopen(request, timeout=10) as response:
+                return response.status, json.loads(response.read())
+        except HTTPError as e:
+            return e.code, json.loads(e.read())
+
+    def test_health(self, base_url, service):
+        """GET /healthでモデルパスと読み込み済みの年度を返すこと"""
+        service.get_resources(2025)
+
+        status, body = self._request(f"{base_url}/health", method="GET")
+
+        assert status == 200
+        assert body["loaded_years"] == [2025]
+
+    @pytest.mark.parametrize("body", [{}, {"date": 20251130}, ["2025-11-30"], {"date": "2025/11/30"}])
+    def test_invalid_request_is_bad_request(self, base_url, body):
+        """dateがない・不正な場合、ボディがJSONオブジェクトでない場合は400を返すこと"""
+        status, body = self._request(f"{base_url}/predict", body)
+
+        assert status == 400
+        assert "error" in body
+
+    def test_race_keys_must_be_list(self, base_url):
+        """race_keysがリストでない場合は400を返すこと"""
+        status, body = self._request(f"{base_url}/predict", {"date": "2025-11-30", "race_keys": "06_5_1_01"})
+
+        assert status == 400
+        assert "race_keys" in body["error"]
+
+    @pytest.mark.parametrize("endpoint, body", [
+        ("/predict", {"date": "2025-11-30", "daily_parquet_path": "../../etc"}),
+        ("/predict", {"date": "2025-11-30", "daily_parquet_path": "/etc"}),
+        ("/repredict", {"date": "2025-11-30", "tyb_parquet_path": "/etc/passwd"}),
+        ("/repredict", {"date": "2025-11-30", "output_path": "../model.txt"}),
+    ])
+    def test_paths_outside_base_dirs_are_rejected(self, base_url, endpoint, body):
+        """Parquet・出力ディレクトリの外を指すパスは400を返すこと"""
+        status, response = self._request(f"{base_url}{endpoint}", body)
+
+        assert status == 400
+        assert "の中のパスを指定してください" in response["error"]
+
+    def test_predict_with_daily_parquet_path(self, base_url, service, monkeypatch):
+        """daily_parquet_pathは日次Parquetのディレクトリからの相対パスとして解決すること"""
+        calls = []
+
+        def predict_daily_parquet(daily_parquet_path, resources, parquet_base_path, race_keys=None):
+            calls.append((daily_parquet_path, race_keys))
+            return pd.DataFrame({
+                "race_key": ["06_5_1_01"], "horse_number": [1], "horse_name": ["馬"], "jockey_name": ["騎手"],
+                "trainer_name": ["調教師"], "predict": [0.5], "predicted_rank": [1],
+            })
+
+        monkeypatch.setattr(PredictionExecutor, "predict_daily_parquet", staticmethod(predict_daily_parquet))
+        status, body = self._request(f"{base_url}/predict", {"date": "2025-11-30", "daily_parquet_path": "2025-11-30", "race_keys": ["06_5_1_01"]})
+
+        assert status == 200
+        assert calls == [((service.parquet_base_path / "daily" / "2025-11-30").resolve(), ["06_5_1_01"])]
+        assert [p["race_key"] for p in body["predictions"]] == ["06_5_1_01"]
+
+    def test_unknown_path_is_not_found(self, base_url):
+        """存在しないパスは404を返すこと"""
+        assert self._request(f"{base_url}/unknown", {})[0] == 404
+        assert self._request(f"{base_url}/unknown", method="GET")[0] == 404
+
+    def test_reload_endpoint(self, base_url, service):
+        """POST /reloadで読み込み済みのリソースを破棄すること"""
+        service.get_resources(2025)
+
+        status, body = self._request(f"{base_url}/reload", {})
+
+        assert status == 200
+        assert service.loaded_years == []
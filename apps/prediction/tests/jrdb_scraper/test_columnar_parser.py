@@ -0,0 +1,109 @@
+"""列指向デコーダーのテスト"""
+
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from src.jrdb_scraper.parsers.columnar_parser import iter_tables_from_buffer, parse_table_from_buffer
+from src.jrdb_scraper.parsers.format_parser import parse_data_from_buffer
+
+
+class TestParseTableFromBuffer:
+    """parse_table_from_buffer関数のテスト"""
+
+    @pytest.fixture
+    def sample_format(self):
+        """サンプルフォーマット定義（9型/Z型/X型と、同名の予備フィールドを含む）"""
+        return {
+            'dataType': 'TEST',
+            'description': 'テストデータ',
+            'recordLength': 24,
+            'encoding': 'ShiftJIS',
+            'lineEnding': 'CRLF',
+            'fields': [
+                {'name': '場コード', 'start': 1, 'length': 2, 'type': 'integer_nine', 'description': '場コード'},
+                {'name': '予備', 'start': 3, 'length': 1, 'type': 'string', 'description': '予備'},
+                {'name': '名前', 'start': 4, 'length': 10, 'type': 'string', 'description': '名前'},
+                {'name': '数値', 'start': 14, 'length': 5, 'type': 'integer_zero_blank', 'description': '数値'},
+                {'name': '増減', 'start': 19, 'length': 3, 'type': 'integer_nine', 'description': '増減'},
+                {'name': '予備', 'start': 22, 'length': 3, 'type': 'string', 'description': '予備'},
+            ]
+        }
+
+    @staticmethod
+    def _record(code: bytes, name: str, number: bytes, diff: bytes, spare: bytes = b'ABC') -> bytes:
+        """24バイトのレコードを作成"""
+        encoded = name.encode('shift_jis')
+        return code + b' ' + encoded + b' ' * (10 - len(encoded)) + number + diff + spare
+
+    @pytest.fixture
+    def sample_records(self):
+        """数値の境界ケース（空白、符号、全角数字、不正値）と全角文字を含むレコード"""
+        return [
+            self._record(b'01', 'テスト', b'  123', b'+12'),
+            self._record(b'05', '　全角空白', b'     ', b' -4'),
+            self._record(b'10', 'ｱｲｳ', b'00042', b'  0'),
+            self._record(b'  ', 'abc', b'1 2  ', '１'.encode('shift_jis') + b' '),
+            self._record(b'99', '馬名ＡＢ', b'\t1234', b'ABC'),
+        ]
+
+    @pytest.mark.parametrize('separator', [b'\r\n', b'\n', b''])
+    def test_matches_record_parser(self, sample_format, sample_records, separator):
+        """レコード単位のパーサーと同じ値になること（区切りの違いを含む）"""
+        buffer = separator.join(sample_records) + separator
+        expected = pd.DataFrame(parse_data_from_buffer(buffer, sample_format))
+        actual = parse_table_from_buffer(buffer, sample_format).to_pandas()
+
+        pd.testing.assert_frame_equal(actual, expected)
+
+    def test_mixed_separators(self, sample_format, sample_records):
+        """レコードごとに区切りが異なる場合もレコード単位のパーサーと同じ値になること"""
+        buffer = sample_records[0] + b'\r\n' + sample_records[1] + sample_records[2] + b'\n' + sample_records[3] + b'\r\n' + sample_records[4] + b'12'
+        expected = pd.DataFrame(parse_data_from_buffer(buffer, sample_format))
+        actual = parse_table_from_buffer(buffer, sample_format).to_pandas()
+
+        pd.testing.assert_frame_equal(actual, expected)
+
+    def test_column_types(self, sample_format, sample_records):
+        """数値フィールドはint64、文字フィールドはstring、同名フィールドは1カラムになること"""
+        table = parse_table_from_buffer(b'\r\n'.join(sample_records), sample_format)
+
+        assert table.column_names == ['場コード', '予備', '名前', '数値', '増減']
+        assert table.schema.field('場コード').type == pa.int64()
+        assert table.schema.field('名前').type == pa.string()
+        assert table.column('予備').to_pylist() == ['ABC'] * len(sample_records)
+        assert table.column('増減').to_pylist() == [12, -4, 0, 1, None]
+        assert table.column('場コード').to_pylist() == [1, 5, 10, None, 99]
+
+    def test_empty_buffer(self, sample_format):
+        """空のバッファは0行のTableになること"""
+        table = parse_table_from_buffer(b'', sample_format)
+
+        assert table.num_rows == 0
+        assert table.column_names == ['場コード', '予備', '名前', '数値', '増減']
+
+
+class TestIterTablesFromBuffer:
+    """iter_tables_from_buffer関数のテスト"""
+
+    def test_chunks_match_whole_table(self):
+        """チャンクを結合すると一括パースと同じTableになること"""
+        format = {
+            'dataType': 'TEST',
+            'recordLength': 6,
+            'fields': [
+                {'name': '番号', 'start': 1, 'length': 3, 'type': 'integer_nine', 'description': '番号'},
+                {'name': '名前', 'start': 4, 'length': 3, 'type': 'string', 'description': '名前'},
+            ]
+        }
+        buffer = b''.join(f'{i:3d}N{i % 7:02d}\r\n'.encode('ascii') for i in range(23))
+
+        chunks = list(iter_tables_from_buffer(buffer, format, chunkSize=5))
+
+        assert [chunk.num_rows for chunk in chunks] == [5, 5, 5, 5, 3]
+        assert pa.concat_tables(chunks).equals(parse_table_from_buffer(buffer, format))
+
+    def test_invalid_chunk_size(self):
+        """chunkSizeが1未満の場合はエラー"""
+        with pytest.raises(ValueError):
+            list(iter_tables_from_buffer(b'', {'dataType': 'TEST', 'recordLength': 6, 'fields': []}, chunkSize=0))
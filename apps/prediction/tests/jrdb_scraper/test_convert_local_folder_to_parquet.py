@@ -9,12 +9,16 @@ import pytest
 
 from src.jrdb_scraper.convert_local_folder_to_parquet import (
     convert_local_folder_to_parquet,
+    convert_local_folders_to_parquet,
     convert_single_local_file,
     find_lzh_files_in_folder
 )
 from src.jrdb_scraper.entities.jrdb import JRDBDataType
 from src.jrdb_scraper.converter import convert_lzh_to_parquet
 
+# リポジトリに含まれる年度パック
+ANNUAL_DATA_DIR = Path(__file__).resolve().parents[4] / "data" / "annual"
+
 
 class TestFindLzhFilesInFolder:
     """find_lzh_files_in_folderのテスト"""
@@ -58,7 +62,7 @@ class TestConvertSingleLocalFile:
         lzh_file.write_bytes(b"test lzh data")
 
         # モックの設定
-        mock_convert.return_value = (JRDBDataType.SED, [{"場コード": 1, "回": 1, "日": "1", "R": 1, "年月日": 20240101}])
+        mock_convert.return_value = (JRDBDataType.SED, 1)
 
         output_dir = tmp_path / "output"
         result = convert_single_local_file(lzh_file, JRDBDataType.SED, 2024, output_dir)
@@ -129,7 +133,7 @@ class TestConvertLocalFolderToParquet:
             # 実際のconvert_to_parquetを呼び出してrace_keyを生成
             from src.jrdb_scraper.converter import convert_to_parquet
             convert_to_parquet(test_records, output_path, data_type)
-            return (data_type, test_records)
+            return (data_type, len(test_records))
 
         mock_convert.side_effect = mock_convert_side_effect
 
@@ -215,7 +219,7 @@ class TestConvertLocalFolderToParquet:
             test_records = [{"場コード": 1, "年": 24, "回": 1, "日": "1", "R": 1, "年月日": 20240101}]
             from src.jrdb_scraper.converter import convert_to_parquet
             convert_to_parquet(test_records, output_path, data_type)
-            return (data_type, test_records)
+            return (data_type, len(test_records))
 
         mock_convert.side_effect = mock_convert_side_effect
 
@@ -251,3 +255,105 @@ class TestConvertLocalFolderToParquet:
         assert results[0]["success"] is False
         assert "見つかりません" in results[0]["error"]
 
+
+
+@pytest.mark.skipif(not (ANNUAL_DATA_DIR / "2023" / "BAC_2023.lzh").exists(), reason="年度パックがありません")
+class TestConvertLocalFoldersToParquet:
+    """convert_local_folders_to_parquet（プロセスプール版）のテスト"""
+
+    @pytest.fixture
+    def year_folders(self, tmp_path):
+        """BACと、race_key生成にBACの年月日が必要なHJCの年度パック"""
+        folders = {}
+        for year in (2023, 2024):
+            folder = tmp_path / "input" / str(year)
+            folder.mkdir(parents=True)
+            for data_type in ("BAC", "HJC"):
+                (folder / f"{data_type}_{year}.lzh").write_bytes((ANNUAL_DATA_DIR / str(year) / f"{data_type}_{year}.lzh").read_bytes())
+            folders[year] = folder
+        return folders
+
+    def test_process_pool_matches_sequential(self, year_folders, tmp_path):
+        """プロセスプールで変換した結果が逐次変換と同じになること"""
+        data_types = [JRDBDataType.HJC, JRDBDataType.BAC]
+        sequential = convert_local_folders_to_parquet(year_folders, data_types, tmp_path / "sequential", maxWorkers=1)
+        parallel = convert_local_folders_to_parquet(year_folders, data_types, tmp_path / "parallel", maxWorkers=2)
+
+        # 結果は年度順・dataTypesの順
+        assert [(r["year"], r["dataType"]) for r in parallel] == [(2023, "HJC"), (2023, "BAC"), (2024, "HJC"), (2024, "BAC")]
+        assert all(r["success"] for r in parallel)
+        assert all(r["elapsedSeconds"] >= 0 for r in parallel)
+        assert [r["recordCount"] for r in parallel] == [r["recordCount"] for r in sequential]
+        for seq_result, par_result in zip(sequential, parallel, strict=True):
+            expected = pd.read_parquet(seq_result["outputPath"])
+            actual = pd.read_parquet(par_result["outputPath"])
+            pd.testing.assert_frame_equal(actual, expected)
+            assert actual["race_key"].notna().all()
+
+    def test_missing_bac_is_reported_per_type(self, year_folders, tmp_path):
+        """BACがない年度は、BACを必要とするデータタイプが失敗として結果に含まれること"""
+        (year_folders[2024] / "BAC_2024.lzh").unlink()
+
+        results = convert_local_folders_to_parquet(year_folders, [JRDBDataType.BAC, JRDBDataType.HJC], tmp_path / "output", maxWorkers=2)
+
+        assert [(r["year"], r["dataType"], r["success"]) for r in results] == [
+            (2023, "BAC", True), (2023, "HJC", True), (2024, "BAC", False), (2024, "HJC", False)
+        ]
+        assert "見つかりません" in results[2]["error"]
+
+    def test_unchanged_inputs_are_skipped(self, year_folders, tmp_path):
+        """2回目はマニフェストと一致するため再変換しないこと"""
+        folders = {2023: year_folders[2023]}
+        output_dir = tmp_path / "output"
+        first = convert_local_folders_to_parquet(folders, [JRDBDataType.BAC, JRDBDataType.HJC], output_dir, maxWorkers=1)
+        mtimes = {r["dataType"]: Path(r["outputPath"]).stat().st_mtime_ns for r in first}
+
+        second = convert_local_folders_to_parquet(folders, [JRDBDataType.BAC, JRDBDataType.HJC], output_dir, maxWorkers=1)
+
+        assert [r["skipped"] for r in first] == [False, False]
+        assert [r["skipped"] for r in second] == [True, True]
+        assert [r["recordCount"] for r in second] == [r["recordCount"] for r in first]
+        assert {r["dataType"]: Path(r["outputPath"]).stat().st_mtime_ns for r in second} == mtimes
+
+    def test_only_affected_data_types_are_rebuilt(self, year_folders, tmp_path):
+        """フォーマット定義が変わったデータタイプのみ、BACが変わった場合はBACに依存するデータタイプも再変換すること"""
+        folders = {2023: year_folders[2023]}
+        output_dir = tmp_path / "output"
+        data_types = [JRDBDataType.BAC, JRDBDataType.HJC, JRDBDataType.BAB]
+        (year_folders[2023] / "BAB_2023.lzh").write_bytes((ANNUAL_DATA_DIR / "2023" / "BAB_2023.lzh").read_bytes())
+        convert_local_folders_to_parquet(folders, data_types, output_dir, maxWorkers=1)
+
+        from src.jrdb_scraper import parquet_manifest
+        original_hash = parquet_manifest.compute_format_hash
+        with patch.object(parquet_manifest, "compute_format_hash", side_effect=lambda dt: "changed" if dt == JRDBDataType.HJC else original_hash(dt)):
+            results = convert_local_folders_to_parquet(folders, data_types, output_dir, maxWorkers=1)
+        assert {r["dataType"]: r["skipped"] for r in results} == {"BAC": True, "HJC": False, "BAB": True}
+        assert all(r["success"] for r in results)
+
+        # BACの変換元が変わった場合（2024年のパックに差し替え）
+        (year_folders[2023] / "BAC_2023.lzh").write_bytes((ANNUAL_DATA_DIR / "2024" / "BAC_2024.lzh").read_bytes())
+        results = convert_local_folders_to_parquet(folders, data_types, output_dir, maxWorkers=1)
+        assert {r["dataType"]: r["skipped"] for r in results} == {"BAC": False, "HJC": False, "BAB": True}
+
+    def test_partitioned_layout_matches_flat(self, year_folders, tmp_path):
+        """パーティション形式で変換した結果がフラット形式と同じデータになり、2回目は再変換しないこと"""
+        from src.utils.parquet_loader import ParquetLoader
+
+        data_types = [JRDBDataType.BAC, JRDBDataType.HJC]
+        convert_local_folders_to_parquet(year_folders, data_types, tmp_path / "flat", maxWorkers=2)
+        first = convert_local_folders_to_parquet(year_folders, data_types, tmp_path / "partitioned", maxWorkers=2, layout="partitioned")
+
+        assert all(r["success"] for r in first)
+        assert not list((tmp_path / "partitioned").glob("*.parquet"))
+        assert (tmp_path / "partitioned" / "type=HJC" / "year=2024").is_dir()
+        for data_type in ("BAC", "HJC"):
+            expected = ParquetLoader(tmp_path / "flat").load_multi_year_parquet(data_type, [2023, 2024])
+            actual = ParquetLoader(tmp_path / "partitioned").load_multi_year_parquet(data_type, [2023, 2024])
+            sort_columns = ["race_key"] + [c for c in expected.columns if c != "race_key"][:5]
+            pd.testing.assert_frame_equal(
+                actual.sort_values(sort_columns, kind="stable").reset_index(drop=True),
+                expected.sort_values(sort_columns, kind="stable").reset_index(drop=True)
+            )
+
+        second = convert_local_folders_to_parquet(year_folders, data_types, tmp_path / "partitioned", maxWorkers=1, layout="partitioned")
+        assert all(r["skipped"] for r in second)
@@ -0,0 +1,77 @@
+"""コンバーター（ストリーミングParquet書き込み）のテスト"""
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from src.jrdb_scraper.converter import convert_to_parquet, write_tables_to_parquet
+
+
+def _sample_table(num_rows: int, with_ymd: bool = True) -> pa.Table:
+    """race_key生成に必要なカラムを持つTable（数値カラムにnullを含む）"""
+    columns = {
+        '場コード': pa.array([6] * num_rows, type=pa.int64()),
+        '年': pa.array([24] * num_rows, type=pa.int64()),
+        '回': pa.array([1 + i // 24 for i in range(num_rows)], type=pa.int64()),
+        '日': pa.array(['a' if i % 2 else '1' for i in range(num_rows)], type=pa.string()),
+        'R': pa.array([1 + i % 12 for i in range(num_rows)], type=pa.int64()),
+        '着順': pa.array([None if i % 5 == 0 else i % 16 for i in range(num_rows)], type=pa.int64()),
+    }
+    if with_ymd:
+        columns['年月日'] = pa.array([20240106 + i // 24 for i in range(num_rows)], type=pa.int64())
+    return pa.table(columns)
+
+
+def _chunks(table: pa.Table, size: int) -> list[pa.Table]:
+    return [table.slice(start, size) for start in range(0, table.num_rows, size)]
+
+
+class TestWriteTablesToParquet:
+    """write_tables_to_parquet関数のテスト"""
+
+    def test_matches_convert_to_parquet(self, tmp_path):
+        """チャンク単位で書き込んだ結果が一括変換と同じ内容になること"""
+        table = _sample_table(50)
+        convert_to_parquet(table, tmp_path / 'whole.parquet', dataType='SED')
+
+        row_count = write_tables_to_parquet(_chunks(table, 8), tmp_path / 'streamed.parquet', dataType='SED', rowGroupSize=8)
+
+        assert row_count == 50
+        expected = pd.read_parquet(tmp_path / 'whole.parquet')
+        actual = pd.read_parquet(tmp_path / 'streamed.parquet')
+        pd.testing.assert_frame_equal(actual, expected)
+        assert pq.ParquetFile(tmp_path / 'streamed.parquet').num_row_groups == 7
+
+    def test_bac_date_per_batch(self, tmp_path):
+        """年月日がないデータでも、チャンクごとにBACデータから年月日とrace_keyが付与されること"""
+        bac_df = _sample_table(50).to_pandas().drop_duplicates(subset=['場コード', '回', '日', 'R'])
+        table = _sample_table(50, with_ymd=False)
+        convert_to_parquet(table, tmp_path / 'whole.parquet', dataType='KYI', bac_df=bac_df)
+
+        write_tables_to_parquet(_chunks(table, 16), tmp_path / 'streamed.parquet', dataType='KYI', bac_df=bac_df)
+
+        expected = pd.read_parquet(tmp_path / 'whole.parquet')
+        actual = pd.read_parquet(tmp_path / 'streamed.parquet')
+        pd.testing.assert_frame_equal(actual, expected)
+        assert list(actual.columns[-2:]) == ['年月日', 'race_key']
+
+    def test_zero_rows_writes_nothing(self, tmp_path):
+        """レコードが0件の場合はファイルを作成しないこと"""
+        output_path = tmp_path / 'empty.parquet'
+
+        assert write_tables_to_parquet([_sample_table(0)], output_path) == 0
+        assert not output_path.exists()
+        assert list(tmp_path.iterdir()) == []
+
+    def test_failure_keeps_existing_file(self, tmp_path):
+        """途中のチャンクで失敗した場合、既存の出力ファイルを壊さないこと"""
+        output_path = tmp_path / 'data.parquet'
+        write_tables_to_parquet([_sample_table(10)], output_path)
+        broken = _sample_table(10).set_column(4, 'R', pa.nulls(10, type=pa.int64()))
+
+        with pytest.raises(RuntimeError, match='race_key追加に失敗しました'):
+            write_tables_to_parquet([_sample_table(10), broken], output_path)
+
+        assert pd.read_parquet(output_path).shape[0] == 10
+        assert list(tmp_path.iterdir()) == [output_path]
@@ -0,0 +1,243 @@
+"""ダウンロードマネージャーのテスト（ローカルのHTTPサーバーを使用）"""
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.jrdb_scraper.download_manager import (
+    META_SUFFIX,
+    PART_SUFFIX,
+    STATUS_DOWNLOADED,
+    STATUS_NOT_MODIFIED,
+    STATUS_RESUMED,
+    DownloadManager,
+    load_download_meta,
+)
+
+
+class StandInServer:
+    """JRDBサーバーの代わりのHTTPサーバー（keep-alive・Range・ETag/Last-Modified・障害注入に対応）"""
+
+    def __init__(self):
+        self.files = {}
+        self.failures = {}
+        self.requests = []
+        self.connectionCount = 0
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with server.lock:
+                    server.connectionCount += 1
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with server.lock:
+                    server.requests.append((self.path, dict(self.headers)))
+                    failure = server.failures.get(self.path, []).pop(0) if server.failures.get(self.path) else None
+
+                if self.path == "/redirect":
+                    self._send(302, b"", {"Location": "/data/A.lzh"})
+                    return
+                if self.path == "/redirect-other-host":
+                    # 同じサーバーを別のホスト名（localhost）で指す
+                    self._send(302, b"", {"Location": f"http://localhost:{self.server.server_address[1]}/data/A.lzh"})
+                    return
+                if self.path == "/redirect-other-host-close":
+                    # 接続を閉じるリダイレクト（要求元のホストの接続は再利用できない）
+                    self._send(302, b"", {"Location": f"http://localhost:{self.server.server_address[1]}/data/A.lzh", "Connection": "close"})
+                    self.close_connection = True
+                    return
+                if self.path not in server.files:
+                    self._send(404, b"not found")
+                    return
+                if failure == 503:
+                    self._send(503, b"busy", {"Retry-After": "0"})
+                    return
+
+                body, etag, lastModified = server.files[self.path]
+                validators = {"ETag": etag, "Last-Modified": lastModified}
+                if self.headers.get("If-None-Match") == etag:
+                    self._send(304, b"", validators)
+                    return
+
+                status, start = 200, 0
+                rangeHeader = self.headers.get("Range")
+                if rangeHeader and self.headers.get("If-Range") in (etag, lastModified):
+                    start = int(rangeHeader.removeprefix("bytes=").rstrip("-"))
+                    status = 206
+                    validators["Content-Range"] = f"bytes {start}-{len(body) - 1}/{len(body)}"
+
+                payload = body[start:]
+                if failure == "truncate":
+                    # Content-Lengthより短い本文を返して切断する
+                    self.send_response(status)
+                    for key, value in {**validators, "Content-Length": str(len(payload))}.items():
+                        self.send_header(key, value)
+                    self.end_headers()
+                    self.wfile.write(payload[:len(payload) // 2])
+                    self.close_connection = True
+                    return
+                self._send(status, payload, validators)
+
+            def _send(self, status, body, headers=None):
+                self.send_response(status)
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                if status != 304:
+                    self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if status != 304:
+                    self.wfile.write(body)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.baseUrl = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def add_file(self, path, body, etag='"v1"'):
+        self.files[path] = (body, etag, "Wed, 01 Jan 2025 00:00:00 GMT")
+
+
+@pytest.fixture
+def server():
+    standIn = StandInServer()
+    standIn.thread.start()
+    yield standIn
+    standIn.httpd.shutdown()
+    standIn.httpd.server_close()
+
+
+@pytest.fixture
+def manager():
+    downloadManager = DownloadManager(maxWorkers=3, maxRetries=2, backoffSeconds=0.01, timeout=5, username="user", password="pass")
+    yield downloadManager
+    downloadManager.close()
+
+
+class TestDownloadManager:
+    """ダウンロードマネージャーのテスト"""
+
+    def test_download_many_reuses_connections(self, server, manager, tmp_path):
+        """複数ファイルを並列に取得し、接続数はワーカー数以下であること"""
+        for i in range(9):
+            server.add_file(f"/data/F{i}.lzh", bytes([i]) * 100_000)
+
+        results = manager.download_many([(f"{server.baseUrl}/data/F{i}.lzh", tmp_path / f"F{i}.lzh") for i in range(9)])
+
+        assert [r["status"] for r in results] == [STATUS_DOWNLOADED] * 9
+        for i in range(9):
+            assert (tmp_path / f"F{i}.lzh").read_bytes() == bytes([i]) * 100_000
+            assert not (tmp_path / f"F{i}.lzh{PART_SUFFIX}").exists()
+        assert server.connectionCount <= 3
+        assert all(headers["Authorization"].startswith("Basic ") for _, headers in server.requests)
+
+    def test_not_modified_is_skipped(self, server, manager, tmp_path):
+        """ETagが一致する場合は304で再取得しないこと"""
+        server.add_file("/data/A.lzh", b"abc" * 1000)
+        outputPath = tmp_path / "A.lzh"
+        manager.download(f"{server.baseUrl}/data/A.lzh", outputPath)
+
+        result = manager.download(f"{server.baseUrl}/data/A.lzh", outputPath)
+
+        assert result["status"] == STATUS_NOT_MODIFIED
+        assert server.requests[-1][1]["If-None-Match"] == '"v1"'
+        assert outputPath.read_bytes() == b"abc" * 1000
+
+        server.add_file("/data/A.lzh", b"new", etag='"v2"')
+        result = manager.download(f"{server.baseUrl}/data/A.lzh", outputPath)
+        assert result["status"] == STATUS_DOWNLOADED
+        assert outputPath.read_bytes() == b"new"
+        assert load_download_meta(outputPath)["etag"] == '"v2"'
+
+    def test_truncated_download_resumes_with_range(self, server, manager, tmp_path):
+        """途中で切断された場合はRangeリクエストで続きから取得すること"""
+        body = bytes(range(256)) * 1000
+        server.add_file("/data/A.lzh", body)
+        server.failures["/data/A.lzh"] = ["truncate"]
+
+        result = manager.download(f"{server.baseUrl}/data/A.lzh", tmp_path / "A.lzh")
+
+        assert result["success"]
+        assert result["status"] == STATUS_RESUMED
+        assert result["attempts"] == 2
+        assert (tmp_path / "A.lzh").read_bytes() == body
+        assert server.requests[-1][1]["Range"] == f"bytes={len(body) // 2}-"
+        assert server.requests[-1][1]["If-Range"] == '"v1"'
+
+    def test_changed_file_is_downloaded_from_start(self, server, manager, tmp_path):
+        """途中までのデータと検証値が異なる場合は最初から取得し直すこと"""
+        outputPath = tmp_path / "A.lzh"
+        (tmp_path / f"A.lzh{PART_SUFFIX}").write_bytes(b"stale")
+        (tmp_path / f"A.lzh{META_SUFFIX}").write_text('{"partEtag": "\\"old\\""}', encoding="utf-8")
+        server.add_file("/data/A.lzh", b"fresh data")
+
+        result = manager.download(f"{server.baseUrl}/data/A.lzh", outputPath)
+
+        assert result["status"] == STATUS_DOWNLOADED
+        assert outputPath.read_bytes() == b"fresh data"
+
+    def test_retry_on_server_error(self, server, manager, tmp_path):
+        """5xxは再試行し、4xxは再試行しないこと"""
+        server.add_file("/data/A.lzh", b"ok")
+        server.failures["/data/A.lzh"] = [503, 503]
+
+        result = manager.download(f"{server.baseUrl}/data/A.lzh", tmp_path / "A.lzh")
+        assert result["success"]
+        assert result["attempts"] == 3
+
+        missing = manager.download(f"{server.baseUrl}/data/missing.lzh", tmp_path / "missing.lzh")
+        assert not missing["success"]
+        assert missing["attempts"] == 1
+        assert "404" in missing["error"]
+
+    def test_retry_limit(self, server, manager, tmp_path):
+        """再試行回数を超えた場合は失敗を返すこと"""
+        server.add_file("/data/A.lzh", b"ok")
+        server.failures["/data/A.lzh"] = [503, 503, 503]
+
+        result = manager.download(f"{server.baseUrl}/data/A.lzh", tmp_path / "A.lzh")
+
+        assert not result["success"]
+        assert result["attempts"] == 3
+        assert not (tmp_path / "A.lzh").exists()
+
+    def test_redirect(self, server, manager, tmp_path):
+        """リダイレクト先から取得すること"""
+        server.add_file("/data/A.lzh", b"redirected")
+
+        result = manager.download(f"{server.baseUrl}/redirect", tmp_path / "A.lzh")
+
+        assert result["success"]
+        assert (tmp_path / "A.lzh").read_bytes() == b"redirected"
+        assert server.requests[-1][1].get("Authorization") is not None
+
+    def test_cross_host_redirect_drops_authorization(self, server, manager, tmp_path):
+        """別のホストへのリダイレクトでは認証情報を送らないこと"""
+        server.add_file("/data/A.lzh", b"redirected")
+
+        result = manager.download(f"{server.baseUrl}/redirect-other-host", tmp_path / "A.lzh")
+
+        assert result["success"]
+        assert [path for path, _ in server.requests] == ["/redirect-other-host", "/data/A.lzh"]
+        assert server.requests[0][1].get("Authorization") is not None
+        assert "Authorization" not in server.requests[1][1]
+
+    def test_cross_host_redirect_releases_original_connection(self, server, manager, tmp_path):
+        """別のホストへのリダイレクトが接続を閉じる場合、リダイレクト元のホストの接続を破棄すること"""
+        server.add_file("/data/A.lzh", b"redirected")
+
+        result = manager.download(f"{server.baseUrl}/redirect-other-host-close", tmp_path / "A.lzh")
+
+        assert result["success"]
+        port = server.httpd.server_address[1]
+        assert list(manager._connections()) == [("http", f"localhost:{port}")]
+
+        again = manager.download(f"{server.baseUrl}/data/A.lzh", tmp_path / "B.lzh")
+        assert again["success"] and again["attempts"] == 1
@@ -0,0 +1,49 @@
+"""fetch_annual_dataのテスト"""
+
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from src.jrdb_scraper.convert_local_folder_to_parquet import convert_local_folders_to_parquet
+from src.jrdb_scraper.entities.jrdb import JRDBDataType
+from src.jrdb_scraper.fetch_annual_data import fetch_single_annual_data_type
+from src.jrdb_scraper.parquet_manifest import compute_hash, load_manifest
+
+# リポジトリに含まれる年度パック
+ANNUAL_DATA_DIR = Path(__file__).resolve().parents[4] / "data" / "annual"
+
+
+@pytest.mark.skipif(not (ANNUAL_DATA_DIR / "2023" / "BAC_2023.lzh").exists(), reason="年度パックがありません")
+class TestFetchSingleAnnualDataType:
+    """fetch_single_annual_data_type（ダウンロード済みLZHを指定）のテスト"""
+
+    def _fetch(self, data_type, output_dir):
+        lzh_file = ANNUAL_DATA_DIR / "2023" / f"{data_type.value}_2023.lzh"
+        return fetch_single_annual_data_type(2023, data_type, output_dir, lzhFilePath=lzh_file)
+
+    def test_bac_dependency_matches_local_conversion(self, tmp_path):
+        """BACの年月日が必要なデータタイプは、BACのハッシュを変換条件に含め、ローカル変換と同じ結果になること"""
+        self._fetch(JRDBDataType.BAC, tmp_path / "fetch")
+        result = self._fetch(JRDBDataType.HJC, tmp_path / "fetch")
+
+        entry = load_manifest(tmp_path / "fetch")["HJC_2023.parquet"]
+        assert entry["dependencyHashes"] == {"BAC": compute_hash(ANNUAL_DATA_DIR / "2023" / "BAC_2023.lzh")}
+
+        local = convert_local_folders_to_parquet({2023: ANNUAL_DATA_DIR / "2023"}, [JRDBDataType.BAC, JRDBDataType.HJC], tmp_path / "local", maxWorkers=1)
+        expected = pd.read_parquet(local[1]["outputPath"])
+        actual = pd.read_parquet(result["outputPath"])
+        pd.testing.assert_frame_equal(actual, expected)
+        assert load_manifest(tmp_path / "local")["HJC_2023.parquet"]["dependencyHashes"] == entry["dependencyHashes"]
+
+    def test_rebuilds_when_bac_changes(self, tmp_path):
+        """BACの変換元が変わった場合は、BACに依存するデータタイプも再変換すること"""
+        self._fetch(JRDBDataType.BAC, tmp_path)
+        self._fetch(JRDBDataType.HJC, tmp_path)
+        assert self._fetch(JRDBDataType.HJC, tmp_path)["skipped"] is True
+
+        # BACを2024年のパックに差し替え（2023年のレースの年月日がないため、再変換はrace_keyの生成で失敗する）
+        fetch_single_annual_data_type(2023, JRDBDataType.BAC, tmp_path, lzhFilePath=ANNUAL_DATA_DIR / "2024" / "BAC_2024.lzh")
+        result = self._fetch(JRDBDataType.HJC, tmp_path)
+        assert not result.get("skipped", False)
+        assert "race_key" in result["error"]
@@ -0,0 +1,115 @@
+"""LZHのインプロセス展開のテスト"""
+
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from src.jrdb_scraper import lzh_decoder
+from src.jrdb_scraper.lzh_decoder import LzhDecodeError, iter_lzh_members
+from src.jrdb_scraper.lzh_extractor import extract_lzh_file
+
+# リポジトリに含まれる年度パック（-lh5-、レベル2ヘッダー）
+ANNUAL_PACK = Path(__file__).resolve().parents[4] / "data" / "annual" / "2023" / "BAB_2023.lzh"
+
+
+def _crc16(data: bytes) -> int:
+    """LHAのCRC16（多項式0xA001）"""
+    crc = 0
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+    return crc
+
+
+def _level0_member(name: bytes, content: bytes, method: bytes = b'-lh0-') -> bytes:
+    """無圧縮メンバー（レベル0ヘッダー）を作成"""
+    header = method + len(content).to_bytes(4, 'little') + len(content).to_bytes(4, 'little') + b'\x00' * 4 + b'\x20\x00' + bytes([len(name)]) + name + _crc16(content).to_bytes(2, 'little')
+    return bytes([len(header), sum(header) & 0xFF]) + header + content
+
+
+def _member_crcs(buffer: bytes) -> list[int]:
+    """レベル2ヘッダーに記録されたメンバーごとのCRC16"""
+    crcs, offset = [], 0
+    while buffer[offset] != 0:
+        crcs.append(int.from_bytes(buffer[offset + 21:offset + 23], 'little'))
+        offset += int.from_bytes(buffer[offset:offset + 2], 'little') + int.from_bytes(buffer[offset + 7:offset + 11], 'little')
+    return crcs
+
+
+class TestCrc16:
+    """メンバーのCRC16計算のテスト"""
+
+    @pytest.mark.parametrize('size', [0, 1, 255, 256, 257, 1000, 65536, 300001])
+    def test_matches_bitwise_crc(self, size):
+        """ブロック数・端数によらず、1ビットずつ計算したCRC16と一致すること"""
+        data = bytes((index * 131 + index // 7) & 0xFF for index in range(size))
+
+        assert lzh_decoder._crc16(data) == _crc16(data)
+
+
+class TestIterLzhMembers:
+    """iter_lzh_members関数のテスト"""
+
+    @pytest.mark.skipif(not ANNUAL_PACK.exists(), reason="年度パックがありません")
+    def test_annual_pack_matches_crc(self):
+        """年度パックの全メンバーがヘッダーのCRC16と一致すること"""
+        buffer = ANNUAL_PACK.read_bytes()
+        members = list(iter_lzh_members(buffer))
+
+        assert len(members) == len(_member_crcs(buffer)) > 100
+        assert members[0][1] == 'BAB230105.txt'
+        assert [_crc16(content) for content, _ in members] == _member_crcs(buffer)
+
+    def test_stored_members(self):
+        """無圧縮（-lh0-）メンバーをファイル名つきで順に返すこと"""
+        buffer = _level0_member(b'A.txt', b'hello\r\n') + _level0_member(b'dir\\B.txt', b'') + b'\x00'
+
+        assert list(iter_lzh_members(buffer)) == [(b'hello\r\n', 'A.txt'), (b'', 'B.txt')]
+
+    def test_unsupported_method(self):
+        """未対応の圧縮方式はLzhDecodeError"""
+        buffer = _level0_member(b'A.txt', b'hello', method=b'-lh1-') + b'\x00'
+
+        with pytest.raises(LzhDecodeError, match='未対応の圧縮方式'):
+            list(iter_lzh_members(buffer))
+
+    def test_crc_mismatch(self):
+        """展開結果がヘッダーのCRC16と一致しない場合はLzhDecodeError"""
+        member = bytearray(_level0_member(b'A.txt', b'hello world'))
+        member[-1] ^= 0xFF
+
+        with pytest.raises(LzhDecodeError, match='CRC16'):
+            list(iter_lzh_members(bytes(member) + b'\x00'))
+
+    def test_truncated_archive(self):
+        """圧縮データが途中で切れている場合はLzhDecodeError"""
+        buffer = _level0_member(b'A.txt', b'hello world')[:-3]
+
+        with pytest.raises(LzhDecodeError):
+            list(iter_lzh_members(buffer))
+
+
+class TestExtractLzhFile:
+    """extract_lzh_file関数のテスト"""
+
+    def test_returns_text_members(self):
+        """.txtメンバーのみを返すこと"""
+        buffer = _level0_member(b'A.txt', b'abc') + _level0_member(b'readme.doc', b'x') + b'\x00'
+
+        assert extract_lzh_file(buffer) == [(b'abc', 'A.txt')]
+
+    @patch('src.jrdb_scraper.lzh_extractor.extract_lzh_file_with_lha')
+    def test_falls_back_to_lha(self, mock_lha):
+        """インプロセス展開に失敗した場合はlhaコマンドで解凍し、未取得のメンバーのみ追加すること"""
+        mock_lha.return_value = [(b'abc', 'A.txt'), (b'def', 'B.txt')]
+        buffer = _level0_member(b'A.txt', b'abc') + _level0_member(b'B.txt', b'def', method=b'-lh1-') + b'\x00'
+
+        assert extract_lzh_file(buffer) == [(b'abc', 'A.txt'), (b'def', 'B.txt')]
+        assert mock_lha.called
+
+    def test_no_text_members(self):
+        """.txtメンバーがない場合はエラー"""
+        with pytest.raises(ValueError, match='.txtファイルが見つかりません'):
+            extract_lzh_file(_level0_member(b'readme.doc', b'x') + b'\x00')
@@ -0,0 +1,63 @@
+"""Parquet出力のマニフェストのテスト"""
+
+import json
+
+from src.jrdb_scraper.converter import CONVERTER_VERSION
+from src.jrdb_scraper.entities.jrdb import JRDBDataType
+from src.jrdb_scraper.parquet_manifest import (
+    MANIFEST_FILE_NAME,
+    build_fingerprint,
+    compute_hash,
+    is_up_to_date,
+    load_manifest,
+    record_outputs,
+)
+
+
+class TestParquetManifest:
+    """マニフェストの読み書きと判定のテスト"""
+
+    def test_fingerprint(self):
+        """変換元・フォーマット定義・コンバーターのバージョンを含むこと"""
+        fingerprint = build_fingerprint(compute_hash(b"lzh"), JRDBDataType.KYI, {"BAC": "abc"})
+
+        assert fingerprint["sourceHash"] == compute_hash(b"lzh")
+        assert len(fingerprint["formatHash"]) == 64
+        assert fingerprint["converterVersion"] == CONVERTER_VERSION
+        assert fingerprint["dependencyHashes"] == {"BAC": "abc"}
+
+    def test_file_hash_matches_bytes_hash(self, tmp_path):
+        """ファイルのハッシュとバイト列のハッシュが一致すること"""
+        path = tmp_path / "a.lzh"
+        path.write_bytes(b"x" * 3_000_000)
+
+        assert compute_hash(path) == compute_hash(b"x" * 3_000_000)
+
+    def test_round_trip(self, tmp_path):
+        """記録した変換条件と一致し、出力ファイルが存在する場合のみ最新と判定されること"""
+        fingerprint = build_fingerprint(compute_hash(b"lzh"), JRDBDataType.SED)
+        record_outputs(tmp_path, {"SED_2024.parquet": {**fingerprint, "recordCount": 10}})
+        manifest = load_manifest(tmp_path)
+
+        assert manifest["SED_2024.parquet"]["recordCount"] == 10
+        assert not is_up_to_date(manifest, tmp_path, "SED_2024.parquet", fingerprint)
+
+        (tmp_path / "SED_2024.parquet").write_bytes(b"")
+        assert is_up_to_date(manifest, tmp_path, "SED_2024.parquet", fingerprint)
+        assert not is_up_to_date(manifest, tmp_path, "SED_2024.parquet", {**fingerprint, "sourceHash": compute_hash(b"other")})
+        assert not is_up_to_date(manifest, tmp_path, "SED_2024.parquet", {**fingerprint, "converterVersion": CONVERTER_VERSION + 1})
+
+    def test_record_keeps_other_entries(self, tmp_path):
+        """追記時に他のファイルのエントリを保持すること"""
+        record_outputs(tmp_path, {"A_2024.parquet": {"recordCount": 1}})
+        record_outputs(tmp_path, {"B_2024.parquet": {"recordCount": 2}})
+
+        with open(tmp_path / MANIFEST_FILE_NAME, encoding="utf-8") as f:
+            files = json.load(f)["files"]
+        assert sorted(files) == ["A_2024.parquet", "B_2024.parquet"]
+
+    def test_broken_manifest_is_ignored(self, tmp_path):
+        """壊れたマニフェストは空として扱うこと"""
+        (tmp_path / MANIFEST_FILE_NAME).write_text("{broken", encoding="utf-8")
+
+        assert load_manifest(tmp_path) == {}
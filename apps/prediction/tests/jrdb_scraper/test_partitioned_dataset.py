@@ -0,0 +1,122 @@
+"""Hiveパーティション形式の書き込み・読み込み・移行のテスト"""
+
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.jrdb_scraper.parquet_manifest import MANIFEST_FILE_NAME, load_manifest, record_outputs
+from src.jrdb_scraper.partitioned_dataset import (
+    LAYOUT_FLAT,
+    LAYOUT_PARTITIONED,
+    get_output_name,
+    list_partition_files,
+    migrate_flat_to_partitioned,
+    publish_output,
+    write_partitioned_dataset,
+)
+from src.utils.parquet_loader import ParquetLoader
+
+
+def _sed_df(year: int, months=(1, 2, 10, 12)) -> pd.DataFrame:
+    """年月日順に並んだSED相当のデータ（最後の行は年月日が欠損）"""
+    ymd = [year * 10000 + month * 100 + day for month in months for day in (1, 15)]
+    return pd.DataFrame({
+        "年月日": pd.array(ymd + [None], dtype="Int64"),
+        "血統登録番号": [f"{year}{i:04d}" for i in range(len(ymd) + 1)],
+        "着順": pd.array(list(range(1, len(ymd) + 1)) + [None], dtype="Int32"),
+        "タイム": np.arange(len(ymd) + 1, dtype=float),
+    })
+
+
+class TestPartitionedDataset:
+    """パーティション形式のテストクラス"""
+
+    def test_write_and_load_single_year(self, tmp_path):
+        """月ごとのパーティションに書き出し、フラット形式と同じDataFrameとして読み込めること"""
+        flat_path = tmp_path / "SED_2023.parquet"
+        expected = _sed_df(2023)
+        expected.to_parquet(flat_path, index=False)
+
+        row_count = write_partitioned_dataset(flat_path, tmp_path, "SED", 2023)
+        flat_path.unlink()
+
+        assert row_count == len(expected)
+        months = [path.parent.name for path in list_partition_files(tmp_path, "SED", [2023])]
+        assert months == ["month=1", "month=2", "month=10", "month=12", "month=__HIVE_DEFAULT_PARTITION__"]
+        actual = ParquetLoader(tmp_path).load_annual_pack_parquet("SED", 2023)
+        pd.testing.assert_frame_equal(actual, expected)
+
+    def test_multi_year_single_scan(self, tmp_path):
+        """複数年度（スキーマが異なる年度・フラット形式の年度を含む）を年度順に読み込めること"""
+        frames = {2021: _sed_df(2021), 2022: _sed_df(2022).drop(columns=["タイム"]), 2023: _sed_df(2023)}
+        for year, df in frames.items():
+            df.to_parquet(tmp_path / f"SED_{year}.parquet", index=False)
+        migrate_flat_to_partitioned(tmp_path, years=[2021, 2022])
+        loader = ParquetLoader(tmp_path)
+
+        actual = loader.load_multi_year_parquet("SED", [2023, 2022, 2021, 2020])
+
+        expected = pd.concat([frames[2021], frames[2022], frames[2023]], ignore_index=True)
+        pd.testing.assert_frame_equal(actual, expected)
+        assert loader.has_annual_pack("SED", 2021) and loader.has_annual_pack("SED", 2023)
+        assert not loader.has_annual_pack("SED", 2020)
+        assert loader.load_multi_year_parquet("SED", [2020]) is None
+
+    def test_projection_and_partition_filter(self, tmp_path):
+        """カラム指定とパーティション（year・month）を使ったフィルタを同時に指定できること"""
+        for year in (2022, 2023):
+            _sed_df(year).to_parquet(tmp_path / f"SED_{year}.parquet", index=False)
+        migrate_flat_to_partitioned(tmp_path)
+
+        actual = ParquetLoader(tmp_path).load_multi_year_parquet(
+            "SED", [2022, 2023], columns=["血統登録番号", "month"], filters=[("month", "=", 10)]
+        )
+
+        assert list(actual.columns) == ["血統登録番号"]
+        assert actual["血統登録番号"].tolist() == ["20220004", "20220005", "20230004", "20230005"]
+
+    def test_rewrite_replaces_year(self, tmp_path):
+        """同じ年度を書き直すと、以前の月のパーティションは残らないこと"""
+        flat_path = tmp_path / "SED_2023.parquet"
+        _sed_df(2023).to_parquet(flat_path, index=False)
+        write_partitioned_dataset(flat_path, tmp_path, "SED", 2023)
+
+        _sed_df(2023, months=(3,)).to_parquet(flat_path, index=False)
+        write_partitioned_dataset(flat_path, tmp_path, "SED", 2023)
+
+        assert [path.parent.name for path in list_partition_files(tmp_path, "SED", [2023])] == ["month=3", "month=__HIVE_DEFAULT_PARTITION__"]
+        assert not list((tmp_path / "type=SED").glob(".*"))
+
+    def test_migrate_moves_manifest_entries(self, tmp_path):
+        """移行でフラット形式のファイルを削除し、マニフェストのエントリをパーティションのキーに付け替えること"""
+        _sed_df(2023).to_parquet(tmp_path / "SED_2023.parquet", index=False)
+        _sed_df(2023).to_parquet(tmp_path / "BAC_2023.parquet", index=False)
+        (tmp_path / "train_2023.parquet").write_bytes(b"not a pack")
+        record_outputs(tmp_path, {"SED_2023.parquet": {"sourceHash": "abc", "recordCount": 9}})
+
+        results = migrate_flat_to_partitioned(tmp_path, dataTypes=["SED"])
+
+        assert [(r["dataType"], r["year"], r["success"]) for r in results] == [("SED", 2023, True)]
+        assert not (tmp_path / "SED_2023.parquet").exists()
+        assert (tmp_path / "BAC_2023.parquet").exists()
+        manifest = load_manifest(tmp_path)
+        assert "SED_2023.parquet" not in manifest
+        assert manifest["type=SED/year=2023"]["sourceHash"] == "abc"
+        assert json.loads((tmp_path / MANIFEST_FILE_NAME).read_text(encoding="utf-8"))["files"]
+
+    def test_publish_output(self, tmp_path):
+        """出力形式に応じて公開し、フラット形式で再変換した場合は古いパーティションを削除すること"""
+        flat_path = tmp_path / "SED_2023.parquet"
+        _sed_df(2023).to_parquet(flat_path, index=False)
+
+        output_path = publish_output(flat_path, tmp_path, "SED", 2023, LAYOUT_PARTITIONED)
+        assert output_path == tmp_path / get_output_name("SED", 2023, LAYOUT_PARTITIONED)
+        assert not flat_path.exists()
+
+        _sed_df(2023).to_parquet(flat_path, index=False)
+        assert publish_output(flat_path, tmp_path, "SED", 2023, LAYOUT_FLAT) == flat_path
+        assert not output_path.exists()
+        with pytest.raises(ValueError):
+            publish_output(flat_path, tmp_path, "SED", 2023, "unknown")
@@ -0,0 +1,99 @@
+"""InferencePlan（学習済みLightGBMモデルの推論計画）のテスト"""
+
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.inference_plan import InferencePlan
+
+
+class TestInferencePlan:
+    """InferencePlanのテスト"""
+
+    FEATURES = ["f_a", "f_b", "f_c"]
+
+    @pytest.fixture
+    def model(self):
+        """3特徴量の回帰モデル"""
+        rng = np.random.default_rng(0)
+        train_df = pd.DataFrame(rng.normal(size=(300, 3)), columns=self.FEATURES)
+        label = train_df["f_a"] * 2 - train_df["f_b"] + train_df["f_c"] * 0.5
+        dataset = lgb.Dataset(train_df, label=label)
+        return lgb.train({"objective": "regression", "verbose": -1, "num_threads": 1}, dataset, num_boost_round=20)
+
+    @pytest.fixture
+    def race_df(self):
+        """モデルにないカラム・順序の異なるカラム・nullable整数型を含む予測対象データ"""
+        rng = np.random.default_rng(1)
+        return pd.DataFrame({
+            "race_key": np.arange(8),
+            "f_c": rng.normal(size=8),
+            "馬名": ["馬"] * 8,
+            "f_a": rng.normal(size=8),
+            "f_b": pd.array([1, None, 3, 4, 5, 6, None, 8], dtype="Int32"),
+        })
+
+    def test_matches_booster_predict_in_model_order(self, model, race_df):
+        """カラムの順序・余分なカラムに関係なく、モデルの特徴量順で予測した結果と一致すること"""
+        expected = model.predict(race_df[self.FEATURES].astype(float).to_numpy())
+        plan = InferencePlan(model)
+
+        assert plan.feature_names == self.FEATURES
+        np.testing.assert_allclose(plan.predict(race_df), expected, rtol=1e-5)
+
+    def test_reuses_matrix_for_different_row_counts(self, model, race_df):
+        """行数の異なる予測を続けても、前回の値が残らないこと"""
+        plan = InferencePlan(model)
+        plan.predict(race_df)
+        subset = race_df.iloc[:3]
+
+        expected = model.predict(subset[self.FEATURES].astype(float).to_numpy())
+        np.testing.assert_allclose(plan.predict(subset), expected, rtol=1e-5)
+        np.testing.assert_allclose(plan.predict(race_df), model.predict(race_df[self.FEATURES].astype(float).to_numpy()), rtol=1e-5)
+
+    def test_large_predictions_do_not_keep_matrix(self, model, race_df, monkeypatch):
+        """使い回す行数の上限を超える予測では、入力行列を保持しないこと"""
+        monkeypatch.setattr(InferencePlan, "REUSED_MATRIX_MAX_ROWS", 4)
+        plan = InferencePlan(model)
+        plan.predict(race_df.iloc[:3])
+
+        np.testing.assert_allclose(plan.predict(race_df), model.predict(race_df[self.FEATURES].astype(float).to_numpy()), rtol=1e-5)
+        assert plan._matrix.shape[0] == 3
+
+    def test_fills_missing_features_and_converts_object_columns(self, model, race_df):
+        """入力にない特徴量は0、object型のカラムは数値に変換して予測すること"""
+        plan = InferencePlan(model)
+        converted = race_df.drop(columns=["f_c"]).assign(f_a=race_df["f_a"].astype(str))
+
+        expected = model.predict(race_df[self.FEATURES].astype(float).assign(f_c=0.0).to_numpy())
+        assert plan.missing_features(converted) == ["f_c"]
+        np.testing.assert_allclose(plan.predict(converted), expected, rtol=1e-5)
+
+    def test_raises_when_no_features(self, model):
+        """モデルの特徴量が1つもない場合はValueErrorになること"""
+        with pytest.raises(ValueError, match="特徴量が見つかりません"):
+            InferencePlan(model).predict(pd.DataFrame({"race_key": [1, 2]}))
+
+    def test_for_model_caches_plan_and_reads_num_threads(self, model, monkeypatch):
+        """同じモデルの推論計画は使い回し、スレッド数は環境変数から取得すること"""
+        monkeypatch.setenv(InferencePlan.ENV_NUM_THREADS, "2")
+
+        assert InferencePlan.for_model(model) is InferencePlan.for_model(model)
+        assert InferencePlan(model).num_threads == 2
+        assert InferencePlan(model, num_threads=1).num_threads == 1
+
+    def test_large_magnitude_features_match_float64_predict(self):
+        """start_datetime（約2e11）・2^24を超えるIDでも、float64で予測した結果と完全に一致すること"""
+        rng = np.random.default_rng(2)
+        train_df = pd.DataFrame({
+            "start_datetime": 202501051000 + np.arange(400) * 7,
+            "horse_id": 20180000 + rng.permutation(400),
+        })
+        label = (train_df["start_datetime"] % 3) + (train_df["horse_id"] % 2) * 0.5
+        dataset = lgb.Dataset(train_df, label=label, params={"max_bin": 1023})
+        model = lgb.train({"objective": "regression", "verbose": -1, "num_threads": 1, "min_data_in_leaf": 1}, dataset, num_boost_round=30)
+        race_df = train_df.assign(horse_id=pd.array(train_df["horse_id"], dtype="Int32")).iloc[::-1]
+
+        expected = model.predict(race_df[["start_datetime", "horse_id"]].to_numpy(dtype=np.float64))
+        np.testing.assert_array_equal(InferencePlan(model).predict(race_df), expected)
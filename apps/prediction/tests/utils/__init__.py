@@ -0,0 +1 @@
+"""utilsモジュールのテスト"""
@@ -0,0 +1,62 @@
+"""ArrowConcatのテスト - 1回の結合が従来の逐次pd.concatと同じ結果になることを確認"""
+
+import pandas as pd
+import pyarrow as pa
+
+from src.utils.arrow_concat import ArrowConcat
+from src.utils.memory_monitor import MemoryMonitor
+from src.utils.parquet_loader import ParquetLoader
+
+
+def _year_df(year: int, rows: int = 4) -> pd.DataFrame:
+    """年度ごとのSED相当のデータ"""
+    return pd.DataFrame({
+        "年月日": [year * 10000 + 101 + i for i in range(rows)],
+        "血統登録番号": [f"{year}{i:04d}" for i in range(rows)],
+        "着順": pd.array([1, None, 3, 4][:rows], dtype="Int32"),
+    })
+
+
+class TestArrowConcat:
+    """ArrowConcatのテストクラス"""
+
+    def test_concat_tables_to_pandas(self):
+        """Arrowテーブルの結合結果がDataFrameの結合と同じになり、カラムが異なる年度は欠損で補われること"""
+        frames = [_year_df(2022), _year_df(2023).drop(columns=["着順"]), _year_df(2024)]
+        tables = [pa.Table.from_pandas(df, preserve_index=False) for df in frames]
+
+        result = ArrowConcat.concat_tables_to_pandas([None] + tables)
+
+        pd.testing.assert_frame_equal(result, pd.concat(frames, ignore_index=True))
+        assert ArrowConcat.concat_tables_to_pandas([None]) is None
+
+    def test_concat_frames(self):
+        """逐次結合と同じ結果になり、Noneと空のDataFrameは無視し、渡したリストは空になること"""
+        frames = [_year_df(2022), None, _year_df(2023).iloc[:0], _year_df(2024)]
+        expected = pd.concat([frames[0], frames[3]], ignore_index=True)
+
+        result = ArrowConcat.concat_frames(frames)
+
+        pd.testing.assert_frame_equal(result, expected)
+        assert frames == []
+        assert ArrowConcat.concat_frames([None]) is None
+
+    def test_load_multi_year_parquet_flat(self, tmp_path):
+        """フラット形式の複数年度を1つのDataFrameとして年度順に読み込めること"""
+        frames = [_year_df(year) for year in (2022, 2023)]
+        for df in frames:
+            df.to_parquet(tmp_path / f"SED_{df['年月日'].iloc[0] // 10000}.parquet", index=False)
+
+        result = ParquetLoader(tmp_path).load_multi_year_parquet("SED", [2023, 2022], columns=["血統登録番号", "着順"])
+
+        expected = pd.concat(frames, ignore_index=True)[["血統登録番号", "着順"]]
+        pd.testing.assert_frame_equal(result, expected)
+
+    def test_peak_memory_usage(self):
+        """ピークメモリ使用量が現在のメモリ使用量以上になること"""
+        current_mb = MemoryMonitor.get_memory_usage_mb()
+        peak_mb = MemoryMonitor.get_peak_memory_usage_mb()
+
+        assert peak_mb is not None and peak_mb > 0
+        if current_mb is not None:
+            assert peak_mb >= current_mb * 0.99
@@ -0,0 +1,152 @@
+"""CacheManagerのテスト - ステージ単位のキャッシュキーと保存・読み込み"""
+
+import importlib
+import multiprocessing
+import sys
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+
+import src.utils as utils_package
+from src.utils.cache_manager import CacheManager
+
+
+@pytest.fixture
+def schema_file(tmp_path):
+    path = tmp_path / "_04_training_schema.json"
+    path.write_text('{"columns": []}', encoding="utf-8")
+    return path
+
+
+def _load_stage_repeatedly(prediction_app_path, count):
+    """別プロセスからキャッシュを繰り返し読み込む（インデックスのヒット数を更新する）"""
+    cache_manager = CacheManager(prediction_app_path)
+    for _ in range(count):
+        cache_manager.load_stage("split", "key1", ["train"])
+
+
+class TestCacheManagerStage:
+    """ステージ単位のキャッシュのテストクラス"""
+
+    def test_stage_key_changes_with_each_input(self, schema_file):
+        """入力・ファイルの内容・パラメータ・コードバージョンのいずれかが変わるとキーが変わること"""
+        base = {"stage": "converted", "version": 1, "inputs": {"featured_2024": "a"}, "files": [schema_file], "params": {"years": [2024]}}
+        key = CacheManager.build_stage_key(**base)
+
+        assert CacheManager.build_stage_key(**base) == key
+        assert CacheManager.build_stage_key(**{**base, "inputs": {"featured_2024": "b"}}) != key
+        assert CacheManager.build_stage_key(**{**base, "params": {"years": [2023]}}) != key
+        assert CacheManager.build_stage_key(**{**base, "version": 2}) != key
+        assert CacheManager.build_stage_key(**{**base, "stage": "split"}) != key
+        schema_file.write_text('{"columns": [1]}', encoding="utf-8")
+        assert CacheManager.build_stage_key(**base) != key
+
+    def test_save_and_load_stage(self, tmp_path):
+        """保存したDataFrameがインデックスを含めて読み込めること、保存されていないキーはNoneになること"""
+        cache_manager = CacheManager(tmp_path)
+        train_df = pd.DataFrame({"x": [1.0, 2.0]}, index=pd.Index([2024010101010101, 2024010101010102], name="race_key"))
+        eval_df = pd.DataFrame({"y": ["a", "b"]})
+
+        assert cache_manager.save_stage("split", "key1", {"train": train_df, "eval": eval_df}, {"split_date": "2024-06-01"})
+        loaded = cache_manager.load_stage("split", "key1", ["train", "eval"])
+
+        pd.testing.assert_frame_equal(loaded["train"], train_df)
+        pd.testing.assert_frame_equal(loaded["eval"], eval_df)
+        assert cache_manager.load_stage("split", "key2", ["train"]) is None
+        assert cache_manager.load_stage("split", "key1", ["test"]) is None
+
+    def test_incomplete_stage_is_ignored(self, tmp_path):
+        """メタデータがない（書き込み途中の）ステージは読み込まないこと"""
+        cache_manager = CacheManager(tmp_path)
+        stage_dir = cache_manager.get_stage_dir("featured", "key1")
+        stage_dir.mkdir(parents=True)
+        pd.DataFrame({"x": [1]}).to_parquet(stage_dir / "featured.parquet")
+
+        assert cache_manager.load_stage("featured", "key1", ["featured"]) is None
+
+
+def _frame(rows: int) -> pd.DataFrame:
+    return pd.DataFrame({"x": range(rows)})
+
+
+class TestCacheManagerIndex:
+    """キャッシュのインデックスと容量上限のテストクラス"""
+
+    def test_index_records_size_and_hits(self, tmp_path):
+        """保存したエントリのサイズ・ヒット数とステージごとのヒット・ミスが記録されること"""
+        cache_manager = CacheManager(tmp_path)
+        cache_manager.save_stage("featured", "key1", {"featured": _frame(10)})
+
+        cache_manager.load_stage("featured", "key1", ["featured"])
+        cache_manager.load_stage("featured", "key1", ["featured"])
+        cache_manager.load_stage("featured", "key2", ["featured"])
+
+        (entry,) = cache_manager.list_entries()
+        assert entry["id"] == "stages/featured/key1"
+        assert entry["hits"] == 2
+        assert entry["size_bytes"] == CacheManager._path_size(cache_manager.get_stage_dir("featured", "key1"))
+        assert cache_manager.get_stats() == {"featured": {"hits": 2, "misses": 1}}
+
+    def test_legacy_entries_are_indexed(self, tmp_path):
+        """年度・データタイプ単位のキャッシュもインデックスに登録され、分割日の有無で別エントリになること"""
+        cache_manager = CacheManager(tmp_path)
+        cache_manager.save(["SED"], 2024, None, converted_df=_frame(3))
+        cache_manager.save(["SED"], 2024, "2024-06-01", train_df=_frame(1), test_df=_frame(1), eval_df=_frame(1))
+
+        assert cache_manager.load(["SED"], 2024) is not None
+        entries = {entry["id"]: entry for entry in cache_manager.list_entries()}
+
+        assert set(entries) == {"SED_2024", "SED_2024_20240601"}
+        assert entries["SED_2024"]["hits"] == 1
+        assert len(entries["SED_2024_20240601"]["paths"]) == 4
+
+    def test_lru_eviction_on_save(self, tmp_path):
+        """容量上限を超えた場合、最終アクセスが古いエントリから削除され、保存直後のエントリは残ること"""
+        probe = CacheManager(tmp_path / "probe")
+        probe.save_stage("featured", "probe", {"featured": _frame(1000)})
+        entry_size = probe.get_total_size()
+
+        cache_manager = CacheManager(tmp_path, max_size_bytes=int(entry_size * 2.5))
+        cache_manager.save_stage("featured", "a", {"featured": _frame(1000)})
+        cache_manager.save_stage("featured", "b", {"featured": _frame(1000)})
+        cache_manager.load_stage("featured", "a", ["featured"])
+        cache_manager.save_stage("featured", "c", {"featured": _frame(1000)})
+
+        assert [entry["id"] for entry in cache_manager.list_entries()] == ["stages/featured/a", "stages/featured/c"]
+        assert not cache_manager.get_stage_dir("featured", "b").exists()
+        assert cache_manager.get_eviction_candidates(entry_size) == cache_manager.list_entries()[:1]
+
+    def test_index_rebuilt_from_disk(self, tmp_path):
+        """インデックスが削除されても、ディスク上のキャッシュから作り直されること"""
+        cache_manager = CacheManager(tmp_path)
+        cache_manager.save_stage("split", "key1", {"train": _frame(2)})
+        (tmp_path / "cache" / CacheManager.INDEX_FILE_NAME).unlink()
+
+        (entry,) = CacheManager(tmp_path).list_entries()
+
+        assert entry["id"] == "stages/split/key1" and entry["stage"] == "split" and entry["hits"] == 0
+
+    def test_concurrent_access_from_processes(self, tmp_path):
+        """複数プロセスから同時に読み込んでも、インデックスのヒット数が失われないこと"""
+        cache_manager = CacheManager(tmp_path)
+        cache_manager.save_stage("split", "key1", {"train": _frame(2)})
+
+        context = multiprocessing.get_context("fork")
+        processes = [context.Process(target=_load_stage_repeatedly, args=(tmp_path, 20)) for _ in range(4)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+
+        assert all(process.exitcode == 0 for process in processes)
+        assert cache_manager.get_stats()["split"]["hits"] == 80
+        assert cache_manager.list_entries()[0]["hits"] == 80
+
+    def test_import_without_fcntl(self):
+        """fcntlがない環境（Windows）でもモジュールを読み込めること"""
+        with patch.dict(sys.modules, {"fcntl": None}), patch.object(utils_package, "cache_manager", utils_package.cache_manager):
+            del sys.modules["src.utils.cache_manager"]
+            module = importlib.import_module("src.utils.cache_manager")
+
+        assert module.CacheManager.INDEX_LOCK_FILE_NAME == CacheManager.INDEX_LOCK_FILE_NAME
@@ -0,0 +1,103 @@
+"""FeatureConverterのテスト - ベクトル化した年月日処理が行単位の処理と同一の結果になることを確認"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.utils.feature_converter import FeatureConverter
+
+MESSY_YMD_SERIES = {
+    "int64": pd.Series([20240101, 20240101, 240101, 0, -5, 123456789], dtype="int64"),
+    "uint64": pd.Series([20240101, 2**64 - 1], dtype="uint64"),
+    "float64": pd.Series([20240101.0, 20240101.9, np.nan, np.inf, -np.inf, -0.0, 1e20, 240101.0]),
+    "Int64": pd.Series([20240101, None, 240101], dtype="Int64"),
+    "Float64": pd.Series([20240101.5, None], dtype="Float64"),
+    "bool": pd.Series([True, False]),
+    "category": pd.Series(pd.Categorical([20240101, 20240102, 20240101])),
+    "string": pd.Series(["20240101", None, "240101"], dtype="string"),
+    "object_str": pd.Series(["20240101", "20240101.0", "2024.01.01", "", "  1 ", "abc", "-5", None, np.nan]),
+    "object_mixed": pd.Series([20240101, 20240101.0, "20240102", None, np.nan, pd.NA, True, 240101.7, "2024.1", 1e20]),
+    "empty": pd.Series([], dtype=object),
+}
+
+
+@pytest.fixture
+def messy_bac_df():
+    """型の揃っていないBACデータ（年月日の欠損・不正値、同一キーの重複を含む）"""
+    return pd.DataFrame({
+        "場コード": ["01", 1.0, 5, 10, 6, 6],
+        "年": [24, 24, 24, 24, 24, 24],
+        "回": [1, 1, 2, 3, 4, 4],
+        "日": ["A", "a", 1, "c", "2", "2"],
+        "R": [1, 1, 11, 12, 3, 3],
+        "年月日": [20240101, "20240102.0", np.nan, "x", 20241130.0, 20241201],
+    })
+
+
+def _legacy_bac_date_mapping(bac_df: pd.DataFrame) -> dict:
+    """ベクトル化前のcreate_bac_date_mapping（iterrowsで1行ずつ処理）"""
+    bac_df_subset = bac_df[FeatureConverter.RACE_KEY_REQUIRED_COLUMNS + ["年月日"]].copy()
+    bac_df_subset["ymd"] = bac_df_subset["年月日"].apply(FeatureConverter.safe_ymd)
+    date_map = {}
+    for _, row in bac_df_subset[bac_df_subset["ymd"].str.len() == 8].iterrows():
+        key = (
+            FeatureConverter.safe_int(row["場コード"]),
+            FeatureConverter.safe_int(row["回"]),
+            str(row["日"]).lower(),
+            FeatureConverter.safe_int(row["R"]),
+        )
+        date_map[key] = row["ymd"]
+    return date_map
+
+
+class TestFeatureConverterVectorizedYmd:
+    """年月日処理のベクトル化のテストクラス"""
+
+    @pytest.mark.parametrize("name", list(MESSY_YMD_SERIES))
+    def test_safe_ymd_vectorized_matches_apply(self, name):
+        """safe_ymd_vectorizedがapply(safe_ymd)と同一の結果になること"""
+        values = MESSY_YMD_SERIES[name].rename("年月日")
+        values.index = values.index * 3 + 7
+
+        expected = values.apply(FeatureConverter.safe_ymd).astype(object)
+        actual = FeatureConverter.safe_ymd_vectorized(values)
+
+        pd.testing.assert_series_equal(actual, expected)
+        assert [type(value) for value in actual] == [str] * len(values)
+
+    def test_add_start_datetime_to_df(self):
+        """start_datetimeが年月日×10000になり、不正な年月日はエラーになること"""
+        df = pd.DataFrame({"年月日": [20240101, 20240102.0, "20240103"]})
+
+        result = FeatureConverter.add_start_datetime_to_df(df)
+
+        assert result["start_datetime"].tolist() == [202401010000, 202401020000, 202401030000]
+        with pytest.raises(ValueError, match="年月日が不正/欠損"):
+            FeatureConverter.add_start_datetime_to_df(pd.DataFrame({"年月日": [20240101, np.nan]}))
+
+    def test_extract_ymd_prefers_primary_column(self):
+        """年月日カラムが取得できない行のみフォールバックカラムを使用すること"""
+        df = pd.DataFrame({"ymd": ["20240105", None, np.nan], "年月日": [20230101, 20230102.0, "20230103"]})
+
+        year, month, day = FeatureConverter.extract_ymd_from_df_vectorized(df, ymd_col="ymd", ymd_fallback_col="年月日")
+
+        assert year.tolist() == [2024, 2023, 2023]
+        assert month.tolist() == [1, 1, 1]
+        assert day.tolist() == [5, 2, 3]
+
+    def test_create_bac_date_mapping_matches_legacy(self, messy_bac_df):
+        """create_bac_date_mappingがiterrows版と同一の辞書（キーの型・順序を含む）になること"""
+        expected = _legacy_bac_date_mapping(messy_bac_df)
+        actual = FeatureConverter.create_bac_date_mapping(messy_bac_df)
+
+        assert list(actual.items()) == list(expected.items())
+        assert [tuple(type(k) for k in key) for key in actual] == [tuple(type(k) for k in key) for key in expected]
+        assert actual[(6, 4, "2", 3)] == "20241201"
+
+    def test_create_bac_date_mapping_for_merge(self, messy_bac_df):
+        """マージ用マッピングのkeyがrace_keyと同じ表記になること"""
+        result = FeatureConverter.create_bac_date_mapping_for_merge(messy_bac_df)
+
+        assert result["key"].tolist() == ["01_1_a_01", "01_1_a_01", "10_3_c_12", "06_4_2_03", "06_4_2_03"]
+        # safe_ymdと同様、8桁に0埋めできる値は数字以外を含んでも除外されない
+        assert result["ymd"].tolist() == ["20240101", "20240102", "0000000x", "20241130", "20241201"]
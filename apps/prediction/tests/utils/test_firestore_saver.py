@@ -0,0 +1,133 @@
+"""Firestoreへの予測結果保存のテスト - 値の変換とエミュレーターでの部分更新（ローカルのHTTPサーバーを使用）"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from src.utils.firestore_saver import (
+    _from_firestore_value,
+    _prediction_to_firestore_map,
+    _to_firestore_value,
+    update_race_predictions_in_firestore,
+)
+
+
+def _record(race_key, horse_number, rank, score=0.5):
+    return {
+        "race_key": race_key, "horse_number": horse_number, "horse_name": f"馬{horse_number}", "jockey_name": "騎手",
+        "trainer_name": "調教師", "predicted_score": score, "predicted_rank": rank,
+    }
+
+
+class StandInEmulator:
+    """Firestoreエミュレーターの代わりのHTTPサーバー（ドキュメントのGETとupdateMask付きのPATCHに対応）"""
+
+    def __init__(self):
+        self.documents = {}
+        self.patches = []
+        emulator = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                document = emulator.documents.get(urlsplit(self.path).path)
+                if document is None:
+                    self._send(404, {"error": "not found"})
+                    return
+                self._send(200, document)
+
+            def do_PATCH(self):
+                url = urlsplit(self.path)
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                mask = parse_qs(url.query).get("updateMask.fieldPaths", [])
+                emulator.patches.append((url.path, mask))
+                document = emulator.documents.setdefault(url.path, {"fields": {}})
+                for name in mask or body["fields"]:
+                    document["fields"][name] = body["fields"][name]
+                self._send(200, document)
+
+            def _send(self, status, body):
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.host = f"127.0.0.1:{self.httpd.server_address[1]}"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+
+@pytest.fixture
+def emulator(monkeypatch):
+    standIn = StandInEmulator()
+    standIn.thread.start()
+    monkeypatch.setenv("USE_FIREBASE_EMULATOR", "true")
+    monkeypatch.setenv("FIRESTORE_EMULATOR_HOST", standIn.host)
+    monkeypatch.setenv("GCLOUD_PROJECT", "test-project")
+    yield standIn
+    standIn.httpd.shutdown()
+    standIn.httpd.server_close()
+
+
+DOC_PATH = "/v1/projects/test-project/databases/(default)/documents/predictions/date_2025_11_30"
+
+
+class TestFirestoreValue:
+    """Firestoreの値の変換のテスト"""
+
+    def test_round_trip_prediction(self):
+        """予測結果をFirestoreの値に変換して戻すと元の値になること"""
+        record = _record("06_5_1_01", 3, 1, 0.75)
+
+        assert _from_firestore_value(_prediction_to_firestore_map(record)) == record
+
+    def test_scalar_and_array_values(self):
+        """整数（文字列で保存）・null・bool・配列・タイムスタンプを変換できること"""
+        assert _from_firestore_value(_to_firestore_value(12)) == 12
+        assert _from_firestore_value({"integerValue": "12"}) == 12
+        assert _from_firestore_value(_to_firestore_value(None)) is None
+        assert _from_firestore_value(_to_firestore_value(True)) is True
+        assert _from_firestore_value({"arrayValue": {"values": [{"stringValue": "a"}, {"doubleValue": 1.5}]}}) == ["a", 1.5]
+        assert _from_firestore_value({"arrayValue": {}}) == []
+        assert _from_firestore_value({"timestampValue": "2025-11-30T00:00:00Z"}) == "2025-11-30T00:00:00Z"
+
+    def test_unsupported_value(self):
+        """対応していない値はValueErrorになること"""
+        with pytest.raises(ValueError):
+            _from_firestore_value({"geoPointValue": {}})
+
+
+class TestUpdateRacePredictionsInFirestore:
+    """update_race_predictions_in_firestore（エミュレーター）のテスト"""
+
+    def test_replaces_only_given_races(self, emulator):
+        """指定したレースの予測結果のみを置き換え、他のレースとcreated_atは残すこと"""
+        existing = [_record("06_5_1_01", 1, 1), _record("06_5_1_01", 2, 2), _record("06_5_1_02", 1, 1)]
+        emulator.documents[DOC_PATH] = {"fields": {
+            "date": {"stringValue": "2025-11-30"},
+            "created_at": {"timestampValue": "2025-11-30T00:00:00Z"},
+            "predictions": {"arrayValue": {"values": [_prediction_to_firestore_map(p) for p in existing]}},
+        }}
+
+        total_count = update_race_predictions_in_firestore("2025-11-30", [_record("06_5_1_02", 2, 1, 0.9)], ["06_5_1_02"])
+
+        fields = emulator.documents[DOC_PATH]["fields"]
+        assert total_count == 3
+        assert _from_firestore_value(fields["predictions"]) == existing[:2] + [_record("06_5_1_02", 2, 1, 0.9)]
+        assert fields["total_count"] == {"integerValue": "3"}
+        assert fields["created_at"] == {"timestampValue": "2025-11-30T00:00:00Z"}
+        assert sorted(emulator.patches[0][1]) == ["date", "predictions", "total_count", "updated_at"]
+
+    def test_creates_document_when_missing(self, emulator):
+        """ドキュメントがない場合は指定したレースの予測結果のみで作成すること"""
+        total_count = update_race_predictions_in_firestore("2025-11-30", [_record("06_5_1_01", 1, 1)], ["06_5_1_01"])
+
+        assert total_count == 1
+        assert _from_firestore_value(emulator.documents[DOC_PATH]["fields"]["predictions"]) == [_record("06_5_1_01", 1, 1)]
@@ -0,0 +1,79 @@
+"""KeyCodecのテスト - 整数キーが従来の文字列キーに復元できることを確認"""
+
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.utils.feature_converter import FeatureConverter
+from src.utils.key_codec import KeyCodec
+
+
+@pytest.fixture
+def race_df():
+    """全場・回・日・Rの組み合わせ（2年分、文字列race_keyは年度間で重複する）"""
+    rows = list(itertools.product([20230701, 20240701], range(1, 11), range(1, 7), list("123456789abc"), range(1, 13)))
+    df = pd.DataFrame(rows, columns=["年月日", "場コード", "回", "日", "R"])
+    df["race_key"] = FeatureConverter.generate_race_key_vectorized(df["場コード"], df["回"], df["日"], df["R"])
+    return df
+
+
+class TestKeyCodec:
+    """KeyCodecのテストクラス"""
+
+    def test_round_trip(self, race_df):
+        """整数キーから従来の文字列race_keyに復元できること"""
+        packed = KeyCodec.pack_race_key_column(race_df)
+
+        assert packed.dtype == np.int64
+        assert KeyCodec.decode_race_keys(packed).tolist() == race_df["race_key"].tolist()
+        assert (KeyCodec.race_key_dates(packed) == race_df["年月日"].to_numpy()).all()
+
+    def test_unique_across_years(self, race_df):
+        """文字列race_keyが同じでも開催日が異なれば別のキーになること"""
+        packed = KeyCodec.pack_race_key_column(race_df)
+
+        assert race_df["race_key"].nunique() == len(race_df) // 2
+        assert packed.nunique() == len(race_df)
+
+    def test_order_follows_date(self):
+        """整数キーの大小が開催日→場コード→回→日→Rの順になること"""
+        df = pd.DataFrame({"年月日": [20240702, 20240701, 20240701], "場コード": [1, 10, 1], "回": [1, 1, 1], "日": ["1", "1", "2"], "R": [1, 1, 12]})
+
+        assert np.argsort(KeyCodec.pack_race_key_column(df).to_numpy()).tolist() == [2, 1, 0]
+
+    def test_invalid_components(self):
+        """欠損・桁あふれ・16進数1桁でない日はエラーになること"""
+        base = {"年月日": [20240701], "場コード": [1], "回": [1], "日": ["1"], "R": [1]}
+        for column, value in [("場コード", np.nan), ("R", 100), ("日", "10"), ("日", None), ("年月日", 240701)]:
+            with pytest.raises(ValueError):
+                KeyCodec.pack_race_key_column(pd.DataFrame({**base, column: [value]}))
+
+    def test_entity_codes(self):
+        """エンティティコードをInt32に変換し、0埋めの文字列に復元できること（不正値は欠損）"""
+        codes = KeyCodec.encode_entity_codes(pd.Series(["21103456", "00000012", None, "2110345A", " "], name="血統登録番号"), 8)
+
+        assert str(codes.dtype) == "Int32"
+        assert codes.isna().tolist() == [False, False, True, True, True]
+        assert KeyCodec.decode_entity_codes(codes, 8).tolist() == ["21103456", "00000012", None, None, None]
+
+        numeric = KeyCodec.encode_entity_codes(pd.Series([1234.0, np.nan, 5.0]), 5)
+        assert KeyCodec.decode_entity_codes(numeric, 5).tolist() == ["01234", None, "00005"]
+
+    def test_encode_and_decode_keys(self, race_df):
+        """race_keyがインデックスの場合も整数化でき、出力時に元の文字列へ戻せること"""
+        df = race_df.head(30).assign(馬番=1, 騎手コード=pd.array([1234] * 30, dtype="Int64")).set_index(["race_key", "馬番"])
+
+        encoded = KeyCodec.encode_keys(df)
+        assert encoded.index.names == ["race_key", "馬番"]
+        assert KeyCodec.is_packed(encoded.index.get_level_values("race_key"))
+        assert str(encoded["騎手コード"].dtype) == "Int32"
+        # 整数化済みのDataFrameはそのまま
+        pd.testing.assert_frame_equal(KeyCodec.encode_keys(encoded), encoded)
+        # 元のDataFrameは変更しない
+        assert df.index.get_level_values("race_key").dtype == object
+
+        decoded = KeyCodec.decode_keys(encoded.reset_index())
+        assert decoded["race_key"].tolist() == race_df.head(30)["race_key"].tolist()
+        assert decoded["騎手コード"].tolist() == ["01234"] * 30
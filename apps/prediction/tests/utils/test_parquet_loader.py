@@ -0,0 +1,122 @@
+"""ParquetLoaderのテスト - カラム・行フィルタのpushdown読み込み"""
+
+import pandas as pd
+import pytest
+
+from src.jrdb_scraper.partitioned_dataset import write_partitioned_dataset
+from src.utils.parquet_loader import ParquetLoader
+
+
+@pytest.fixture
+def parquet_dir(tmp_path):
+    """行グループを複数持つSEDの年度パックParquet"""
+    sed_df = pd.DataFrame({
+        "race_key": [f"06_1_{day}_{r:02d}" for day in range(1, 5) for r in range(1, 4)],
+        "年月日": [20230100 + day for day in range(1, 5) for _ in range(1, 4)],
+        "血統登録番号": [f"2020{i:04d}" for i in range(12)],
+        "着順": pd.array([1, 2, 3, None] * 3, dtype="Int32"),
+        "馬名": [f"馬{i}" for i in range(12)],
+    })
+    sed_df.to_parquet(tmp_path / "SED_2023.parquet", index=False, row_group_size=3)
+    return tmp_path, sed_df
+
+
+class TestParquetLoader:
+    """ParquetLoaderのテストクラス"""
+
+    def test_load_without_projection(self, parquet_dir):
+        """columns・filters未指定の場合は全カラム・全行を読み込むこと"""
+        path, sed_df = parquet_dir
+
+        result = ParquetLoader(path).load_annual_pack_parquet("SED", 2023)
+
+        pd.testing.assert_frame_equal(result, sed_df)
+
+    def test_column_projection(self, parquet_dir):
+        """指定したカラムのみを指定順で読み込み、存在しないカラムは無視すること"""
+        path, sed_df = parquet_dir
+
+        result = ParquetLoader(path).load_annual_pack_parquet("SED", 2023, columns=["着順", "race_key", "存在しないカラム", "着順"])
+
+        pd.testing.assert_frame_equal(result, sed_df[["着順", "race_key"]])
+
+    def test_date_range_filter(self, parquet_dir):
+        """年月日の範囲で行を絞り込むこと（終了日は含まない）"""
+        path, sed_df = parquet_dir
+        loader = ParquetLoader(path)
+
+        result = loader.load_annual_pack_parquet("SED", 2023, filters=ParquetLoader.date_range_filter(20230102, 20230104))
+
+        expected = sed_df[(sed_df["年月日"] >= 20230102) & (sed_df["年月日"] < 20230104)].reset_index(drop=True)
+        pd.testing.assert_frame_equal(result, expected)
+        assert ParquetLoader.date_range_filter() is None
+        assert len(loader.load_annual_pack_parquet("SED", 2023, filters=ParquetLoader.date_range_filter(start=20230104))) == 3
+
+    def test_isin_filter_with_projection(self, parquet_dir):
+        """血統登録番号の集合による絞り込みとカラム指定を同時に行えること"""
+        path, sed_df = parquet_dir
+        horse_ids = {"20200001", "20200007", "29999999"}
+
+        result = ParquetLoader(path).load_annual_pack_parquet(
+            "SED", 2023, columns=["血統登録番号", "着順"], filters=ParquetLoader.isin_filter("血統登録番号", horse_ids)
+        )
+
+        expected = sed_df.loc[sed_df["血統登録番号"].isin(horse_ids), ["血統登録番号", "着順"]].reset_index(drop=True)
+        pd.testing.assert_frame_equal(result, expected)
+
+    def test_tuple_filters(self, parquet_dir):
+        """pd.read_parquetと同じ形式のフィルタも指定できること"""
+        path, sed_df = parquet_dir
+
+        result = ParquetLoader(path).load_annual_pack_parquet("SED", 2023, filters=[("年月日", "==", 20230101), ("着順", "<=", 2)])
+
+        assert result["race_key"].tolist() == ["06_1_1_01", "06_1_1_02"]
+
+    def test_load_parquet_files_per_data_type_columns(self, parquet_dir):
+        """load_parquet_filesでデータタイプごとにカラムを指定できること"""
+        path, sed_df = parquet_dir
+        sed_df.to_parquet(path / "BAC_2023.parquet", index=False)
+
+        data_dict = ParquetLoader(path).load_parquet_files(["SED", "BAC"], 2023, columns={"SED": ["race_key"]})
+
+        assert list(data_dict["SED"].columns) == ["race_key"]
+        assert list(data_dict["BAC"].columns) == list(sed_df.columns)
+
+    def test_missing_file(self, parquet_dir):
+        """ファイルが存在しない場合の動作はカラム指定時も変わらないこと"""
+        path, _ = parquet_dir
+        loader = ParquetLoader(path)
+
+        assert loader.load_annual_pack_parquet("SED", 2022, raise_on_not_found=False, columns=["race_key"]) is None
+        with pytest.raises(FileNotFoundError):
+            loader.load_annual_pack_parquet("SED", 2022, columns=["race_key"])
+
+    def test_annual_pack_fingerprint(self, parquet_dir):
+        """年度パックの内容が変わるとフィンガープリントが変わり、存在しない場合はNoneになること"""
+        path, sed_df = parquet_dir
+        loader = ParquetLoader(path)
+
+        fingerprint = loader.get_annual_pack_fingerprint("SED", 2023)
+        assert fingerprint == loader.get_annual_pack_fingerprint("SED", 2023)
+        assert loader.get_annual_pack_fingerprint("SED", 2022) is None
+
+        sed_df.head(6).to_parquet(path / "SED_2023.parquet", index=False)
+        assert loader.get_annual_pack_fingerprint("SED", 2023) != fingerprint
+
+    def test_mixed_layouts_are_loaded_in_year_order(self, tmp_path):
+        """フラット形式とパーティション形式が混在する場合も年度順に結合すること"""
+        frames = {
+            year: pd.DataFrame({"race_key": [f"{year}_{i}" for i in range(2)], "年月日": [year * 10000 + 101 + i for i in range(2)]})
+            for year in (2021, 2022, 2023, 2024)
+        }
+        for year, df in frames.items():
+            df.to_parquet(tmp_path / f"SED_{year}.parquet", index=False)
+        # 2022年・2024年のみパーティション形式
+        for year in (2022, 2024):
+            write_partitioned_dataset(tmp_path / f"SED_{year}.parquet", tmp_path, "SED", year)
+            (tmp_path / f"SED_{year}.parquet").unlink()
+
+        result = ParquetLoader(tmp_path).load_multi_year_parquet("SED", [2024, 2021, 2023, 2022], columns=["race_key", "年月日"])
+
+        expected = pd.concat([frames[year] for year in (2021, 2022, 2023, 2024)], ignore_index=True)
+        pd.testing.assert_frame_equal(result.reset_index(drop=True), expected, check_dtype=False)
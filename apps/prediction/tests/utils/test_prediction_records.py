@@ -0,0 +1,38 @@
+"""予測結果の辞書のリストの操作のテスト"""
+
+from src.utils.prediction_records import patch_prediction_records
+
+
+def _record(race_key, horse_number, rank, score=0.0):
+    return {
+        "race_key": race_key, "horse_number": horse_number, "horse_name": f"馬{horse_number}", "jockey_name": "騎手",
+        "trainer_name": "調教師", "predicted_score": score, "predicted_rank": rank,
+    }
+
+
+class TestPatchPredictionRecords:
+    """patch_prediction_recordsのテスト"""
+
+    def test_replaces_only_given_races(self):
+        """指定したレースの予測結果のみを置き換え、他のレースの予測結果はそのまま残すこと"""
+        predictions = [
+            _record("06_5_1_01", 1, 1), _record("06_5_1_01", 2, 2),
+            _record("06_5_1_02", 1, 2), _record("06_5_1_02", 2, 1),
+        ]
+        updated = [_record("06_5_1_02", 2, 2, 0.1), _record("06_5_1_02", 1, 1, 0.9)]
+
+        patched = patch_prediction_records(predictions, updated, ["06_5_1_02"])
+
+        assert patched[:2] == predictions[:2]
+        assert [(p["race_key"], p["horse_number"], p["predicted_rank"]) for p in patched[2:]] == [
+            ("06_5_1_02", 1, 1), ("06_5_1_02", 2, 2)
+        ]
+
+    def test_removes_race_without_new_predictions_and_adds_new_race(self):
+        """新しい予測結果がないレースは削除し、元の予測結果にないレースは追加して、race_key・予測順位の順に並べること"""
+        predictions = [_record("06_5_1_02", 1, 1), _record("06_5_1_03", 1, 1)]
+        updated = [_record("06_5_1_01", 3, 1)]
+
+        patched = patch_prediction_records(predictions, updated, ["06_5_1_01", "06_5_1_03"])
+
+        assert [(p["race_key"], p["horse_number"]) for p in patched] == [("06_5_1_01", 3), ("06_5_1_02", 1)]